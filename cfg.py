@@ -13,7 +13,8 @@ APP_CFG = {
 
     # In case of URL_TIMEOUT, MAX_DOWNLOAD_REATTEMPTS specifies number of maximum attempts to \
     # download an URL resource. Set it to None, if you prefer not to reattempt. \
-    # If "URL_TIMEOUT" is already set to None, application ignores this configuration.
+    # If "URL_TIMEOUT" is already set to None, application ignores this configuration. \
+    # With RETRY_POLICY, failed URLs are retried later instead, and it only applies to resuming interrupted transfers.
     MAX_DOWNLOAD_REATTEMPTS: 2,
 
     # If you need to use a proxy, assign a dictionary (e.g; using proxies argument) mapping protocol \
@@ -34,4 +35,275 @@ APP_CFG = {
     # All the options are case-insensitive.
     # If an invalid option is provided, then by default application will configure itself with "INFO".
     LOG_LEVEL: "INFO",
+
+    # Set how the logs are written. Available options are "sync" and "async".
+    # "sync" writes every log record into the log file on the thread which logs it.
+    # "async" only queues the log records on the logging threads. A single background thread formats them, \
+    # writes them into the log file and rotates it, so that downloader threads never wait on the log file.
+    LOG_MODE: "sync",
+
+    # Download engine of the application. Available options are "thread" and "asyncio".
+    # "thread" employs four downloader threads, each of them downloads one URL at a time.
+    # "asyncio" runs all the downloads on a single asyncio event loop using the non-blocking "aiohttp" \
+    # HTTP client, so it can keep thousands of downloads in flight at the same time.
+    # "asyncio" requires "aiohttp" package. If it is not installed, application falls back to "thread".
+    # This configuration can also be overridden by "--engine" command line option.
+    DOWNLOAD_ENGINE: "thread",
+
+    # Maximum number of downloads which "asyncio" engine keeps in flight at the same time.
+    # If DOWNLOAD_ENGINE is "thread", application ignores this configuration.
+    ASYNC_MAX_CONCURRENCY: 1000,
+
+    # Application keeps one HTTP connection pool per host, which is shared by the URL validation and the image download.
+    # HTTP_POOL_SIZE specifies the maximum number of connections kept open (alive) per host for reuse.
+    HTTP_POOL_SIZE: 10,
+
+    # Maximum number of hosts whose HTTP connection pool is kept. Beyond it, least recently used pool gets closed.
+    HTTP_POOL_MAX_HOSTS: 100,
+
+    # If True, connections are kept alive and reused by subsequent requests to the same host, which avoids \
+    # a new TCP connection (and TLS handshake) per request. Set it to False for servers which misbehave on \
+    # persistent connections.
+    HTTP_KEEP_ALIVE: True,
+
+    # Specifies how the application validates that an URL is a downloadable image. Available options are "head" and "get".
+    # "head" sends a HEAD request per URL while parsing the file and only queues the URLs of image resources \
+    # for download. It costs two requests per image (HEAD, then GET).
+    # "get" skips the HEAD request. The downloader validates the headers of the (streamed) GET response as \
+    # soon as they arrive, and drops the connection before the body is transferred for non-image resources.
+    # Use "head" for servers which do not report the content-type of a resource properly on GET requests.
+    URL_VALIDATION: "head",
+
+    # Whether or not the downloader checks the first bytes of every image against the signatures of the image formats \
+    # (JPEG, PNG, GIF, TIFF, WebP, JPEG 2000, BMP, HEIC, AVIF, SVG, etc.). The transfer of a resource which is not an \
+    # image (e.g; an HTML error page labelled "image/jpeg") is aborted right away, and an image is saved with the \
+    # extension of its format. Resources whose type is not declared (e.g; "application/octet-stream") are then \
+    # validated by their content instead of being rejected.
+    IMAGE_SNIFFING: False,
+
+    # Size limits of an image, in bytes. Images smaller than MIN_IMAGE_SIZE (e.g; tracking pixels) or larger than \
+    # MAX_IMAGE_SIZE are not saved. The size reported by the server (Content-Length header) is checked first, while \
+    # the URLs are validated and before the body is transferred. A transfer whose size is not reported, or which \
+    # exceeds the reported size (e.g; an endless chunked response), is aborted as soon as it exceeds MAX_IMAGE_SIZE.
+    # None as MAX_IMAGE_SIZE removes the maximum size limit.
+    MIN_IMAGE_SIZE: 0,
+    MAX_IMAGE_SIZE: None,
+
+    # Number of bytes which have to remain free on the disk of IMAGE_SAVE_DIR. Downloads are paused while the disk \
+    # has less free space, and resumed once space has been freed. None disables the check.
+    MIN_FREE_DISK_SPACE: None,
+
+    # Maximum number of seconds the downloads stay paused for lack of free space (see MIN_FREE_DISK_SPACE). Then, \
+    # the URLs are failed right away until space has been freed. None waits for free space as long as needed.
+    MAX_DISK_SPACE_WAIT: 600,
+
+    # Number of threads which concurrently validate the URLs read from the plaintext file (see URL_VALIDATION).
+    # Slow or dead hosts only hold up one validator thread, while the other threads keep validating URLs. \
+    # With more than one thread, URLs might get downloaded in a different order than they are listed in the file.
+    # If URL_VALIDATION is "get", application ignores this configuration.
+    NUM_VALIDATOR_THREADS: 4,
+
+    # Content-addressed de-duplication of downloaded images. Available options are None, "hardlink" and "manifest".
+    # None saves every downloaded image as its own file.
+    # Otherwise, every image is hashed (SHA-256) while it is downloaded. If an identical image has already been \
+    # saved into IMAGE_SAVE_DIR (also by an earlier run), "hardlink" saves the duplicate as a hardlink to the \
+    # saved file, while "manifest" does not save it at all and records it into IMAGE_SAVE_DIR/.duplicates_manifest.
+    DEDUP_MODE: None,
+
+    # If True, URLs are normalized while parsing the plaintext file (lowercase scheme and host, no default port, \
+    # no fragment) and the URLs which have already been seen are skipped before validation.
+    # Seen URLs are kept in a Bloom filter, a compact probabilistic set, so that lists of hundreds of millions \
+    # of URLs fit into a fixed memory budget. As a trade-off, a small fraction of unique URLs might be mistaken \
+    # for duplicates and skipped (see URL_DEDUP_FP_RATE).
+    URL_DEDUP: False,
+
+    # Memory (in MB) reserved for the Bloom filter of seen URLs. If URL_DEDUP is False, application ignores it.
+    URL_DEDUP_MEMORY_MB: 32,
+
+    # Targeted probability of mistaking a unique URL for a duplicate. Together with URL_DEDUP_MEMORY_MB, it \
+    # determines how many unique URLs the Bloom filter holds before this probability starts rising \
+    # (e.g; 32 MB and 0.001 hold about 18 million URLs). If URL_DEDUP is False, application ignores it.
+    URL_DEDUP_FP_RATE: 0.001,
+
+    # Path of the job journal (a SQLite database), which records the state of every URL of a run \
+    # (pending, validated, downloaded or failed). An interrupted run can then be resumed (see JOURNAL_RESUME).
+    # Every new (not resumed) run starts over with an empty journal. Set it to None to disable the journal.
+    JOURNAL_PATH: None,
+
+    # Maximum number of URL states written to the journal per transaction. States are written by a \
+    # background thread, so downloading never waits on the journal.
+    JOURNAL_BATCH_SIZE: 1000,
+
+    # If True, the run resumes the job recorded in the journal: downloaded and failed URLs are skipped, \
+    # validated URLs are downloaded without being validated again, and all the others are processed again.
+    # It is usually enabled by "--resume" command line option. If JOURNAL_PATH is None, application ignores it.
+    JOURNAL_RESUME: False,
+
+    # Path of the conditional-request cache. For every downloaded image, it keeps the validators sent by the \
+    # server (ETag and Last-Modified headers), its size and its local path. Later runs request these images \
+    # conditionally (If-None-Match / If-Modified-Since headers): an unchanged image is answered with \
+    # "304 Not Modified" without its body, and is not downloaded again. Set it to None to disable the cache.
+    HTTP_CACHE_PATH: None,
+
+    # Maximum number of URLs kept in the conditional-request cache. Beyond it, least recently used URLs are evicted.
+    HTTP_CACHE_MAX_ENTRIES: 1000000,
+
+    # Number of byte ranges (segments) which are downloaded at once, each over its own connection, for large images.
+    # Segmented download requires the size of the image and the support of byte ranges to be announced by the \
+    # server on URL validation (so URL_VALIDATION must be "head"). Segments are assembled into a preallocated file.
+    # Set it to 1 to download every image in a single transfer.
+    # Independently of this configuration, an interrupted transfer is resumed from its last received byte \
+    # (as part of the reattempts of MAX_DOWNLOAD_REATTEMPTS), if the server supports byte ranges.
+    SEGMENT_COUNT: 1,
+
+    # Minimum size (in bytes) of an image to be downloaded in segments. If SEGMENT_COUNT is 1, application ignores it.
+    SEGMENTED_DOWNLOAD_MIN_SIZE: 16 * 1024 * 1024,
+
+    # Order in which the serviceable URLs are handed over to the downloader. Supported values are "fifo" and "per_host".
+    # "fifo": URLs are downloaded in the order of the plaintext file.
+    # "per_host": URLs are kept in one queue per host and handed over round-robin across the hosts, while no host \
+    # has more than HOST_MAX_IN_FLIGHT downloads at once nor two downloads started within HOST_MIN_INTERVAL seconds.
+    # It keeps a long run of URLs of a single host from taking all the downloader threads.
+    URL_SCHEDULER: "fifo",
+
+    # Maximum number of downloads in flight per host. If URL_SCHEDULER is "fifo", application ignores it.
+    HOST_MAX_IN_FLIGHT: 2,
+
+    # Minimum number of seconds between the starts of two downloads from the same host. \
+    # If URL_SCHEDULER is "fifo", application ignores it.
+    HOST_MIN_INTERVAL: 0,
+
+    # Maximum number of serviceable URLs waiting in the per-host scheduler. A larger value lets the scheduler see \
+    # more hosts at once, at the cost of memory. If URL_SCHEDULER is "fifo", application ignores it.
+    SCHEDULER_MAX_QUEUED: 1000,
+
+    # Number of downloader threads of the "thread" DOWNLOAD_ENGINE. With ADAPTIVE_CONCURRENCY, it is the initial \
+    # number of downloads in flight.
+    NUM_DL_THREADS: 4,
+
+    # If True, the number of downloads in flight of the "thread" DOWNLOAD_ENGINE is tuned at runtime, within \
+    # [MIN_DL_THREADS, MAX_DL_THREADS]. Every 2 seconds, the throughput, time to first byte and rate of timeouts / \
+    # connection errors of the finished downloads are measured: the number of downloads in flight is increased by \
+    # one while it pays off, and halved when the network or the servers show signs of overload (AIMD).
+    ADAPTIVE_CONCURRENCY: False,
+
+    # Lower bound of the number of downloads in flight. If ADAPTIVE_CONCURRENCY is False, application ignores it.
+    MIN_DL_THREADS: 1,
+
+    # Upper bound of the number of downloads in flight (and number of downloader threads created). \
+    # If ADAPTIVE_CONCURRENCY is False, application ignores it.
+    MAX_DL_THREADS: 32,
+
+    # Retry policy of the URLs whose validation or download failed for a transient reason, per class of error:
+    # "timeout" (connect or read timeout), "connection" (connection refused or reset, incomplete transfer), \
+    # "throttled" (429 Too Many Requests) and "server_error" (5xx status codes, but 501 and 505).
+    # A failed URL is put back into its queue after a delay, so threads move on to other URLs meanwhile. \
+    # The delay of the n-th retry is drawn at random in [d/2, d], with d = min(max_delay, base_delay * 2^(n-1)) \
+    # seconds, and is never shorter than the delay asked by the server with a Retry-After header.
+    # An URL is given up after "max_retries" retries. An error class which is not listed is never retried.
+    # None reattempts timed out URLs right away instead, as per MAX_DOWNLOAD_REATTEMPTS. A recommended policy is:
+    # {
+    #     "timeout": { "max_retries": 2, "base_delay": 1.0, "max_delay": 30.0 },
+    #     "connection": { "max_retries": 2, "base_delay": 1.0, "max_delay": 30.0 },
+    #     "throttled": { "max_retries": 3, "base_delay": 5.0, "max_delay": 300.0 },
+    #     "server_error": { "max_retries": 2, "base_delay": 2.0, "max_delay": 60.0 },
+    # }
+    # Independently of this configuration, an interrupted transfer is resumed right away (see SEGMENT_COUNT).
+    RETRY_POLICY: None,
+
+    # Maximum number of bytes read from the network and written to the disk at once, per download. Every downloader \
+    # thread reuses a single buffer of this size for all its downloads.
+    WRITE_BUFFER_SIZE: 256 * 1024,
+
+    # Number of saved images flushed to the disk (fsync) together. Every image is first written into a temporary \
+    # file, which replaces its final path only once the download is complete.
+    # 0: images are never flushed explicitly, the operating system flushes them on its own (fastest).
+    # 1: every image is flushed before it replaces its final path (safest, slowest).
+    # N > 1: images are flushed in batches of N, so a power failure might lose the last batch.
+    FSYNC_BATCH_SIZE: 0,
+
+    # Layout of the downloaded images into IMAGE_SAVE_DIR. With a sharded layout, images are placed into nested \
+    # shard directories, created on their first use, so that no directory grows to millions of entries.
+    # "flat": every image directly in IMAGE_SAVE_DIR.
+    # "hash": shards from the hash of the URL (256 directories per level, see HASH_SHARD_LEVELS), e.g; "3f/a2/tiger.png".
+    # "host": one shard per host of the URL, e.g; "www.example.com/tiger.png".
+    # "date": one shard per (UTC) date of download, e.g; "2018/03/25/tiger.png".
+    OUTPUT_LAYOUT: "flat",
+
+    # Number of nested shard directories of "hash" OUTPUT_LAYOUT (from 1 to 16).
+    HASH_SHARD_LEVELS: 2,
+
+    # How the downloaded images are stored into IMAGE_SAVE_DIR.
+    # "files": one file per image (see OUTPUT_LAYOUT).
+    # "tar": images are appended into rolling tar shards "images-NNNNN.tar".
+    # "warc": images are appended into rolling WARC/1.1 shards "images-NNNNN.warc", as "resource" records.
+    # Every shard gets an index "<shard name>.idx" with one "name<TAB>url<TAB>offset<TAB>size" line per image. \
+    # DEDUP_MODE and HTTP_CACHE_PATH are not supported by archive shards, and are deactivated.
+    OUTPUT_SINK: "files",
+
+    # Maximum size of an archive shard of OUTPUT_SINK in bytes. An image larger than it gets a shard of its own.
+    ARCHIVE_SHARD_SIZE: 1024 * 1024 * 1024,
+
+    # How the plaintext file is split between the shards of a sharded run (see SHARD_COUNT and SHARD_WORKERS).
+    # "hash": an URL belongs to shard crc32(host of URL) % SHARD_COUNT, so all the URLs of a host are processed \
+    # by the same worker, which keeps reusing its connections.
+    # "byte_range": the file is split into SHARD_COUNT byte ranges of equal size, aligned to line boundaries, so \
+    # a worker reads its own part of the file only. It requires a UTF-8 encoded file (hash is used otherwise).
+    SHARD_MODE: "hash",
+
+    # Index (from 0) of the shard processed by this run, among SHARD_COUNT shards. A sharded run saves its images \
+    # into IMAGE_SAVE_DIR/shard-<SHARD_INDEX>-of-<SHARD_COUNT>, suffixes JOURNAL_PATH and HTTP_CACHE_PATH the same \
+    # way, and writes its statistics into LOG_DIR/shard-<SHARD_INDEX>-of-<SHARD_COUNT>.stats.json.
+    # They are usually set by "--shard INDEX/COUNT" command line option, e.g; to spread a job over several machines.
+    SHARD_INDEX: 0,
+    SHARD_COUNT: 1,
+
+    # Number of worker processes of a sharded run on this machine. With more than one, application runs as a \
+    # coordinator: it starts one worker process per shard, waits for them and merges their statistics into \
+    # LOG_DIR/shard-summary.json. It is usually set by "--workers" command line option.
+    SHARD_WORKERS: 1,
+
+    # Minimum size in bytes of a plaintext file scanned through a memory mapping instead of read buffers. \
+    # It applies to regular, uncompressed, UTF-8 encoded files.
+    INPUT_MMAP_MIN_SIZE: 64 * 1024 * 1024,
+
+    # Number of lines of the plaintext file between two checkpoints recorded into the journal (see JOURNAL_PATH). \
+    # A checkpoint is the byte offset up to which the file has been read: a resumed job takes the unfinished URLs \
+    # read before it from the journal, and reads the file from there only. Set it to 0 to disable checkpoints. \
+    # It applies to UTF-8 encoded files.
+    INPUT_CHECKPOINT_INTERVAL: 10000,
+
+    # Local port (on 127.0.0.1) of an HTTP endpoint serving the runtime metrics in the Prometheus text format on \
+    # "/metrics": urls read, validated and rejected, downloads by result, bytes downloaded, HTTP status codes, \
+    # transport errors, depth of the queues, active workers and latency of every stage.
+    # Set it to None to disable the endpoint.
+    METRICS_PORT: None,
+
+    # Path of a JSON file into which the same metrics are written every METRICS_SNAPSHOT_INTERVAL seconds, and once \
+    # more at the end of the job. Set it to None to disable snapshots.
+    METRICS_SNAPSHOT_PATH: None,
+    METRICS_SNAPSHOT_INTERVAL: 10,
+
+    # Path of a manifest file into which one record per URL is appended: result (downloaded, failed, retried or \
+    # rejected), final URL after redirects, HTTP status, content type, bytes, local path, number of retries and \
+    # latency breakdown in milliseconds (DNS, connect, TLS, time to first byte, transfer and total).
+    # Records are written by a background thread, in batches. Set it to None to disable the manifest.
+    MANIFEST_PATH: None,
+
+    # Format of the manifest: "jsonl" (one JSON object per line) or "csv" (with a header row).
+    MANIFEST_FORMAT: "jsonl",
+
+    # Number of seconds for which the addresses of a resolved host are cached, so that a host is resolved once for \
+    # all the validation and download requests of all the threads. Set it to None to disable the DNS cache.
+    DNS_CACHE_TTL: None,
+
+    # Number of seconds for which the resolution error of an unresolvable host (e.g; a dead domain) is cached. \
+    # Meanwhile, urls of the host fail right away, without waiting on the resolver or attempting a connection.
+    # Set it to 0 to disable negative caching.
+    DNS_NEGATIVE_TTL: 60,
+
+    # Number of threads which resolve the hosts of the urls ahead of their requests, as the urls are read from the \
+    # plaintext file, so that host resolution is off the critical path. It requires DNS_CACHE_TTL, and hosts are \
+    # not resolved ahead if SYSTEM_PROXY is configured. Set it to 0 to disable pre-resolution.
+    DNS_PREFETCH_THREADS: 0,
 }
@@ -5,3 +5,56 @@ SYSTEM_PROXY = 3
 MAX_DOWNLOAD_REATTEMPTS = 4
 LOG_DIR = 5
 LOG_LEVEL = 6
+DOWNLOAD_ENGINE = 7
+ASYNC_MAX_CONCURRENCY = 8
+HTTP_POOL_SIZE = 9
+HTTP_POOL_MAX_HOSTS = 10
+HTTP_KEEP_ALIVE = 11
+URL_VALIDATION = 12
+NUM_VALIDATOR_THREADS = 13
+DEDUP_MODE = 14
+URL_DEDUP = 15
+URL_DEDUP_MEMORY_MB = 16
+URL_DEDUP_FP_RATE = 17
+JOURNAL_PATH = 18
+JOURNAL_BATCH_SIZE = 19
+JOURNAL_RESUME = 20
+HTTP_CACHE_PATH = 21
+HTTP_CACHE_MAX_ENTRIES = 22
+SEGMENT_COUNT = 23
+SEGMENTED_DOWNLOAD_MIN_SIZE = 24
+URL_SCHEDULER = 25
+HOST_MAX_IN_FLIGHT = 26
+HOST_MIN_INTERVAL = 27
+SCHEDULER_MAX_QUEUED = 28
+NUM_DL_THREADS = 29
+ADAPTIVE_CONCURRENCY = 30
+MIN_DL_THREADS = 31
+MAX_DL_THREADS = 32
+RETRY_POLICY = 33
+WRITE_BUFFER_SIZE = 34
+FSYNC_BATCH_SIZE = 35
+OUTPUT_LAYOUT = 36
+HASH_SHARD_LEVELS = 37
+OUTPUT_SINK = 38
+ARCHIVE_SHARD_SIZE = 39
+SHARD_MODE = 40
+SHARD_INDEX = 41
+SHARD_COUNT = 42
+SHARD_WORKERS = 43
+INPUT_MMAP_MIN_SIZE = 44
+INPUT_CHECKPOINT_INTERVAL = 45
+METRICS_PORT = 46
+METRICS_SNAPSHOT_PATH = 47
+METRICS_SNAPSHOT_INTERVAL = 48
+MANIFEST_PATH = 49
+MANIFEST_FORMAT = 50
+LOG_MODE = 51
+DNS_CACHE_TTL = 52
+DNS_NEGATIVE_TTL = 53
+DNS_PREFETCH_THREADS = 54
+IMAGE_SNIFFING = 55
+MIN_IMAGE_SIZE = 56
+MAX_IMAGE_SIZE = 57
+MIN_FREE_DISK_SPACE = 58
+MAX_DISK_SPACE_WAIT = 59
@@ -0,0 +1,311 @@
+import abc
+import datetime
+import os
+import re
+import shutil
+import tarfile
+import threading
+import uuid
+
+# Supported sinks of the downloaded images (see OUTPUT_SINK in cfg.py)
+FILES = "files"  # one file per image into IMAGE_SAVE_DIR
+TAR = "tar"  # rolling tar shards
+WARC = "warc"  # rolling WARC (ISO 28500) shards of "resource" records
+
+OUTPUT_SINKS = (FILES, TAR, WARC)
+
+
+class ArchiveSink ( abc.ABC ):
+    """
+    Description: ArchiveSink class appends the downloaded images into a few large archive files (shards) instead of \
+                 writing one file per image, which are cheap to move and to index. A shard is closed, and the next \
+                 one opened, once adding an image would make it exceed "shard_size" bytes (a larger image gets a \
+                 shard of its own). Every shard "<prefix>-NNNNN.<ext>" gets an index "<shard name>.idx" with one \
+                 "name<TAB>url<TAB>offset<TAB>size" line per image, where offset is the position of the first byte \
+                 of the image into the shard, so an image can be read back without scanning the shard.
+                 Images are downloaded concurrently into their temporary files, then copied into the current \
+                 shard one at a time, in chunks of "buffer_size" bytes, so the memory used does not depend on the \
+                 size of the images. Shard numbering continues from the shards of earlier runs.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # file extension of the shards
+    EXTENSION = None
+
+    # suffix of the index of a shard
+    INDEX_SUFFIX = ".idx"
+
+    def __init__ ( self, save_dir, shard_size, prefix="images", buffer_size=256 * 1024 ):
+        # directory into which shards are written
+        self.save_dir = save_dir
+
+        # maximum size of a shard in bytes
+        self.shard_size = shard_size
+
+        self.prefix = prefix
+        self.buffer_size = buffer_size
+
+        # current shard and its index (file objects), opened on the first image
+        self.shard_fp = None
+        self.index_fp = None
+
+        # number of the next shard
+        self.next_shard_id = self.find_next_shard_id ( )
+
+        # this is used by downloader threads to get a lock over the current shard
+        self.mutex = threading.Lock ( )
+
+    def find_next_shard_id ( self ):
+        """
+        Finds the number following the ones of the shards already present in save_dir
+        :return: int
+        """
+        shard_pattern = re.compile ( re.escape ( self.prefix ) + r"-(\d+)\." + re.escape ( self.EXTENSION ) + "$" )
+        max_shard_id = -1
+
+        try:
+            with os.scandir ( self.save_dir ) as dir_entries:
+                for dir_entry in dir_entries:
+                    shard_match = shard_pattern.match ( dir_entry.name )
+                    if shard_match:
+                        max_shard_id = max ( max_shard_id, int ( shard_match.group ( 1 ) ) )
+        except FileNotFoundError:
+            pass
+
+        return max_shard_id + 1
+
+    def add ( self, url, name, temp_path, content_type=None ):
+        """
+        Appends a completely downloaded image into the current shard, and records it into the index of the shard. \
+        It is a thread safe function.
+        :param url: url of the image (str)
+        :param name: name of the image into the archive (str, e.g; "tiger.png" or "3f/a2/tiger.png")
+        :param temp_path: path of the file holding the image (str), which is left in place
+        :param content_type: media type of the image (str) / None
+        :return: name of the shard holding the image (str)
+        """
+        size = os.path.getsize ( temp_path )
+
+        with self.mutex:
+            if self.shard_fp is None or \
+                    (self.shard_fp.tell ( ) > self.get_shard_start_size ( ) and
+                     self.shard_fp.tell ( ) + self.get_record_size ( url, name, size ) > self.shard_size):
+                self.open_next_shard ( )
+
+            with open ( temp_path, 'rb' ) as src_fp:
+                offset = self.write_record ( url, name, src_fp, size, content_type )
+
+            self.index_fp.write ( "\t".join ( (name, url, str ( offset ), str ( size )) ) + "\n" )
+
+            return os.path.basename ( self.shard_fp.name )
+
+    def open_next_shard ( self ):
+        """
+        Closes the current shard, if any, and opens the next one. Caller must hold self.mutex.
+        :return:
+        """
+        self.close_shard ( )
+
+        shard_path = os.path.join ( self.save_dir,
+                                    "{0}-{1:05d}.{2}".format ( self.prefix, self.next_shard_id, self.EXTENSION ) )
+        self.next_shard_id += 1
+
+        self.shard_fp = open ( shard_path, 'xb' )
+        self.index_fp = open ( shard_path + self.INDEX_SUFFIX, mode='w', encoding='utf-8' )
+        self.start_shard ( )
+
+    def close_shard ( self ):
+        """
+        Completes and closes the current shard and its index. Caller must hold self.mutex.
+        :return:
+        """
+        if self.shard_fp is None:
+            return
+
+        try:
+            self.end_shard ( )
+        finally:
+            self.shard_fp.close ( )
+            self.index_fp.close ( )
+            self.shard_fp = self.index_fp = None
+
+    def close ( self ):
+        """
+        Completes and closes the current shard. It is a thread safe function.
+        :return:
+        """
+        with self.mutex:
+            self.close_shard ( )
+
+    def copy_content ( self, src_fp ):
+        """
+        Copies a file into the current shard
+        :param src_fp: file object
+        :return:
+        """
+        shutil.copyfileobj ( src_fp, self.shard_fp, self.buffer_size )
+
+    def get_shard_start_size ( self ):
+        """
+        :return: size of an empty shard, in bytes
+        """
+        return 0
+
+    def start_shard ( self ):
+        """
+        Writes the leading data of a new shard
+        :return:
+        """
+        pass
+
+    def end_shard ( self ):
+        """
+        Writes the trailing data of the current shard
+        :return:
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_record_size ( self, url, name, size ):
+        """
+        :param url: str
+        :param name: str
+        :param size: size of the image in bytes
+        :return: number of bytes an image takes into a shard
+        """
+
+    @abc.abstractmethod
+    def write_record ( self, url, name, src_fp, size, content_type ):
+        """
+        Writes an image at the end of the current shard
+        :param url: str
+        :param name: str
+        :param src_fp: file object holding the image
+        :param size: size of the image in bytes
+        :param content_type: str / None
+        :return: offset of the first byte of the image into the shard (int)
+        """
+
+
+class TarSink ( ArchiveSink ):
+    """
+    Description: TarSink class writes the images into uncompressed POSIX (pax) tar shards, readable by any tar tool.
+
+    Version: 1.0
+    Comment:
+    """
+
+    EXTENSION = "tar"
+
+    def __init__ ( self, *args, **kwargs ):
+        super ( ).__init__ ( *args, **kwargs )
+        self.tar = None
+
+    def start_shard ( self ):
+        self.tar = tarfile.open ( fileobj=self.shard_fp, mode='w', format=tarfile.PAX_FORMAT,
+                                  copybufsize=self.buffer_size )
+
+    def end_shard ( self ):
+        # writes the end-of-archive blocks
+        self.tar.close ( )
+        self.tar = None
+
+    def get_tar_info ( self, name, size ):
+        """
+        :param name: str
+        :param size: int
+        :return: tarfile.TarInfo of an image
+        """
+        tar_info = tarfile.TarInfo ( name )
+        tar_info.size = size
+        tar_info.mtime = int ( datetime.datetime.now ( ).timestamp ( ) )
+        tar_info.mode = 0o644
+        return tar_info
+
+    def get_record_size ( self, url, name, size ):
+        header_size = len ( self.get_tar_info ( name, size ).tobuf ( tarfile.PAX_FORMAT ) )
+        # content is padded to a multiple of the block size, and the archive ends with zero blocks padding it to \
+        # a multiple of the record size
+        return header_size + -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE + tarfile.RECORDSIZE
+
+    def write_record ( self, url, name, src_fp, size, content_type ):
+        tar_info = self.get_tar_info ( name, size )
+        offset = self.tar.offset + len ( tar_info.tobuf ( self.tar.format, self.tar.encoding, self.tar.errors ) )
+        self.tar.addfile ( tar_info, src_fp )
+        return offset
+
+
+class WarcSink ( ArchiveSink ):
+    """
+    Description: WarcSink class writes the images into uncompressed WARC/1.1 shards, as "resource" records holding \
+                 the image and its URL. Every shard starts with a "warcinfo" record.
+
+    Version: 1.0
+    Comment:
+    """
+
+    EXTENSION = "warc"
+
+    # length of the headers of a record which do not depend on the image, except for the date (see get_record_size)
+    RECORD_SLACK = 512
+
+    @staticmethod
+    def get_record_header ( warc_type, content_length, extra_headers=( ) ):
+        """
+        :param warc_type: str
+        :param content_length: int
+        :param extra_headers: tuple of (name, value) pairs
+        :return: header block of a WARC record (bytes)
+        """
+        headers = [ ("WARC-Type", warc_type),
+                    ("WARC-Record-ID", "<urn:uuid:{}>".format ( uuid.uuid4 ( ) )),
+                    ("WARC-Date", datetime.datetime.now ( datetime.timezone.utc ).strftime ( "%Y-%m-%dT%H:%M:%SZ" )) ]
+        headers.extend ( extra_headers )
+        headers.append ( ("Content-Length", str ( content_length )) )
+
+        return ("WARC/1.1\r\n" + "".join ( "{0}: {1}\r\n".format ( *header ) for header in headers ) +
+                "\r\n").encode ( 'utf-8' )
+
+    def start_shard ( self ):
+        warc_info = "software: image_downloader\r\nformat: WARC File Format 1.1\r\n".encode ( 'utf-8' )
+        self.shard_fp.write ( self.get_record_header ( "warcinfo", len ( warc_info ), (
+            ("WARC-Filename", os.path.basename ( self.shard_fp.name )),
+            ("Content-Type", "application/warc-fields")) ) )
+        self.shard_fp.write ( warc_info + b"\r\n\r\n" )
+
+    def get_shard_start_size ( self ):
+        # the warcinfo record is written as soon as the shard is opened
+        return self.shard_fp.tell ( ) if self.shard_fp else 0
+
+    def get_record_size ( self, url, name, size ):
+        return len ( url ) + len ( name ) + size + self.RECORD_SLACK
+
+    def write_record ( self, url, name, src_fp, size, content_type ):
+        record_header = self.get_record_header ( "resource", size, (
+            ("WARC-Target-URI", url),
+            ("WARC-Filename", name),
+            ("Content-Type", content_type or "application/octet-stream")) )
+        self.shard_fp.write ( record_header )
+
+        offset = self.shard_fp.tell ( )
+        self.copy_content ( src_fp )
+        self.shard_fp.write ( b"\r\n\r\n" )
+        return offset
+
+
+def get_archive_sink ( output_sink, save_dir, shard_size, buffer_size=256 * 1024 ):
+    """
+    Creates the archive sink of a configured OUTPUT_SINK
+    :param output_sink: one of OUTPUT_SINKS
+    :param save_dir: directory into which shards are written (str)
+    :param shard_size: maximum size of a shard in bytes (int)
+    :param buffer_size: size of the copy buffer in bytes (int)
+    :return: ArchiveSink / None (If images are saved as files)
+    """
+    if output_sink == TAR:
+        return TarSink ( save_dir, shard_size, buffer_size=buffer_size )
+    if output_sink == WARC:
+        return WarcSink ( save_dir, shard_size, buffer_size=buffer_size )
+    return None
@@ -0,0 +1,506 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import cfg
+from .app_constants import *
+from .dns_cache import get_dns_cache
+from .downloader import Downloader
+from .file_sink import FileSink, ImageSizeError, PartialDownload, is_size_allowed
+from .http_session import RequestTiming
+from .manifest import new_manifest_entry
+from .media_type import is_image_content_type, sniff_image_type, SNIFF_SIZE
+from .retry import TIMEOUT, CONNECTION, classify_status, parse_retry_after
+
+try:
+    import aiohttp
+
+    # aiohttp tells unresolvable hosts apart (ClientConnectorDNSError) since version 3.10. An older version is \
+    # handled as if it was not installed.
+    if not hasattr ( aiohttp, "ClientConnectorDNSError" ):
+        aiohttp = None
+except ImportError:  # aiohttp is an optional dependency which is only required by this download engine
+    aiohttp = None
+
+# whether or not the failure of the download of a task is worth a retry (see Downloader.note_retry_error). \
+# Every download task runs in its own copy of the context, so tasks sharing the event loop thread do not mix it up.
+retry_error_var = contextvars.ContextVar ( "retry_error", default=None )
+
+# manifest record and RequestTiming of the download of a task, if MANIFEST_PATH is configured
+manifest_entry_var = contextvars.ContextVar ( "manifest_entry", default=None )
+request_timing_var = contextvars.ContextVar ( "request_timing", default=None )
+
+
+class CachedResolver ( aiohttp.abc.AbstractResolver if aiohttp else object ):
+    """
+    Description: CachedResolver class resolves the hosts of the asyncio engine through the DnsCache shared with \
+                 FileParser. Hosts which are not cached are resolved on the default executor of the event loop, \
+                 so that the event loop is never blocked by the system resolver.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, dns_cache ):
+        self.dns_cache = dns_cache
+
+    async def resolve ( self, host, port=0, family=socket.AF_INET ):
+        addresses = self.dns_cache.get_cached ( host )
+        if addresses is None:
+            addresses = await asyncio.get_running_loop ( ).run_in_executor ( None, self.dns_cache.resolve, host )
+
+        hosts = [ { "hostname": host, "host": address, "port": port, "family": address_family, "proto": 0,
+                    "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV }
+                  for address_family, address in addresses if family in (socket.AF_UNSPEC, address_family) ]
+        if not hosts:
+            raise socket.gaierror ( socket.EAI_NONAME, "Host {0} has no address of family {1}".format ( host, family ) )
+
+        return hosts
+
+    async def close ( self ):
+        pass
+
+
+class ExecutorFileSink:
+    """
+    Description: ExecutorFileSink class is the asynchronous counterpart of FileSink for the asyncio engine. The \
+                 blocking file operations of FileSink (open, preallocation, writes, truncation and fsync) run on the \
+                 default executor of the event loop, so that a slow disk never stalls the other downloads in flight. \
+                 The chunks received from the network are gathered up to BATCH_SIZE bytes, so that the event loop \
+                 hands one write per batch over to the executor. It is an asynchronous context manager.
+
+    Version: 1.0
+    Comment: Writes of a download are awaited one at a time, so the FileSink is never used by two threads at once.
+    """
+
+    BATCH_SIZE = 64 * 1024
+
+    def __init__ ( self, partial_dl, expected_size=None, fsync=False, max_size=None ):
+        self.create_file_sink = functools.partial ( FileSink, partial_dl, expected_size, fsync=fsync,
+                                                    max_size=max_size )
+        self.file_sink = None
+
+        self.batch = [ ]
+        self.batch_size = 0
+
+    async def run_in_executor ( self, func, *args ):
+        return await asyncio.get_running_loop ( ).run_in_executor ( None, func, *args )
+
+    async def __aenter__ ( self ):
+        self.file_sink = await self.run_in_executor ( self.create_file_sink )
+        return self
+
+    async def __aexit__ ( self, exc_type, exc_value, traceback ):
+        try:
+            if exc_type is None:
+                await self.flush ( )
+        except BaseException as err:
+            await self.run_in_executor ( self.file_sink.__exit__, type ( err ), err, err.__traceback__ )
+            raise
+
+        await self.run_in_executor ( self.file_sink.__exit__, exc_type, exc_value, traceback )
+
+    async def write ( self, data_block ):
+        """
+        Writes a chunk of content at the end of the file, once its batch is full
+        :param data_block: bytes-like object
+        :return:
+        :raise ImageSizeError: If the content exceeds the maximum size of the FileSink
+        """
+        self.batch.append ( data_block )
+        self.batch_size += len ( data_block )
+        if self.batch_size >= self.BATCH_SIZE:
+            await self.flush ( )
+
+    async def flush ( self ):
+        """
+        Writes the gathered chunks into the file
+        :return:
+        """
+        if not self.batch:
+            return
+
+        batch = self.batch[ 0 ] if len ( self.batch ) == 1 else b"".join ( self.batch )
+        self.batch = [ ]
+        self.batch_size = 0
+
+        await self.run_in_executor ( self.file_sink.write, batch )
+
+
+class AsyncDownloader ( Downloader ):
+    """
+    Description: AsyncDownloader class is an alternative download engine to Downloader. Instead of four threads each \
+                 blocking on one request at a time, it runs a single asyncio event loop (hosted by one thread) which \
+                 keeps up to ASYNC_MAX_CONCURRENCY downloads in flight using the non-blocking aiohttp client. It \
+                 consumes the same "url_queue" filled up by FileParser class (Producer) and names the downloaded \
+                 files with the same rules as Downloader.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, url_queue ):
+        if aiohttp is None:
+            raise ImportError ( "AsyncDownloader requires aiohttp package (3.10 or later). Please install it or use "
+                                "Downloader." )
+
+        # Maximum number of downloads in flight at the same time
+        self.max_concurrency = cfg.APP_CFG.get ( ASYNC_MAX_CONCURRENCY ) or 1000
+
+        super ( ).__init__ ( url_queue )
+
+    def create_downloader_threads ( self ):
+        """
+        Creates the only downloader thread of this engine, which hosts the asyncio event loop
+        :return:
+        """
+        self.NUM_DL_THREADS = 1
+
+        # the number of downloads in flight is bounded by ASYNC_MAX_CONCURRENCY instead (see ADAPTIVE_CONCURRENCY)
+        self.concurrency_controller = None
+        self.dl_thread_list.append ( threading.Thread ( target=self.thread_downloader ) )
+
+    def get_concurrency ( self ):
+        """
+        Returns the maximum number of downloads in flight at the same time
+        :return: int
+        """
+        return self.max_concurrency
+
+    def thread_downloader ( self ):
+        """
+        This function details the functionality of the downloader thread. It runs the event loop until \
+        "EXIT" is fetched from self.url_queue and all the downloads in flight have finished.
+        :return:
+        """
+        asyncio.run ( self.async_downloader ( ) )
+
+    async def async_downloader ( self ):
+        """
+        Fetches items from self.url_queue and schedules a download task for each of them, while never keeping \
+        more than self.max_concurrency downloads in flight.
+        :return:
+        """
+        loop = asyncio.get_running_loop ( )
+        slots = asyncio.Semaphore ( self.max_concurrency )
+        dl_tasks = set ( )
+
+        def on_download_done ( dl_task ):
+            dl_tasks.discard ( dl_task )
+            slots.release ( )
+
+        url_timeout = cfg.APP_CFG[ URL_TIMEOUT ]
+        client_timeout = aiohttp.ClientTimeout ( total=None, sock_connect=url_timeout, sock_read=url_timeout )
+
+        # connection limit is enforced by slots, so the connector must not add a second (lower) limit. \
+        # The connector pools connections per host, keeping them alive unless HTTP_KEEP_ALIVE is False.
+        # With DNS_CACHE_TTL, hosts are resolved through the DnsCache shared with FileParser instead of the own \
+        # cache of the connector.
+        dns_cache = get_dns_cache ( )
+        resolver_kwargs = { "resolver": CachedResolver ( dns_cache ), "use_dns_cache": False } if dns_cache else { }
+        connector = aiohttp.TCPConnector ( limit=0, force_close=not cfg.APP_CFG.get ( HTTP_KEEP_ALIVE, True ),
+                                           **resolver_kwargs )
+
+        # with the manifest, host resolution and connection setup are measured
+        trace_configs = [ self.create_trace_config ( ) ] if self.manifest else None
+
+        async with aiohttp.ClientSession ( connector=connector, timeout=client_timeout,
+                                           trace_configs=trace_configs ) as session:
+            while True:
+                await slots.acquire ( )
+
+                # url_queue is a blocking queue shared with FileParser thread, so it is read off the event loop
+                url = await loop.run_in_executor ( None, self.url_queue.get )
+
+                # exit point of the engine (put "EXIT" back into the queue as Downloader threads do)
+                if url == "EXIT":
+                    slots.release ( )
+                    if self.retry_scheduler and not self.retry_scheduler.handle_exit ( ):
+                        continue
+                    self.url_queue.put ( item="EXIT", block=True, timeout=None )
+                    break
+
+                if self.retry_scheduler:
+                    self.retry_scheduler.task_started ( )
+
+                # downloads are paused while the disk is running out of space (see Downloader.thread_downloader)
+                has_space = True
+                if self.disk_watermark:
+                    has_space = await loop.run_in_executor ( None, self.disk_watermark.wait_for_space )
+
+                dl_task = asyncio.ensure_future ( self.async_download_and_record ( session, url, has_space ) )
+                dl_tasks.add ( dl_task )
+                dl_task.add_done_callback ( on_download_done )
+
+            if dl_tasks:
+                await asyncio.gather ( *dl_tasks )
+
+    @staticmethod
+    def create_trace_config ( ):
+        """
+        Creates the tracing of the requests which adds the time it takes to resolve hosts and to establish \
+        connections to the RequestTiming of the calling task. aiohttp does not report the TLS handshake on its \
+        own, so it is counted into the connection time.
+        :return: aiohttp.TraceConfig
+        """
+        loop_time = asyncio.get_running_loop ( ).time
+
+        async def on_dns_resolvehost_start ( session, trace_ctx, params ):
+            trace_ctx.dns_start = loop_time ( )
+
+        async def on_dns_resolvehost_end ( session, trace_ctx, params ):
+            timing = request_timing_var.get ( )
+            if timing is not None:
+                timing.dns += loop_time ( ) - trace_ctx.dns_start
+
+        async def on_connection_create_start ( session, trace_ctx, params ):
+            timing = request_timing_var.get ( )
+            trace_ctx.connect_start = loop_time ( )
+            trace_ctx.dns_at_connect = timing.dns if timing else 0.0
+
+        async def on_connection_create_end ( session, trace_ctx, params ):
+            timing = request_timing_var.get ( )
+            if timing is not None:
+                timing.connect += loop_time ( ) - trace_ctx.connect_start - (timing.dns - trace_ctx.dns_at_connect)
+
+        trace_config = aiohttp.TraceConfig ( )
+        trace_config.on_dns_resolvehost_start.append ( on_dns_resolvehost_start )
+        trace_config.on_dns_resolvehost_end.append ( on_dns_resolvehost_end )
+        trace_config.on_connection_create_start.append ( on_connection_create_start )
+        trace_config.on_connection_create_end.append ( on_connection_create_end )
+        return trace_config
+
+    def get_manifest_entry ( self ):
+        return manifest_entry_var.get ( )
+
+    def get_request_timing ( self ):
+        return request_timing_var.get ( )
+
+    def get_proxy_for_url ( self, url ):
+        """
+        Finds the proxy configured in SYSTEM_PROXY for the protocol of an url
+        :param url: string
+        :return: proxy url (str) / None
+        """
+        sys_proxy = cfg.APP_CFG[ SYSTEM_PROXY ]
+        if not sys_proxy:
+            return None
+
+        return sys_proxy.get ( urlsplit ( url ).scheme )
+
+    async def async_download_and_record ( self, session, url, has_space=True ):
+        """
+        Downloads an image and records the result into the journal, if it is configured
+        :param session: aiohttp.ClientSession
+        :param url: str
+        :param has_space: False (If url is failed without being downloaded, as the disk is full) / True
+        :return:
+        """
+        if self.manifest:
+            manifest_entry_var.set ( new_manifest_entry ( url ) )
+            timing = RequestTiming ( )
+            timing.num_delayed_retries = self.get_retry_count ( url )
+            request_timing_var.set ( timing )
+
+        self.metrics.active_workers.inc ( labels=("download",) )
+        start_time = time.monotonic ( )
+
+        # an unexpected error fails the url for good, which is accounted as finished anyway \
+        # (see Downloader.thread_downloader)
+        dl_status = False
+        try:
+            if not has_space:
+                self.logger.debug ( "URL %s has not been downloaded. The disk is full.", url )
+            else:
+                dl_status = await self.async_download_image ( session, url )
+                if not dl_status and self.schedule_retry ( url ):
+                    dl_status = None
+        except Exception:
+            self.logger.exception ( "For URL: %s - An unexpected exception occurred.", url )
+            dl_status = False
+        finally:
+            self.metrics.stage_latency.observe ( time.monotonic ( ) - start_time, labels=("download",) )
+            self.metrics.active_workers.dec ( labels=("download",) )
+
+            # releasing a held back "EXIT" puts it into url_queue, which must not block the event loop
+            await asyncio.get_running_loop ( ).run_in_executor ( None, self.record_download_result, url, dl_status )
+
+        if self.manifest:
+            self.record_manifest_entry ( dl_status, request_timing_var.get ( ) )
+
+    def schedule_retry ( self, url ):
+        """
+        Schedules the retry of a failed download of the current task, if its failure is worth a retry as per \
+        RETRY_POLICY
+        :param url: str
+        :return: True (If a retry has been scheduled) / False (If url is given up)
+        """
+        retry_error = retry_error_var.get ( )
+        retry_error_var.set ( None )
+
+        return bool ( self.retry_scheduler and retry_error and self.retry_scheduler.schedule ( url, *retry_error ) )
+
+    @staticmethod
+    async def run_blocking ( func, *args ):
+        """
+        Runs a blocking function (e.g; file operations) on the default executor, so that it never blocks the event \
+        loop. The function runs in a copy of the context of the calling task (e.g; its manifest record).
+        :param func: callable
+        :param args: arguments of func
+        :return: return value of func
+        """
+        return await asyncio.get_running_loop ( ).run_in_executor ( None, contextvars.copy_context ( ).run, func,
+                                                                     *args )
+
+    @staticmethod
+    async def read_response_head ( response ):
+        """
+        Reads the first SNIFF_SIZE bytes of the body of a response. The rest of the body can be read afterwards.
+        :param response: aiohttp.ClientResponse
+        :return: bytes (fewer than SNIFF_SIZE, if the body is shorter)
+        """
+        head = b""
+        while len ( head ) < SNIFF_SIZE:
+            data_block = await response.content.read ( SNIFF_SIZE - len ( head ) )
+            if not data_block:
+                break
+            head += data_block
+
+        return head
+
+    async def async_download_image ( self, session, url,
+                                     reattempt_count=cfg.APP_CFG.get ( MAX_DOWNLOAD_REATTEMPTS ) ):
+        """
+        This coroutine downloads image resource from web and saves it into IMAGE_SAVE_DIR directory
+        :param session: aiohttp.ClientSession
+        :param url: str
+        :param reattempt_count: int (Number of times an url will attempted to be fetched in case of failure)
+        :return: True (If successful download) / False (If download fails)
+        """
+        # conditional request on the version downloaded by an earlier run (see Downloader.download_image)
+        cache_entry = self.http_cache.get_entry ( url ) if self.http_cache else None
+        partial_dl = None
+        self.note_request_start ( )
+
+        try:
+            async with session.get ( url,
+                                     headers=self.http_cache.get_conditional_headers ( url ) if cache_entry else None,
+                                     allow_redirects=True, proxy=self.get_proxy_for_url ( url ) ) as response:
+                self.metrics.http_responses.inc ( labels=(str ( response.status ),) )
+                self.note_response ( response.url, response.status, response.headers )
+
+                if response.status == 304 and cache_entry:
+                    self.logger.debug ( "URL %s has not been modified since it was saved to %s.", url,
+                                        cache_entry[ "path" ] )
+                    self.note_saved_image ( cache_entry[ "path" ], cache_entry.get ( "size" ) )
+                    return True
+
+                if response.status != 200:
+                    self.logger.debug (
+                        "For URL: %s - Received status code %s. Reason: %s", url, response.status, response.reason )
+                    if classify_status ( response.status ):
+                        retry_error_var.set ( (classify_status ( response.status ),
+                                               parse_retry_after ( response.headers.get ( 'retry-after' ) )) )
+                    return False
+
+                # In "get" URL_VALIDATION, url has not been validated by FileParser (see Downloader.download_image)
+                is_sniffing = cfg.APP_CFG.get ( IMAGE_SNIFFING )
+                if cfg.APP_CFG.get ( URL_VALIDATION ) == "get" and not is_image_content_type (
+                        response.headers.get ( 'content-type' ), allow_generic=is_sniffing ):
+                    self.logger.debug ( "URL %s is not serviceable.", url )
+                    return False
+
+                expected_size = response.content_length
+                if response.headers.get ( 'content-encoding', 'identity' ).lower ( ) != 'identity':
+                    expected_size = None
+
+                if not is_size_allowed ( expected_size, self.min_image_size, self.max_image_size ):
+                    self.logger.debug ( "URL %s is not serviceable. Its size of %s bytes is out of the size limits.",
+                                        url, expected_size )
+                    return False
+
+                # content of a resource which is not an image is not downloaded (see Downloader.download_image)
+                head = b""
+                image_ext = None
+                if is_sniffing:
+                    head = await self.read_response_head ( response )
+                    image_ext = sniff_image_type ( head )
+                    if image_ext is None:
+                        self.logger.debug ( "URL %s is not serviceable. Its content is not an image.", url )
+                        return False
+
+                if cache_entry and not self.content_store:
+                    path = cache_entry[ "path" ]
+                else:
+                    path = cfg.APP_CFG[ IMAGE_SAVE_DIR ] + await self.run_blocking ( self.reserve_dl_filename,
+                                                                                      url, image_ext )
+
+                # image is streamed into a temporary file and, with DEDUP_MODE, hashed (see Downloader.download_image)
+                partial_dl = PartialDownload ( path, path + ".part",
+                                               hashlib.sha256 ( ) if self.content_store else None,
+                                               is_name_reserved=not (cache_entry and not self.content_store) )
+
+                async with ExecutorFileSink ( partial_dl, expected_size,
+                                              fsync=cfg.APP_CFG.get ( FSYNC_BATCH_SIZE ) == 1,
+                                              max_size=self.max_image_size ) as file_sink:
+                    if head:
+                        await file_sink.write ( head )
+
+                    # iter_any yields the data as soon as it is received, whatever its size is
+                    async for data_block in response.content.iter_any ( ):
+                        await file_sink.write ( data_block )
+
+                if partial_dl.size < self.min_image_size:
+                    self.logger.debug ( "URL %s is not serviceable. Its size of %s bytes is below %s bytes.", url,
+                                        partial_dl.size, self.min_image_size )
+                    await self.run_blocking ( self.discard_partial_download, partial_dl )
+                    return False
+
+            # the image is copied, hashed or moved into place (see Downloader.complete_download)
+            await self.run_blocking ( self.complete_download, url, response.headers, partial_dl )
+
+        except ImageSizeError as err:
+            self.note_error ( err )
+            self.logger.debug ( "URL %s is not serviceable. %s", url, err )
+            await self.run_blocking ( self.discard_partial_download, partial_dl )
+            return False
+
+        except asyncio.TimeoutError as t_err:
+            self.metrics.errors.inc ( labels=("download",) )
+            self.note_error ( t_err )
+            self.logger.info ( "For URL: %s - An exception of type %s occurred. Arguments:\n%r", url,
+                               type ( t_err ).__name__, t_err.args )
+
+            await self.run_blocking ( self.discard_partial_download, partial_dl )
+
+            # with RETRY_POLICY, download is retried later by retry_scheduler instead of right away
+            if not reattempt_count or self.retry_scheduler:
+                self.logger.debug ( "URL %s has not been downloaded.", url )
+                retry_error_var.set ( (TIMEOUT, None) )
+                return False
+
+            return await self.async_download_image ( session, url, reattempt_count - 1 )
+
+        except (aiohttp.ClientError,  # connection-related errors, invalid URL, too many redirects, etc.
+                ValueError  # malformed URL
+                ) as err:
+            self.metrics.errors.inc ( labels=("download",) )
+            self.note_error ( err )
+            self.logger.info ( "For URL: %s - An exception of type %s occurred. Arguments:\n%r", url,
+                               type ( err ).__name__, err.args )
+
+            self.logger.debug ( "URL %s has not been downloaded.", url )
+            await self.run_blocking ( self.discard_partial_download, partial_dl )
+
+            # connection refused or reset and incomplete transfers are worth a retry, unlike unresolvable hosts
+            if isinstance ( err, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) ) and \
+                    not isinstance ( err, aiohttp.ClientConnectorDNSError ):
+                retry_error_var.set ( (CONNECTION, None) )
+            return False
+
+        return True
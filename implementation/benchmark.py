@@ -0,0 +1,383 @@
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .metrics import reset_app_metrics
+
+# Synthetic content served by StandInImageServer, by file extension: media type and leading (magic) bytes
+CONTENT_TYPES = {
+    "png": ("image/png", b"\x89PNG\r\n\x1a\n"),
+    "jpeg": ("image/jpeg", b"\xff\xd8\xff\xe0"),
+    "gif": ("image/gif", b"GIF89a"),
+    "webp": ("image/webp", b"RIFF\x00\x00\x00\x00WEBP"),
+    "html": ("text/html", b"<!DOCTYPE html>"),  # not an image: its url is rejected by the validation
+}
+
+# Benchmark scenarios. Sizes are drawn log-uniformly between min_size and max_size bytes, latency_ms is the delay \
+# of every response (before its headers), bandwidth limits every response (bytes/s, None for unlimited), and the \
+# rates are the shares of the urls answered with an HTTP error, never answered (timeout) or redirected first.
+SCENARIOS = {
+    # many small images from a fast server: measures the overhead of the application per url
+    "small": { "num_urls": 2000, "min_size": 2 * 1024, "max_size": 32 * 1024, "content_types": ("png", "jpeg"),
+               "latency_ms": 0, "bandwidth": None, "error_rate": 0.0, "timeout_rate": 0.0, "redirect_rate": 0.0,
+               "url_timeout": 5 },
+
+    # images of all sizes and types, with latency, errors, timeouts and redirects
+    "mixed": { "num_urls": 1000, "min_size": 1024, "max_size": 4 * 1024 * 1024,
+               "content_types": ("png", "jpeg", "gif", "webp", "html"), "latency_ms": 20, "bandwidth": None,
+               "error_rate": 0.05, "timeout_rate": 0.01, "redirect_rate": 0.1, "url_timeout": 1 },
+
+    # large images from a slow server: measures how well slow transfers overlap
+    "slow": { "num_urls": 100, "min_size": 128 * 1024, "max_size": 1024 * 1024, "content_types": ("jpeg",),
+              "latency_ms": 150, "bandwidth": 1024 * 1024, "error_rate": 0.02, "timeout_rate": 0.02,
+              "redirect_rate": 0.05, "url_timeout": 2 },
+}
+
+# HTTP errors answered to the urls of the error_rate share
+ERROR_STATUSES = (404, 500, 503)
+
+# upper bounds (seconds) of the latency buckets during a benchmark, 10% apart from 1 ms to over 2 minutes, so that \
+# percentiles are estimated within a few percent (see Histogram.get_percentile)
+BENCHMARK_LATENCY_BUCKETS = tuple ( 0.001 * 1.1 ** i for i in range ( 125 ) )
+
+
+def get_synthetic_body ( extension, size ):
+    """
+    :param extension: key of CONTENT_TYPES
+    :param size: int
+    :return: content of a synthetic file (bytes), starting with the magic bytes of its format
+    """
+    magic = CONTENT_TYPES[ extension ][ 1 ]
+    filler = bytes ( range ( 256 ) ) * (size // 256 + 1)
+    return (magic + filler)[ :size ]
+
+
+class StandInRequestHandler ( BaseHTTPRequestHandler ):
+    """
+    Description: StandInRequestHandler class answers the urls generated by generate_urls. What is served is \
+                 encoded into the path of the url, so the server holds no state:
+                 "/image/<size>/<latency_ms>/<n>.<ext>": synthetic file of the type of <ext> (see CONTENT_TYPES)
+                 "/status/<code>/<n>.<ext>": HTTP error <code>
+                 "/hang/<n>.<ext>": no answer before the hang time of the server
+                 "/redirect/<hops>/<path>": <hops> redirects before <path>
+                 HEAD requests get the headers of the GET ones. Connections are kept alive (HTTP/1.1).
+
+    Version: 1.0
+    Comment:
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    # headers and body are written separately, which Nagle's algorithm would delay by the delayed ACK of the client
+    disable_nagle_algorithm = True
+
+    def do_GET ( self ):
+        self.handle_request ( send_body=True )
+
+    def do_HEAD ( self ):
+        self.handle_request ( send_body=False )
+
+    def handle_request ( self, send_body ):
+        """
+        :param send_body: False for a HEAD request
+        :return:
+        """
+        parts = self.path.split ( "?" )[ 0 ].strip ( "/" ).split ( "/" )
+
+        try:
+            if parts[ 0 ] == "redirect" and len ( parts ) > 2:
+                hops = int ( parts[ 1 ] )
+                target = "/" + "/".join ( parts[ 2: ] )
+                if hops > 1:
+                    target = "/redirect/{0}{1}".format ( hops - 1, target )
+                self.send_response ( 302 )
+                self.send_header ( "Location", target )
+                self.send_header ( "Content-Length", "0" )
+                self.end_headers ( )
+
+            elif parts[ 0 ] == "image" and len ( parts ) == 4:
+                size, latency_ms = int ( parts[ 1 ] ), int ( parts[ 2 ] )
+                extension = parts[ 3 ].rsplit ( ".", 1 )[ -1 ]
+                time.sleep ( latency_ms / 1000.0 )
+                self.send_response ( 200 )
+                self.send_header ( "Content-Type", CONTENT_TYPES[ extension ][ 0 ] )
+                self.send_header ( "Content-Length", str ( size ) )
+                self.send_header ( "Accept-Ranges", "none" )
+                self.end_headers ( )
+                if send_body:
+                    self.write_body ( get_synthetic_body ( extension, size ) )
+
+            elif parts[ 0 ] == "status" and len ( parts ) == 3:
+                self.send_error_status ( int ( parts[ 1 ] ), send_body )
+
+            elif parts[ 0 ] == "hang":
+                time.sleep ( self.server.hang_time )
+                self.send_error_status ( 504, send_body )
+
+            else:
+                self.send_error_status ( 404, send_body )
+
+        except (ValueError, KeyError):
+            self.send_error_status ( 400, send_body )
+
+        except (BrokenPipeError, ConnectionResetError):
+            # client has given up (e.g; timed out)
+            self.close_connection = True
+
+    def send_error_status ( self, status, send_body ):
+        """
+        :param status: HTTP status code (int)
+        :param send_body: False for a HEAD request
+        :return:
+        """
+        body = "error {}\n".format ( status ).encode ( 'ascii' )
+        self.send_response ( status )
+        self.send_header ( "Content-Type", "text/plain" )
+        self.send_header ( "Content-Length", str ( len ( body ) ) )
+        self.end_headers ( )
+        if send_body:
+            self.wfile.write ( body )
+
+    def write_body ( self, body ):
+        """
+        Writes a response body, no faster than the bandwidth of the server
+        :param body: bytes
+        :return:
+        """
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write ( body )
+            return
+
+        chunk_size = 16 * 1024
+        start_time = time.monotonic ( )
+        for offset in range ( 0, len ( body ), chunk_size ):
+            self.wfile.write ( body[ offset:offset + chunk_size ] )
+            delay = start_time + (offset + chunk_size) / bandwidth - time.monotonic ( )
+            if delay > 0:
+                time.sleep ( delay )
+
+    def log_message ( self, *args ):
+        # requests are not logged
+        pass
+
+
+class StandInImageServer:
+    """
+    Description: StandInImageServer class is a local HTTP server standing in for the image hosts of the internet, \
+                 so that the application can be measured reproducibly and without network access. It serves the \
+                 urls of generate_urls from a pool of daemon threads (one per connection).
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, bandwidth=None, hang_time=5.0, host="127.0.0.1", port=0 ):
+        self.http_server = ThreadingHTTPServer ( (host, port), StandInRequestHandler )
+        self.http_server.daemon_threads = True
+        self.http_server.request_queue_size = 1024
+
+        # bytes/s of every response body (None for unlimited)
+        self.http_server.bandwidth = bandwidth
+
+        # seconds a "/hang/" url waits before its (late) answer
+        self.http_server.hang_time = hang_time
+
+        threading.Thread ( target=self.http_server.serve_forever, daemon=True ).start ( )
+
+    def get_base_url ( self ):
+        """
+        :return: url of the server (str, e.g; "http://127.0.0.1:41234")
+        """
+        host, port = self.http_server.server_address[ :2 ]
+        return "http://{0}:{1}".format ( host, port )
+
+    def close ( self ):
+        self.http_server.shutdown ( )
+        self.http_server.server_close ( )
+
+
+def generate_urls ( base_url, scenario, seed=0 ):
+    """
+    Generates the urls of a scenario. The same seed always gives the same urls (apart from base_url).
+    :param base_url: url of a StandInImageServer (str)
+    :param scenario: dict (see SCENARIOS)
+    :param seed: int
+    :return: generator of urls (str)
+    """
+    rand = random.Random ( seed )
+    log_min_size, log_max_size = math.log ( scenario[ "min_size" ] ), math.log ( scenario[ "max_size" ] )
+
+    for url_id in range ( scenario[ "num_urls" ] ):
+        extension = rand.choice ( scenario[ "content_types" ] )
+        roll = rand.random ( )
+
+        if roll < scenario[ "timeout_rate" ]:
+            path = "/hang/{0}.{1}".format ( url_id, extension )
+        elif roll < scenario[ "timeout_rate" ] + scenario[ "error_rate" ]:
+            path = "/status/{0}/{1}.{2}".format ( rand.choice ( ERROR_STATUSES ), url_id, extension )
+        else:
+            size = int ( math.exp ( rand.uniform ( log_min_size, log_max_size ) ) )
+            path = "/image/{0}/{1}/{2}.{3}".format ( size, scenario[ "latency_ms" ], url_id, extension )
+
+        if rand.random ( ) < scenario[ "redirect_rate" ]:
+            path = "/redirect/{0}{1}".format ( rand.randint ( 1, 3 ), path )
+
+        yield base_url + path
+
+
+def get_peak_rss ( ):
+    """
+    :return: peak resident set size of this process in bytes (int) / None (If the platform does not report it)
+    """
+    # Linux reports the peak of this process image only, unlike getrusage which keeps the one of the parent process
+    try:
+        with open ( "/proc/self/status", mode='r', encoding='ascii' ) as fd:
+            for line in fd:
+                if line.startswith ( "VmHWM:" ):
+                    return int ( line.split ( )[ 1 ] ) * 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage ( resource.RUSAGE_SELF ).ru_maxrss
+    # reported in bytes by macOS, in kilobytes by Linux
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def run_pipeline ( url_fname, engine ):
+    """
+    Runs FileParser and a download engine over a plaintext file, as scripts/run_parser_downloader.py does, and \
+    measures them. The application must have been configured (see settings.configure_application).
+    :param url_fname: path of the plaintext file (str)
+    :param engine: "thread" or "asyncio"
+    :return: dict of the measurements
+    """
+    from .dns_cache import close_dns_cache
+    from .downloader import Downloader
+    from .http_session import close_http_session_pool
+    from .parser import FileParser
+
+    metrics = reset_app_metrics ( BENCHMARK_LATENCY_BUCKETS )
+    start_time = time.monotonic ( )
+
+    with open ( url_fname, 'rb' ) as url_fd:
+        fp = FileParser ( url_fd )
+        fp.start_parser_thread ( )
+
+        if engine == "asyncio":
+            from .async_downloader import AsyncDownloader
+            url_dl = AsyncDownloader ( fp.url_queue )
+        else:
+            url_dl = Downloader ( fp.url_queue )
+        url_dl.start_downloader_threads ( )
+
+        fp.wait_for_parser_thread ( )
+        url_dl.wait_for_downloader_threads ( )
+
+    elapsed = time.monotonic ( ) - start_time
+    close_http_session_pool ( )
+    close_dns_cache ( )
+
+    def get_latency_ms ( percent, stage ):
+        latency = metrics.stage_latency.get_percentile ( percent, (stage,) )
+        return None if latency is None else round ( latency * 1000, 3 )
+
+    num_bytes = metrics.bytes_downloaded.get_snapshot ( )
+    peak_rss = get_peak_rss ( )
+
+    return {
+        "engine": engine,
+        "num_urls": fp.num_urls,
+        "num_downloaded": url_dl.num_downloaded,
+        "num_failed": url_dl.num_failed,
+        "num_rejected": metrics.urls_rejected.get_snapshot ( ),
+        "bytes_downloaded": num_bytes,
+        "elapsed": round ( elapsed, 3 ),
+        "urls_per_s": round ( fp.num_urls / elapsed, 2 ),
+        "mb_per_s": round ( num_bytes / elapsed / 1e6, 3 ),
+        "download_p50_ms": get_latency_ms ( 50, "download" ),
+        "download_p99_ms": get_latency_ms ( 99, "download" ),
+        "validation_p50_ms": get_latency_ms ( 50, "validation" ),
+        "validation_p99_ms": get_latency_ms ( 99, "validation" ),
+        "peak_rss_mb": None if peak_rss is None else round ( peak_rss / 1024 / 1024, 1 ),
+        "http_responses": metrics.http_responses.get_snapshot ( ),
+    }
+
+
+def get_git_commit ( repo_dir ):
+    """
+    :param repo_dir: directory of the git repository of the application
+    :return: abbreviated hash of the checked out commit, suffixed with "-dirty" if the tree has local changes \
+             (str) / None (If it is not a git repository)
+    """
+    try:
+        commit = subprocess.run ( [ "git", "rev-parse", "--short", "HEAD" ], cwd=repo_dir, capture_output=True,
+                                  text=True, check=True ).stdout.strip ( )
+        changes = subprocess.run ( [ "git", "status", "--porcelain", "--untracked-files=no" ], cwd=repo_dir,
+                                   capture_output=True, text=True, check=True ).stdout.strip ( )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit + "-dirty" if changes else commit
+
+
+def save_results ( output_dir, results, commit, cfg_overrides=( ) ):
+    """
+    Saves the results of a benchmark run, for comparison with the runs of other commits
+    :param output_dir: directory of the result files (str)
+    :param results: list of dicts (see run_pipeline)
+    :param commit: str / None (see get_git_commit)
+    :param cfg_overrides: list of "NAME=VALUE" configurations applied on top of cfg.py
+    :return: path of the result file (str)
+    """
+    os.makedirs ( output_dir, exist_ok=True )
+    timestamp = datetime.datetime.now ( )
+    result_path = os.path.join ( output_dir, "benchmark-{0}-{1}.json".format ( timestamp.strftime ( "%Y%m%d-%H%M%S" ),
+                                                                            commit or "unknown" ) )
+
+    with open ( result_path, mode='w', encoding='utf-8' ) as fd:
+        json.dump ( { "commit": commit, "timestamp": timestamp.isoformat ( timespec='seconds' ),
+                      "python": platform.python_version ( ), "platform": platform.platform ( ),
+                      "cpu_count": os.cpu_count ( ), "cfg_overrides": list ( cfg_overrides ), "results": results },
+                    fd, indent=2, sort_keys=True )
+
+    return result_path
+
+
+def compare_results ( baseline, results ):
+    """
+    Compares results with the ones of a baseline run, scenario by scenario and engine by engine
+    :param baseline: dict loaded from a result file (see save_results)
+    :param results: list of dicts (see run_pipeline)
+    :return: list of lines of the comparison (str)
+    """
+    baseline_results = { (result[ "scenario" ], result[ "engine" ]): result for result in baseline[ "results" ] }
+    lines = [ ]
+
+    for result in results:
+        base = baseline_results.get ( (result[ "scenario" ], result[ "engine" ]) )
+        if not base:
+            continue
+
+        changes = [ ]
+        for key in ("urls_per_s", "mb_per_s", "download_p50_ms", "download_p99_ms", "peak_rss_mb"):
+            if result.get ( key ) is not None and base.get ( key ):
+                changes.append ( "{0} {1:+.1%}".format ( key, result[ key ] / base[ key ] - 1 ) )
+
+        lines.append ( "{0}/{1} vs {2}: {3}".format ( result[ "scenario" ], result[ "engine" ], baseline[ "commit" ],
+                                                      ", ".join ( changes ) ) )
+
+    return lines
@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from collections import deque
+
+
+class AdaptiveConcurrencyController:
+    """
+    Description: AdaptiveConcurrencyController class tunes the number of downloads in flight at runtime. Every \
+                 download holds a permit (acquire / release) and the number of permits (the concurrency level) is \
+                 adjusted at the end of every measurement window of "interval" seconds, from the throughput \
+                 (bytes per second), the mean time to first byte and the error rate (timeouts and connection errors) \
+                 of the downloads finished during the window. The time to first byte does not depend on the size of \
+                 the images, unlike their whole latency. It follows AIMD (additive increase, multiplicative decrease):
+                 * level is halved if the error rate exceeds "max_error_rate" or the mean time to first byte exceeds \
+                   "max_latency_factor" times the lowest one of the last "base_windows" windows (network or servers \
+                   are overloaded). As the base ages out, a lasting change of hosts or routes is not taken for load.
+                 * otherwise level is decreased by one if the throughput fell after the last increase (the extra \
+                   downloads do not pay off), or increased by one if the window was saturated (every permit was \
+                   held at some point) or the throughput rose (there is unused bandwidth). A window in which the \
+                   downloads did not use all of the permits keeps level as it is: more permits would stay unused.
+                 Level always stays within [min_level, max_level].
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, min_level, max_level, initial_level, interval=2.0, max_error_rate=0.1,
+                   max_latency_factor=2.0, base_windows=30 ):
+        self.logger = logging.getLogger ( __name__ )
+
+        # bounds of the concurrency level
+        self.min_level = min_level
+        self.max_level = max_level
+
+        # current concurrency level, i.e; number of permits
+        self.level = min ( max ( initial_level, min_level ), max_level )
+
+        # number of permits currently held
+        self.active = 0
+
+        # length of a measurement window in seconds
+        self.interval = interval
+
+        # thresholds of the multiplicative decrease
+        self.max_error_rate = max_error_rate
+        self.max_latency_factor = max_latency_factor
+
+        # measurements of the current window
+        self.window_start = time.monotonic ( )
+        self.window_downloads = 0
+        self.window_errors = 0
+        self.window_bytes = 0
+        self.window_ttfb = 0.0
+        self.window_saturated = self.active >= self.level
+        self.window_ttfb_count = 0
+
+        # whether or not every permit has been held at some point of the current window
+        self.window_saturated = False
+
+        # throughput of the previous window and whether or not level was increased at its end
+        self.prev_throughput = None
+        self.prev_increased = False
+
+        # mean time to first byte of the last base_windows windows. The lowest one is used as the latency of \
+        # an unloaded network.
+        self.recent_ttfbs = deque ( maxlen=base_windows )
+
+        self.mutex = threading.Lock ( )
+        self.permit_available = threading.Condition ( self.mutex )
+
+    @property
+    def concurrency ( self ):
+        """
+        Returns the current concurrency level
+        :return: int
+        """
+        return self.level
+
+    def acquire ( self ):
+        """
+        Waits for a permit to start a download. It is a thread safe function.
+        :return:
+        """
+        with self.permit_available:
+            # this download takes the last permit or waits for one
+            if self.active + 1 >= self.level:
+                self.window_saturated = True
+
+            self.permit_available.wait_for ( lambda: self.active < self.level )
+            self.active += 1
+
+    def release ( self ):
+        """
+        Gives back the permit of a finished download. It is a thread safe function.
+        :return:
+        """
+        with self.permit_available:
+            self.active -= 1
+            self.permit_available.notify ( )
+
+    def record ( self, num_bytes, num_errors, ttfb=None ):
+        """
+        Records the measurements of a finished download and adjusts the concurrency level at the end of \
+        a measurement window. It is a thread safe function.
+        :param num_bytes: number of downloaded bytes (int)
+        :param num_errors: number of timeouts and connection errors met by the download (int)
+        :param ttfb: time from the request of the last attempt to its response headers in seconds (float) / \
+                     None (If no response has been received)
+        :return:
+        """
+        with self.mutex:
+            self.window_downloads += 1
+            self.window_errors += num_errors
+            self.window_bytes += num_bytes
+            if ttfb is not None:
+                self.window_ttfb += ttfb
+                self.window_ttfb_count += 1
+
+            elapsed = time.monotonic ( ) - self.window_start
+            if elapsed >= self.interval:
+                self.adjust ( elapsed )
+
+    def adjust ( self, elapsed ):
+        """
+        Adjusts the concurrency level from the measurements of the window which just ended. Caller must hold \
+        self.mutex.
+        :param elapsed: length of the window in seconds (float)
+        :return:
+        """
+        throughput = self.window_bytes / elapsed
+        error_rate = self.window_errors / self.window_downloads
+
+        # a window without any response (e.g; only failures) gives no latency measurement
+        is_latency_spike = False
+        mean_ttfb = None
+        if self.window_ttfb_count:
+            mean_ttfb = self.window_ttfb / self.window_ttfb_count
+            self.recent_ttfbs.append ( mean_ttfb )
+            is_latency_spike = mean_ttfb > self.max_latency_factor * min ( self.recent_ttfbs )
+
+        prev_level = self.level
+        increased = False
+
+        if error_rate > self.max_error_rate or is_latency_spike:
+            self.level = max ( self.min_level, self.level // 2 )
+        elif self.prev_increased and self.prev_throughput and throughput < self.prev_throughput:
+            self.level = max ( self.min_level, self.level - 1 )
+        elif self.level < self.max_level and (self.window_saturated or (
+                self.prev_throughput is not None and throughput > self.prev_throughput)):
+            self.level += 1
+            increased = True
+
+        if self.level != prev_level:
+            self.logger.debug (
+                "Concurrency level changed from %s to %s (throughput: %.0f B/s, mean time to first byte: %s s, "
+                "error rate: %.2f).", prev_level, self.level, throughput,
+                "-" if mean_ttfb is None else "{:.3f}".format ( mean_ttfb ), error_rate )
+            self.permit_available.notify_all ( )
+
+        self.prev_throughput = throughput
+        self.prev_increased = increased
+
+        self.window_start = time.monotonic ( )
+        self.window_downloads = self.window_errors = self.window_bytes = self.window_ttfb_count = 0
+        self.window_ttfb = 0.0
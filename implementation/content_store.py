@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+
+
+class ContentStore:
+    """
+    Description: ContentStore class keeps an index of the content digests (SHA-256) of the images saved into the \
+                 download directory. Downloader hashes every image while streaming it into a temporary file, then \
+                 commits the file through ContentStore. A new content is moved into place and indexed. A content \
+                 which has already been saved is not written twice: it is either hardlinked to the saved file \
+                 ("hardlink" mode), or only recorded into a manifest of duplicates ("manifest" mode). The index \
+                 is persisted in the download directory, so duplicates of the images of earlier runs are detected too.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # name of the index file (one "digest<TAB>file name" line per saved content)
+    INDEX_FILE_NAME = ".content_index"
+
+    # name of the manifest of duplicates (one "url<TAB>digest<TAB>file name of saved content" line per duplicate)
+    MANIFEST_FILE_NAME = ".duplicates_manifest"
+
+    def __init__ ( self, save_dir, mode ):
+        self.logger = logging.getLogger ( __name__ )
+
+        # directory into which images are saved
+        self.save_dir = save_dir
+
+        # How duplicates are stored: "hardlink" or "manifest"
+        self.mode = mode
+
+        # maps the hex digest of a content to the path (relative to self.save_dir) of the file holding it
+        self.digest_index = { }
+
+        # this is used by downloader threads to get a lock over self.digest_index and the index files
+        self.mutex = threading.Lock ( )
+
+        self.index_path = os.path.join ( save_dir, self.INDEX_FILE_NAME )
+        self.manifest_path = os.path.join ( save_dir, self.MANIFEST_FILE_NAME )
+        self.load_index ( )
+
+    def load_index ( self ):
+        """
+        Loads the index of already saved contents from the download directory
+        :return:
+        """
+        try:
+            with open ( self.index_path, mode='r', encoding='utf-8' ) as fd:
+                for line in fd:
+                    digest, _, rel_path = line.rstrip ( '\n' ).partition ( '\t' )
+                    if digest and rel_path:
+                        self.digest_index[ digest ] = rel_path
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def append_line ( file_path, fields ):
+        """
+        Appends a tab separated line to a file
+        :param file_path: str
+        :param fields: tuple of str
+        :return:
+        """
+        with open ( file_path, mode='a', encoding='utf-8' ) as fd:
+            fd.write ( "\t".join ( fields ) + "\n" )
+
+    def commit ( self, url, temp_path, path, digest ):
+        """
+        Moves a completely downloaded image from its temporary file into place, unless the same content has \
+        already been saved. In that case the temporary file is discarded and the duplicate gets hardlinked or \
+        recorded into the manifest. It is a thread safe function.
+        :param url: url of the image (str)
+        :param temp_path: path of the temporary file holding the downloaded image (str)
+        :param path: path the image would be saved to, if its content is new (str)
+        :param digest: hex digest of the content of the image (str)
+        :return: True (If content is new) / False (If content is a duplicate)
+        """
+        rel_path = os.path.relpath ( path, self.save_dir )
+
+        with self.mutex:
+            saved_rel_path = self.digest_index.get ( digest )
+
+            if saved_rel_path is not None:
+                saved_path = os.path.join ( self.save_dir, saved_rel_path )
+
+                if os.path.isfile ( saved_path ):
+                    os.remove ( temp_path )
+                    self.store_duplicate ( url, digest, saved_path, path )
+                    return False
+
+                # the saved file has been deleted in the meantime, so this content is stored again
+                self.logger.debug ( "Indexed file {} does not exist anymore.".format ( saved_path ) )
+
+            os.replace ( temp_path, path )
+            self.digest_index[ digest ] = rel_path
+            self.append_line ( self.index_path, (digest, rel_path) )
+
+        return True
+
+    def get_saved_path ( self, digest ):
+        """
+        Finds the file which holds a content. It is a thread safe function.
+        :param digest: hex digest of the content (str)
+        :return: path of the file (str) / None (If the content has not been saved)
+        """
+        with self.mutex:
+            saved_rel_path = self.digest_index.get ( digest )
+
+        return os.path.join ( self.save_dir, saved_rel_path ) if saved_rel_path is not None else None
+
+    def store_duplicate ( self, url, digest, saved_path, path ):
+        """
+        Stores a duplicate content as per the configured mode. If a hardlink is not possible (e.g; file system \
+        without hardlinks), the duplicate is recorded into the manifest instead.
+        :param url: url of the duplicate image (str)
+        :param digest: hex digest of the content (str)
+        :param saved_path: path of the file which already holds the content (str)
+        :param path: path the duplicate image would have been saved to (str)
+        :return:
+        """
+        if self.mode == "hardlink":
+            try:
+                os.link ( saved_path, path )
+                return
+            except OSError as err:
+                self.logger.info (
+                    "For URL: {0} - Hardlink could not be created. Arguments:\n{1!r}".format ( url, err.args ) )
+
+        self.append_line ( self.manifest_path, (url, digest, os.path.relpath ( saved_path, self.save_dir )) )
@@ -0,0 +1,220 @@
+import concurrent.futures
+import logging
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from urllib3.util.connection import allowed_gai_family
+
+import cfg
+from .app_constants import *
+
+
+class DnsCache:
+    """
+    Description: DnsCache class keeps the addresses of the resolved hosts for "ttl" seconds, and the resolution \
+                 errors of the unresolvable ones (e.g; dead domains) for "negative_ttl" seconds, so that a host is \
+                 resolved by the system resolver once for all the requests of all the threads. Concurrent lookups \
+                 of a host which is not cached wait for a single resolution. Hosts can also be resolved ahead of \
+                 their requests by a pool of "prefetch_threads" threads (see prefetch).
+
+    Version: 1.0
+    Comment: The system resolver does not report the TTL of the DNS records, so "ttl" applies to every host.
+    """
+
+    def __init__ ( self, ttl=300, negative_ttl=60, max_entries=100000, prefetch_threads=0 ):
+        self.logger = logging.getLogger ( __name__ )
+
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+
+        # maps a host to (expiry time, list of (family, address)) / (expiry time, socket.gaierror)
+        self.entries = { }
+
+        # maps a host being resolved to the concurrent.futures.Future of its resolution
+        self.pending = { }
+        self.mutex = threading.Lock ( )
+
+        self.prefetch_executor = None
+        if prefetch_threads:
+            self.prefetch_executor = concurrent.futures.ThreadPoolExecutor ( max_workers=prefetch_threads,
+                                                                             thread_name_prefix="dns_prefetch" )
+
+    def resolve ( self, host ):
+        """
+        Returns the addresses of a host, from the cache if it has been resolved recently. It is a thread safe \
+        function.
+        :param host: str
+        :return: list of (address family, IP address str), in the order they have to be tried
+        :raise socket.gaierror: If the host cannot be resolved (also while the error is cached)
+        """
+        with self.mutex:
+            entry = self.entries.get ( host )
+            if entry is not None and entry[ 0 ] > time.monotonic ( ):
+                result = entry[ 1 ]
+            else:
+                result = None
+                future = self.pending.get ( host )
+                is_resolver = future is None
+                if is_resolver:
+                    future = self.pending[ host ] = concurrent.futures.Future ( )
+
+        if result is None:
+            if is_resolver:
+                self.resolve_into ( host, future )
+            result = future.result ( )
+
+        if isinstance ( result, socket.gaierror ):
+            raise result
+
+        return result
+
+    def get_cached ( self, host ):
+        """
+        Returns the addresses of a host, only if it has been resolved recently. It is a thread safe function.
+        :param host: str
+        :return: list of (address family, IP address str) / None (If the host is not cached)
+        :raise socket.gaierror: If the resolution error of the host is cached
+        """
+        with self.mutex:
+            entry = self.entries.get ( host )
+            result = entry[ 1 ] if entry is not None and entry[ 0 ] > time.monotonic ( ) else None
+
+        if isinstance ( result, socket.gaierror ):
+            raise result
+
+        return result
+
+    def resolve_into ( self, host, future ):
+        """
+        Resolves a host with the system resolver, caches the result and sets it into the future waited for by the \
+        other lookups of the host
+        :param host: str
+        :param future: concurrent.futures.Future
+        :return:
+        """
+        try:
+            result = [ ]
+            for family, _, _, _, sock_addr in socket.getaddrinfo ( host, None, allowed_gai_family ( ),
+                                                                   socket.SOCK_STREAM ):
+                if (family, sock_addr[ 0 ]) not in result:
+                    result.append ( (family, sock_addr[ 0 ]) )
+            ttl = self.ttl
+        except (OSError, UnicodeError) as err:
+            result = err if isinstance ( err, socket.gaierror ) else socket.gaierror ( socket.EAI_NONAME, str ( err ) )
+            ttl = self.negative_ttl
+            self.logger.debug ( "Host %s cannot be resolved: %s", host, err )
+
+        with self.mutex:
+            if len ( self.entries ) >= self.max_entries:
+                self.evict_entries ( )
+            if ttl:
+                self.entries[ host ] = (time.monotonic ( ) + ttl, result)
+            self.pending.pop ( host, None )
+
+        if not future.done ( ):
+            future.set_result ( result )
+
+    def evict_entries ( self ):
+        """
+        Removes the expired entries, or else the oldest half of the entries. Caller must hold self.mutex.
+        :return:
+        """
+        now = time.monotonic ( )
+        expired_hosts = [ host for host, entry in self.entries.items ( ) if entry[ 0 ] <= now ]
+        if not expired_hosts:
+            expired_hosts = list ( self.entries )[ :len ( self.entries ) // 2 + 1 ]
+
+        for host in expired_hosts:
+            del self.entries[ host ]
+
+    def is_cached ( self, host ):
+        """
+        Caller must hold self.mutex.
+        :param host: str
+        :return: True (If the host is cached or being resolved) / False
+        """
+        entry = self.entries.get ( host )
+        return host in self.pending or (entry is not None and entry[ 0 ] > time.monotonic ( ))
+
+    def prefetch ( self, url ):
+        """
+        Resolves the host of an url in the background, if it is neither cached nor being resolved. It does \
+        nothing without prefetch threads. It is a thread safe function.
+        :param url: str
+        :return:
+        """
+        if self.prefetch_executor is None:
+            return
+
+        try:
+            host = urlsplit ( url.strip ( ) ).hostname
+        except ValueError:
+            return
+
+        if not host:
+            return
+
+        with self.mutex:
+            if self.is_cached ( host ):
+                return
+            future = self.pending[ host ] = concurrent.futures.Future ( )
+
+        self.prefetch_executor.submit ( self.resolve_into, host, future )
+
+    def close ( self ):
+        """
+        Stops the prefetch threads. Pending prefetches are dropped, and the lookups waiting for them fail.
+        :return:
+        """
+        if self.prefetch_executor is None:
+            return
+
+        self.prefetch_executor.shutdown ( wait=False, cancel_futures=True )
+
+        with self.mutex:
+            pending, self.pending = self.pending, { }
+        for host, future in pending.items ( ):
+            if not future.done ( ):
+                future.set_result ( socket.gaierror ( socket.EAI_AGAIN, "DNS cache is closed" ) )
+
+
+# DnsCache shared by all the components of the application (created on its first use)
+shared_dns_cache = None
+shared_dns_cache_mutex = threading.Lock ( )
+
+
+def get_dns_cache ( ):
+    """
+    Returns the DnsCache shared by FileParser and Downloader, configured as per cfg.py. It is a thread safe function.
+    :return: DnsCache / None (If DNS_CACHE_TTL is not configured)
+    """
+    global shared_dns_cache
+
+    if not cfg.APP_CFG.get ( DNS_CACHE_TTL ):
+        return None
+
+    with shared_dns_cache_mutex:
+        if shared_dns_cache is None:
+            # hosts are not resolved ahead through a proxy, as the proxy resolves them
+            prefetch_threads = 0 if cfg.APP_CFG.get ( SYSTEM_PROXY ) else cfg.APP_CFG.get ( DNS_PREFETCH_THREADS ) or 0
+
+            shared_dns_cache = DnsCache ( cfg.APP_CFG[ DNS_CACHE_TTL ], cfg.APP_CFG.get ( DNS_NEGATIVE_TTL ) or 0,
+                                          prefetch_threads=prefetch_threads )
+
+        return shared_dns_cache
+
+
+def close_dns_cache ( ):
+    """
+    Closes the shared DnsCache, stopping its prefetch threads.
+    :return:
+    """
+    global shared_dns_cache
+
+    with shared_dns_cache_mutex:
+        if shared_dns_cache is not None:
+            shared_dns_cache.close ( )
+            shared_dns_cache = None
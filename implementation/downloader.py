@@ -1,19 +1,37 @@
+import hashlib
 import logging
 import os
 import threading
+import time
 
 import requests
 
 import cfg
 from .app_constants import *
+from .archive_sink import get_archive_sink, FILES
+from .concurrency import AdaptiveConcurrencyController
+from .content_store import ContentStore
+from .file_sink import DiskSpaceWatermark, FileSink, FsyncBatcher, ImageSizeError, PartialDownload, \
+    is_size_allowed, read_response_head
+from .filename_allocator import FilenameAllocator
+from .host_scheduler import HostScheduler
+from .http_cache import ConditionalCache
+from .http_session import get_http_session_pool, get_request_timing, start_request_timing, stop_request_timing
+from .journal import get_job_journal, DOWNLOADED, FAILED
+from .manifest import get_result_manifest, new_manifest_entry, finish_manifest_entry, RETRIED
+from .media_type import is_image_content_type, is_image_extension, sniff_image_type, SNIFF_SIZE
+from .metrics import get_app_metrics
+from .output_layout import OutputLayout, FLAT
+from .retry import RetryScheduler, get_retry_error
 
 
 class Downloader:
     """
     Description: Downloader class contains methods which collectively work together to download image resources \
-                 from urls and save them into user specified system path. As per its mechanism, it employs four \
-                 threads to concurrently download the resources. These threads (Consumers) pick up urls from the "url_queue" \
-                 which is filled up by FileParser class (Producer).
+                 from urls and save them into user specified system path. As per its mechanism, it employs \
+                 NUM_DL_THREADS threads (tuned at runtime with ADAPTIVE_CONCURRENCY) to concurrently download the \
+                 resources. These threads (Consumers) pick up urls from the "url_queue" which is filled up by \
+                 FileParser class (Producer).
 
     Version: 1.0
     Comment:
@@ -26,18 +44,90 @@ class Downloader:
         # FileParser is the producer of urls in this queue, while Downloader threads are consumers
         self.url_queue = url_queue
 
-        # this will be used, if because of any reason function "get_filename_from_url"
-        # could not derive a file name
-        self.custom_file_id = 0
+        # hands out unique file names within IMAGE_SAVE_DIR to the downloader threads, including the custom names \
+        # used if because of any reason function "get_dl_filename_from_url" could not derive a file name
+        self.filename_allocator = FilenameAllocator ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] )
+
+        # maps an url being downloaded to the file name reserved by its last attempt, which its next attempt \
+        # (e.g; a retry) asks for again (see reserve_dl_filename)
+        self.dl_filenames = { }
+
+        # places the images into shard directories of IMAGE_SAVE_DIR (see OUTPUT_LAYOUT)
+        self.output_layout = OutputLayout ( cfg.APP_CFG[ IMAGE_SAVE_DIR ], cfg.APP_CFG.get ( OUTPUT_LAYOUT ) or FLAT,
+                                            cfg.APP_CFG.get ( HASH_SHARD_LEVELS ) or 2 )
 
         # default image extension in case downloading file is missing
         self.default_image_ext = "jfif"
 
-        # this is used by downloader threads to get a lock over self.custom_file_id
-        self.mutex = threading.Lock ( )
+        # pooled keep-alive HTTP sessions, shared with FileParser
+        self.session_pool = get_http_session_pool ( )
+
+        # journal recording the state of every url, if JOURNAL_PATH is configured
+        self.journal = get_job_journal ( )
+
+        # index of the contents already saved, used to avoid saving identical images twice (see DEDUP_MODE)
+        self.content_store = None
+        if cfg.APP_CFG.get ( DEDUP_MODE ):
+            self.content_store = ContentStore ( cfg.APP_CFG[ IMAGE_SAVE_DIR ], cfg.APP_CFG[ DEDUP_MODE ] )
+
+        # validators of the images downloaded by earlier runs, used to request them conditionally (see HTTP_CACHE_PATH)
+        self.http_cache = None
+        if cfg.APP_CFG.get ( HTTP_CACHE_PATH ):
+            self.http_cache = ConditionalCache ( cfg.APP_CFG[ HTTP_CACHE_PATH ],
+                                                 cfg.APP_CFG.get ( HTTP_CACHE_MAX_ENTRIES ) or 1000000 )
 
         # Number of downloader threads
-        self.NUM_DL_THREADS = 4
+        self.NUM_DL_THREADS = cfg.APP_CFG.get ( NUM_DL_THREADS ) or 4
+
+        # With ADAPTIVE_CONCURRENCY, MAX_DL_THREADS threads are created and the controller lets only as many of \
+        # them download at once as its current concurrency level (starting from NUM_DL_THREADS)
+        self.concurrency_controller = None
+        if cfg.APP_CFG.get ( ADAPTIVE_CONCURRENCY ):
+            min_dl_threads = cfg.APP_CFG.get ( MIN_DL_THREADS ) or 1
+            max_dl_threads = max ( cfg.APP_CFG.get ( MAX_DL_THREADS ) or 32, min_dl_threads )
+            self.concurrency_controller = AdaptiveConcurrencyController ( min_dl_threads, max_dl_threads,
+                                                                          self.NUM_DL_THREADS )
+            self.NUM_DL_THREADS = max_dl_threads
+
+        # measurements of the download in progress of a downloader thread, read by concurrency_controller
+        self.dl_stats = threading.local ( )
+
+        # appends the downloaded images into rolling archive shards instead of loose files (see OUTPUT_SINK)
+        self.archive_sink = get_archive_sink ( cfg.APP_CFG.get ( OUTPUT_SINK ) or FILES, cfg.APP_CFG[ IMAGE_SAVE_DIR ],
+                                               cfg.APP_CFG.get ( ARCHIVE_SHARD_SIZE ) or 1024 * 1024 * 1024,
+                                               cfg.APP_CFG.get ( WRITE_BUFFER_SIZE ) or 256 * 1024 )
+
+        # flushes the saved images to the disk in batches (see FSYNC_BATCH_SIZE)
+        self.fsync_batcher = None
+        if (cfg.APP_CFG.get ( FSYNC_BATCH_SIZE ) or 0) >= 1:
+            self.fsync_batcher = FsyncBatcher ( cfg.APP_CFG[ FSYNC_BATCH_SIZE ] )
+
+        # size limits of an image (see MIN_IMAGE_SIZE and MAX_IMAGE_SIZE)
+        self.min_image_size = cfg.APP_CFG.get ( MIN_IMAGE_SIZE ) or 0
+        self.max_image_size = cfg.APP_CFG.get ( MAX_IMAGE_SIZE )
+
+        # pauses the downloads while the disk of IMAGE_SAVE_DIR is running out of space (see MIN_FREE_DISK_SPACE)
+        self.disk_watermark = None
+        if cfg.APP_CFG.get ( MIN_FREE_DISK_SPACE ) is not None:
+            self.disk_watermark = DiskSpaceWatermark ( cfg.APP_CFG[ IMAGE_SAVE_DIR ],
+                                                       cfg.APP_CFG[ MIN_FREE_DISK_SPACE ],
+                                                       cfg.APP_CFG.get ( MAX_DISK_SPACE_WAIT, 600 ) )
+
+        # puts the urls failed for a transient reason back into url_queue after a backoff delay (see RETRY_POLICY)
+        self.retry_scheduler = None
+        if cfg.APP_CFG.get ( RETRY_POLICY ):
+            self.retry_scheduler = RetryScheduler ( self.url_queue, cfg.APP_CFG[ RETRY_POLICY ] )
+
+        # number of urls downloaded and failed so far (e.g; for the statistics of a shard, see SHARD_COUNT)
+        self.num_downloaded = 0
+        self.num_failed = 0
+        self.stats_mutex = threading.Lock ( )
+
+        # metrics shared with FileParser
+        self.metrics = get_app_metrics ( )
+
+        # per-url records of the results and latency breakdown of the downloads, if MANIFEST_PATH is configured
+        self.manifest = get_result_manifest ( )
 
         # thread_list contains downloader thread instance which are created and \
         # started by create_start_downloader_threads function
@@ -69,6 +159,18 @@ class Downloader:
         for i in range ( self.NUM_DL_THREADS ):
             self.dl_thread_list[ i ].join ( )
 
+        if self.retry_scheduler:
+            self.retry_scheduler.close ( )
+
+        if self.archive_sink:
+            self.archive_sink.close ( )
+
+        if self.fsync_batcher:
+            self.fsync_batcher.flush ( )
+
+        if self.http_cache:
+            self.http_cache.save ( )
+
         # Last message for user
         print ( "Download dir is {}".format ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) )
         print ( "Log dir is {}".format ( cfg.APP_CFG[ LOG_DIR ] ) )
@@ -80,48 +182,298 @@ class Downloader:
         :return:
         """
         while (True):
+            if self.concurrency_controller:
+                self.concurrency_controller.acquire ( )
+
             url = self.url_queue.get ( block=True, timeout=None )
 
             # exit point of a thread (Use "EXIT" to exit and then put it back for other threads to use (and exit)
+            # "EXIT" is held back by retry_scheduler while retries are pending, as they are put back into url_queue.
             if url == "EXIT":
-                self.url_queue.put ( item="EXIT", block=True, timeout=None )
-                break
+                is_exiting = not self.retry_scheduler or self.retry_scheduler.handle_exit ( )
+                if is_exiting:
+                    self.url_queue.put ( item="EXIT", block=True, timeout=None )
+                if self.concurrency_controller:
+                    self.concurrency_controller.release ( )
+                if is_exiting:
+                    break
+                continue
+
+            if self.retry_scheduler:
+                self.retry_scheduler.task_started ( )
+
+            self.dl_stats.num_bytes = 0
+            self.dl_stats.num_errors = 0
+            self.dl_stats.ttfb = None
+            self.dl_stats.retry_error = None
+
+            self.metrics.active_workers.inc ( labels=("download",) )
+            start_time = time.monotonic ( )
+
+            # an unexpected error (e.g; a full disk while the image is moved into place) fails the url for good. \
+            # The url is accounted as finished anyway, so that "EXIT" is not held back by retry_scheduler forever.
+            dl_status = False
+            try:
+                if self.manifest:
+                    self.dl_stats.manifest_entry = new_manifest_entry ( url )
+                    start_request_timing ( ).num_delayed_retries = self.get_retry_count ( url )
+
+                # an url is failed without being downloaded, if there has been no free space for MAX_DISK_SPACE_WAIT
+                if self.disk_watermark and not self.disk_watermark.wait_for_space ( ):
+                    self.logger.debug ( "URL %s has not been downloaded. The disk is full.", url )
+                else:
+                    dl_status = self.download_image ( url )
+                    if not dl_status and self.schedule_retry ( url ):
+                        dl_status = None
+            except Exception:
+                self.logger.exception ( "For URL: %s - An unexpected exception occurred.", url )
+                dl_status = False
+            finally:
+                dl_time = time.monotonic ( ) - start_time
+                self.metrics.stage_latency.observe ( dl_time, labels=("download",) )
+                self.metrics.active_workers.dec ( labels=("download",) )
+
+                try:
+                    self.record_download_result ( url, dl_status )
+
+                    if self.manifest:
+                        self.record_manifest_entry ( dl_status, stop_request_timing ( ) )
+                finally:
+                    if self.concurrency_controller:
+                        self.concurrency_controller.record ( self.dl_stats.num_bytes, self.dl_stats.num_errors,
+                                                             self.dl_stats.ttfb )
+                        self.concurrency_controller.release ( )
+
+    def get_concurrency ( self ):
+        """
+        Returns the current number of downloads allowed in flight at the same time
+        :return: int
+        """
+        if self.concurrency_controller:
+            return self.concurrency_controller.concurrency
+
+        return self.NUM_DL_THREADS
+
+    def note_retry_error ( self, err ):
+        """
+        Keeps, for the download in progress of the calling thread, whether or not its failure is worth a retry
+        :param err: requests.exceptions.RequestException
+        :return:
+        """
+        self.dl_stats.retry_error = get_retry_error ( err )
+
+    def get_retry_count ( self, url ):
+        """
+        Returns the number of retries of an url scheduled so far, as per RETRY_POLICY
+        :param url: str
+        :return: int
+        """
+        return self.retry_scheduler.get_retry_count ( url ) if self.retry_scheduler else 0
+
+    def schedule_retry ( self, url ):
+        """
+        Schedules the retry of a failed download, if its failure is worth a retry as per RETRY_POLICY
+        :param url: str
+        :return: True (If a retry has been scheduled) / False (If url is given up)
+        """
+        retry_error = getattr ( self.dl_stats, "retry_error", None )
+        self.dl_stats.retry_error = None
+
+        return bool ( self.retry_scheduler and retry_error and self.retry_scheduler.schedule ( url, *retry_error ) )
+
+    def count_transport_error ( self ):
+        """
+        Counts a timeout or connection error into the measurements of the download in progress of the calling thread
+        :return:
+        """
+        self.dl_stats.num_errors = getattr ( self.dl_stats, "num_errors", 0 ) + 1
+        self.metrics.errors.inc ( labels=("download",) )
+
+    def get_manifest_entry ( self ):
+        """
+        :return: manifest record of the download in progress of the calling thread (dict) / None (If MANIFEST_PATH \
+                 is not configured)
+        """
+        return getattr ( self.dl_stats, "manifest_entry", None )
+
+    def get_request_timing ( self ):
+        """
+        :return: RequestTiming of the download in progress of the calling thread / None
+        """
+        return get_request_timing ( )
+
+    def note_request_start ( self ):
+        """
+        Notes the start of an attempt of the download in progress, into its manifest record and into the \
+        measurements read by concurrency_controller
+        :return:
+        """
+        if self.concurrency_controller:
+            self.dl_stats.request_start = time.monotonic ( )
+
+        timing = self.get_request_timing ( )
+        if timing is not None:
+            timing.start_request ( )
+
+    def note_response ( self, final_url, status, headers ):
+        """
+        Notes the response of the download in progress, into its manifest record and its time to first byte into \
+        the measurements read by concurrency_controller
+        :param final_url: url of the response, after redirects
+        :param status: HTTP status code (int)
+        :param headers: response headers (case-insensitive dict)
+        :return:
+        """
+        # the time to first byte of the last attempt tells concurrency_controller how loaded the servers are, \
+        # whatever the size of the image
+        if self.concurrency_controller:
+            self.dl_stats.ttfb = time.monotonic ( ) - self.dl_stats.request_start
+
+        entry = self.get_manifest_entry ( )
+        if entry is None:
+            return
+
+        entry[ "final_url" ] = str ( final_url )
+        entry[ "status" ] = status
+        entry[ "content_type" ] = headers.get ( 'content-type' )
 
-            self.download_image ( url )
+        timing = self.get_request_timing ( )
+        if timing is not None:
+            timing.note_headers ( )
 
-    def download_image ( self, url, reattempt_count=cfg.APP_CFG.get ( MAX_DOWNLOAD_REATTEMPTS ) ):
+    def note_error ( self, err ):
+        """
+        Notes the exception which made an attempt of the download in progress fail, into its manifest record
+        :param err: Exception
+        :return:
+        """
+        entry = self.get_manifest_entry ( )
+        if entry is not None:
+            entry[ "error" ] = type ( err ).__name__
+
+    def note_saved_image ( self, path, size ):
+        """
+        Notes where the image of the download in progress has been saved, into its manifest record
+        :param path: str
+        :param size: size of the image in bytes (int) / None
+        :return:
         """
-        This function downloads image resource from web and saves it into IMAGE_SAVE_DIR directory
+        entry = self.get_manifest_entry ( )
+        if entry is None:
+            return
+
+        entry[ "path" ] = path
+        entry[ "bytes" ] = size
+
+        timing = self.get_request_timing ( )
+        if timing is not None:
+            timing.note_transfer_end ( )
+
+    def record_manifest_entry ( self, dl_status, timing ):
+        """
+        Writes the manifest record of the download in progress of the calling thread (or task)
+        :param dl_status: True (If successful download) / False (If download fails) / None (If retry is scheduled)
+        :param timing: RequestTiming of the download
+        :return:
+        """
+        entry = self.get_manifest_entry ( )
+        if entry is not None:
+            result = { True: DOWNLOADED, False: FAILED, None: RETRIED }[ dl_status ]
+            self.manifest.record ( finish_manifest_entry ( entry, result, timing ) )
+
+    def record_download_result ( self, url, dl_status ):
+        """
+        Records the result of the download of an url into the journal, if it is configured, and frees the slot \
+        of its host in the per-host scheduler, if url_queue is one. The url is reported as finished to \
+        retry_scheduler even if the journal fails.
+        :param url: str
+        :param dl_status: True (If successful download) / False (If download fails) / None (If retry is scheduled)
+        :return:
+        """
+        try:
+            if dl_status is not None:
+                with self.stats_mutex:
+                    if dl_status:
+                        self.num_downloaded += 1
+                    else:
+                        self.num_failed += 1
+
+            self.metrics.downloads.inc (
+                labels=({ True: "downloaded", False: "failed", None: "retried" }[ dl_status ],) )
+
+            if self.journal and dl_status is not None:
+                self.journal.record ( url, DOWNLOADED if dl_status else FAILED )
+        finally:
+            if isinstance ( self.url_queue, HostScheduler ):
+                self.url_queue.task_done ( url )
+
+            # the name of a retried url is kept for its next attempt
+            if dl_status is not None:
+                self.dl_filenames.pop ( url, None )
+
+            if self.retry_scheduler:
+                self.retry_scheduler.task_finished ( url, is_final=dl_status is not None )
+
+    def download_image ( self, url, reattempt_count=cfg.APP_CFG.get ( MAX_DOWNLOAD_REATTEMPTS ), partial_dl=None ):
+        """
+        This function downloads image resource from web and saves it into IMAGE_SAVE_DIR directory.
+        If the transfer of the image gets interrupted and the server serves byte ranges, the next attempt resumes \
+        the transfer where it stopped instead of starting over.
         :param url: str
         :param reattempt_count: int (Number of times an url will attempted to be fetched in case of failure)
+        :param partial_dl: PartialDownload (Download to be continued by this attempt, e.g; an interrupted one)
         :return: True (If successful download) / False (If download fails)
         """
+        if partial_dl is None and self.is_segmented_download ( url ):
+            # the size of a segmented image is known from the validation of url, so it is checked before any request
+            if not is_size_allowed ( url.content_length, self.min_image_size, self.max_image_size ):
+                self.logger.debug ( "URL %s is not serviceable. Its size of %s bytes is out of the size limits.", url,
+                                    url.content_length )
+                return False
+
+            return self.download_image_segments ( url, reattempt_count )
+
+        self.note_request_start ( )
+
+        # If the image has been downloaded by an earlier run, it is requested conditionally on that version
+        cache_entry = self.http_cache.get_entry ( url ) if self.http_cache and not partial_dl else None
+        request_headers = self.http_cache.get_conditional_headers ( url ) if cache_entry else { }
+
+        if partial_dl and partial_dl.size:
+            request_headers[ "Range" ] = "bytes={}-".format ( partial_dl.size )
+
         # stream=True is set on the request, this avoids reading the content at once into memory for large responses.
         # timeout parameter specifies Requests to stop waiting for a response after a given number of seconds.
         try:
-            response = requests.get (
+            response = self.session_pool.get (
                 url,
+                headers=request_headers,
                 allow_redirects=True,
                 stream=True,
                 timeout=cfg.APP_CFG[ URL_TIMEOUT ],
                 proxies=cfg.APP_CFG[ SYSTEM_PROXY ]
             )
+            self.metrics.http_responses.inc ( labels=(str ( response.status_code ),) )
+            self.note_response ( response.url, response.status_code, response.headers )
 
             # Raises stored HTTPError, if one occurred.
             response.raise_for_status ( )
 
         # Reference: http://docs.python-requests.org/en/master/api/#exceptions
         except requests.exceptions.Timeout as t_err:  # Maybe set up for a retry, or continue in a retry loop
-            self.logger.info (
-                "For URL: {0} - An exception of type {1} occurred. Arguments:\n{2!r}".format ( url,
-                                                                                               type ( t_err ).__name__,
-                                                                                               t_err.args ) )
-
-            if not reattempt_count:
-                self.logger.debug ( "URL {} has not been downloaded.".format ( url ) )
+            self.count_transport_error ( )
+            self.note_error ( t_err )
+            self.logger.info ( "For URL: %s - An exception of type %s occurred. Arguments:\n%r", url,
+                               type ( t_err ).__name__, t_err.args )
+
+            # with RETRY_POLICY, a new download is retried later by retry_scheduler instead of right away
+            if not reattempt_count or (self.retry_scheduler and not partial_dl):
+                self.logger.debug ( "URL %s has not been downloaded.", url )
+                self.note_retry_error ( t_err )
+                self.discard_partial_download ( partial_dl )
                 return False
 
-            return self.download_image ( url, reattempt_count - 1 )
+            return self.download_image ( url, reattempt_count - 1, partial_dl )
 
         except (requests.exceptions.ConnectionError,  # connection-related errors
                 requests.exceptions.HTTPError,  # 401 Unauthorized
@@ -129,86 +481,469 @@ class Downloader:
                 requests.exceptions.TooManyRedirects,  # request exceeds the configured number of max redirections
                 requests.exceptions.RequestException  # Mother of all requests exceptions. it's doomsday :D
                 ) as err:
-            self.logger.info (
-                "For URL: {0} - An exception of type {1} occurred. Arguments:\n{2!r}".format ( url,
-                                                                                               type ( err ).__name__,
-                                                                                               err.args ) )
-
-            self.logger.debug ( "URL {} has not been downloaded.".format ( url ) )
+            if isinstance ( err, requests.exceptions.ConnectionError ):
+                self.count_transport_error ( )
+            self.note_error ( err )
+            self.logger.info ( "For URL: %s - An exception of type %s occurred. Arguments:\n%r", url,
+                               type ( err ).__name__, err.args )
+
+            self.logger.debug ( "URL %s has not been downloaded.", url )
+            self.note_retry_error ( err )
+            self.discard_partial_download ( partial_dl )
             return False
 
-        if response.status_code != 200:
+        # 304 Not Modified: the image downloaded by an earlier run is still up to date
+        if response.status_code == 304 and cache_entry:
+            self.logger.debug ( "URL %s has not been modified since it was saved to %s.", url,
+                                cache_entry[ "path" ] )
+            response.close ( )
+            self.note_saved_image ( cache_entry[ "path" ], cache_entry.get ( "size" ) )
+            return True
+
+        # 206 Partial Content: the server resumes the transfer where the interrupted attempt stopped
+        if response.status_code == 206 and partial_dl and partial_dl.size and \
+                response.headers.get ( 'content-range', '' ).startswith ( "bytes {}-".format ( partial_dl.size ) ):
+            self.logger.debug ( "URL %s is resumed from byte %s.", url, partial_dl.size )
+
+        elif response.status_code != 200:
             self.logger.debug (
-                "For URL: %s - Received status code %s. Reason: %s" % (url, response.status_code, response.reason) )
+                "For URL: %s - Received status code %s. Reason: %s", url, response.status_code, response.reason )
+            response.close ( )
+            self.discard_partial_download ( partial_dl )
+            return False
+
+        elif partial_dl:
+            # the server sent the whole image again, so the transfer starts over
+            partial_dl.restart ( )
+
+        # In "get" URL_VALIDATION, url has not been validated by FileParser. Only the headers have been received \
+        # so far, so closing the response of a non-image resource drops the connection before its body is sent.
+        is_sniffing = cfg.APP_CFG.get ( IMAGE_SNIFFING )
+        if not partial_dl and cfg.APP_CFG.get ( URL_VALIDATION ) == "get" and \
+                not is_image_content_type ( response.headers.get ( 'content-type' ), allow_generic=is_sniffing ):
+            self.logger.debug ( "URL %s is not serviceable.", url )
+            response.close ( )
             return False
 
-        path = cfg.APP_CFG[ IMAGE_SAVE_DIR ] + self.get_dl_filename_from_url ( url )
+        # the size announced by the server is checked before the body is transferred
+        expected_size = self.get_expected_size ( response, partial_dl )
+        if not is_size_allowed ( expected_size, self.min_image_size, self.max_image_size ):
+            self.logger.debug ( "URL %s is not serviceable. Its size of %s bytes is out of the size limits.", url,
+                                expected_size )
+            response.close ( )
+            self.discard_partial_download ( partial_dl )
+            return False
+
+        try:
+            # With IMAGE_SNIFFING, the first bytes of the body tell whether it is an image, and in which format. \
+            # The transfer of a resource which is not an image is aborted right away.
+            head = b""
+            image_ext = None
+            if is_sniffing and not (partial_dl and partial_dl.size):
+                head = read_response_head ( response, SNIFF_SIZE )
+                image_ext = sniff_image_type ( head )
+                if image_ext is None:
+                    self.logger.debug ( "URL %s is not serviceable. Its content is not an image.", url )
+                    response.close ( )
+                    self.discard_partial_download ( partial_dl )
+                    return False
+
+            if not partial_dl:
+                # a modified image replaces its earlier version, unless contents are de-duplicated (as the earlier \
+                # version might be shared by other urls)
+                if cache_entry and not self.content_store:
+                    path = cache_entry[ "path" ]
+                else:
+                    path = cfg.APP_CFG[ IMAGE_SAVE_DIR ] + self.reserve_dl_filename ( url, image_ext )
+
+                # the image is streamed into a temporary file, which replaces path only once it is complete, so \
+                # a failed download never leaves a truncated image behind. With DEDUP_MODE, the image is hashed \
+                # while it is streamed, and is committed into place by content_store only if the same content has \
+                # not been saved already.
+                partial_dl = PartialDownload ( path, path + ".part",
+                                               hashlib.sha256 ( ) if self.content_store else None,
+                                               is_name_reserved=not (cache_entry and not self.content_store) )
+
+            # a transfer exceeding MAX_IMAGE_SIZE (e.g; whose size is not announced) is aborted by file_sink
+            with FileSink ( partial_dl, expected_size,
+                            buffer_size=cfg.APP_CFG.get ( WRITE_BUFFER_SIZE ) or 256 * 1024,
+                            fsync=cfg.APP_CFG.get ( FSYNC_BATCH_SIZE ) == 1,
+                            max_size=self.max_image_size ) as file_sink:
+                if head:
+                    file_sink.write ( head )
+
+                # When stream=True is set on the request, this avoids reading the content at once into memory \
+                # for large responses
+                file_sink.write_response ( response )
+
+        except ImageSizeError as err:
+            self.note_error ( err )
+            self.logger.debug ( "URL %s is not serviceable. %s", url, err )
+            response.close ( )
+            self.discard_partial_download ( partial_dl )
+            return False
+
+        # transfer got interrupted (e.g; read timeout or connection reset)
+        except requests.exceptions.RequestException as err:
+            self.count_transport_error ( )
+            self.note_error ( err )
+            self.logger.info ( "For URL: %s - An exception of type %s occurred. Arguments:\n%r", url,
+                               type ( err ).__name__, err.args )
+
+            if not reattempt_count:
+                self.logger.debug ( "URL %s has not been downloaded.", url )
+                self.note_retry_error ( err )
+                self.discard_partial_download ( partial_dl )
+                return False
+
+            # without byte ranges support (or with a transfer decoded by requests), the next attempt starts over
+            if partial_dl and not self.is_resumable ( url, response ):
+                partial_dl.restart ( )
 
-        # It is strongly recommended that we open files in binary mode as per requests documentation
-        # Reference: http://docs.python-requests.org/en/master/user/quickstart/
-        with open ( path, 'wb' ) as fp:
-            # Iterates over the response data. When stream=True is set on the request, this avoids \
-            # reading the content at once into memory for large responses. The chunk size is the \
-            # number of bytes it should read into memory.
-            # iter_content automatically decodes the gzip and deflate transfer-encodings.
-            chunk_size = 1024
-            for data_block in response.iter_content ( chunk_size ):
-                fp.write ( data_block )
+            return self.download_image ( url, reattempt_count - 1, partial_dl )
+
+        if partial_dl.size < self.min_image_size:
+            self.logger.debug ( "URL %s is not serviceable. Its size of %s bytes is below %s bytes.", url,
+                                partial_dl.size, self.min_image_size )
+            self.discard_partial_download ( partial_dl )
+            return False
+
+        return self.complete_download ( url, response.headers, partial_dl )
+
+    def complete_download ( self, url, response_headers, partial_dl ):
+        """
+        Completes the download of an image whose content has been entirely written
+        :param url: str
+        :param response_headers: headers of the (last) response of the image (case-insensitive dict)
+        :param partial_dl: PartialDownload of the image
+        :return: True
+        """
+        self.dl_stats.num_bytes = partial_dl.size
+        self.metrics.bytes_downloaded.inc ( partial_dl.size )
+
+        # the temporary file is copied into the current archive shard, under the name reserved for the image
+        if self.archive_sink:
+            name = os.path.relpath ( partial_dl.path, cfg.APP_CFG[ IMAGE_SAVE_DIR ] )
+            shard_name = self.archive_sink.add ( url, name, partial_dl.write_path,
+                                                 response_headers.get ( 'content-type' ) )
+            os.remove ( partial_dl.write_path )
+            self.note_saved_image ( os.path.join ( cfg.APP_CFG[ IMAGE_SAVE_DIR ], shard_name, name ), partial_dl.size )
+            return True
+
+        saved_path = partial_dl.path
+        is_new_file = True
+        if self.content_store:
+            digest = partial_dl.hasher.hexdigest ( )
+            if not self.content_store.commit ( url, partial_dl.write_path, partial_dl.path, digest ):
+                # a duplicate content is either hardlinked to path, or only recorded by content_store. In the \
+                # latter case, the image is found at the path of the saved content, and its own name is released.
+                is_new_file = False
+                if not os.path.isfile ( partial_dl.path ):
+                    saved_path = self.content_store.get_saved_path ( digest )
+                    if partial_dl.is_name_reserved:
+                        self.release_dl_filename ( partial_dl.path )
+        else:
+            os.replace ( partial_dl.write_path, partial_dl.path )
+
+        # the saved content of a duplicate has been flushed already
+        if self.fsync_batcher and is_new_file:
+            self.fsync_batcher.add ( saved_path )
+
+        self.note_saved_image ( saved_path, partial_dl.size )
+
+        if self.http_cache:
+            self.http_cache.store ( url, response_headers.get ( 'etag' ), response_headers.get ( 'last-modified' ),
+                                    partial_dl.size, saved_path )
 
         return True
 
-    def create_custom_dl_file_name ( self ):
+    @staticmethod
+    def get_expected_size ( response, partial_dl ):
         """
-        Create a customized name for a downloading image file. It is a thread safe function.
-        :return: str
+        Finds the size the image will have, once the body of a response has been written
+        :param response: requests.Response
+        :param partial_dl: PartialDownload of the image
+        :return: int / None (If unknown, e.g; compressed transfer)
+        """
+        if response.headers.get ( 'content-encoding', 'identity' ).lower ( ) != 'identity':
+            return None
+
+        try:
+            content_length = int ( response.headers.get ( 'content-length' ) )
+        except (TypeError, ValueError):
+            return None
+
+        return partial_dl.size + content_length if response.status_code == 206 else content_length
+
+    @staticmethod
+    def is_resumable ( url, response ):
+        """
+        Verifies whether or not, an interrupted transfer can be resumed with a byte range request
+        :param url: str / UrlItem
+        :param response: requests.Response whose transfer got interrupted
+        :return: boolean
+        """
+        # byte ranges apply to the encoded content, while requests writes the decoded (e.g; gunzipped) content
+        if response.headers.get ( 'content-encoding', 'identity' ).lower ( ) != 'identity':
+            return False
+
+        if getattr ( url, "accept_ranges", False ):
+            return True
+
+        return (response.headers.get ( 'accept-ranges' ) or '').strip ( ).lower ( ) == 'bytes'
+
+    def discard_partial_download ( self, partial_dl, release_name=True ):
+        """
+        Removes the file of an image download which cannot be completed, so no truncated image is left behind, \
+        and releases the name reserved for the image
+        :param partial_dl: PartialDownload / None
+        :param release_name: False (If the name is kept for another download of the image) / True
+        :return:
         """
-        self.mutex.acquire ( )
+        if partial_dl is None:
+            return
 
-        curr_file_id = self.custom_file_id
-        self.custom_file_id += 1
+        try:
+            os.remove ( partial_dl.write_path )
+        except OSError:
+            pass
+
+        if release_name and partial_dl.is_name_reserved:
+            self.release_dl_filename ( partial_dl.path )
+            partial_dl.is_name_reserved = False
 
-        self.mutex.release ( )
+    @staticmethod
+    def is_segmented_download ( url ):
+        """
+        Verifies whether or not, an url is downloaded in SEGMENT_COUNT byte ranges at once. It requires the size \
+        of the image and the support of byte ranges to be known from the validation of the url.
+        :param url: str / UrlItem
+        :return: boolean
+        """
+        segment_count = cfg.APP_CFG.get ( SEGMENT_COUNT ) or 1
+        content_length = getattr ( url, "content_length", None )
 
-        custom_dl_file_name = "application_image_" + str ( curr_file_id ) + "." + self.default_image_ext
-        return custom_dl_file_name
+        return segment_count > 1 and getattr ( url, "accept_ranges", False ) and bool ( content_length ) and \
+               content_length >= (cfg.APP_CFG.get ( SEGMENTED_DOWNLOAD_MIN_SIZE ) or 0)
 
-    def check_create_dup_dl_file_name ( self, dl_file_name ):
+    def download_image_segments ( self, url, reattempt_count ):
+        """
+        Downloads a large image in SEGMENT_COUNT byte ranges at once. Each range is fetched by its own thread and \
+        written at its offset into a file preallocated to the size of the image. If the server does not serve \
+        the byte ranges as expected, the image is downloaded in a single transfer instead.
+        :param url: UrlItem
+        :param reattempt_count: int (Number of times a byte range will attempted to be fetched in case of failure)
+        :return: True (If successful download) / False (If download fails)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        content_length = url.content_length
+        segment_count = min ( cfg.APP_CFG[ SEGMENT_COUNT ], content_length )
+
+        # the segments are requested from other threads, so they are measured into the RequestTiming of this one
+        timing = self.get_request_timing ( )
+        segment_size = -(-content_length // segment_count)  # ceiling division
+
+        path = cfg.APP_CFG[ IMAGE_SAVE_DIR ] + self.reserve_dl_filename ( url )
+        partial_dl = PartialDownload ( path, path + ".part", None, is_name_reserved=True )
+
+        fd = os.open ( partial_dl.write_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644 )
+        try:
+            # preallocating the whole file avoids fragmentation and lets the segments be written in any order
+            if hasattr ( os, "posix_fallocate" ) and content_length:
+                os.posix_fallocate ( fd, 0, content_length )
+            else:
+                os.ftruncate ( fd, content_length )
+
+            with ThreadPoolExecutor ( max_workers=segment_count ) as executor:
+                segment_results = list ( executor.map (
+                    lambda start: self.download_segment ( url, fd, start,
+                                                          min ( start + segment_size, content_length ) - 1,
+                                                          reattempt_count, timing ),
+                    range ( 0, content_length, segment_size ) ) )
+        finally:
+            os.close ( fd )
+
+        if not all ( segment_results ):
+            # if at least one byte range has not been served as requested, the image is downloaded at once \
+            # under the name reserved for it
+            self.discard_partial_download ( partial_dl, release_name=None in segment_results )
+            if None in segment_results:
+                return False
+
+            self.logger.debug ( "URL %s does not serve byte ranges. Downloading it at once.", url )
+            return self.download_image ( str ( url ), reattempt_count,
+                                         PartialDownload ( path, partial_dl.write_path,
+                                                           hashlib.sha256 ( ) if self.content_store else None,
+                                                           is_name_reserved=True ) )
+
+        # the segments have been requested in parallel, so the content is sniffed once it has been written
+        if cfg.APP_CFG.get ( IMAGE_SNIFFING ):
+            with open ( partial_dl.write_path, 'rb' ) as fp:
+                if sniff_image_type ( fp.read ( SNIFF_SIZE ) ) is None:
+                    self.logger.debug ( "URL %s is not serviceable. Its content is not an image.", url )
+                    self.discard_partial_download ( partial_dl )
+                    return False
+
+        partial_dl.size = content_length
+        if self.content_store:
+            partial_dl.hasher = hashlib.sha256 ( )
+            with open ( partial_dl.write_path, 'rb' ) as fp:
+                for data_block in iter ( lambda: fp.read ( 1024 * 1024 ), b"" ):
+                    partial_dl.hasher.update ( data_block )
+
+        return self.complete_download ( url, { }, partial_dl )
+
+    def download_segment ( self, url, fd, first_byte, last_byte, reattempt_count, timing=None ):
+        """
+        Downloads the byte range [first_byte, last_byte] of an image and writes it at its offset into a file.
+        An interrupted transfer is resumed from the last written byte.
+        :param url: str
+        :param fd: file descriptor of the preallocated file
+        :param first_byte: int
+        :param last_byte: int
+        :param reattempt_count: int (Number of times the range will attempted to be fetched in case of failure)
+        :param timing: RequestTiming of the segmented download / None
+        :return: True (If successful download) / False (If server does not serve the range) / None (If download fails)
+        """
+        offset = first_byte
+
+        # the first request of a range is made in parallel with the ones of the other ranges, while the following \
+        # ones are retries
+        is_first_request = True
+
+        while True:
+            request_start = timing.start_request ( is_parallel=is_first_request ) if timing else None
+            is_first_request = False
+            try:
+                response = self.session_pool.get (
+                    url,
+                    headers={ "Range": "bytes={0}-{1}".format ( offset, last_byte ),
+                              "Accept-Encoding": "identity" },
+                    allow_redirects=True,
+                    stream=True,
+                    timeout=cfg.APP_CFG[ URL_TIMEOUT ],
+                    proxies=cfg.APP_CFG[ SYSTEM_PROXY ]
+                )
+
+                if timing is not None:
+                    timing.note_headers ( request_start )
+
+                with response:
+                    if response.status_code != 206 or \
+                            not response.headers.get ( 'content-range', '' ).startswith ( "bytes {}-".format ( offset ) ):
+                        return False
+
+                    # a server might send more than the requested range (e.g; up to the end of the image), which \
+                    # must not overwrite the following segments
+                    for data_block in response.iter_content ( 64 * 1024 ):
+                        data_block = data_block[ :last_byte + 1 - offset ]
+                        os.pwrite ( fd, data_block, offset )
+                        offset += len ( data_block )
+                        if offset > last_byte:
+                            break
+
+                if offset > last_byte:
+                    return True
+
+                raise requests.exceptions.ChunkedEncodingError ( "Byte range ended before its last byte." )
+
+            except requests.exceptions.RequestException as err:
+                self.logger.info ( "For URL: %s - An exception of type %s occurred. Arguments:\n%r", url,
+                                   type ( err ).__name__, err.args )
+                if not reattempt_count:
+                    self.logger.debug ( "URL %s has not been downloaded.", url )
+                    return None
+
+                reattempt_count -= 1
+
+    def create_custom_dl_file_name ( self, shard_dir="", image_ext=None ):
+        """
+        Create a customized name for a downloading image file. It is a thread safe function.
+        :param shard_dir: shard directory of the image, relative to IMAGE_SAVE_DIR (str)
+        :param image_ext: extension of the sniffed image format (str) / None (default extension)
+        :return: str
+        """
+        return self.filename_allocator.reserve ( None, image_ext or self.default_image_ext, shard_dir )
+
+    def check_create_dup_dl_file_name ( self, dl_file_name, shard_dir="", image_ext=None ):
         """
         Checks whether the download file already exist or not in IMAGE_SAVE_DIR directory. If it does not exist, then return \
         the same dl_file_name. If it already exist, then returns a customized dl_file_name for this image.
+        The returned name is reserved, so it is never returned again. It is a thread safe function.
 
         :param dl_file_name: Name of the downloading image file (str)
+        :param shard_dir: shard directory of the image, relative to IMAGE_SAVE_DIR (str)
+        :param image_ext: extension of the sniffed image format (str) / None (default extension)
         :return: unique file_name of the downloading image into IMAGE_SAVE_DIR directory (str)
         """
-        file_path = cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/" + dl_file_name
-        if not os.path.isfile ( file_path ): return dl_file_name
+        return self.filename_allocator.reserve ( dl_file_name, image_ext or self.default_image_ext, shard_dir )
 
-        return self.create_custom_dl_file_name ( )
+    def reserve_dl_filename ( self, url, image_ext=None ):
+        """
+        Reserves the download filename of an url. A retried url (or a reattempt of it) asks for the name reserved \
+        by its earlier attempt again, so it keeps its name unless another url has taken it meanwhile.
+        :param url: string
+        :param image_ext: extension of the sniffed image format (str, e.g; "png") / None (If not sniffed)
+        :return: dl_file_name: string (see get_dl_filename_from_url)
+        """
+        prev_dl_file_name = self.dl_filenames.get ( url )
+        if prev_dl_file_name:
+            shard_dir, _, name = prev_dl_file_name[ 1: ].rpartition ( "/" )
+            shard_prefix = "/" + shard_dir if shard_dir else ""
+            dl_file_name = shard_prefix + "/" + self.check_create_dup_dl_file_name ( name, shard_dir, image_ext )
+        else:
+            dl_file_name = self.get_dl_filename_from_url ( url, image_ext )
+
+        self.dl_filenames[ url ] = dl_file_name
+        return dl_file_name
+
+    def release_dl_filename ( self, path ):
+        """
+        Releases the reserved name of an image which has not been saved. It is a thread safe function.
+        :param path: path of the image (str)
+        :return:
+        """
+        shard_dir, name = os.path.split ( os.path.relpath ( path, cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) )
+        self.filename_allocator.release ( name, shard_dir )
 
-    def get_dl_filename_from_url ( self, url ):
+    def get_dl_filename_from_url ( self, url, image_ext=None ):
         """
         Finds download filename from url. If it is not possible to get a file name from url then it assigns one.
+        The extension of the file name is the one of the sniffed image format, unless the url already ends with \
+        an extension of that format.
         :param url: string
-        :return: dl_file_name: string (e.g; "/application_image_1.jfif" or "/tiger_image.jfif")
+        :param image_ext: extension of the sniffed image format (str, e.g; "png") / None (If not sniffed)
+        :return: dl_file_name: string (e.g; "/application_image_1.jfif" or "/tiger_image.jfif", or \
+                 "/3f/a2/tiger_image.jfif" with a sharded OUTPUT_LAYOUT)
         """
+        # shard directory of the image, created on its first use ("" with flat layout)
+        shard_dir = self.output_layout.make_shard_dir ( url )
+        shard_prefix = "/" + shard_dir if shard_dir else ""
+
         # striping rightmost '/' char in url if it exists
         url = url.rstrip ( '/' )
         dl_file_name = url.split ( "/" )[ -1 ]
 
         if not dl_file_name:
-            dl_file_name = self.create_custom_dl_file_name ( )
+            return shard_prefix + "/" + self.create_custom_dl_file_name ( shard_dir, image_ext )
 
         # web image might lack extension. so verifying and if it lacks ext then assigning one
         file_name_ext = dl_file_name.rsplit ( '.', 1 )
         file_extension = file_name_ext[ -1 ]
 
+        if image_ext:
+            # the sniffed format prevails over the extension in the url
+            if not is_image_extension ( file_extension, image_ext ):
+                file_extension = image_ext
+
         # Available image file formats: http://preservationtutorial.library.cornell.edu/presentation/table7-1.html
-        if file_extension not in (
+        elif file_extension not in (
                 "tif", "tiff", "gif", "jpeg", "jpg", "jif", "jfif", "jp2", "jpx", "j2k", "j2c", "fpx", "pcd", "png"):
             # assigning default image extension
             file_extension = self.default_image_ext
 
         dl_file_name = file_name_ext[ 0 ] + "." + file_extension
 
-        dl_file_name = self.check_create_dup_dl_file_name ( dl_file_name )
-        return "/" + dl_file_name
+        dl_file_name = self.check_create_dup_dl_file_name ( dl_file_name, shard_dir, image_ext )
+        return shard_prefix + "/" + dl_file_name
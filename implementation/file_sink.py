@@ -0,0 +1,334 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+
+import requests
+import urllib3
+
+
+class ImageSizeError ( Exception ):
+    """
+    Description: ImageSizeError is raised by FileSink when the content written for an image exceeds its maximum size.
+
+    Version: 1.0
+    Comment:
+    """
+
+
+def is_size_allowed ( size, min_size=0, max_size=None ):
+    """
+    Verifies whether or not, the size of an image is within the size limits
+    :param size: size of the image in bytes (int) / None (If unknown, which is allowed)
+    :param min_size: int
+    :param max_size: int / None (no maximum size)
+    :return: boolean
+    """
+    if size is None:
+        return True
+
+    return size >= (min_size or 0) and (max_size is None or size <= max_size)
+
+
+class PartialDownload:
+    """
+    Description: PartialDownload class holds the state of an image download, so that an interrupted transfer \
+                 can be resumed by the next attempt instead of starting over.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, path, write_path, hasher, is_name_reserved=False ):
+        # final path of the image
+        self.path = path
+
+        # whether or not the name of path has been reserved for this download, and is released if it fails \
+        # (see FilenameAllocator)
+        self.is_name_reserved = is_name_reserved
+
+        # path of the temporary file being written, which replaces path once the download is complete
+        self.write_path = write_path
+
+        # incremental hash of the written content (hashlib object) / None
+        self.hasher = hasher
+
+        # number of bytes written so far
+        self.size = 0
+
+    def restart ( self ):
+        """
+        Starts the download over from the first byte
+        :return:
+        """
+        self.size = 0
+        if self.hasher:
+            self.hasher = hashlib.sha256 ( )
+
+
+class FileSink:
+    """
+    Description: FileSink class writes the content of an image download into its temporary file, from the byte \
+                 where the download stands (PartialDownload.size). The file is preallocated to the expected size \
+                 of the image, when it is known, which avoids fragmentation and fails early on a full disk. \
+                 A response body is read in chunks of up to "buffer_size" bytes into a buffer which is allocated \
+                 once per thread and reused by all its downloads, and written without further copy (unbuffered I/O).
+                 FileSink is a context manager. On exit, the file is truncated to the written size (dropping the \
+                 unused preallocated bytes) and, with "fsync", flushed to the disk. With "max_size", a transfer \
+                 which exceeds it (e.g; an endless chunked response) is aborted by an ImageSizeError.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # read buffers, one per thread
+    thread_buffers = threading.local ( )
+
+    def __init__ ( self, partial_dl, expected_size=None, buffer_size=256 * 1024, fsync=False, max_size=None ):
+        self.partial_dl = partial_dl
+        self.buffer_size = buffer_size
+        self.fsync = fsync
+        self.max_size = max_size
+
+        self.fp = open ( partial_dl.write_path, 'r+b' if partial_dl.size else 'wb', buffering=0 )
+        self.fp.seek ( partial_dl.size )
+
+        if expected_size and expected_size > partial_dl.size and hasattr ( os, "posix_fallocate" ):
+            try:
+                os.posix_fallocate ( self.fp.fileno ( ), 0, expected_size )
+            except OSError:  # e.g; file system does not support it. Preallocation is only an optimization.
+                pass
+
+    def __enter__ ( self ):
+        return self
+
+    def __exit__ ( self, exc_type, exc_value, traceback ):
+        try:
+            self.fp.truncate ( self.partial_dl.size )
+            if self.fsync and exc_type is None:
+                os.fsync ( self.fp.fileno ( ) )
+        finally:
+            self.fp.close ( )
+
+    @classmethod
+    def get_thread_buffer ( cls, buffer_size ):
+        """
+        Returns the read buffer of the calling thread, allocating it on the first use
+        :param buffer_size: int
+        :return: bytearray of at least buffer_size bytes
+        """
+        buffer = getattr ( cls.thread_buffers, "buffer", None )
+        if buffer is None or len ( buffer ) < buffer_size:
+            buffer = bytearray ( buffer_size )
+            cls.thread_buffers.buffer = buffer
+
+        return buffer
+
+    def write ( self, data_block ):
+        """
+        Writes a chunk of content at the end of the file
+        :param data_block: bytes-like object
+        :return:
+        :raise ImageSizeError: If the content exceeds self.max_size (The chunk is not written)
+        """
+        if self.max_size is not None and self.partial_dl.size + len ( data_block ) > self.max_size:
+            raise ImageSizeError ( "Image exceeds {} bytes.".format ( self.max_size ) )
+
+        self.fp.write ( data_block )
+        self.partial_dl.size += len ( data_block )
+        if self.partial_dl.hasher:
+            self.partial_dl.hasher.update ( data_block )
+
+    def write_response ( self, response ):
+        """
+        Writes the body of a streamed response. Errors of the transfer are raised as requests exceptions, \
+        like requests.Response.iter_content does.
+        :param response: requests.Response (requested with stream=True)
+        :return:
+        """
+        # a compressed body (e.g; gzip) is decoded by requests, which yields it in chunks of its own
+        if response.headers.get ( 'content-encoding', 'identity' ).lower ( ) != 'identity':
+            for data_block in response.iter_content ( self.buffer_size ):
+                self.write ( data_block )
+            return
+
+        buffer = self.get_thread_buffer ( self.buffer_size )
+        buffer_view = memoryview ( buffer )[ :self.buffer_size ]
+
+        try:
+            while True:
+                num_bytes = response.raw.readinto ( buffer_view )
+                if not num_bytes:
+                    break
+                self.write ( buffer_view[ :num_bytes ] )
+
+        except urllib3.exceptions.ProtocolError as err:  # e.g; connection reset, body shorter than Content-Length
+            raise requests.exceptions.ChunkedEncodingError ( err )
+        except urllib3.exceptions.ReadTimeoutError as err:
+            raise requests.exceptions.ConnectionError ( err )
+        except urllib3.exceptions.SSLError as err:
+            raise requests.exceptions.SSLError ( err )
+
+
+def read_response_head ( response, size ):
+    """
+    Reads the first bytes of the body of a streamed response. The rest of the body can be read afterwards \
+    (e.g; by FileSink.write_response). Errors of the transfer are raised as requests exceptions.
+    :param response: requests.Response (requested with stream=True)
+    :param size: number of bytes (int)
+    :return: bytes (fewer than size, if the body is shorter)
+    """
+    # a compressed body is decoded, like requests.Response.iter_content does
+    decode_content = response.headers.get ( 'content-encoding', 'identity' ).lower ( ) != 'identity'
+
+    try:
+        return response.raw.read ( size, decode_content=decode_content )
+
+    except urllib3.exceptions.ProtocolError as err:
+        raise requests.exceptions.ChunkedEncodingError ( err )
+    except urllib3.exceptions.DecodeError as err:
+        raise requests.exceptions.ContentDecodingError ( err )
+    except urllib3.exceptions.ReadTimeoutError as err:
+        raise requests.exceptions.ConnectionError ( err )
+    except urllib3.exceptions.SSLError as err:
+        raise requests.exceptions.SSLError ( err )
+
+
+class FsyncBatcher:
+    """
+    Description: FsyncBatcher class flushes the saved images to the disk in batches of "batch_size" files, so that \
+                 the cost of a disk flush (and of the flush of their directory) is shared by the batch. Images of \
+                 the batch in progress might be lost by a power failure.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, batch_size ):
+        self.batch_size = batch_size
+
+        # paths of the saved images which have not been flushed yet
+        self.paths = [ ]
+
+        self.mutex = threading.Lock ( )
+
+    def add ( self, path ):
+        """
+        Adds a saved image into the batch in progress and flushes the batch once it is full. It is a thread safe \
+        function.
+        :param path: str
+        :return:
+        """
+        with self.mutex:
+            self.paths.append ( path )
+            if len ( self.paths ) < self.batch_size:
+                return
+            paths, self.paths = self.paths, [ ]
+
+        self.flush_paths ( paths )
+
+    def flush ( self ):
+        """
+        Flushes the batch in progress
+        :return:
+        """
+        with self.mutex:
+            paths, self.paths = self.paths, [ ]
+
+        self.flush_paths ( paths )
+
+    @staticmethod
+    def flush_paths ( paths ):
+        """
+        Flushes files and their directories to the disk
+        :param paths: list of file paths
+        :return:
+        """
+        for path in paths + sorted ( { os.path.dirname ( path ) or "." for path in paths } ):
+            try:
+                fd = os.open ( path, os.O_RDONLY )
+            except OSError:  # e.g; removed meanwhile
+                continue
+            try:
+                os.fsync ( fd )
+            finally:
+                os.close ( fd )
+
+
+class DiskSpaceWatermark:
+    """
+    Description: DiskSpaceWatermark class pauses the downloads while the free space of the disk holding "directory" \
+                 is below "min_free_space" bytes, so that the application never fills the disk up. The free space is \
+                 checked at most every CHECK_INTERVAL seconds, and every POLL_INTERVAL seconds while the downloads \
+                 are paused. Once the downloads have been paused for "max_wait" seconds, it gives up waiting and \
+                 the urls are failed right away, until space has been freed. It is shared by all the downloader \
+                 threads.
+
+    Version: 1.0
+    Comment: Downloads in progress are not paused. Their size is bounded by MAX_IMAGE_SIZE.
+    """
+
+    CHECK_INTERVAL = 1.0
+    POLL_INTERVAL = 5.0
+
+    def __init__ ( self, directory, min_free_space, max_wait=None ):
+        self.logger = logging.getLogger ( __name__ )
+
+        self.directory = directory
+        self.min_free_space = min_free_space
+        self.max_wait = max_wait
+
+        self.is_paused = False
+        self.paused_at = None
+        self.is_given_up = False
+        self.checked_at = None
+        self.mutex = threading.Lock ( )
+
+    def get_free_space ( self ):
+        """
+        :return: number of bytes available on the disk of self.directory (int)
+        """
+        return shutil.disk_usage ( self.directory ).free
+
+    def wait_for_space ( self ):
+        """
+        Returns once the free space of the disk is above the watermark, waiting for it if needed. It is a thread safe \
+        function.
+        :return: True (If there is enough free space) / False (If the downloads have been paused for max_wait seconds)
+        """
+        while True:
+            with self.mutex:
+                now = time.monotonic ( )
+                check_interval = self.POLL_INTERVAL if self.is_paused else self.CHECK_INTERVAL
+                if self.checked_at is None or now - self.checked_at >= check_interval:
+                    self.checked_at = now
+                    free_space = self.get_free_space ( )
+                    is_paused = free_space < self.min_free_space
+
+                    if is_paused and not self.is_paused:
+                        self.paused_at = now
+                        self.logger.warning ( "Only %s bytes are free on the disk of %s. Downloads are paused until "
+                                              "%s bytes are free.", free_space, self.directory, self.min_free_space )
+                    elif self.is_paused and not is_paused:
+                        self.is_given_up = False
+                        self.logger.info ( "%s bytes are free on the disk of %s. Downloads are resumed.", free_space,
+                                           self.directory )
+                    self.is_paused = is_paused
+
+                if not self.is_paused:
+                    return True
+
+                wait_time = self.POLL_INTERVAL
+                if self.max_wait is not None:
+                    wait_time = min ( wait_time, self.paused_at + self.max_wait - now )
+                    if wait_time <= 0:
+                        if not self.is_given_up:
+                            self.is_given_up = True
+                            self.logger.error ( "Downloads have been paused for %s seconds. URLs are failed until "
+                                                "%s bytes are free on the disk of %s.", self.max_wait,
+                                                self.min_free_space, self.directory )
+                        return False
+
+            time.sleep ( wait_time )
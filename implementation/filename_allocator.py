@@ -0,0 +1,128 @@
+import os
+import re
+import threading
+import time
+
+
+class FilenameAllocator:
+    """
+    Description: FilenameAllocator class hands out unique file names within a directory to concurrent downloads. \
+                 The names present in the directory are indexed once, on the first allocation, with a single \
+                 streaming pass over the directory (no stat per entry). Afterwards, a name is checked and reserved \
+                 atomically in memory in O(1), so two threads never get the same name and no file system call is \
+                 made per download, however many files the directory holds. A reserved name stays reserved until \
+                 it is released (e.g; its download has failed).
+                 Custom names ("application_image_N.ext") are numbered on from the highest N found in the directory, \
+                 so they never collide with the ones of earlier runs.
+                 Sub-directories (e.g; shard directories of OutputLayout) are indexed separately, on their first use.
+                 Temporary files left by the interrupted downloads of an earlier run are removed while indexing, so \
+                 they do not block the names of their images.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # prefix of the names assigned to the images whose url does not provide a usable name
+    CUSTOM_NAME_PREFIX = "application_image_"
+
+    # suffix of the temporary files of the downloads in progress (see file_sink.PartialDownload)
+    TEMP_SUFFIX = ".part"
+
+    def __init__ ( self, save_dir ):
+        # directory in which the names are allocated
+        self.save_dir = save_dir
+
+        # maps a sub-directory of save_dir ("" for save_dir itself) to the set of the names present in it or \
+        # reserved by this allocator. A sub-directory is missing until it is indexed.
+        self.taken_names = { }
+
+        # maps a sub-directory of save_dir to the number of its next custom name
+        self.next_custom_ids = { }
+
+        self.custom_name_pattern = re.compile ( re.escape ( self.CUSTOM_NAME_PREFIX ) + r"(\d+)\." )
+
+        # temporary files modified before this time have been left by an earlier run (a second is taken off, as \
+        # file systems stamp the files with a coarser clock)
+        self.start_time = time.time ( ) - 1
+
+        self.mutex = threading.Lock ( )
+
+    def load_index ( self, sub_dir ):
+        """
+        Indexes the names present in a sub-directory of save_dir. Caller must hold self.mutex.
+        :param sub_dir: relative directory path (str, "" for save_dir itself)
+        :return: set of the names
+        """
+        taken_names = set ( )
+        max_custom_id = -1
+
+        try:
+            with os.scandir ( os.path.join ( self.save_dir, sub_dir ) ) as dir_entries:
+                for dir_entry in dir_entries:
+                    name = dir_entry.name
+                    # the temporary file of a download in progress belongs to a name which has been reserved, \
+                    # while the one of an interrupted run is an orphan (the download of its url starts over)
+                    if name.endswith ( self.TEMP_SUFFIX ):
+                        self.remove_stale_temp_file ( dir_entry )
+                        continue
+                    taken_names.add ( name )
+
+                    custom_name_match = self.custom_name_pattern.match ( name )
+                    if custom_name_match:
+                        max_custom_id = max ( max_custom_id, int ( custom_name_match.group ( 1 ) ) )
+        except FileNotFoundError:
+            pass
+
+        self.taken_names[ sub_dir ] = taken_names
+        self.next_custom_ids[ sub_dir ] = max_custom_id + 1
+
+        return taken_names
+
+    def remove_stale_temp_file ( self, dir_entry ):
+        """
+        Removes a temporary file, if it has been left by the interrupted download of an earlier run
+        :param dir_entry: os.DirEntry of the temporary file
+        :return:
+        """
+        try:
+            if dir_entry.stat ( ).st_mtime < self.start_time:
+                os.remove ( dir_entry.path )
+        except OSError:
+            pass
+
+    def reserve ( self, name, default_ext, sub_dir="" ):
+        """
+        Reserves a name, or a custom name if it is already taken. It is a thread safe function.
+        :param name: wanted file name (str) / None (If url does not provide a name)
+        :param default_ext: extension of a custom name (str, e.g; "jfif")
+        :param sub_dir: sub-directory of save_dir in which the name is reserved (str, "" for save_dir itself)
+        :return: reserved file name (str)
+        """
+        with self.mutex:
+            taken_names = self.taken_names.get ( sub_dir )
+            if taken_names is None:
+                taken_names = self.load_index ( sub_dir )
+
+            if name and name not in taken_names:
+                taken_names.add ( name )
+                return name
+
+            while True:
+                custom_name = self.CUSTOM_NAME_PREFIX + str ( self.next_custom_ids[ sub_dir ] ) + "." + default_ext
+                self.next_custom_ids[ sub_dir ] += 1
+                if custom_name not in taken_names:
+                    taken_names.add ( custom_name )
+                    return custom_name
+
+    def release ( self, name, sub_dir="" ):
+        """
+        Releases a reserved name whose file has not been saved, so it can be reserved again (e.g; by a retry of \
+        its url). It is a thread safe function.
+        :param name: reserved file name (str)
+        :param sub_dir: sub-directory of save_dir in which the name is reserved (str, "" for save_dir itself)
+        :return:
+        """
+        with self.mutex:
+            taken_names = self.taken_names.get ( sub_dir )
+            if taken_names is not None:
+                taken_names.discard ( name )
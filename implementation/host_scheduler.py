@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+from collections import OrderedDict, deque, defaultdict
+from urllib.parse import urlsplit
+
+
+class HostScheduler:
+    """
+    Description: HostScheduler class is a drop-in replacement of the FIFO "url_queue" between FileParser and \
+                 Downloader. It keeps one sub-queue per host and dispatches urls round-robin across the hosts \
+                 which are ready, i.e; which have less than "max_in_flight_per_host" downloads in flight and whose \
+                 last download started at least "min_interval" seconds ago. A long run of urls of one host \
+                 therefore does not make all the downloader threads hit that host at once, while urls of the other \
+                 hosts wait. A consumer must call task_done with every url it has got, once it is done with it.
+
+                 "EXIT" keeps its meaning: it is handed out only once every queued url has been dispatched.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, maxsize=1000, max_in_flight_per_host=2, min_interval=0.0 ):
+        # maximum number of urls waiting in the scheduler. Beyond it, put blocks.
+        self.maxsize = maxsize
+
+        # maximum number of urls of a host being downloaded at the same time
+        self.max_in_flight_per_host = max_in_flight_per_host
+
+        # minimum number of seconds between the starts of two downloads from the same host
+        self.min_interval = min_interval
+
+        # maps a host to the deque of its waiting urls, in round-robin order
+        self.host_queues = OrderedDict ( )
+
+        # maps a host to its number of urls being downloaded
+        self.in_flight = defaultdict ( int )
+
+        # maps a host to the time (time.monotonic) its last download started
+        self.last_dispatch = { }
+
+        # number of urls waiting in the scheduler
+        self.num_waiting = 0
+
+        # whether or not "EXIT" has been put
+        self.exit_queued = False
+
+        self.mutex = threading.Lock ( )
+        self.not_empty = threading.Condition ( self.mutex )
+        self.not_full = threading.Condition ( self.mutex )
+
+    @staticmethod
+    def get_host ( url ):
+        """
+        Finds the host of an url
+        :param url: string
+        :return: host name in lowercase (str). Empty for an url without host.
+        """
+        try:
+            return (urlsplit ( url ).hostname or "").lower ( )
+        except ValueError:
+            return ""
+
+    def put ( self, item, block=True, timeout=None ):
+        """
+        Puts an url (or "EXIT") into the sub-queue of its host
+        :param item: url (str) / "EXIT"
+        :param block: if True, waits for a free slot, otherwise raises queue.Full when the scheduler is full
+        :param timeout: maximum number of seconds to wait for a free slot (float) / None
+        :return:
+        """
+        with self.not_full:
+            if item == "EXIT":
+                self.exit_queued = True
+                self.not_empty.notify_all ( )
+                return
+
+            if not self.not_full.wait_for ( lambda: self.num_waiting < self.maxsize,
+                                            timeout=timeout if block else 0 ):
+                raise queue.Full
+
+            host = self.get_host ( item )
+            if host not in self.host_queues:
+                self.host_queues[ host ] = deque ( )
+            self.host_queues[ host ].append ( item )
+            self.num_waiting += 1
+
+            self.not_empty.notify ( )
+
+    def get ( self, block=True, timeout=None ):
+        """
+        Removes and returns the next url to download, taken round-robin from the hosts which are ready.
+        :param block: if True, waits for an url, otherwise raises queue.Empty when none is ready
+        :param timeout: maximum number of seconds to wait for an url (float) / None
+        :return: url (str) / "EXIT"
+        """
+        deadline = None if timeout is None else time.monotonic ( ) + timeout
+
+        with self.not_empty:
+            while True:
+                item, wait_time = self.pop_ready_item ( )
+                if item is not None:
+                    return item
+
+                if not self.num_waiting and self.exit_queued:
+                    self.exit_queued = False
+                    return "EXIT"
+
+                if deadline is not None:
+                    remaining = deadline - time.monotonic ( )
+                    wait_time = remaining if wait_time is None else min ( wait_time, remaining )
+
+                if not block or (wait_time is not None and wait_time <= 0):
+                    raise queue.Empty
+
+                self.not_empty.wait ( wait_time )
+
+    def pop_ready_item ( self ):
+        """
+        Removes the next url of the first ready host (in round-robin order). Caller must hold self.mutex.
+        :return: tuple of (url or None, seconds until a host becomes ready or None)
+        """
+        now = time.monotonic ( )
+        wait_time = None
+
+        for host, host_queue in self.host_queues.items ( ):
+            if self.in_flight[ host ] >= self.max_in_flight_per_host:
+                continue
+
+            ready_time = self.last_dispatch.get ( host, now - self.min_interval ) + self.min_interval
+            if ready_time > now:
+                wait_time = ready_time - now if wait_time is None else min ( wait_time, ready_time - now )
+                continue
+
+            item = host_queue.popleft ( )
+            if host_queue:
+                # the host gets its next turn after all the other hosts
+                self.host_queues.move_to_end ( host )
+            else:
+                del self.host_queues[ host ]
+
+            self.in_flight[ host ] += 1
+            self.last_dispatch[ host ] = now
+            self.num_waiting -= 1
+            self.not_full.notify ( )
+
+            return item, None
+
+        return None, wait_time
+
+    def task_done ( self, item ):
+        """
+        Indicates that the download of an url got from this scheduler is done, which frees a slot of its host.
+        :param item: url (str)
+        :return:
+        """
+        host = self.get_host ( item )
+
+        with self.mutex:
+            self.in_flight[ host ] -= 1
+            if self.in_flight[ host ] <= 0:
+                del self.in_flight[ host ]
+
+            self.not_empty.notify_all ( )
+
+    def qsize ( self ):
+        """
+        Returns the number of waiting urls (and "EXIT", if it has been put)
+        :return: int
+        """
+        with self.mutex:
+            return self.num_waiting + (1 if self.exit_queued else 0)
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+
+class ConditionalCache:
+    """
+    Description: ConditionalCache class keeps, per url, the validators (ETag and Last-Modified headers), the size and \
+                 the local path of the last downloaded version of an image. On the next run, the image is requested \
+                 conditionally (If-None-Match / If-Modified-Since headers), so an unchanged image is answered with \
+                 "304 Not Modified" and no body. The cache holds up to "max_entries" urls and evicts the least \
+                 recently used ones beyond it. It is persisted as a JSON lines file.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, cache_path, max_entries=1000000 ):
+        self.logger = logging.getLogger ( __name__ )
+
+        # path of the file the cache is persisted to
+        self.cache_path = cache_path
+
+        # maximum number of urls kept in the cache
+        self.max_entries = max_entries
+
+        # maps an url to a dict of "etag", "last_modified", "size" and "path", ordered from least to most recently used
+        self.entries = OrderedDict ( )
+
+        # this is used by downloader threads to get a lock over self.entries
+        self.mutex = threading.Lock ( )
+
+        self.load ( )
+
+    def load ( self ):
+        """
+        Loads the cache persisted by an earlier run
+        :return:
+        """
+        try:
+            with open ( self.cache_path, mode='r', encoding='utf-8' ) as fd:
+                for line in fd:
+                    try:
+                        url, entry = json.loads ( line )
+                    except ValueError:  # e.g; line truncated by a crash
+                        continue
+                    self.entries[ url ] = entry
+        except FileNotFoundError:
+            pass
+
+        while len ( self.entries ) > self.max_entries:
+            self.entries.popitem ( last=False )
+
+    def save ( self ):
+        """
+        Persists the cache. The file is replaced atomically, so a crash never leaves a truncated cache behind.
+        :return:
+        """
+        with self.mutex:
+            entries = list ( self.entries.items ( ) )
+
+        temp_path = self.cache_path + ".tmp"
+        with open ( temp_path, mode='w', encoding='utf-8' ) as fd:
+            for url, entry in entries:
+                fd.write ( json.dumps ( [ url, entry ] ) + "\n" )
+
+        os.replace ( temp_path, self.cache_path )
+
+    def get_entry ( self, url ):
+        """
+        Returns the cache entry of an url, if its downloaded file still exists. It is a thread safe function.
+        :param url: string
+        :return: dict of "etag", "last_modified", "size" and "path" / None
+        """
+        with self.mutex:
+            entry = self.entries.get ( url )
+            if entry is None:
+                return None
+            self.entries.move_to_end ( url )
+
+        if not os.path.isfile ( entry[ "path" ] ):
+            return None
+
+        return entry
+
+    def get_conditional_headers ( self, url ):
+        """
+        Returns the headers which make the request of an url conditional on the cached version of its image.
+        :param url: string
+        :return: dict (empty, if url is not cached)
+        """
+        entry = self.get_entry ( url )
+        if entry is None:
+            return { }
+
+        headers = { }
+        if entry.get ( "etag" ):
+            headers[ "If-None-Match" ] = entry[ "etag" ]
+        if entry.get ( "last_modified" ):
+            headers[ "If-Modified-Since" ] = entry[ "last_modified" ]
+
+        return headers
+
+    def store ( self, url, etag, last_modified, size, path ):
+        """
+        Caches the validators of a downloaded image. Images without any validator are not cached, as they \
+        cannot be requested conditionally. It is a thread safe function.
+        :param url: string
+        :param etag: value of ETag header (str) / None
+        :param last_modified: value of Last-Modified header (str) / None
+        :param size: size of the image in bytes (int)
+        :param path: path of the downloaded image (str)
+        :return:
+        """
+        if not etag and not last_modified:
+            return
+
+        with self.mutex:
+            self.entries[ url ] = { "etag": etag, "last_modified": last_modified, "size": size, "path": path }
+            self.entries.move_to_end ( url )
+
+            while len ( self.entries ) > self.max_entries:
+                self.entries.popitem ( last=False )
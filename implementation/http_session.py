@@ -0,0 +1,513 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+import cfg
+from .app_constants import *
+from .dns_cache import get_dns_cache
+
+
+class RequestTiming:
+    """
+    Description: RequestTiming class holds the latency breakdown of the requests made for an url: time spent \
+                 resolving host names (DNS), establishing TCP connections and TLS sessions, summed over all the \
+                 attempts (zero when a pooled connection is reused), and the time to first byte and transfer time \
+                 of the last attempt. All the durations are in seconds. The byte ranges of a segmented download \
+                 are requested in parallel, from their own threads, and make up a single attempt.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self ):
+        self.start_time = time.monotonic ( )
+
+        self.dns = 0.0
+        self.connect = 0.0
+
+        # None if no TLS session could be measured (e.g; plain HTTP)
+        self.tls = None
+
+        # time from the request of the last attempt to its response headers, without connection setup
+        self.ttfb = None
+
+        # time from the response headers of the last attempt to the end of its body
+        self.transfer = None
+
+        # number of requests made (e.g; reattempts after a timeout, byte ranges of a segmented download)
+        self.num_attempts = 0
+
+        # number of the requests made in parallel with other ones of the same attempt (see start_request)
+        self.num_parallel_requests = 0
+
+        # number of retries of the url scheduled before this attempt (see RETRY_POLICY)
+        self.num_delayed_retries = 0
+
+        # start of the request of the last attempt and connection setup time measured before it
+        self.request_start = None
+        self.setup_at_request_start = 0.0
+
+        # time the response headers of the last attempt have been received
+        self.headers_time = None
+
+        self.mutex = threading.Lock ( )
+
+    def get_setup_time ( self ):
+        """
+        :return: time spent on connection setup so far (float)
+        """
+        return self.dns + self.connect + (self.tls or 0.0)
+
+    def get_num_retries ( self ):
+        """
+        :return: number of retries of the url: the delayed ones, and the requests made again after a failure \
+                 within this attempt (int)
+        """
+        num_attempts = self.num_attempts - max ( self.num_parallel_requests - 1, 0 )
+        return self.num_delayed_retries + max ( num_attempts - 1, 0 )
+
+    def start_request ( self, is_parallel=False ):
+        """
+        Notes the start of an attempt
+        :param is_parallel: True (If the request is made in parallel with the other ones of the same attempt, \
+                            e.g; the first request of a byte range of a segmented download) / False
+        :return: start time of the request (float)
+        """
+        request_start = time.monotonic ( )
+        with self.mutex:
+            self.num_attempts += 1
+            if is_parallel:
+                self.num_parallel_requests += 1
+            else:
+                self.request_start = request_start
+                self.setup_at_request_start = self.get_setup_time ( )
+
+        return request_start
+
+    def note_headers ( self, request_start=None ):
+        """
+        Notes the reception of the response headers of the current attempt
+        :param request_start: start time of the request (float), if it has been made in parallel with other ones \
+                              (see start_request) / None. Only the first response of parallel requests is noted.
+        :return:
+        """
+        headers_time = time.monotonic ( )
+        with self.mutex:
+            if request_start is not None:
+                if self.headers_time is None:
+                    self.headers_time = headers_time
+                    self.ttfb = headers_time - request_start
+                return
+
+            self.headers_time = headers_time
+            if self.request_start is not None:
+                self.ttfb = self.headers_time - self.request_start - (self.get_setup_time ( ) -
+                                                                      self.setup_at_request_start)
+
+    def note_transfer_end ( self ):
+        """
+        Notes the end of the transfer of the response body of the current attempt
+        :return:
+        """
+        if self.headers_time is not None:
+            self.transfer = time.monotonic ( ) - self.headers_time
+
+
+# RequestTiming of the url in progress of a thread (see start_request_timing)
+thread_timing = threading.local ( )
+
+
+def start_request_timing ( ):
+    """
+    Starts measuring the connections established by the calling thread
+    :return: RequestTiming
+    """
+    thread_timing.current = RequestTiming ( )
+    return thread_timing.current
+
+
+def get_request_timing ( ):
+    """
+    :return: RequestTiming of the calling thread / None (If its connections are not measured)
+    """
+    return getattr ( thread_timing, "current", None )
+
+
+def stop_request_timing ( ):
+    """
+    Stops measuring the connections established by the calling thread
+    :return: its RequestTiming / None
+    """
+    timing = get_request_timing ( )
+    thread_timing.current = None
+    return timing
+
+
+def resolve_host ( host, port ):
+    """
+    Resolves a host name the way urllib3 does, through the shared DnsCache if DNS_CACHE_TTL is configured
+    :param host: str
+    :param port: int
+    :return: list of the IP addresses of the host (str), in the order they have to be tried
+    """
+    dns_cache = get_dns_cache ( )
+    if dns_cache:
+        return [ address for _, address in dns_cache.resolve ( host ) ]
+
+    addresses = [ ]
+    for family, _, _, _, sock_addr in socket.getaddrinfo ( host, port, allowed_gai_family ( ), socket.SOCK_STREAM ):
+        if sock_addr[ 0 ] not in addresses:
+            addresses.append ( sock_addr[ 0 ] )
+
+    return addresses
+
+
+class TimedHTTPConnection ( HTTPConnection ):
+    """
+    Description: TimedHTTPConnection class adds the time it takes to resolve the host and to establish the TCP \
+                 connection to the RequestTiming of the calling thread, if any. The host is resolved before the \
+                 connection is established (through the shared DnsCache, if DNS_CACHE_TTL is configured), and its \
+                 addresses are tried in turn as urllib3 does.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def _new_conn ( self ):
+        timing = get_request_timing ( )
+        dns_cache = get_dns_cache ( )
+        if timing is None and dns_cache is None:
+            return super ( )._new_conn ( )
+
+        start_time = time.monotonic ( )
+        dns_host = self._dns_host
+        try:
+            addresses = resolve_host ( dns_host, self.port )
+        except (socket.gaierror, UnicodeError) as err:
+            if dns_cache:
+                # an unresolvable host is rejected before any connection attempt, even while its error is cached
+                raise NameResolutionError ( self.host, self, err ) from err
+
+            # urllib3 reports the resolution error
+            addresses = [ dns_host ]
+        finally:
+            resolved_time = time.monotonic ( )
+            if timing is not None:
+                timing.dns += resolved_time - start_time
+
+        try:
+            for address_index, address in enumerate ( addresses ):
+                self._dns_host = address
+                try:
+                    return super ( )._new_conn ( )
+                except (NewConnectionError, ConnectTimeoutError):
+                    if address_index == len ( addresses ) - 1:
+                        raise
+        finally:
+            self._dns_host = dns_host
+            if timing is not None:
+                timing.connect += time.monotonic ( ) - resolved_time
+
+
+class TimedHTTPSConnection ( TimedHTTPConnection, HTTPSConnection ):
+    """
+    Description: TimedHTTPSConnection class also adds the time of the TLS handshake (and of the proxy tunnel, if \
+                 any) to the RequestTiming of the calling thread.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def connect ( self ):
+        timing = get_request_timing ( )
+        if timing is None:
+            return super ( ).connect ( )
+
+        start_time = time.monotonic ( )
+        setup_time = timing.dns + timing.connect
+        try:
+            super ( ).connect ( )
+        finally:
+            timing.tls = (timing.tls or 0.0) + time.monotonic ( ) - start_time - (timing.dns + timing.connect -
+                                                                                  setup_time)
+
+
+class TimedHTTPConnectionPool ( HTTPConnectionPool ):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool ( HTTPSConnectionPool ):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter ( HTTPAdapter ):
+    """
+    Description: TimedHTTPAdapter class is an HTTPAdapter whose connections are measured (see TimedHTTPConnection).
+
+    Version: 1.0
+    Comment:
+    """
+
+    POOL_CLASSES = { "http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool }
+
+    def init_poolmanager ( self, *args, **kwargs ):
+        super ( ).init_poolmanager ( *args, **kwargs )
+        self.poolmanager.pool_classes_by_scheme = self.POOL_CLASSES
+
+    def proxy_manager_for ( self, proxy, **proxy_kwargs ):
+        proxy_manager = super ( ).proxy_manager_for ( proxy, **proxy_kwargs )
+
+        # SOCKS proxies have connection classes of their own
+        if not proxy.lower ( ).startswith ( "socks" ):
+            proxy_manager.pool_classes_by_scheme = self.POOL_CLASSES
+
+        return proxy_manager
+
+
+class HttpSessionPool:
+    """
+    Description: HttpSessionPool class keeps one HTTPAdapter per host (scheme and network location of an url). \
+                 The connection pool of an adapter keeps up to HTTP_POOL_SIZE connections alive, so consecutive \
+                 requests to the same host reuse an already established TCP connection (and TLS session) instead \
+                 of opening a new one. The adapters (whose connection pools are thread safe) are shared by all the \
+                 threads, while every thread sends its requests through requests.Session objects of its own, as \
+                 requests.Session is not guaranteed to be thread safe. It is shared by FileParser and Downloader \
+                 and is safe to use from all of their threads.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, pool_size=10, max_hosts=100, keep_alive=True ):
+        # Maximum number of connections kept alive per host
+        self.pool_size = pool_size
+
+        # Maximum number of hosts whose adapter is cached. Least recently used adapter gets closed beyond it.
+        self.max_hosts = max_hosts
+
+        # If False, every connection gets closed by the server after the response (HTTP "Connection: close")
+        self.keep_alive = keep_alive
+
+        # maps (scheme, netloc) of a host to its HTTPAdapter, ordered from least to most recently used
+        self.adapters = OrderedDict ( )
+
+        # maps an adapter to the number of requests being sent through it
+        self.num_requests = { }
+
+        # adapters evicted from self.adapters while requests were being sent through them. They get closed once \
+        # these requests are done.
+        self.evicted_adapters = set ( )
+
+        # sessions of the calling thread, mapping the key of a host to (adapter, requests.Session)
+        self.thread_sessions = threading.local ( )
+
+        # this is used by threads to get a lock over self.adapters, self.num_requests and self.evicted_adapters
+        self.mutex = threading.Lock ( )
+
+    @staticmethod
+    def get_host_key ( url ):
+        """
+        :param url: string
+        :return: (scheme, netloc) of the host of url, in lower case
+        """
+        url_parts = urlsplit ( url )
+        return url_parts.scheme.lower ( ), url_parts.netloc.lower ( )
+
+    def create_adapter ( self ):
+        """
+        Creates an HTTPAdapter whose connection pools are sized as configured
+        :return: TimedHTTPAdapter
+        """
+        # pool_block=False: if all pooled connections are busy, an extra connection is opened (and discarded \
+        # afterwards) instead of making a thread wait for a pooled connection
+        # connections established while a RequestTiming is started are measured (see TimedHTTPAdapter)
+        return TimedHTTPAdapter ( pool_connections=1, pool_maxsize=self.pool_size, pool_block=False )
+
+    def create_session ( self, adapter ):
+        """
+        Creates a requests.Session which sends its requests through an adapter
+        :param adapter: TimedHTTPAdapter
+        :return: requests.Session
+        """
+        session = requests.Session ( )
+        session.mount ( "http://", adapter )
+        session.mount ( "https://", adapter )
+
+        if not self.keep_alive:
+            session.headers[ "Connection" ] = "close"
+
+        return session
+
+    def get_adapter ( self, url, is_acquired=False ):
+        """
+        Returns the adapter of the host of an url. It creates the adapter if it does not exist yet. \
+        It is a thread safe function.
+        :param url: string
+        :param is_acquired: boolean (If True, the adapter is kept open until release_adapter is called)
+        :return: TimedHTTPAdapter
+        """
+        host_key = self.get_host_key ( url )
+
+        closed_adapter = None
+        with self.mutex:
+            adapter = self.adapters.get ( host_key )
+            if adapter is not None:
+                self.adapters.move_to_end ( host_key )
+            else:
+                adapter = self.adapters[ host_key ] = self.create_adapter ( )
+
+                if len ( self.adapters ) > self.max_hosts:
+                    _, evicted_adapter = self.adapters.popitem ( last=False )
+                    if self.num_requests.get ( evicted_adapter ):
+                        self.evicted_adapters.add ( evicted_adapter )
+                    else:
+                        closed_adapter = evicted_adapter
+
+            if is_acquired:
+                self.num_requests[ adapter ] = self.num_requests.get ( adapter, 0 ) + 1
+
+        if closed_adapter is not None:
+            closed_adapter.close ( )
+
+        return adapter
+
+    def release_adapter ( self, adapter ):
+        """
+        Indicates that a request sent through an adapter (see get_adapter) is done. An evicted adapter gets closed \
+        once no request is sent through it anymore. It is a thread safe function.
+        :param adapter: TimedHTTPAdapter
+        :return:
+        """
+        with self.mutex:
+            num_requests = self.num_requests.pop ( adapter ) - 1
+            if num_requests:
+                self.num_requests[ adapter ] = num_requests
+                return
+
+            if adapter not in self.evicted_adapters:
+                return
+            self.evicted_adapters.discard ( adapter )
+
+        adapter.close ( )
+
+    def get_session ( self, url, adapter=None ):
+        """
+        Returns the session of the calling thread for the host of an url. It creates the session if it does not \
+        exist yet.
+        :param url: string
+        :param adapter: adapter of the host of url (TimedHTTPAdapter) / None (If it is looked up)
+        :return: requests.Session
+        """
+        if adapter is None:
+            adapter = self.get_adapter ( url )
+
+        sessions = getattr ( self.thread_sessions, "sessions", None )
+        if sessions is None:
+            sessions = self.thread_sessions.sessions = OrderedDict ( )
+
+        host_key = self.get_host_key ( url )
+        session_adapter, session = sessions.get ( host_key, (None, None) )
+
+        # a session whose adapter has been evicted is replaced. Sessions are not closed, as they do not own \
+        # their adapter.
+        if session_adapter is not adapter:
+            session = self.create_session ( adapter )
+            sessions[ host_key ] = (adapter, session)
+            if len ( sessions ) > self.max_hosts:
+                sessions.popitem ( last=False )
+
+        sessions.move_to_end ( host_key )
+        return session
+
+    def send_request ( self, method, url, **kwargs ):
+        """
+        Sends a request using the pooled connections of the host of an url
+        :param method: "head" / "get"
+        :param url: string
+        :param kwargs: optional arguments of requests.Session.head / requests.Session.get
+        :return: requests.Response
+        """
+        # the adapter is not closed while the request is sent. The connection of a streamed response is closed \
+        # instead of being pooled, when it is released after its adapter has been closed.
+        adapter = self.get_adapter ( url, is_acquired=True )
+        try:
+            return getattr ( self.get_session ( url, adapter ), method ) ( url, **kwargs )
+        finally:
+            self.release_adapter ( adapter )
+
+    def head ( self, url, **kwargs ):
+        """
+        Sends a HEAD request using the pooled connections of the host of an url
+        :param url: string
+        :param kwargs: optional arguments of requests.Session.head
+        :return: requests.Response
+        """
+        return self.send_request ( "head", url, **kwargs )
+
+    def get ( self, url, **kwargs ):
+        """
+        Sends a GET request using the pooled connections of the host of an url
+        :param url: string
+        :param kwargs: optional arguments of requests.Session.get
+        :return: requests.Response
+        """
+        return self.send_request ( "get", url, **kwargs )
+
+    def close ( self ):
+        """
+        Closes all the adapters and their pooled connections
+        :return:
+        """
+        with self.mutex:
+            adapters = list ( self.adapters.values ( ) ) + list ( self.evicted_adapters )
+            self.adapters.clear ( )
+            self.evicted_adapters.clear ( )
+
+        for adapter in adapters:
+            adapter.close ( )
+
+
+# HttpSessionPool shared by all the components of the application (created on its first use)
+shared_session_pool = None
+shared_session_pool_mutex = threading.Lock ( )
+
+
+def get_http_session_pool ( ):
+    """
+    Returns the HttpSessionPool shared by FileParser and Downloader, configured as per cfg.py. \
+    It is a thread safe function.
+    :return: HttpSessionPool
+    """
+    global shared_session_pool
+
+    with shared_session_pool_mutex:
+        if shared_session_pool is None:
+            shared_session_pool = HttpSessionPool (
+                pool_size=cfg.APP_CFG.get ( HTTP_POOL_SIZE ) or 10,
+                max_hosts=cfg.APP_CFG.get ( HTTP_POOL_MAX_HOSTS ) or 100,
+                keep_alive=cfg.APP_CFG.get ( HTTP_KEEP_ALIVE, True )
+            )
+
+        return shared_session_pool
+
+
+def close_http_session_pool ( ):
+    """
+    Closes the shared HttpSessionPool. A new one gets created if it is requested again.
+    :return:
+    """
+    global shared_session_pool
+
+    with shared_session_pool_mutex:
+        if shared_session_pool is not None:
+            shared_session_pool.close ( )
+            shared_session_pool = None
@@ -0,0 +1,237 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import cfg
+from .app_constants import *
+
+# States of an url recorded in the journal
+PENDING = "pending"  # read from the plaintext file
+VALIDATED = "validated"  # serviceable, waiting to be downloaded
+DOWNLOADED = "downloaded"  # downloaded and saved
+FAILED = "failed"  # not serviceable or download failed
+
+# Kind of the write queue items recording how far the plaintext file has been read (see record_checkpoint)
+CHECKPOINT = "checkpoint"
+
+
+class JobJournal:
+    """
+    Description: JobJournal class records the state of every url of a job (pending, validated, downloaded, failed) \
+                 into an on-disk SQLite database in WAL mode. If a job is interrupted, the next run can resume it: \
+                 finished urls are skipped and only the remaining ones are processed again. \
+                 Threads never wait on the database to record a state. States are queued and a single writer \
+                 thread stores them in batches of up to "batch_size" rows per transaction.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # Maximum number of seconds a recorded state waits in the write queue before it is committed
+    FLUSH_INTERVAL = 1.0
+
+    def __init__ ( self, db_path, batch_size=1000, resume=False ):
+        self.logger = logging.getLogger ( __name__ )
+
+        # path of the SQLite database file
+        self.db_path = db_path
+
+        # maximum number of states written per transaction
+        self.batch_size = batch_size
+
+        # If True, the states of the previous (interrupted) job are kept, otherwise a new job is started
+        self.resume = resume
+
+        # Connection of the writer thread. It is created here to set up the database before any thread uses it.
+        self.write_conn = sqlite3.connect ( db_path, check_same_thread=False )
+        self.write_conn.execute ( "PRAGMA journal_mode=WAL" )
+        # in WAL mode, NORMAL synchronous mode is safe against corruption and only syncs at checkpoints
+        self.write_conn.execute ( "PRAGMA synchronous=NORMAL" )
+        self.write_conn.execute (
+            "CREATE TABLE IF NOT EXISTS url_state (url TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)" )
+        self.write_conn.execute (
+            "CREATE TABLE IF NOT EXISTS input_checkpoint (input TEXT PRIMARY KEY, offset INTEGER NOT NULL, " +
+            "updated REAL NOT NULL)" )
+        if not resume:
+            self.write_conn.execute ( "DELETE FROM url_state" )
+            self.write_conn.execute ( "DELETE FROM input_checkpoint" )
+        self.write_conn.commit ( )
+
+        # read connections, one per thread
+        self.thread_local = threading.local ( )
+
+        # (url, state, timestamp) tuples waiting to be written. It is bounded, so that a slow disk throttles \
+        # the job instead of exhausting the memory.
+        self.write_queue = queue.Queue ( maxsize=100 * batch_size )
+
+        self.writer_thread = threading.Thread ( target=self.thread_writer, daemon=True )
+        self.writer_thread.start ( )
+
+    def record ( self, url, state ):
+        """
+        Records the state of an url. The state is written asynchronously. It is a thread safe function.
+        :param url: string
+        :param state: one of PENDING, VALIDATED, DOWNLOADED, FAILED
+        :return:
+        """
+        self.write_queue.put ( item=(url, state, time.time ( )), block=True, timeout=None )
+
+    def record_checkpoint ( self, input_name, offset ):
+        """
+        Records that the plaintext file has been read up to a byte offset, i.e; that the states of all the urls \
+        before it have been recorded. The checkpoint is written with (and after) these states, as they are queued \
+        before it. It is a thread safe function.
+        :param input_name: name identifying the plaintext file (str)
+        :param offset: byte offset of the end of the last read line (int)
+        :return:
+        """
+        self.write_queue.put ( item=(input_name, CHECKPOINT, time.time ( ), offset), block=True, timeout=None )
+
+    def get_read_conn ( self ):
+        """
+        :return: read connection of the calling thread
+        """
+        read_conn = getattr ( self.thread_local, "read_conn", None )
+        if read_conn is None:
+            read_conn = sqlite3.connect ( self.db_path )
+            self.thread_local.read_conn = read_conn
+
+        return read_conn
+
+    def get_state ( self, url ):
+        """
+        Gets the state of an url recorded by the resumed job. It is a thread safe function.
+        :param url: string
+        :return: one of PENDING, VALIDATED, DOWNLOADED, FAILED / None (If url has not been recorded)
+        """
+        row = self.get_read_conn ( ).execute ( "SELECT state FROM url_state WHERE url = ?", (url,) ).fetchone ( )
+        return row[ 0 ] if row else None
+
+    def get_checkpoint ( self, input_name ):
+        """
+        Gets the last checkpoint of a plaintext file recorded by the resumed job. It is a thread safe function.
+        :param input_name: name identifying the plaintext file (str)
+        :return: byte offset (int) / None (If no checkpoint has been recorded)
+        """
+        row = self.get_read_conn ( ).execute ( "SELECT offset FROM input_checkpoint WHERE input = ?",
+                                               (input_name,) ).fetchone ( )
+        return row[ 0 ] if row else None
+
+    def get_unfinished_urls ( self ):
+        """
+        Gets the urls of the resumed job which are neither downloaded nor failed. It is a thread safe function.
+        :return: generator of urls (str)
+        """
+        cursor = self.get_read_conn ( ).execute ( "SELECT url FROM url_state WHERE state IN (?, ?)",
+                                                  (PENDING, VALIDATED) )
+        for row in cursor:
+            yield row[ 0 ]
+
+    def thread_writer ( self ):
+        """
+        This function details the functionality of the writer thread. It fetches the recorded states from \
+        self.write_queue and writes them in batches, until "EXIT" is fetched.
+        :return:
+        """
+        while True:
+            try:
+                item = self.write_queue.get ( block=True, timeout=self.FLUSH_INTERVAL )
+            except queue.Empty:
+                continue
+
+            batch = [ ]
+            while item != "EXIT":
+                batch.append ( item )
+                if len ( batch ) >= self.batch_size:
+                    break
+                try:
+                    item = self.write_queue.get_nowait ( )
+                except queue.Empty:
+                    break
+
+            if batch:
+                self.write_batch ( batch )
+
+            if item == "EXIT":
+                break
+
+        self.write_conn.close ( )
+
+    def write_batch ( self, batch ):
+        """
+        Writes a batch of states and checkpoints in a single transaction
+        :param batch: list of (url, state, timestamp) and (input name, CHECKPOINT, timestamp, offset) tuples
+        :return:
+        """
+        states = [ item for item in batch if item[ 1 ] != CHECKPOINT ]
+        checkpoints = [ (item[ 0 ], item[ 3 ], item[ 2 ]) for item in batch if item[ 1 ] == CHECKPOINT ]
+
+        try:
+            with self.write_conn:
+                self.write_conn.executemany ( "INSERT OR REPLACE INTO url_state (url, state, updated) VALUES (?, ?, ?)",
+                                              states )
+                self.write_conn.executemany (
+                    "INSERT OR REPLACE INTO input_checkpoint (input, offset, updated) VALUES (?, ?, ?)", checkpoints )
+        except sqlite3.Error as err:
+            self.logger.info (
+                "Journal - An exception of type {0} occurred. Arguments:\n{1!r}".format ( type ( err ).__name__,
+                                                                                           err.args ) )
+
+    def close ( self ):
+        """
+        Writes the remaining recorded states and closes the journal
+        :return:
+        """
+        self.write_queue.put ( item="EXIT", block=True, timeout=None )
+        self.writer_thread.join ( )
+
+        read_conn = getattr ( self.thread_local, "read_conn", None )
+        if read_conn is not None:
+            read_conn.close ( )
+
+
+# JobJournal shared by all the components of the application (created on its first use)
+shared_journal = None
+shared_journal_mutex = threading.Lock ( )
+
+
+def get_job_journal ( ):
+    """
+    Returns the JobJournal shared by FileParser and Downloader, configured as per cfg.py. \
+    It is a thread safe function.
+    :return: JobJournal / None (If JOURNAL_PATH is not configured)
+    """
+    global shared_journal
+
+    if not cfg.APP_CFG.get ( JOURNAL_PATH ):
+        return None
+
+    with shared_journal_mutex:
+        if shared_journal is None:
+            journal_dir = os.path.dirname ( cfg.APP_CFG[ JOURNAL_PATH ] )
+            if journal_dir:
+                os.makedirs ( journal_dir, exist_ok=True )
+
+            shared_journal = JobJournal (
+                cfg.APP_CFG[ JOURNAL_PATH ],
+                batch_size=cfg.APP_CFG.get ( JOURNAL_BATCH_SIZE ) or 1000,
+                resume=bool ( cfg.APP_CFG.get ( JOURNAL_RESUME ) )
+            )
+
+        return shared_journal
+
+
+def close_job_journal ( ):
+    """
+    Closes the shared JobJournal, once all of its recorded states have been written.
+    :return:
+    """
+    global shared_journal
+
+    with shared_journal_mutex:
+        if shared_journal is not None:
+            shared_journal.close ( )
+            shared_journal = None
@@ -0,0 +1,203 @@
+import csv
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import cfg
+from .app_constants import *
+from .journal import DOWNLOADED, FAILED
+
+# Supported formats of the manifest (see MANIFEST_FORMAT in cfg.py)
+JSONL = "jsonl"  # one JSON object per line
+CSV = "csv"  # one row per url, after a header row
+
+MANIFEST_FORMATS = (JSONL, CSV)
+
+# Results of an url recorded in the manifest: DOWNLOADED and FAILED as in the journal, or
+RETRIED = "retried"  # download failed and is retried later (see RETRY_POLICY)
+REJECTED = "rejected"  # not serviceable, as per its validation
+
+# Fields of a record, in CSV column order. Durations are in milliseconds.
+MANIFEST_FIELDS = ("timestamp", "url", "final_url", "result", "status", "content_type", "bytes", "path", "retries",
+                   "dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "transfer_ms", "total_ms", "error")
+
+
+def new_manifest_entry ( url ):
+    """
+    :param url: str
+    :return: record of an url, to be filled while it is processed (dict with all the MANIFEST_FIELDS)
+    """
+    entry = dict.fromkeys ( MANIFEST_FIELDS )
+    entry[ "url" ] = str ( url )
+    return entry
+
+
+def finish_manifest_entry ( entry, result, timing ):
+    """
+    Completes the record of an url with its result and latency breakdown
+    :param entry: dict (see new_manifest_entry)
+    :param result: one of DOWNLOADED, FAILED, RETRIED, REJECTED
+    :param timing: http_session.RequestTiming of the url / None
+    :return: entry
+    """
+    def to_ms ( duration ):
+        return None if duration is None else round ( duration * 1000, 3 )
+
+    entry[ "timestamp" ] = datetime.datetime.now ( datetime.timezone.utc ).isoformat ( timespec='milliseconds' )
+    entry[ "result" ] = result
+
+    if timing is not None:
+        entry[ "retries" ] = timing.get_num_retries ( )
+        entry[ "dns_ms" ] = to_ms ( timing.dns )
+        entry[ "connect_ms" ] = to_ms ( timing.connect )
+        entry[ "tls_ms" ] = to_ms ( timing.tls )
+        entry[ "ttfb_ms" ] = to_ms ( timing.ttfb )
+        entry[ "transfer_ms" ] = to_ms ( timing.transfer )
+        entry[ "total_ms" ] = to_ms ( time.monotonic ( ) - timing.start_time )
+
+    return entry
+
+
+class ResultManifest:
+    """
+    Description: ResultManifest class writes one record per url (result, final url after redirects, HTTP status, \
+                 content type, size, local path, retries and latency breakdown) into a JSONL or CSV file, so that \
+                 slow hosts and regressions can be found offline. Threads never wait on the disk to record an url: \
+                 records are queued and a single writer thread appends them in batches of up to "batch_size", \
+                 flushing the file after every batch. Records are appended to the ones of earlier runs.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # Maximum number of seconds a record waits in the write queue before it is written
+    FLUSH_INTERVAL = 1.0
+
+    def __init__ ( self, path, manifest_format=JSONL, batch_size=1000 ):
+        self.logger = logging.getLogger ( __name__ )
+
+        self.path = path
+        self.manifest_format = manifest_format
+        self.batch_size = batch_size
+
+        self.fd = open ( path, mode='a', encoding='utf-8', newline='' )
+
+        self.csv_writer = None
+        if manifest_format == CSV:
+            self.csv_writer = csv.DictWriter ( self.fd, MANIFEST_FIELDS, extrasaction='ignore' )
+            if self.fd.tell ( ) == 0:
+                self.csv_writer.writeheader ( )
+
+        # records waiting to be written. It is bounded, so that a slow disk throttles the job instead of \
+        # exhausting the memory.
+        self.write_queue = queue.Queue ( maxsize=100 * batch_size )
+
+        self.writer_thread = threading.Thread ( target=self.thread_writer, daemon=True )
+        self.writer_thread.start ( )
+
+    def record ( self, entry ):
+        """
+        Records an url. The record is written asynchronously. It is a thread safe function.
+        :param entry: dict (see finish_manifest_entry)
+        :return:
+        """
+        self.write_queue.put ( item=entry, block=True, timeout=None )
+
+    def thread_writer ( self ):
+        """
+        This function details the functionality of the writer thread. It fetches the records from \
+        self.write_queue and writes them in batches, until "EXIT" is fetched.
+        :return:
+        """
+        while True:
+            try:
+                item = self.write_queue.get ( block=True, timeout=self.FLUSH_INTERVAL )
+            except queue.Empty:
+                continue
+
+            batch = [ ]
+            while item != "EXIT":
+                batch.append ( item )
+                if len ( batch ) >= self.batch_size:
+                    break
+                try:
+                    item = self.write_queue.get_nowait ( )
+                except queue.Empty:
+                    break
+
+            if batch:
+                self.write_batch ( batch )
+
+            if item == "EXIT":
+                break
+
+    def write_batch ( self, batch ):
+        """
+        Writes a batch of records, and flushes them to the file
+        :param batch: list of dicts
+        :return:
+        """
+        try:
+            if self.csv_writer:
+                self.csv_writer.writerows ( batch )
+            else:
+                self.fd.write ( "".join ( json.dumps ( entry, separators=(",", ":") ) + "\n" for entry in batch ) )
+            self.fd.flush ( )
+        except (OSError, ValueError) as err:
+            self.logger.info (
+                "Manifest - An exception of type {0} occurred. Arguments:\n{1!r}".format ( type ( err ).__name__,
+                                                                                            err.args ) )
+
+    def close ( self ):
+        """
+        Writes the remaining records and closes the manifest
+        :return:
+        """
+        self.write_queue.put ( item="EXIT", block=True, timeout=None )
+        self.writer_thread.join ( )
+        self.fd.close ( )
+
+
+# ResultManifest shared by all the components of the application (created on its first use)
+shared_manifest = None
+shared_manifest_mutex = threading.Lock ( )
+
+
+def get_result_manifest ( ):
+    """
+    Returns the ResultManifest shared by FileParser and Downloader, configured as per cfg.py. \
+    It is a thread safe function.
+    :return: ResultManifest / None (If MANIFEST_PATH is not configured)
+    """
+    global shared_manifest
+
+    if not cfg.APP_CFG.get ( MANIFEST_PATH ):
+        return None
+
+    with shared_manifest_mutex:
+        if shared_manifest is None:
+            manifest_dir = os.path.dirname ( cfg.APP_CFG[ MANIFEST_PATH ] )
+            if manifest_dir:
+                os.makedirs ( manifest_dir, exist_ok=True )
+
+            shared_manifest = ResultManifest ( cfg.APP_CFG[ MANIFEST_PATH ],
+                                               cfg.APP_CFG.get ( MANIFEST_FORMAT ) or JSONL )
+
+        return shared_manifest
+
+
+def close_result_manifest ( ):
+    """
+    Closes the shared ResultManifest, once all of its records have been written.
+    :return:
+    """
+    global shared_manifest
+
+    with shared_manifest_mutex:
+        if shared_manifest is not None:
+            shared_manifest.close ( )
+            shared_manifest = None
@@ -0,0 +1,114 @@
+# Content types of a resource whose type is not declared. Its content tells whether it is an image (see IMAGE_SNIFFING).
+GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream", "application/binary",
+                         "application/unknown", "application/x-download", "application/force-download")
+
+# Number of first bytes of a resource which are needed to recognize its image format. The signatures of binary \
+# formats fit into 32 bytes, while the root element of an SVG document might follow an XML declaration and a doctype.
+SNIFF_SIZE = 512
+
+# Signatures of the image formats: (offset, magic bytes, extension of the format). The first matching one wins.
+IMAGE_SIGNATURES = (
+    (0, b"\xff\xd8\xff", "jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"II*\x00", "tif"),
+    (0, b"MM\x00*", "tif"),
+    (8, b"WEBP", "webp"),  # after b"RIFF" and the size of the file (see sniff_image_type)
+    (0, b"\x00\x00\x00\x0cjP  \r\n\x87\n", "jp2"),
+    (0, b"\xff\x4f\xff\x51", "j2k"),
+    (0, b"\x00\x00\x00\x0cJXL \r\n\x87\n", "jxl"),
+    (0, b"\xff\x0a", "jxl"),
+    (0, b"BM", "bmp"),
+    (0, b"\x00\x00\x01\x00", "ico"),
+    (0, b"8BPS", "psd"),
+)
+
+# Brands of the ISO base media file format (at offset 8, after b"ftyp") which are images
+IMAGE_FTYP_BRANDS = {
+    b"heic": "heic", b"heix": "heic", b"heim": "heic", b"heis": "heic", b"mif1": "heic", b"msf1": "heic",
+    b"avif": "avif", b"avis": "avif",
+}
+
+# Extensions of the same format as the extension of a sniffed format (e.g; an url ending with ".jpeg" is a JPEG)
+IMAGE_EXTENSION_ALIASES = {
+    "jpg": ("jpg", "jpeg", "jpe", "jif", "jfif", "jfi"),
+    "tif": ("tif", "tiff"),
+    "jp2": ("jp2", "jpx", "jpf"),
+    "j2k": ("j2k", "j2c", "jpc"),
+    "heic": ("heic", "heif"),
+}
+
+
+def is_image_content_type ( content_type, allow_generic=False ):
+    """
+    Verifies whether or not, the value of a content-type header denotes an image resource
+    :param content_type: string (value of content-type header) / None
+    :param allow_generic: boolean (If True, a resource whose type is not declared, e.g; "application/octet-stream" \
+                          or no content-type header, might be an image as well)
+    :return: boolean
+    """
+    if not content_type: return allow_generic
+
+    content_type = content_type.lower ( )
+    if 'image' in content_type:
+        return True
+    if 'png' in content_type:
+        return True
+
+    if allow_generic:
+        return content_type.split ( ";", 1 )[ 0 ].strip ( ) in GENERIC_CONTENT_TYPES
+
+    return False
+
+
+def sniff_image_type ( data ):
+    """
+    Recognizes the image format of a resource from its first bytes
+    :param data: first SNIFF_SIZE bytes of the resource (bytes-like object; fewer if the resource is shorter)
+    :return: extension of the image format (str, e.g; "png") / None (If the resource is not an image)
+    """
+    data = bytes ( data[ :SNIFF_SIZE ] )
+
+    for offset, magic, extension in IMAGE_SIGNATURES:
+        if data.startswith ( magic, offset ):
+            if extension == "webp" and not data.startswith ( b"RIFF" ):
+                continue
+            return extension
+
+    if data[ 4:8 ] == b"ftyp":
+        return IMAGE_FTYP_BRANDS.get ( data[ 8:12 ] )
+
+    if is_svg_document ( data ):
+        return "svg"
+
+    return None
+
+
+def is_svg_document ( data ):
+    """
+    Recognizes an SVG document (a text format without signature) from its first bytes: its root <svg> element, \
+    possibly after an XML declaration, comments and a doctype. An (X)HTML page embedding an SVG image is not one.
+    :param data: first bytes of the resource (bytes)
+    :return: boolean
+    """
+    text = data[ 3: ] if data.startswith ( b"\xef\xbb\xbf" ) else data
+    text = text.lstrip ( ).lower ( )
+
+    if text.startswith ( b"<svg" ):
+        return True
+
+    if not text.startswith ( (b"<?xml", b"<!--", b"<!doctype svg") ):
+        return False
+
+    svg_pos = text.find ( b"<svg" )
+    return svg_pos > 0 and b"<html" not in text[ :svg_pos ]
+
+
+def is_image_extension ( extension, image_ext ):
+    """
+    :param extension: extension of a file name (str, e.g; "jpeg")
+    :param image_ext: extension of a sniffed image format (str, e.g; "jpg")
+    :return: True (If the extension denotes the sniffed format) / False
+    """
+    return extension.lower ( ) in IMAGE_EXTENSION_ALIASES.get ( image_ext, (image_ext,) )
@@ -0,0 +1,465 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cfg
+from .app_constants import *
+
+# default upper bounds (seconds) of the buckets of latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metric:
+    """
+    Description: Metric class is the base of the metric types. A metric holds one value per combination of the \
+                 values of its labels (e.g; one per HTTP status code). All its methods are thread safe.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # Prometheus type of the metric
+    TYPE = None
+
+    def __init__ ( self, name, help_text, label_names=( ) ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple ( label_names )
+
+        # maps a tuple of label values to the value of the metric
+        self.values = { }
+
+        self.mutex = threading.Lock ( )
+
+    def get_samples ( self ):
+        """
+        :return: list of (sample name suffix, label dict, value) tuples, in Prometheus exposition order
+        """
+        with self.mutex:
+            return [ ("", dict ( zip ( self.label_names, labels ) ), value )
+                     for labels, value in sorted ( self.values.items ( ) ) ]
+
+    def get_snapshot ( self ):
+        """
+        :return: JSON serializable value of the metric (number, or dict keyed by the joined label values)
+        """
+        with self.mutex:
+            if not self.label_names:
+                return self.values.get ( ( ), 0 )
+            return { ",".join ( labels ): value for labels, value in sorted ( self.values.items ( ) ) }
+
+
+class Counter ( Metric ):
+    """
+    Description: Counter class is a metric which only goes up (e.g; number of urls read).
+
+    Version: 1.0
+    Comment:
+    """
+
+    TYPE = "counter"
+
+    def inc ( self, amount=1, labels=( ) ):
+        """
+        :param amount: number added to the counter
+        :param labels: tuple of the label values
+        :return:
+        """
+        with self.mutex:
+            self.values[ labels ] = self.values.get ( labels, 0 ) + amount
+
+
+class Gauge ( Metric ):
+    """
+    Description: Gauge class is a metric which goes up and down (e.g; number of active workers). Its value can \
+                 also be read, when it is collected, from a function (e.g; the depth of a queue).
+
+    Version: 1.0
+    Comment:
+    """
+
+    TYPE = "gauge"
+
+    def __init__ ( self, *args, **kwargs ):
+        super ( ).__init__ ( *args, **kwargs )
+
+        # maps a tuple of label values to the function returning the value of the metric
+        self.functions = { }
+
+    def inc ( self, amount=1, labels=( ) ):
+        with self.mutex:
+            self.values[ labels ] = self.values.get ( labels, 0 ) + amount
+
+    def dec ( self, amount=1, labels=( ) ):
+        self.inc ( -amount, labels )
+
+    def set_function ( self, function, labels=( ) ):
+        """
+        :param function: callable without argument returning the value of the metric
+        :param labels: tuple of the label values
+        :return:
+        """
+        with self.mutex:
+            self.functions[ labels ] = function
+
+    def collect_functions ( self ):
+        """
+        Reads the values of the metric given by functions
+        :return:
+        """
+        with self.mutex:
+            functions = list ( self.functions.items ( ) )
+
+        for labels, function in functions:
+            value = function ( )
+            with self.mutex:
+                self.values[ labels ] = value
+
+    def get_samples ( self ):
+        self.collect_functions ( )
+        return super ( ).get_samples ( )
+
+    def get_snapshot ( self ):
+        self.collect_functions ( )
+        return super ( ).get_snapshot ( )
+
+
+class Histogram ( Metric ):
+    """
+    Description: Histogram class counts observations (e.g; latencies) into buckets of fixed upper bounds, and \
+                 keeps their count and sum, so percentiles can be estimated by the consumer of the metrics.
+
+    Version: 1.0
+    Comment:
+    """
+
+    TYPE = "histogram"
+
+    def __init__ ( self, name, help_text, label_names=( ), buckets=LATENCY_BUCKETS ):
+        super ( ).__init__ ( name, help_text, label_names )
+        self.buckets = tuple ( sorted ( buckets ) )
+
+    def observe ( self, value, labels=( ) ):
+        """
+        :param value: observed number (e.g; seconds)
+        :param labels: tuple of the label values
+        :return:
+        """
+        with self.mutex:
+            state = self.values.get ( labels )
+            if state is None:
+                # [count per bucket (the last one is +Inf), count, sum]
+                state = self.values[ labels ] = [ [ 0 ] * (len ( self.buckets ) + 1), 0, 0.0 ]
+            state[ 0 ][ bisect.bisect_left ( self.buckets, value ) ] += 1
+            state[ 1 ] += 1
+            state[ 2 ] += value
+
+    def get_percentile ( self, percent, labels=( ) ):
+        """
+        Estimates a percentile of the observations, by linear interpolation into the bucket holding it. The error \
+        of the estimate is bounded by the width of that bucket.
+        :param percent: number in range [0, 100] (e.g; 99)
+        :param labels: tuple of the label values
+        :return: estimated value (float) / None (If nothing has been observed)
+        """
+        with self.mutex:
+            state = self.values.get ( labels )
+            if state is None or not state[ 1 ]:
+                return None
+            bucket_counts, count = list ( state[ 0 ] ), state[ 1 ]
+
+        rank = percent / 100.0 * count
+        cumulative_count = 0
+        lower_bound = 0.0
+        for upper_bound, bucket_count in zip ( self.buckets, bucket_counts ):
+            if bucket_count and cumulative_count + bucket_count >= rank:
+                return lower_bound + (upper_bound - lower_bound) * (rank - cumulative_count) / bucket_count
+            cumulative_count += bucket_count
+            lower_bound = upper_bound
+
+        # the percentile is beyond the last finite bucket
+        return lower_bound
+
+    def get_samples ( self ):
+        samples = [ ]
+        with self.mutex:
+            for labels, (bucket_counts, count, total) in sorted ( self.values.items ( ) ):
+                label_dict = dict ( zip ( self.label_names, labels ) )
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip ( self.buckets + (float ( "inf" ),), bucket_counts ):
+                    cumulative_count += bucket_count
+                    le = "+Inf" if upper_bound == float ( "inf" ) else repr ( upper_bound )
+                    samples.append ( ("_bucket", dict ( label_dict, le=le ), cumulative_count) )
+                samples.append ( ("_count", label_dict, count) )
+                samples.append ( ("_sum", label_dict, total) )
+        return samples
+
+    def get_snapshot ( self ):
+        with self.mutex:
+            return { ",".join ( labels ) or "all": { "count": count, "sum": total,
+                                                     "buckets": dict ( zip ( [ repr ( b ) for b in self.buckets ] +
+                                                                             [ "+Inf" ], bucket_counts ) ) }
+                     for labels, (bucket_counts, count, total) in sorted ( self.values.items ( ) ) }
+
+
+class MetricsRegistry:
+    """
+    Description: MetricsRegistry class holds the metrics of the application, and renders them in the Prometheus \
+                 text exposition format or as a JSON snapshot.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self ):
+        # metrics in registration order
+        self.metrics = [ ]
+
+    def register ( self, metric ):
+        """
+        :param metric: Metric
+        :return: metric
+        """
+        self.metrics.append ( metric )
+        return metric
+
+    @staticmethod
+    def format_labels ( label_dict ):
+        """
+        :param label_dict: dict of label values
+        :return: Prometheus label set (str, e.g; '{status="200"}')
+        """
+        if not label_dict:
+            return ""
+
+        return "{" + ",".join ( '{0}="{1}"'.format ( name, str ( value ).replace ( "\\", "\\\\" ).replace (
+            '"', '\\"' ).replace ( "\n", "\\n" ) ) for name, value in label_dict.items ( ) ) + "}"
+
+    def render_prometheus ( self ):
+        """
+        :return: metrics in the Prometheus text exposition format (str)
+        """
+        lines = [ ]
+        for metric in self.metrics:
+            lines.append ( "# HELP {0} {1}".format ( metric.name, metric.help_text ) )
+            lines.append ( "# TYPE {0} {1}".format ( metric.name, metric.TYPE ) )
+            for suffix, label_dict, value in metric.get_samples ( ):
+                lines.append ( "{0}{1}{2} {3}".format ( metric.name, suffix, self.format_labels ( label_dict ),
+                                                        value ) )
+
+        return "\n".join ( lines ) + "\n"
+
+    def get_snapshot ( self ):
+        """
+        :return: JSON serializable dict mapping the name of every metric to its value
+        """
+        snapshot = { "timestamp": time.time ( ) }
+        for metric in self.metrics:
+            snapshot[ metric.name ] = metric.get_snapshot ( )
+
+        return snapshot
+
+
+class AppMetrics:
+    """
+    Description: AppMetrics class defines the metrics of the application: progress of the parser and of the \
+                 validators, of the downloads, depth of the queues between them, number of active workers and \
+                 latency of every stage, so that a bottleneck can be spotted while a job is running.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, latency_buckets=LATENCY_BUCKETS ):
+        self.registry = MetricsRegistry ( )
+        register = self.registry.register
+
+        self.urls_read = register ( Counter ( "image_downloader_urls_read_total",
+                                              "Lines read from the plaintext file." ) )
+        self.urls_validated = register ( Counter ( "image_downloader_urls_validated_total",
+                                                   "URLs found serviceable by the validators." ) )
+        self.urls_rejected = register ( Counter ( "image_downloader_urls_rejected_total",
+                                                  "URLs found not serviceable by the validators." ) )
+        self.downloads = register ( Counter ( "image_downloader_downloads_total",
+                                              "Finished downloads by result (downloaded, failed or retried).",
+                                              ("result",) ) )
+        self.bytes_downloaded = register ( Counter ( "image_downloader_bytes_downloaded_total",
+                                                     "Bytes of the saved images." ) )
+        self.http_responses = register ( Counter ( "image_downloader_http_responses_total",
+                                                   "HTTP responses to download requests by status code.",
+                                                   ("status",) ) )
+        self.errors = register ( Counter ( "image_downloader_errors_total",
+                                           "Transport errors (e.g; timeouts, connection resets) by stage.",
+                                           ("stage",) ) )
+        self.queue_depth = register ( Gauge ( "image_downloader_queue_depth",
+                                              "Items waiting in a queue of the pipeline.", ("queue",) ) )
+        self.active_workers = register ( Gauge ( "image_downloader_active_workers",
+                                                 "Validations or downloads in progress by stage.", ("stage",) ) )
+        self.stage_latency = register ( Histogram ( "image_downloader_stage_latency_seconds",
+                                                    "Latency of the validation or the download of an URL.",
+                                                    ("stage",), latency_buckets ) )
+
+
+class MetricsRequestHandler ( BaseHTTPRequestHandler ):
+    """
+    Description: MetricsRequestHandler class serves the metrics in the Prometheus text format on "/metrics".
+
+    Version: 1.0
+    Comment:
+    """
+
+    def do_GET ( self ):
+        if self.path.split ( "?" )[ 0 ] not in ("/metrics", "/"):
+            self.send_error ( 404 )
+            return
+
+        body = self.server.registry.render_prometheus ( ).encode ( 'utf-8' )
+        self.send_response ( 200 )
+        self.send_header ( "Content-Type", "text/plain; version=0.0.4; charset=utf-8" )
+        self.send_header ( "Content-Length", str ( len ( body ) ) )
+        self.end_headers ( )
+        self.wfile.write ( body )
+
+    def log_message ( self, *args ):
+        # scrapes are not logged
+        pass
+
+
+class MetricsExporter:
+    """
+    Description: MetricsExporter class exposes the metrics of a registry while the job is running: on a local \
+                 HTTP port in the Prometheus text format (scraped on "/metrics"), and/or as a JSON snapshot file \
+                 rewritten every "snapshot_interval" seconds (and once more when the exporter is closed).
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, registry, port=None, snapshot_path=None, snapshot_interval=10.0 ):
+        self.logger = logging.getLogger ( __name__ )
+        self.registry = registry
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+
+        self.http_server = None
+        if port is not None:
+            self.http_server = ThreadingHTTPServer ( ("127.0.0.1", port), MetricsRequestHandler )
+            self.http_server.daemon_threads = True
+            self.http_server.registry = registry
+            threading.Thread ( target=self.http_server.serve_forever, daemon=True ).start ( )
+
+        self.stop_event = threading.Event ( )
+        self.snapshot_thread = None
+        if snapshot_path:
+            self.snapshot_thread = threading.Thread ( target=self.thread_snapshot_writer, daemon=True )
+            self.snapshot_thread.start ( )
+
+    def get_port ( self ):
+        """
+        :return: port of the HTTP endpoint (int, e.g; if 0 was configured) / None
+        """
+        return self.http_server.server_address[ 1 ] if self.http_server else None
+
+    def write_snapshot ( self ):
+        """
+        Writes the JSON snapshot. The file is replaced atomically, so a reader never sees a partial snapshot.
+        :return:
+        """
+        temp_path = self.snapshot_path + ".tmp"
+        try:
+            with open ( temp_path, mode='w', encoding='utf-8' ) as fd:
+                json.dump ( self.registry.get_snapshot ( ), fd, indent=2, sort_keys=True )
+            os.replace ( temp_path, self.snapshot_path )
+        except OSError as err:
+            self.logger.info ( "Metrics - An exception of type {0} occurred. Arguments:\n{1!r}".format (
+                type ( err ).__name__, err.args ) )
+
+    def thread_snapshot_writer ( self ):
+        """
+        This function details the functionality of the snapshot writer thread
+        :return:
+        """
+        while not self.stop_event.wait ( self.snapshot_interval ):
+            self.write_snapshot ( )
+
+    def close ( self ):
+        """
+        Writes the last snapshot and stops the exporter
+        :return:
+        """
+        if self.snapshot_thread:
+            self.stop_event.set ( )
+            self.snapshot_thread.join ( )
+            self.write_snapshot ( )
+
+        if self.http_server:
+            self.http_server.shutdown ( )
+            self.http_server.server_close ( )
+
+
+# AppMetrics shared by all the components of the application (created on its first use)
+shared_metrics = None
+shared_metrics_mutex = threading.Lock ( )
+
+# MetricsExporter of the shared AppMetrics, if METRICS_PORT or METRICS_SNAPSHOT_PATH is configured
+shared_exporter = None
+
+
+def get_app_metrics ( ):
+    """
+    Returns the AppMetrics shared by FileParser and Downloader. It is a thread safe function.
+    :return: AppMetrics
+    """
+    global shared_metrics
+
+    with shared_metrics_mutex:
+        if shared_metrics is None:
+            shared_metrics = AppMetrics ( )
+
+        return shared_metrics
+
+
+def reset_app_metrics ( latency_buckets=LATENCY_BUCKETS ):
+    """
+    Replaces the shared AppMetrics by new ones (e.g; between the runs of a benchmark). Components created before \
+    keep updating the former ones.
+    :param latency_buckets: upper bounds (seconds) of the buckets of the latency histogram
+    :return: AppMetrics
+    """
+    global shared_metrics
+
+    with shared_metrics_mutex:
+        shared_metrics = AppMetrics ( latency_buckets )
+        return shared_metrics
+
+
+def start_metrics_exporter ( ):
+    """
+    Starts exposing the shared AppMetrics, as per cfg.py
+    :return: MetricsExporter / None (If neither METRICS_PORT nor METRICS_SNAPSHOT_PATH is configured)
+    """
+    global shared_exporter
+
+    if cfg.APP_CFG.get ( METRICS_PORT ) is None and not cfg.APP_CFG.get ( METRICS_SNAPSHOT_PATH ):
+        return None
+
+    shared_exporter = MetricsExporter ( get_app_metrics ( ).registry, cfg.APP_CFG.get ( METRICS_PORT ),
+                                        cfg.APP_CFG.get ( METRICS_SNAPSHOT_PATH ),
+                                        cfg.APP_CFG.get ( METRICS_SNAPSHOT_INTERVAL ) or 10.0 )
+    return shared_exporter
+
+
+def close_metrics_exporter ( ):
+    """
+    Stops exposing the shared AppMetrics, once their last snapshot has been written
+    :return:
+    """
+    global shared_exporter
+
+    if shared_exporter is not None:
+        shared_exporter.close ( )
+        shared_exporter = None
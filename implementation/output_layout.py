@@ -0,0 +1,80 @@
+import hashlib
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
+# Supported layouts of IMAGE_SAVE_DIR (see OUTPUT_LAYOUT in cfg.py)
+FLAT = "flat"  # every image directly in IMAGE_SAVE_DIR
+HASH = "hash"  # e.g; "3f/a2/tiger.png", from the hash of the url
+HOST = "host"  # e.g; "www.example.com/tiger.png"
+DATE = "date"  # e.g; "2018/03/25/tiger.png", from the (UTC) date of the download
+
+OUTPUT_LAYOUTS = (FLAT, HASH, HOST, DATE)
+
+
+class OutputLayout:
+    """
+    Description: OutputLayout class places the downloaded images into nested shard directories of IMAGE_SAVE_DIR, \
+                 so that no directory grows to millions of entries (which slows down file lookups, listings and \
+                 backups). The shard of an image is derived from the hash of its url (evenly spread, 256 directories \
+                 per level), from its host or from the date of its download. Shard directories are created on their \
+                 first use only, and remembered, so a shard costs a single mkdir per run.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # characters which are not allowed into a shard directory name derived from a host
+    UNSAFE_CHARS = re.compile ( r"[^a-z0-9._-]" )
+
+    def __init__ ( self, save_dir, layout=FLAT, hash_levels=2 ):
+        # root directory of the layout
+        self.save_dir = save_dir
+
+        # one of OUTPUT_LAYOUTS
+        self.layout = layout
+
+        # number of nested directories of HASH layout
+        self.hash_levels = hash_levels
+
+        # shard directories known to exist
+        self.created_dirs = set ( )
+
+    def get_shard_dir ( self, url ):
+        """
+        Finds the shard directory of an url, relative to save_dir
+        :param url: string
+        :return: relative directory path (str, e.g; "3f/a2"), empty for FLAT layout
+        """
+        if self.layout == HASH:
+            url_hash = hashlib.md5 ( url.encode ( 'utf-8', 'surrogatepass' ) ).hexdigest ( )
+            return "/".join ( url_hash[ 2 * i:2 * i + 2 ] for i in range ( self.hash_levels ) )
+
+        if self.layout == HOST:
+            try:
+                host = (urlsplit ( url ).hostname or "").lower ( )
+            except ValueError:
+                host = ""
+            return self.UNSAFE_CHARS.sub ( "_", host ).strip ( "." ) or "_no_host"
+
+        if self.layout == DATE:
+            return time.strftime ( "%Y/%m/%d", time.gmtime ( ) )
+
+        return ""
+
+    def make_shard_dir ( self, url ):
+        """
+        Finds the shard directory of an url and creates it, if it has not been created yet. It is a thread safe \
+        function.
+        :param url: string
+        :return: relative directory path (str)
+        """
+        shard_dir = self.get_shard_dir ( url )
+
+        # os.makedirs tolerates a directory created meanwhile by another thread
+        if shard_dir and shard_dir not in self.created_dirs:
+            os.makedirs ( os.path.join ( self.save_dir, shard_dir ), exist_ok=True )
+            self.created_dirs.add ( shard_dir )
+
+        return shard_dir
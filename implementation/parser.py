@@ -1,18 +1,34 @@
 import logging
 import queue
 import threading
+import time
 
 import requests
 
 import cfg
 from .app_constants import *
+from .dns_cache import get_dns_cache
+from .file_sink import is_size_allowed
+from .host_scheduler import HostScheduler
+from .http_session import get_http_session_pool, get_request_timing, start_request_timing, stop_request_timing
+from .journal import get_job_journal, PENDING, VALIDATED, DOWNLOADED, FAILED
+from .manifest import get_result_manifest, new_manifest_entry, finish_manifest_entry, REJECTED, RETRIED
+from .media_type import is_image_content_type
+from .metrics import get_app_metrics
+from .retry import RetryScheduler, get_retry_error
+from .sharding import get_byte_range, get_url_shard, BYTE_RANGE
+from .url_source import UrlSource
+from .url_filter import BloomFilter, normalize_url
+from .url_item import UrlItem
 
 
 class FileParser:
     """
     Description: FileParser class contains methods which collectively work together to parse a document. \
                  This document contains image URLs, one per line. FileParser parses the document and put \
-                 the URLs into a queue which is consumed by downloader threads.
+                 the URLs into a queue which is consumed by downloader threads. The parser thread reads the \
+                 document and a pool of validator threads verifies the URLs concurrently, so that a slow or dead \
+                 host does not hold up the validation of the following URLs.
 
     Version: 1.0
     Comment:
@@ -21,8 +37,10 @@ class FileParser:
     def __init__ ( self, url_fd ):
         self.logger = logging.getLogger ( __name__ )
 
-        # File descriptor to the file containing urls (provided by user through command line argument)
+        # File descriptor to the file containing urls (provided by user through command line argument). It is read \
+        # through url_source (e.g; decompressed), and never reopened, so it can be the standard input.
         self.url_fd = url_fd
+        self.url_source = UrlSource ( url_fd, cfg.APP_CFG.get ( INPUT_MMAP_MIN_SIZE ) or 64 * 1024 * 1024 )
 
         # Name to the file containing urls (provided by user through command line argument)
         self.url_fname = self.url_fd.name
@@ -32,7 +50,56 @@ class FileParser:
 
         # this queue holds only serviceable urls which are consumed by downloader threads
         # FileParser is the producer of urls in this queue, while Downloader is consumer
-        self.url_queue = queue.Queue ( maxsize=50 )
+        if cfg.APP_CFG.get ( URL_SCHEDULER ) == "per_host":
+            self.url_queue = HostScheduler (
+                maxsize=cfg.APP_CFG.get ( SCHEDULER_MAX_QUEUED ) or 1000,
+                max_in_flight_per_host=cfg.APP_CFG.get ( HOST_MAX_IN_FLIGHT ) or 2,
+                min_interval=cfg.APP_CFG.get ( HOST_MIN_INTERVAL ) or 0
+            )
+        else:
+            self.url_queue = queue.Queue ( maxsize=50 )
+
+        # pooled keep-alive HTTP sessions, shared with Downloader
+        self.session_pool = get_http_session_pool ( )
+
+        # journal recording the state of every url, if JOURNAL_PATH is configured
+        self.journal = get_job_journal ( )
+
+        # cache of the resolved hosts, shared with Downloader, if DNS_CACHE_TTL is configured. Hosts of the urls \
+        # read from the document are resolved ahead of their validation and download (see DNS_PREFETCH_THREADS).
+        self.dns_cache = get_dns_cache ( )
+
+        # this queue holds the urls read from the document which are consumed by validator threads
+        # file parser thread is the producer of urls in this queue, while validator threads are consumers
+        self.line_queue = queue.Queue ( maxsize=100 )
+
+        # per-url records of the results, shared with Downloader, if MANIFEST_PATH is configured. FileParser \
+        # records the urls rejected by their validation.
+        self.manifest = get_result_manifest ( )
+
+        # metrics shared with Downloader. The depths of the queues are read when the metrics are collected.
+        self.metrics = get_app_metrics ( )
+        self.metrics.queue_depth.set_function ( self.url_queue.qsize, labels=("url_queue",) )
+        self.metrics.queue_depth.set_function ( self.line_queue.qsize, labels=("line_queue",) )
+
+        # Number of validator threads
+        self.NUM_VALIDATOR_THREADS = cfg.APP_CFG.get ( NUM_VALIDATOR_THREADS ) or 4
+
+        # validator_thread_list contains validator thread instances which are created and started \
+        # by parse_image_url_file function
+        self.validator_thread_list = [ ]
+
+        # puts the urls whose validation failed for a transient reason back into line_queue after a backoff delay \
+        # (see RETRY_POLICY)
+        self.retry_scheduler = None
+        if cfg.APP_CFG.get ( RETRY_POLICY ):
+            self.retry_scheduler = RetryScheduler ( self.line_queue, cfg.APP_CFG[ RETRY_POLICY ] )
+
+        # whether or not the failure of the validation in progress of a validator thread is worth a retry
+        self.validation_state = threading.local ( )
+
+        # number of lines read from the document (from the shard of this run, with SHARD_COUNT)
+        self.num_urls = 0
 
         # file parser thread
         self.parser_thread = threading.Thread ( target=self.parse_image_url_file )
@@ -59,16 +126,11 @@ class FileParser:
             (codecs.BOM_UTF16_LE, "UTF-16-LE"),
         )
 
-        data = self.url_fd.read ( 4 )  # reading 4 bytes from the beginning of the file
+        data = self.url_source.peek ( 4 )  # peeking 4 bytes from the beginning of the (decompressed) file
         for bom, encoding in BOMS:
             if data.startswith ( bom ):
-                self.url_fd.close ( )
-                self.url_fd = None
                 return encoding
 
-        self.url_fd.close ( )
-        self.url_fd = None
-
         # For most plaintext programs, UTF-8 is the default encoding signature which python calls UTF-8-SIG
         # Reference: https://docs.python.org/2/library/codecs.html
         return "UTF-8-SIG"
@@ -84,14 +146,30 @@ class FileParser:
         :param reattempt_count: integer (Number of reattempts to make if the request times out)
         :return: boolean (If the url is serviceable, it returns True, otherwise False)
         """
+        return self.get_serviceable_url_item ( url, reattempt_count ) is not None
+
+    def get_serviceable_url_item ( self, url, reattempt_count=cfg.APP_CFG.get ( MAX_DOWNLOAD_REATTEMPTS ) ):
+        """
+        Verifies whether or not, the url is serviceable (see is_url_serviceable) and keeps the meta-information \
+        of the resource (size, support of byte ranges) which Downloader uses to plan its download.
+
+        :param url: string
+        :param reattempt_count: integer (Number of reattempts to make if the request times out)
+        :return: UrlItem (If the url is serviceable) / None
+        """
+        timing = get_request_timing ( )
+        if timing is not None:
+            timing.start_request ( )
+
         try:
-            response = requests.head (
+            response = self.session_pool.head (
                 url,
                 allow_redirects=True,
                 stream=False,
                 timeout=cfg.APP_CFG[ URL_TIMEOUT ],
                 proxies=cfg.APP_CFG[ SYSTEM_PROXY ]
             )
+            self.note_validation_response ( response )
 
             # Raises stored HTTPError, if one occurred.
             response.raise_for_status ( )
@@ -99,16 +177,16 @@ class FileParser:
 
         # Reference: http://docs.python-requests.org/en/master/api/#exceptions
         except requests.exceptions.Timeout as t_err:  # Maybe set up for a retry, or continue in a retry loop
-            self.logger.info (
-                "For URL: {0} - An exception of type {1} occurred. Arguments:\n{2!r}".format ( url,
-                                                                                               type ( t_err ).__name__,
-                                                                                               t_err.args ) )
+            self.note_validation_error ( t_err )
+            self.logger.info ( "For URL: %s - An exception of type %s occurred. Arguments:\n%r", url,
+                               type ( t_err ).__name__, t_err.args )
 
             if not reattempt_count:
-                self.logger.debug ( "URL {} has not been downloaded.".format ( url ) )
-                return False
+                self.logger.debug ( "URL %s has not been downloaded.", url )
+                self.validation_state.retry_error = get_retry_error ( t_err )
+                return None
 
-            return self.is_url_serviceable ( url, reattempt_count - 1 )
+            return self.get_serviceable_url_item ( url, reattempt_count - 1 )
 
         except (requests.exceptions.ConnectionError,  # connection-related errors
                 requests.exceptions.HTTPError,  # 401 Unauthorized
@@ -116,25 +194,58 @@ class FileParser:
                 requests.exceptions.TooManyRedirects,  # request exceeds the configured number of max redirections
                 requests.exceptions.RequestException  # Mother of all requests exceptions. it's doomsday :D
                 ) as err:
-            self.logger.info (
-                "For URL: {0} - An exception of type {1} occurred. Arguments:\n{2!r}".format ( url,
-                                                                                               type ( err ).__name__,
-                                                                                               err.args ) )
-
-            self.logger.debug ( "URL {} is not serviceable.".format ( url ) )
-            return False
-
-        content_type = response.headers.get ( 'content-type' )
-        if not content_type: return False
+            self.note_validation_error ( err )
+            self.logger.info ( "For URL: %s - An exception of type %s occurred. Arguments:\n%r", url,
+                               type ( err ).__name__, err.args )
+
+            self.logger.debug ( "URL %s is not serviceable.", url )
+            self.validation_state.retry_error = get_retry_error ( err )
+            return None
+
+        # Verify download resource is an image. With IMAGE_SNIFFING, a resource whose type is not declared is \
+        # validated by its content, once downloaded.
+        if is_image_content_type ( response.headers.get ( 'content-type' ),
+                                   allow_generic=cfg.APP_CFG.get ( IMAGE_SNIFFING ) ):
+            url_item = UrlItem.from_headers ( url, response.headers )
+
+            # Verify the announced size is within the size limits. The size of a compressed resource is only \
+            # known once it is downloaded.
+            if response.headers.get ( 'content-encoding', 'identity' ).lower ( ) != 'identity' or \
+                    is_size_allowed ( url_item.content_length, cfg.APP_CFG.get ( MIN_IMAGE_SIZE ) or 0,
+                                      cfg.APP_CFG.get ( MAX_IMAGE_SIZE ) ):
+                return url_item
+
+            self.logger.debug ( "URL %s is not serviceable. Its size of %s bytes is out of the size limits.", url,
+                                url_item.content_length )
+            return None
+
+        self.logger.debug ( "URL %s is not serviceable.", url )
+        return None
+
+    def note_validation_response ( self, response ):
+        """
+        Notes the response of the validation in progress of the calling thread, into its manifest record
+        :param response: requests.Response
+        :return:
+        """
+        entry = getattr ( self.validation_state, "manifest_entry", None )
+        if entry is None:
+            return
 
-        # Verify download resource is an image
-        if 'image' in content_type.lower ( ):
-            return True
-        if 'png' in content_type.lower ( ):
-            return True
+        entry[ "final_url" ] = response.url
+        entry[ "status" ] = response.status_code
+        entry[ "content_type" ] = response.headers.get ( 'content-type' )
+        get_request_timing ( ).note_headers ( )
 
-        self.logger.debug ( "URL {} is not serviceable.".format ( url ) )
-        return False
+    def note_validation_error ( self, err ):
+        """
+        Notes the exception which made the validation in progress of the calling thread fail, into its manifest record
+        :param err: Exception
+        :return:
+        """
+        entry = getattr ( self.validation_state, "manifest_entry", None )
+        if entry is not None:
+            entry[ "error" ] = type ( err ).__name__
 
     def start_parser_thread ( self ):
         """
@@ -145,23 +256,287 @@ class FileParser:
 
     def wait_for_parser_thread ( self ):
         """
-        Waits for file parser thread
+        Waits for file parser thread and closes the plaintext file
         :return:
         """
         self.parser_thread.join ( )
+        self.url_source.close ( )
+
+    def start_validator_threads ( self ):
+        """
+        Creates and starts the validator threads
+        :return:
+        """
+        self.validator_thread_list = [ ]
+        for _ in range ( self.NUM_VALIDATOR_THREADS ):
+            validator_th_inst = threading.Thread ( target=self.thread_validator )
+            self.validator_thread_list.append ( validator_th_inst )
+            validator_th_inst.start ( )
+
+    def wait_for_validator_threads ( self ):
+        """
+        Waits for and releases resources held by validator threads
+        :return:
+        """
+        for validator_th_inst in self.validator_thread_list:
+            validator_th_inst.join ( )
+
+    def thread_validator ( self ):
+        """
+        This function details the functionality of a validator thread. Each thread fetches urls from \
+        self.line_queue and puts the serviceable ones into self.url_queue. The order of the urls in \
+        self.url_queue therefore might differ from their order in the document.
+        :return:
+        """
+        while (True):
+            url = self.line_queue.get ( block=True, timeout=None )
+
+            # exit point of a thread (Use "EXIT" to exit and then put it back for other threads to use (and exit)
+            # "EXIT" is held back by retry_scheduler while retries are pending, as they are put back into line_queue.
+            if url == "EXIT":
+                if self.retry_scheduler and not self.retry_scheduler.handle_exit ( ):
+                    continue
+                self.line_queue.put ( item="EXIT", block=True, timeout=None )
+                break
+
+            if not self.retry_scheduler:
+                self.record_validation_result ( url, self.validate_url ( url ) )
+                continue
+
+            # with RETRY_POLICY, a timed out url is retried later by retry_scheduler instead of right away. \
+            # The url is accounted as finished even on an unexpected error, so that "EXIT" is not held back forever.
+            self.retry_scheduler.task_started ( )
+            is_retried = False
+            try:
+                self.validation_state.retry_error = None
+
+                url_item = self.validate_url ( url, reattempt_count=0 )
+                retry_error = self.validation_state.retry_error
+                is_retried = url_item is None and retry_error is not None and \
+                             self.retry_scheduler.schedule ( url, *retry_error )
+
+                if not is_retried:
+                    self.record_validation_result ( url, url_item )
+                else:
+                    self.record_manifest_entry ( RETRIED )
+            except Exception:
+                self.logger.exception ( "For URL: %s - An unexpected exception occurred.", url )
+            finally:
+                self.retry_scheduler.task_finished ( url, is_final=not is_retried )
+
+    def validate_url ( self, url, *args, **kwargs ):
+        """
+        Runs get_serviceable_url_item, and records its latency and the number of validations in progress into \
+        the metrics. With the manifest, it also starts the manifest record of the url.
+        :param url: string
+        :return: UrlItem (If the url is serviceable) / None
+        """
+        if self.manifest:
+            self.validation_state.manifest_entry = new_manifest_entry ( url )
+            start_request_timing ( ).num_delayed_retries = \
+                self.retry_scheduler.get_retry_count ( url ) if self.retry_scheduler else 0
+
+        self.metrics.active_workers.inc ( labels=("validation",) )
+        start_time = time.monotonic ( )
+        try:
+            return self.get_serviceable_url_item ( url, *args, **kwargs )
+        finally:
+            self.metrics.stage_latency.observe ( time.monotonic ( ) - start_time, labels=("validation",) )
+            self.metrics.active_workers.dec ( labels=("validation",) )
+
+    def record_validation_result ( self, url, url_item ):
+        """
+        Puts a serviceable url into self.url_queue and records the result of its validation into the journal, \
+        if it is configured
+        :param url: string
+        :param url_item: UrlItem (If the url is serviceable) / None
+        :return:
+        """
+        if url_item is not None:
+            self.metrics.urls_validated.inc ( )
+            if self.journal:
+                self.journal.record ( url, VALIDATED )
+            self.url_queue.put ( item=url_item, block=True, timeout=None )
+            return
+
+        self.metrics.urls_rejected.inc ( )
+        if self.journal:
+            self.journal.record ( url, FAILED )
+
+        self.record_manifest_entry ( REJECTED )
+
+    def record_manifest_entry ( self, result ):
+        """
+        Records the validation in progress of the calling thread into the manifest, if it is configured
+        :param result: REJECTED / RETRIED
+        :return:
+        """
+        entry = getattr ( self.validation_state, "manifest_entry", None )
+        if entry is not None:
+            self.manifest.record ( finish_manifest_entry ( entry, result, stop_request_timing ( ) ) )
+            self.validation_state.manifest_entry = None
+
+    def get_journal_state ( self, url ):
+        """
+        Finds how an url has to be processed by a journaled job. In a resumed job (see JOURNAL_RESUME), \
+        finished urls (downloaded or failed) are skipped and validated urls are only downloaded.
+        Urls which have to be processed from scratch are recorded as pending.
+        :param url: string
+        :return: PENDING (process from scratch) / VALIDATED (only download) / None (skip)
+        """
+        if cfg.APP_CFG.get ( JOURNAL_RESUME ):
+            url_state = self.journal.get_state ( url )
+
+            if url_state in (DOWNLOADED, FAILED):
+                self.logger.debug ( "URL %s has already been processed.", url )
+                return None
+
+            if url_state == VALIDATED:
+                return VALIDATED
+
+        self.journal.record ( url, PENDING )
+        return PENDING
+
+    def is_url_unseen ( self, url, seen_urls ):
+        """
+        Verifies whether or not, a normalized url has not been seen before, and records it as seen.
+        :param url: string (normalized url)
+        :param seen_urls: BloomFilter of the normalized urls seen so far
+        :return: boolean (If the url has not been seen before, it returns True, otherwise False)
+        """
+        if not url:
+            return False
+
+        if not seen_urls.add ( url ):
+            self.logger.debug ( "URL %s is a duplicate.", url )
+            return False
+
+        if seen_urls.count == seen_urls.capacity + 1:
+            self.logger.info ( "{0}: {1}".format ( "Warning", "URL_DEDUP_MEMORY_MB is exhausted. Beyond " +
+                                                   "{} unique urls, more urls might be skipped ".format (
+                                                       seen_urls.capacity ) +
+                                                   "as duplicates than URL_DEDUP_FP_RATE." ) )
+
+        return True
+
+    def read_input_lines ( self ):
+        """
+        Reads the lines of the plaintext file which belong to the shard of this run (see SHARD_COUNT in cfg.py). \
+        Without sharding, every line is read.
+        A resumed job (see JOURNAL_RESUME) with a checkpoint of the file does not read it again up to the \
+        checkpoint: the unfinished urls recorded before the checkpoint are taken from the journal instead.
+        :return: generator of (line, byte offset of the end of the line / None) tuples (str, int)
+        """
+        num_shards = cfg.APP_CFG.get ( SHARD_COUNT ) or 1
+        shard_index = cfg.APP_CFG.get ( SHARD_INDEX ) or 0
+
+        # byte offsets can only be tracked in a byte oriented encoding
+        is_byte_oriented = self.encoding == "UTF-8-SIG"
+
+        start_offset, end_offset, align = 0, None, False
+        shard_by_hash = num_shards > 1
+
+        # a byte range can only be aligned to line boundaries in a byte oriented and seekable file
+        if num_shards > 1 and cfg.APP_CFG.get ( SHARD_MODE ) == BYTE_RANGE:
+            if is_byte_oriented and self.url_source.is_seekable ( ):
+                start_offset, end_offset = get_byte_range ( self.url_source.file_size, shard_index, num_shards )
+                align, shard_by_hash = True, False
+            else:
+                self.logger.info ( "{0}: {1}".format ( "Warning", "{} cannot be sharded by byte ranges ".format (
+                    self.url_fname ) + "(compressed, not seekable or not UTF-8). It is sharded by url hash instead." ) )
+
+        requeued_urls = set ( )
+        if self.journal and cfg.APP_CFG.get ( JOURNAL_RESUME ) and is_byte_oriented:
+            checkpoint = self.journal.get_checkpoint ( self.url_source.get_key ( ) )
+            if checkpoint is not None and checkpoint >= start_offset:
+                for url in self.journal.get_unfinished_urls ( ):
+                    requeued_urls.add ( url )
+                    yield url + "\n", None
+                start_offset, align = checkpoint, False
+
+        for line_terminated, offset in self.url_source.iter_lines ( self.encoding, start_offset, end_offset, align ):
+            url = line_terminated.rstrip ( '\n' )
+            if shard_by_hash and get_url_shard ( url, num_shards ) != shard_index:
+                continue
+            # read again after the checkpoint, while it has already been taken from the journal
+            if requeued_urls and url in requeued_urls:
+                requeued_urls.discard ( url )
+                continue
+            yield line_terminated, offset
 
     def parse_image_url_file ( self ):
         """
         Parse the file that contains url per line and put it into a queue if the url is serviceable.
+        The urls are validated by validator threads. If URL_VALIDATION is "get", urls are not validated \
+        here (no HEAD request), as Downloader validates them on the download response itself.
         :return:
         """
-        with open ( file=self.url_fname, mode='r', encoding=self.encoding, newline=None ) as fd:
-            for line_terminated in fd:
-                # removing newline from line_terminated
-                url = line_terminated.rstrip ( '\n' )
-
-                if self.is_url_serviceable ( url ):
+        validate_with_head = cfg.APP_CFG.get ( URL_VALIDATION ) != "get"
+
+        # with URL_DEDUP, urls are normalized and the ones seen before are skipped
+        seen_urls = None
+        if cfg.APP_CFG.get ( URL_DEDUP ):
+            seen_urls = BloomFilter ( cfg.APP_CFG[ URL_DEDUP_MEMORY_MB ] * 1024 * 1024, cfg.APP_CFG[ URL_DEDUP_FP_RATE ] )
+
+        if validate_with_head:
+            self.start_validator_threads ( )
+
+        # with the journal, a checkpoint of the file is recorded every INPUT_CHECKPOINT_INTERVAL lines
+        checkpoint_interval = cfg.APP_CFG.get ( INPUT_CHECKPOINT_INTERVAL ) or 0
+        checkpoint_offset = None
+
+        for line_terminated, offset in self.read_input_lines ( ):
+            # all the lines before checkpoint_offset have been recorded into the journal
+            if checkpoint_interval and checkpoint_offset is not None and self.num_urls % checkpoint_interval == 0:
+                self.journal.record_checkpoint ( self.url_source.get_key ( ), checkpoint_offset )
+
+            if self.journal and offset is not None:
+                checkpoint_offset = offset
+
+            # removing newline from line_terminated
+            url = line_terminated.rstrip ( '\n' )
+            self.num_urls += 1
+            self.metrics.urls_read.inc ( )
+
+            if seen_urls is not None:
+                url = normalize_url ( url )
+                if not self.is_url_unseen ( url, seen_urls ):
+                    continue
+
+            if self.journal and url.strip ( ):
+                url_state = self.get_journal_state ( url )
+                if url_state is None:
+                    continue
+
+                if url_state == VALIDATED:
+                    if self.dns_cache:
+                        self.dns_cache.prefetch ( url )
                     self.url_queue.put ( item=url, block=True, timeout=None )
+                    continue
+
+            if self.dns_cache:
+                self.dns_cache.prefetch ( url )
+
+            if validate_with_head:
+                self.line_queue.put ( item=url, block=True, timeout=None )
+
+            elif url.strip ( ):
+                self.url_queue.put ( item=url, block=True, timeout=None )
+
+        if checkpoint_interval and checkpoint_offset is not None:
+            self.journal.record_checkpoint ( self.url_source.get_key ( ), checkpoint_offset )
+
+        if validate_with_head:
+            # "EXIT" will be used by validator threads to terminate themselves. Downloader threads must not get \
+            # "EXIT" before every validator thread has put its last serviceable url into self.url_queue.
+            self.line_queue.put ( item="EXIT", block=True, timeout=None )
+            self.wait_for_validator_threads ( )
+
+            if self.retry_scheduler:
+                self.retry_scheduler.close ( )
+
+            # leaving self.line_queue empty, as parse_image_url_file might be run again
+            self.line_queue.get ( block=True, timeout=None )
 
         # "EXIT" will be used by downloader threads to terminate themselves
         self.url_queue.put ( item="EXIT", block=True, timeout=None )
@@ -0,0 +1,276 @@
+import email.utils
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+import requests
+
+# Classes of the errors which are worth a retry (see RETRY_POLICY in cfg.py)
+TIMEOUT = "timeout"  # connect or read timeout
+CONNECTION = "connection"  # connection refused or reset, incomplete transfer
+THROTTLED = "throttled"  # 429 Too Many Requests
+SERVER_ERROR = "server_error"  # 500, 502, 503, 504, ...
+
+ERROR_CLASSES = (TIMEOUT, CONNECTION, THROTTLED, SERVER_ERROR)
+
+# Recommended retry policy, activated when RETRY_POLICY is misconfigured in cfg.py
+DEFAULT_RETRY_POLICY = {
+    TIMEOUT: { "max_retries": 2, "base_delay": 1.0, "max_delay": 30.0 },
+    CONNECTION: { "max_retries": 2, "base_delay": 1.0, "max_delay": 30.0 },
+    THROTTLED: { "max_retries": 3, "base_delay": 5.0, "max_delay": 300.0 },
+    SERVER_ERROR: { "max_retries": 2, "base_delay": 2.0, "max_delay": 60.0 },
+}
+
+
+def classify_status ( status_code ):
+    """
+    Finds the error class of an HTTP status code
+    :param status_code: int
+    :return: THROTTLED / SERVER_ERROR / None (If the status is not worth a retry)
+    """
+    if status_code == 429:
+        return THROTTLED
+
+    # 501 Not Implemented and 505 HTTP Version Not Supported will not be fixed by waiting
+    if 500 <= status_code < 600 and status_code not in (501, 505):
+        return SERVER_ERROR
+
+    return None
+
+
+def parse_retry_after ( value ):
+    """
+    Parses the value of a Retry-After header, which is either a number of seconds or an HTTP date
+    :param value: str / None
+    :return: number of seconds to wait (float) / None
+    """
+    if not value:
+        return None
+
+    value = value.strip ( )
+    if value.isdigit ( ):
+        return float ( value )
+
+    try:
+        retry_date = email.utils.parsedate_to_datetime ( value )
+    except (TypeError, ValueError):
+        return None
+
+    return max ( 0.0, retry_date.timestamp ( ) - time.time ( ) )
+
+
+def get_retry_error ( err ):
+    """
+    Finds whether or not, a failed request of the requests package is worth a retry
+    :param err: requests.exceptions.RequestException
+    :return: tuple of (error class, seconds asked by Retry-After header or None) / None (If not worth a retry)
+    """
+    if isinstance ( err, requests.exceptions.Timeout ):
+        return TIMEOUT, None
+
+    response = getattr ( err, "response", None )
+    if isinstance ( err, requests.exceptions.HTTPError ) and response is not None:
+        error_class = classify_status ( response.status_code )
+        if error_class is None:
+            return None
+        return error_class, parse_retry_after ( response.headers.get ( 'retry-after' ) )
+
+    if isinstance ( err, requests.exceptions.ConnectionError ):
+        # a host name which cannot be resolved will not be resolved by waiting
+        if any ( reason in repr ( err.args ) for reason in ("NameResolutionError", "Failed to resolve") ):
+            return None
+        return CONNECTION, None
+
+    if isinstance ( err, requests.exceptions.ChunkedEncodingError ):
+        return CONNECTION, None
+
+    return None
+
+
+class RetryScheduler:
+    """
+    Description: RetryScheduler class puts failed urls back into the queue they were consumed from, once their \
+                 backoff delay has elapsed. Waiting urls are kept in a timer heap served by a single timer thread, \
+                 so a consumer thread never sleeps through a backoff and moves on to other urls meanwhile. \
+                 The delay of the n-th retry of an url is drawn in [d/2, d], with d = min(max_delay, base_delay * 2^n) \
+                 of the policy of its error class (exponential backoff with jitter), and is never shorter than \
+                 the delay asked by the server with a Retry-After header.
+
+                 As a retried url comes back after "EXIT" might have been put into the queue, consumers hand "EXIT" \
+                 over to handle_exit: "EXIT" is held back until no url is either being processed or waiting for \
+                 a retry, and consumers report every url they process with task_started / task_finished.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, target_queue, retry_policy ):
+        self.logger = logging.getLogger ( __name__ )
+
+        # queue into which the urls are put back (queue.Queue or HostScheduler)
+        self.target_queue = target_queue
+
+        # maps an error class to a dict of "max_retries", "base_delay" and "max_delay"
+        self.retry_policy = retry_policy
+
+        # (due time, sequence number, url) of the urls waiting for a retry
+        self.timer_heap = [ ]
+        self.sequence = itertools.count ( )
+
+        # number of urls waiting for a retry, including the ones being put back by the timer thread
+        self.num_pending = 0
+
+        # number of urls being processed by the consumers
+        self.num_in_flight = 0
+
+        # maps an url to the number of retries scheduled so far
+        self.retry_counts = { }
+
+        # whether or not "EXIT" is held back
+        self.exit_held = False
+
+        self.timer_thread = None
+        self.closed = False
+
+        self.mutex = threading.Lock ( )
+        self.heap_changed = threading.Condition ( self.mutex )
+
+    def schedule ( self, url, error_class, retry_after=None ):
+        """
+        Schedules the retry of a failed url as per the policy of its error class. It is a thread safe function.
+        :param url: str / UrlItem
+        :param error_class: one of ERROR_CLASSES
+        :param retry_after: number of seconds asked by the server (float) / None
+        :return: True (If a retry has been scheduled) / False (If url must be given up)
+        """
+        policy = self.retry_policy.get ( error_class )
+        if not policy:
+            return False
+
+        with self.mutex:
+            retry_count = self.retry_counts.get ( url, 0 )
+            if retry_count >= policy[ "max_retries" ]:
+                return False
+            self.retry_counts[ url ] = retry_count + 1
+
+            backoff = min ( policy[ "max_delay" ], policy[ "base_delay" ] * (2 ** retry_count) )
+            delay = max ( random.uniform ( backoff / 2, backoff ), retry_after or 0 )
+
+            heapq.heappush ( self.timer_heap, (time.monotonic ( ) + delay, next ( self.sequence ), url) )
+            self.num_pending += 1
+
+            if self.timer_thread is None:
+                self.closed = False
+                self.timer_thread = threading.Thread ( target=self.thread_timer, daemon=True )
+                self.timer_thread.start ( )
+
+            self.heap_changed.notify ( )
+
+        self.logger.debug ( "URL %s will be retried in %.1f seconds (%s, retry %s).", url, delay, error_class,
+                            retry_count + 1 )
+        return True
+
+    def get_retry_count ( self, url ):
+        """
+        Returns the number of retries of an url scheduled so far. It is a thread safe function.
+        :param url: str / UrlItem
+        :return: int
+        """
+        with self.mutex:
+            return self.retry_counts.get ( url, 0 )
+
+    def thread_timer ( self ):
+        """
+        This function details the functionality of the timer thread. It puts the urls back into \
+        self.target_queue once their delay has elapsed, until close is called.
+        :return:
+        """
+        while True:
+            with self.heap_changed:
+                while not self.closed and \
+                        (not self.timer_heap or self.timer_heap[ 0 ][ 0 ] > time.monotonic ( )):
+                    self.heap_changed.wait ( self.timer_heap[ 0 ][ 0 ] - time.monotonic ( ) if self.timer_heap
+                                             else None )
+
+                if self.closed:
+                    return
+
+                _, _, url = heapq.heappop ( self.timer_heap )
+
+            # the queue might be full, so it is not put while holding the lock
+            self.target_queue.put ( item=url, block=True, timeout=None )
+
+            # a consumer might have got url and finished it for good in the meantime, while it was still counted \
+            # as pending. The held back "EXIT" is then released here.
+            with self.mutex:
+                self.num_pending -= 1
+                release_exit = self.pop_held_exit ( )
+
+            if release_exit:
+                self.target_queue.put ( item="EXIT", block=True, timeout=None )
+
+    def pop_held_exit ( self ):
+        """
+        Decides whether or not, the held back "EXIT" is released, as no url is left. Caller must hold self.mutex.
+        :return: True (If "EXIT" has to be put back into self.target_queue) / False
+        """
+        release_exit = self.exit_held and not self.num_in_flight and not self.num_pending
+        if release_exit:
+            self.exit_held = False
+
+        return release_exit
+
+    def task_started ( self ):
+        """
+        Indicates that a consumer has got an url (other than "EXIT") and processes it. It is a thread safe function.
+        :return:
+        """
+        with self.mutex:
+            self.num_in_flight += 1
+
+    def task_finished ( self, url, is_final ):
+        """
+        Indicates that a consumer is done with an url. The held back "EXIT" is released, if no url is left. \
+        It is a thread safe function.
+        :param url: str
+        :param is_final: False (If a retry of url has been scheduled) / True (Otherwise)
+        :return:
+        """
+        with self.mutex:
+            self.num_in_flight -= 1
+            if is_final:
+                self.retry_counts.pop ( url, None )
+
+            release_exit = self.pop_held_exit ( )
+
+        if release_exit:
+            self.target_queue.put ( item="EXIT", block=True, timeout=None )
+
+    def handle_exit ( self ):
+        """
+        Decides what a consumer which got "EXIT" does. It is a thread safe function.
+        :return: True (If consumer exits and puts "EXIT" back as usual) / \
+                 False (If "EXIT" is held back until the pending urls are done. Consumer continues to consume.)
+        """
+        with self.mutex:
+            if not self.num_in_flight and not self.num_pending:
+                return True
+
+            self.exit_held = True
+            return False
+
+    def close ( self ):
+        """
+        Stops the timer thread. Urls still waiting for a retry are dropped.
+        :return:
+        """
+        with self.heap_changed:
+            self.closed = True
+            self.heap_changed.notify ( )
+            timer_thread, self.timer_thread = self.timer_thread, None
+
+        if timer_thread is not None:
+            timer_thread.join ( )
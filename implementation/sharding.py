@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import zlib
+from urllib.parse import urlsplit
+
+# Supported ways of splitting the plaintext file into shards (see SHARD_MODE in cfg.py)
+HASH = "hash"  # an url belongs to shard crc32(host of url) % num_shards
+BYTE_RANGE = "byte_range"  # shard i gets the lines starting into the i-th of num_shards equal byte ranges
+
+SHARD_MODES = (HASH, BYTE_RANGE)
+
+
+def parse_shard_arg ( shard_arg ):
+    """
+    Parses the value of "--shard" command line option
+    :param shard_arg: str (e.g; "2/8" for the third of eight shards)
+    :return: (shard_index, num_shards) tuple of int
+    """
+    shard_index, _, num_shards = shard_arg.partition ( "/" )
+
+    try:
+        shard_index, num_shards = int ( shard_index ), int ( num_shards )
+    except ValueError:
+        raise ValueError ( "shard must be given as INDEX/COUNT, e.g; 0/4" )
+
+    if not 0 <= shard_index < num_shards:
+        raise ValueError ( "shard index must be in range [0, COUNT)" )
+
+    return shard_index, num_shards
+
+
+def get_shard_name ( shard_index, num_shards ):
+    """
+    :param shard_index: int
+    :param num_shards: int
+    :return: name identifying a shard into file and directory names (str, e.g; "shard-2-of-8")
+    """
+    return "shard-{0}-of-{1}".format ( shard_index, num_shards )
+
+
+def get_url_shard ( url, num_shards ):
+    """
+    Finds the shard of an url in HASH mode. The shard is derived from the host of the url, so all the urls of a \
+    host are processed by the same worker, which keeps reusing its connections to the host. crc32 is used instead \
+    of hash(), as the shard of an url must be the same in every worker process.
+    :param url: string
+    :param num_shards: int
+    :return: shard index (int)
+    """
+    try:
+        key = (urlsplit ( url.strip ( ) ).hostname or url).lower ( )
+    except ValueError:
+        key = url
+
+    return zlib.crc32 ( key.encode ( 'utf-8', 'surrogatepass' ) ) % num_shards
+
+
+def get_byte_range ( file_size, shard_index, num_shards ):
+    """
+    Finds the byte range of a shard in BYTE_RANGE mode. The file is split into num_shards byte ranges of equal \
+    size, and a line belongs to the range holding its first byte, so every line is read by exactly one shard, \
+    without any shard reading the lines of the others (see UrlSource.iter_lines with align=True). Only byte \
+    oriented encodings (e.g; UTF-8) can be split this way.
+    :param file_size: size of the plaintext file in bytes
+    :param shard_index: int
+    :param num_shards: int
+    :return: (start, end) offsets of the range (int tuple)
+    """
+    return file_size * shard_index // num_shards, file_size * (shard_index + 1) // num_shards
+
+
+def write_shard_stats ( stats_path, stats ):
+    """
+    Writes the statistics of a shard into a JSON file, read by the coordinator
+    :param stats_path: str
+    :param stats: dict of the statistics
+    :return:
+    """
+    temp_path = stats_path + ".tmp"
+    with open ( temp_path, mode='w', encoding='utf-8' ) as fd:
+        json.dump ( stats, fd, indent=2, sort_keys=True )
+    os.replace ( temp_path, stats_path )
+
+
+def merge_shard_stats ( stats_list ):
+    """
+    Merges the statistics of the shards of a run. Counters are summed up, while the elapsed time of the run is \
+    the one of its slowest shard.
+    :param stats_list: list of dicts of statistics (see write_shard_stats)
+    :return: dict of the merged statistics
+    """
+    merged_stats = { "num_shards": len ( stats_list ), "elapsed": 0.0 }
+
+    for stats in stats_list:
+        for key, value in stats.items ( ):
+            if key == "elapsed":
+                merged_stats[ key ] = max ( merged_stats[ key ], value )
+            elif key not in ("shard_index", "num_shards") and isinstance ( value, (int, float) ):
+                merged_stats[ key ] = merged_stats.get ( key, 0 ) + value
+
+    return merged_stats
+
+
+def merge_shard_manifests ( manifest_path, shard_manifest_paths, has_header=False ):
+    """
+    Appends the manifests of the shards of a run to the manifest of the job (see MANIFEST_PATH), and removes them, \
+    so that they are not merged again by a later run. Manifests of the shards which have not written any are skipped.
+    :param manifest_path: str
+    :param shard_manifest_paths: list of str
+    :param has_header: True (If every manifest starts with a header row, e.g; CSV format) / False
+    :return: number of merged manifests (int)
+    """
+    shard_manifest_paths = [ path for path in shard_manifest_paths if os.path.isfile ( path ) ]
+    if not shard_manifest_paths:
+        return 0
+
+    with open ( manifest_path, mode='ab' ) as manifest_fd:
+        for shard_manifest_path in shard_manifest_paths:
+            with open ( shard_manifest_path, mode='rb' ) as shard_fd:
+                # the header row is only written once, at the top of the manifest
+                header = shard_fd.readline ( ) if has_header else b""
+                if manifest_fd.tell ( ) == 0:
+                    manifest_fd.write ( header )
+                shutil.copyfileobj ( shard_fd, manifest_fd )
+
+            os.remove ( shard_manifest_path )
+
+    return len ( shard_manifest_paths )
+
+
+class ShardCoordinator:
+    """
+    Description: ShardCoordinator class runs a sharded job on this machine. It starts one worker process per shard, \
+                 each running the application with "--shard INDEX/COUNT" (i.e; its own FileParser and Downloader, \
+                 with its own interpreter lock and connections), waits for all of them, and merges the statistics \
+                 they have written into LOG_DIR and their manifests into MANIFEST_PATH. Images are left into the \
+                 shard directories of the workers, which are listed into the merged statistics. The same job can be \
+                 spread over several machines by running the workers with "--shard" there instead.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, script_path, url_fname, num_workers, log_dir, worker_args=( ), image_save_dir=None,
+                   manifest_path=None, manifest_has_header=False ):
+        self.logger = logging.getLogger ( __name__ )
+
+        # path of the application script run by every worker
+        self.script_path = script_path
+
+        # path of the plaintext file
+        self.url_fname = url_fname
+
+        self.num_workers = num_workers
+        self.log_dir = log_dir
+
+        # extra command line arguments of the workers (e.g; ("--engine", "asyncio"))
+        self.worker_args = tuple ( worker_args )
+
+        # IMAGE_SAVE_DIR, into which every worker saves its images into a shard directory / None
+        self.image_save_dir = image_save_dir
+
+        # MANIFEST_PATH, into which the manifests of the workers are merged / None (If there is no manifest)
+        self.manifest_path = manifest_path
+        self.manifest_has_header = manifest_has_header
+
+    def get_stats_path ( self, shard_index ):
+        """
+        :param shard_index: int
+        :return: path of the statistics file of a shard (str)
+        """
+        return os.path.join ( self.log_dir, get_shard_name ( shard_index, self.num_workers ) + ".stats.json" )
+
+    def run ( self ):
+        """
+        Runs the workers, merges their statistics into LOG_DIR/shard-summary.json and their manifests into \
+        MANIFEST_PATH
+        :return: dict of the merged statistics
+        """
+        workers = [ ]
+        for shard_index in range ( self.num_workers ):
+            # a stale statistics file of an earlier run must not be merged, if this worker fails
+            try:
+                os.remove ( self.get_stats_path ( shard_index ) )
+            except FileNotFoundError:
+                pass
+
+            workers.append ( subprocess.Popen (
+                [ sys.executable, self.script_path, "--file", self.url_fname,
+                  "--shard", "{0}/{1}".format ( shard_index, self.num_workers ) ] + list ( self.worker_args ) ) )
+
+        stats_list = [ ]
+        failed_shards = [ ]
+        for shard_index, worker in enumerate ( workers ):
+            return_code = worker.wait ( )
+            try:
+                with open ( self.get_stats_path ( shard_index ), mode='r', encoding='utf-8' ) as fd:
+                    stats_list.append ( json.load ( fd ) )
+                is_stats_written = True
+            except (OSError, ValueError):
+                is_stats_written = False
+
+            # a worker which has written its statistics before exiting abnormally has failed as well
+            if return_code or not is_stats_written:
+                self.logger.error ( "Worker of shard {0} has failed with exit code {1}{2}.".format (
+                    shard_index, return_code, "" if is_stats_written else " and without statistics" ) )
+                failed_shards.append ( shard_index )
+
+        merged_stats = merge_shard_stats ( stats_list )
+        merged_stats[ "failed_shards" ] = failed_shards
+        merged_stats[ "shards" ] = stats_list
+
+        shard_names = [ get_shard_name ( shard_index, self.num_workers ) for shard_index in range ( self.num_workers ) ]
+        if self.image_save_dir:
+            merged_stats[ "shard_dirs" ] = [ os.path.join ( self.image_save_dir, shard_name )
+                                             for shard_name in shard_names ]
+
+        # the manifest of a failed worker is merged as well, as its records are still valid
+        if self.manifest_path:
+            merge_shard_manifests ( self.manifest_path,
+                                    [ self.manifest_path + "." + shard_name for shard_name in shard_names ],
+                                    self.manifest_has_header )
+            merged_stats[ "manifest_path" ] = self.manifest_path
+        write_shard_stats ( os.path.join ( self.log_dir, "shard-summary.json" ), merged_stats )
+
+        return merged_stats
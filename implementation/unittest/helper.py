@@ -1,3 +1,7 @@
+import http.server
+import threading
+import time
+
 import cfg
 from implementation.app_constants import *
 
@@ -73,10 +77,15 @@ class Helper:
         :return:
         """
         import os
+        import shutil
         for del_dir in del_dirs_tup:
             file_list = os.listdir ( del_dir )
             for fileName in file_list:
-                os.remove ( del_dir + "/" + fileName )
+                # shard directories of OUTPUT_LAYOUT
+                if os.path.isdir ( del_dir + "/" + fileName ):
+                    shutil.rmtree ( del_dir + "/" + fileName )
+                else:
+                    os.remove ( del_dir + "/" + fileName )
 
     @staticmethod
     def num_serviceable_urls ( parser ):
@@ -100,6 +109,19 @@ class Helper:
 
         return count
 
+    @staticmethod
+    def create_url_file ( urls ):
+        """
+        Creates a temporary plaintext file which contains the given urls, one per line
+        :param urls: list of url strings
+        :return: path of the created file (str). It is the responsibility of the caller to delete it.
+        """
+        import tempfile
+        with tempfile.NamedTemporaryFile ( mode='w', suffix='.txt', delete=False ) as fp:
+            fp.write ( "\n".join ( urls ) + "\n" )
+
+        return fp.name
+
     @staticmethod
     def stop_downloader_threads ( th_list ):
         """
@@ -110,3 +132,157 @@ class Helper:
         """
         for th in th_list:
             th._stop ( )
+
+
+class LocalImageServer:
+    """
+    Description: LocalImageServer serves in-memory resources over HTTP on localhost, so that unittests can exercise \
+                 the download path of the application without depending on the internet.
+
+    Version: 1.0
+    Comment:
+    """
+
+    # A minimal but valid 1x1 PNG image
+    PNG_BYTES = bytes.fromhex ( "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+                                "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082" )
+
+    def __init__ ( self ):
+        # maps a url path to a dict of "status", "headers", "body", "delay" and "interrupt_at" of the resource
+        self.resources = { }
+
+        # number of TCP connections accepted by this server
+        self.connection_count = 0
+
+        # (method, path, status code) of every request served by this server
+        self.request_log = [ ]
+
+        self.add_resource ( "/image.png", self.PNG_BYTES, "image/png" )
+        self.add_resource ( "/page.html", b"<html><body>Not an image</body></html>", "text/html" )
+
+        self.httpd = http.server.ThreadingHTTPServer ( ("127.0.0.1", 0), self.create_request_handler ( ) )
+        self.httpd.daemon_threads = True
+        self.server_thread = threading.Thread ( target=self.httpd.serve_forever, daemon=True )
+
+    def add_resource ( self, path, body, content_type, status=200, headers=None, delay=0, interrupt_at=None,
+                       failures=0, open_ended_ranges=False ):
+        """
+        Registers a resource which will be served by this server. Byte ranges of the resource are served, \
+        if its headers contain "Accept-Ranges: bytes".
+        :param path: url path of the resource (str, e.g; "/image.png")
+        :param body: content of the resource (bytes)
+        :param content_type: value of the content-type header (str)
+        :param status: HTTP status code of the response (int)
+        :param headers: additional response headers (dict)
+        :param delay: seconds to wait before responding (float)
+        :param interrupt_at: number of bytes after which the first transfer of the body is dropped (int) / None
+        :param failures: number of first requests answered with "503 Service Unavailable" (int)
+        :param open_ended_ranges: boolean (If True, every byte range is served up to the end of the resource)
+        :return:
+        """
+        resource_headers = { "Content-Type": content_type }
+        resource_headers.update ( headers or { } )
+        self.resources[ path ] = { "status": status, "headers": resource_headers, "body": body, "delay": delay,
+                                   "interrupt_at": interrupt_at, "failures": failures,
+                                   "open_ended_ranges": open_ended_ranges }
+
+    def url ( self, path ):
+        """
+        Returns the absolute url of a path served by this server
+        :param path: str (e.g; "/image.png")
+        :return: str
+        """
+        return "http://127.0.0.1:{0}{1}".format ( self.httpd.server_address[ 1 ], path )
+
+    def start ( self ):
+        """
+        Starts serving requests in a background thread
+        :return:
+        """
+        self.server_thread.start ( )
+
+    def stop ( self ):
+        """
+        Stops the server and releases its socket
+        :return:
+        """
+        self.httpd.shutdown ( )
+        self.httpd.server_close ( )
+
+    def create_request_handler ( self ):
+        """
+        Creates the request handler class bound to the resources of this server
+        :return: subclass of http.server.BaseHTTPRequestHandler
+        """
+        server = self
+        resources = self.resources
+
+        class RequestHandler ( http.server.BaseHTTPRequestHandler ):
+            protocol_version = "HTTP/1.1"
+
+            def setup ( self ):
+                # a new handler instance is created per accepted connection
+                server.connection_count += 1
+                super ( ).setup ( )
+
+            def send_resource ( self, send_body ):
+                resource = resources.get ( self.path )
+                if resource is None:
+                    resource = { "status": 404, "headers": { "Content-Type": "text/plain" }, "body": b"",
+                                 "delay": 0, "interrupt_at": None, "failures": 0 }
+
+                status, headers, body = resource[ "status" ], dict ( resource[ "headers" ] ), resource[ "body" ]
+                if resource[ "delay" ]:
+                    time.sleep ( resource[ "delay" ] )
+
+                if resource[ "failures" ]:
+                    resource[ "failures" ] -= 1
+                    status, headers, body = 503, { "Content-Type": "text/plain" }, b""
+
+                # conditional request on the current ETag of the resource
+                if status == 200 and headers.get ( "ETag" ) and \
+                        self.headers.get ( "If-None-Match" ) == headers[ "ETag" ]:
+                    status, body, send_body = 304, b"", False
+
+                # byte range request ("bytes=first-" or "bytes=first-last")
+                byte_range = self.headers.get ( "Range" )
+                if status == 200 and byte_range and headers.get ( "Accept-Ranges" ) == "bytes":
+                    first_byte, _, last_byte = byte_range.replace ( "bytes=", "" ).partition ( "-" )
+                    first_byte = int ( first_byte )
+                    last_byte = int ( last_byte ) if last_byte and not resource.get ( "open_ended_ranges" ) \
+                        else len ( body ) - 1
+                    headers[ "Content-Range" ] = "bytes {0}-{1}/{2}".format ( first_byte, last_byte, len ( body ) )
+                    status, body = 206, body[ first_byte:last_byte + 1 ]
+
+                server.request_log.append ( (self.command, self.path, status) )
+
+                self.send_response ( status )
+                for name, value in headers.items ( ):
+                    self.send_header ( name, value )
+                self.send_header ( "Content-Length", str ( len ( body ) ) )
+                self.end_headers ( )
+
+                if not send_body:
+                    return
+
+                if status == 200 and resource[ "interrupt_at" ] is not None:
+                    # dropping the connection in the middle of the body, only once
+                    self.wfile.write ( body[ :resource[ "interrupt_at" ] ] )
+                    self.wfile.flush ( )
+                    resource[ "interrupt_at" ] = None
+                    self.close_connection = True
+                    return
+
+                self.wfile.write ( body )
+
+            def do_HEAD ( self ):
+                self.send_resource ( send_body=False )
+
+            def do_GET ( self ):
+                self.send_resource ( send_body=True )
+
+            def log_message ( self, format, *args ):
+                # keeping the console output of unittests clean
+                pass
+
+        return RequestHandler
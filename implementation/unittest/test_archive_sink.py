@@ -0,0 +1,98 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from implementation.archive_sink import TarSink, WarcSink
+
+
+class ArchiveSinkTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.save_dir = tempfile.mkdtemp ( )
+        self.images = [ ]
+        for i, size in enumerate ( (3000, 100, 5000) ):
+            path = os.path.join ( self.save_dir, "image_{}.png.part".format ( i ) )
+            with open ( path, 'wb' ) as fp:
+                fp.write ( os.urandom ( size ) )
+            self.images.append ( path )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        shutil.rmtree ( self.save_dir )
+
+    def add_images ( self, archive_sink ):
+        """
+        Adds the images into an archive sink and closes it
+        :param archive_sink: ArchiveSink
+        :return: list of shard names, one per image
+        """
+        shard_names = [ archive_sink.add ( "http://a.com/{}.png".format ( i ), "ab/image_{}.png".format ( i ), path,
+                                           "image/png" ) for i, path in enumerate ( self.images ) ]
+        archive_sink.close ( )
+        return shard_names
+
+    def read_index ( self, shard_name ):
+        """
+        Reads back the images of a shard through its index
+        :param shard_name: str
+        :return: dict mapping the name of an image to its content
+        """
+        contents = { }
+        shard_path = os.path.join ( self.save_dir, shard_name )
+        with open ( shard_path + ".idx", encoding='utf-8' ) as index_fp, open ( shard_path, 'rb' ) as shard_fp:
+            for line in index_fp:
+                name, url, offset, size = line.rstrip ( '\n' ).split ( '\t' )
+                shard_fp.seek ( int ( offset ) )
+                contents[ name ] = shard_fp.read ( int ( size ) )
+        return contents
+
+    def get_content ( self, i ):
+        with open ( self.images[ i ], 'rb' ) as fp:
+            return fp.read ( )
+
+    def test_tar_sink ( self ):
+        """
+        It tests that shards roll over at shard_size, are valid tar archives, and that their index locates the images.
+        Please look into corresponding function add in archive_sink.py
+        :return:
+        """
+        shard_names = self.add_images ( TarSink ( self.save_dir, shard_size=12000 ) )
+        self.assertEqual ( shard_names, [ "images-00000.tar", "images-00001.tar", "images-00002.tar" ] )
+
+        with tarfile.open ( os.path.join ( self.save_dir, "images-00000.tar" ) ) as tar:
+            self.assertEqual ( tar.getnames ( ), [ "ab/image_0.png" ] )
+            self.assertEqual ( tar.extractfile ( "ab/image_0.png" ).read ( ), self.get_content ( 0 ) )
+
+        self.assertEqual ( self.read_index ( "images-00001.tar" ), { "ab/image_1.png": self.get_content ( 1 ) } )
+
+        # numbering continues from the shards of earlier runs
+        self.assertEqual ( TarSink ( self.save_dir, shard_size=12000 ).next_shard_id, 3 )
+
+    def test_warc_sink ( self ):
+        """
+        It tests that WARC records are appended into a shard, and that its index locates the images.
+        Please look into corresponding function add in archive_sink.py
+        :return:
+        """
+        shard_names = self.add_images ( WarcSink ( self.save_dir, shard_size=1024 * 1024 ) )
+        self.assertEqual ( set ( shard_names ), { "images-00000.warc" } )
+
+        self.assertEqual ( self.read_index ( "images-00000.warc" ),
+                           { "ab/image_{}.png".format ( i ): self.get_content ( i ) for i in range ( 3 ) } )
+
+        with open ( os.path.join ( self.save_dir, "images-00000.warc" ), 'rb' ) as fp:
+            warc = fp.read ( )
+        self.assertTrue ( warc.startswith ( b"WARC/1.1\r\nWARC-Type: warcinfo\r\n" ) )
+        self.assertEqual ( warc.count ( b"WARC-Type: resource\r\n" ), 3 )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
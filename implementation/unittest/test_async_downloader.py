@@ -0,0 +1,176 @@
+import gzip
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import cfg
+from implementation.app_constants import *
+from implementation.async_downloader import AsyncDownloader, ExecutorFileSink, aiohttp
+from implementation.file_sink import FileSink
+from .helper import Helper, LocalImageServer
+
+
+@unittest.skipIf ( aiohttp is None, "aiohttp package is not installed" )
+class AsyncDownloaderTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        # cfg.APP_CFG is restored after every unittest case
+        self.app_cfg = dict ( cfg.APP_CFG )
+
+        self.helper = Helper ( )
+        self.helper.create_default_cfg ( )
+
+        # images are downloaded into an empty directory
+        cfg.APP_CFG[ IMAGE_SAVE_DIR ] = tempfile.mkdtemp ( )
+
+        self.server = LocalImageServer ( )
+        self.server.start ( )
+
+        self.url_queue = queue.Queue ( )
+        self.url_dl = AsyncDownloader ( self.url_queue )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        self.server.stop ( )
+        shutil.rmtree ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] )
+
+        cfg.APP_CFG.clear ( )
+        cfg.APP_CFG.update ( self.app_cfg )
+
+    def test_single_downloader_thread ( self ):
+        """
+        Verifies that asyncio engine hosts all of its downloads on a single thread.
+        Please look into corresponding function create_downloader_threads in async_downloader.py
+        :return:
+        """
+        self.assertEqual ( len ( self.url_dl.dl_thread_list ), 1 )
+
+    def test_async_downloader_system ( self ):
+        """
+        Test the asyncio engine end to end. All the queued urls get downloaded and in the end the url_queue \
+        will have only 1 item left which is "EXIT".
+        Please look into corresponding function async_downloader in async_downloader.py
+        :return:
+        """
+        for _ in range ( 5 ):
+            self.url_queue.put ( self.server.url ( "/image.png" ) )
+        self.url_queue.put ( self.server.url ( "/missing.png" ) )
+        self.url_queue.put ( "EXIT" )
+
+        self.url_dl.start_downloader_threads ( )
+        self.url_dl.wait_for_downloader_threads ( )
+
+        self.assertEqual ( self.url_queue.qsize ( ), 1 )
+
+        # first image keeps its name, duplicates get the customized names
+        downloaded = os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] )
+        self.assertIn ( "image.png", downloaded )
+        self.assertEqual ( len ( [ f for f in downloaded if f.startswith ( "application_image_" ) ] ), 4 )
+
+        with open ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/image.png", 'rb' ) as fp:
+            self.assertEqual ( fp.read ( ), LocalImageServer.PNG_BYTES )
+
+    def test_file_operations_off_event_loop ( self ):
+        """
+        Verifies that asyncio engine writes and completes the downloaded images on the default executor instead of \
+        the event loop thread, in batches of the received chunks.
+        Please look into corresponding class ExecutorFileSink in async_downloader.py
+        :return:
+        """
+        body = LocalImageServer.PNG_BYTES + os.urandom ( 256 * 1024 )
+        self.server.add_resource ( "/large.png", body, "image/png" )
+        self.url_queue.put ( self.server.url ( "/large.png" ) )
+        self.url_queue.put ( "EXIT" )
+
+        write_threads = [ ]
+        complete_threads = [ ]
+        file_sink_write = FileSink.write
+        complete_download = AsyncDownloader.complete_download
+
+        def write ( file_sink, data_block ):
+            write_threads.append ( threading.current_thread ( ) )
+            file_sink_write ( file_sink, data_block )
+
+        def complete ( url_dl, *args ):
+            complete_threads.append ( threading.current_thread ( ) )
+            return complete_download ( url_dl, *args )
+
+        with mock.patch.object ( FileSink, "write", write ), \
+                mock.patch.object ( AsyncDownloader, "complete_download", complete ):
+            self.url_dl.start_downloader_threads ( )
+            self.url_dl.wait_for_downloader_threads ( )
+
+        event_loop_thread = self.url_dl.dl_thread_list[ 0 ]
+        self.assertTrue ( write_threads )
+        self.assertLessEqual ( len ( write_threads ), len ( body ) // ExecutorFileSink.BATCH_SIZE + 2 )
+        self.assertNotIn ( event_loop_thread, write_threads + complete_threads )
+        self.assertEqual ( len ( complete_threads ), 1 )
+
+        with open ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/large.png", 'rb' ) as fp:
+            self.assertEqual ( fp.read ( ), body )
+
+    def test_failure_async_download_image ( self ):
+        """
+        Verifies that asyncio engine does not download an invalid web address link.
+        Please look into corresponding function async_download_image in async_downloader.py
+        :return:
+        """
+        self.url_queue.put ( "mk.com" )
+        self.url_queue.put ( "EXIT" )
+
+        self.url_dl.thread_downloader ( )
+
+        self.assertEqual ( self.url_queue.qsize ( ), 1 )
+        self.assertNotIn ( "mk.com", os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) )
+
+    def test_sniffed_async_download_image ( self ):
+        """
+        Verifies that asyncio engine saves an image whose type is not declared with the extension of its format, \
+        and drops a resource labelled as an image whose content is not one.
+        Please look into corresponding function async_download_image in async_downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ IMAGE_SNIFFING ] = True
+        self.server.add_resource ( "/photo", b"GIF87a" + os.urandom ( 1024 ), "application/octet-stream" )
+        self.server.add_resource ( "/error.png", b"<html>Not found</html>", "image/png" )
+        for path in ("/photo", "/error.png", "EXIT"):
+            self.url_queue.put ( self.server.url ( path ) if path != "EXIT" else path )
+
+        self.url_dl.start_downloader_threads ( )
+        self.url_dl.wait_for_downloader_threads ( )
+
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ "photo.gif" ] )
+
+    def test_size_limits_async_download_image ( self ):
+        """
+        Verifies that asyncio engine drops an image whose announced size is out of the size limits, and aborts a \
+        transfer exceeding MAX_IMAGE_SIZE without announcing it.
+        Please look into corresponding function async_download_image in async_downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ MIN_IMAGE_SIZE ] = 100
+        cfg.APP_CFG[ MAX_IMAGE_SIZE ] = 64 * 1024
+        body = LocalImageServer.PNG_BYTES + bytes ( 1024 * 1024 )
+        self.server.add_resource ( "/large.png", body, "image/png" )
+        self.server.add_resource ( "/inflated.png", gzip.compress ( body ), "image/png",
+                                   headers={ "Content-Encoding": "gzip" } )
+        self.server.add_resource ( "/pixel.png", LocalImageServer.PNG_BYTES[ :50 ], "image/png" )
+        self.server.add_resource ( "/medium.png", LocalImageServer.PNG_BYTES + bytes ( 1024 ), "image/png" )
+        for path in ("/large.png", "/inflated.png", "/pixel.png", "/medium.png", "EXIT"):
+            self.url_queue.put ( self.server.url ( path ) if path != "EXIT" else path )
+
+        url_dl = AsyncDownloader ( self.url_queue )
+        url_dl.start_downloader_threads ( )
+        url_dl.wait_for_downloader_threads ( )
+
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ "medium.png" ] )
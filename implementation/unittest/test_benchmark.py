@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+
+import cfg
+from implementation.app_constants import *
+from implementation.benchmark import SCENARIOS, StandInImageServer, generate_urls, run_pipeline
+from .helper import Helper
+
+
+class BenchmarkTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.helper = Helper ( )
+        self.helper.create_default_cfg ( )
+
+        # images are downloaded into an empty directory
+        cfg.APP_CFG[ IMAGE_SAVE_DIR ] = tempfile.mkdtemp ( )
+
+        self.server = StandInImageServer ( hang_time=0.1 )
+        self.scenario = dict ( SCENARIOS[ "mixed" ], num_urls=40, latency_ms=0, max_size=64 * 1024,
+                               timeout_rate=0.0, redirect_rate=0.2 )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        self.server.close ( )
+        shutil.rmtree ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] )
+        self.helper.create_default_cfg ( )
+
+    def test_stand_in_server ( self ):
+        """
+        It tests the synthetic images, errors and redirects served by the stand-in server.
+        Please look into corresponding class StandInRequestHandler in benchmark.py
+        :return:
+        """
+        base_url = self.server.get_base_url ( )
+        with urllib.request.urlopen ( base_url + "/redirect/2/image/1000/0/7.png", timeout=5 ) as response:
+            self.assertEqual ( response.geturl ( ), base_url + "/image/1000/0/7.png" )
+            self.assertEqual ( response.headers[ "Content-Type" ], "image/png" )
+            body = response.read ( )
+        self.assertEqual ( len ( body ), 1000 )
+        self.assertTrue ( body.startswith ( b"\x89PNG" ) )
+
+        with self.assertRaises ( urllib.error.HTTPError ) as context:
+            urllib.request.urlopen ( base_url + "/status/503/8.png", timeout=5 )
+        self.assertEqual ( context.exception.code, 503 )
+
+    def test_generate_urls ( self ):
+        """
+        It tests that the urls of a scenario are reproducible.
+        Please look into corresponding function generate_urls in benchmark.py
+        :return:
+        """
+        urls = list ( generate_urls ( "http://h", self.scenario, seed=3 ) )
+        self.assertEqual ( len ( urls ), 40 )
+        self.assertEqual ( urls, list ( generate_urls ( "http://h", self.scenario, seed=3 ) ) )
+        self.assertNotEqual ( urls, list ( generate_urls ( "http://h", self.scenario, seed=4 ) ) )
+
+    def test_run_pipeline ( self ):
+        """
+        It tests that the pipeline downloads exactly the images served by the stand-in server, and reports its \
+        measurements.
+        Please look into corresponding function run_pipeline in benchmark.py
+        :return:
+        """
+        urls = list ( generate_urls ( self.server.get_base_url ( ), self.scenario ) )
+        url_fname = self.helper.create_url_file ( urls )
+        try:
+            result = run_pipeline ( url_fname, "thread" )
+        finally:
+            os.remove ( url_fname )
+
+        num_images = len ( [ url for url in urls if "/image/" in url and not url.endswith ( ".html" ) ] )
+        self.assertEqual ( result[ "num_urls" ], 40 )
+        self.assertEqual ( result[ "num_downloaded" ], num_images )
+        self.assertEqual ( result[ "num_rejected" ], 40 - num_images )
+        self.assertEqual ( len ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) ), num_images )
+        self.assertGreater ( result[ "urls_per_s" ], 0 )
+        self.assertIsNotNone ( result[ "download_p99_ms" ] )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
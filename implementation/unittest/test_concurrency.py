@@ -0,0 +1,116 @@
+import itertools
+import threading
+import unittest
+from unittest import mock
+
+from implementation.concurrency import AdaptiveConcurrencyController
+
+
+class AdaptiveConcurrencyControllerTestCase ( unittest.TestCase ):
+    def test_additive_increase ( self ):
+        """
+        It tests that the concurrency level grows by one per window while throughput keeps rising, up to max_level. \
+        The first window has no throughput to compare with and does not use all of the permits, so it keeps the level.
+        Please look into corresponding function adjust in concurrency.py
+        :return:
+        """
+        # every window lasts exactly one second
+        with mock.patch ( "implementation.concurrency.time.monotonic", side_effect=itertools.count ( ) ):
+            controller = AdaptiveConcurrencyController ( min_level=1, max_level=4, initial_level=2, interval=0 )
+
+            controller.record ( ttfb=0.1, num_bytes=1000, num_errors=0 )
+            self.assertEqual ( controller.concurrency, 2 )
+
+            for num_bytes in (2000, 3000, 4000):
+                controller.record ( ttfb=0.1, num_bytes=num_bytes, num_errors=0 )
+
+        self.assertEqual ( controller.concurrency, 4 )
+
+    def test_unsaturated_window ( self ):
+        """
+        It tests that the concurrency level grows when all of the permits are held, but not when downloads are idle \
+        or too few to use all of the permits.
+        Please look into corresponding function adjust in concurrency.py
+        :return:
+        """
+        with mock.patch ( "implementation.concurrency.time.monotonic", side_effect=itertools.count ( ) ):
+            controller = AdaptiveConcurrencyController ( min_level=1, max_level=8, initial_level=2, interval=0 )
+
+            # a single download at a time, at a steady throughput
+            for _ in range ( 3 ):
+                controller.acquire ( )
+                controller.release ( )
+                controller.record ( ttfb=0.1, num_bytes=1000, num_errors=0 )
+            self.assertEqual ( controller.concurrency, 2 )
+
+            # both of the permits are held
+            controller.acquire ( )
+            controller.acquire ( )
+            controller.release ( )
+            controller.release ( )
+            controller.record ( ttfb=0.1, num_bytes=1000, num_errors=0 )
+            self.assertEqual ( controller.concurrency, 3 )
+
+    def test_multiplicative_decrease ( self ):
+        """
+        It tests that the concurrency level is halved on errors or a time to first byte spike, but never below \
+        min_level.
+        Please look into corresponding function adjust in concurrency.py
+        :return:
+        """
+        controller = AdaptiveConcurrencyController ( min_level=3, max_level=32, initial_level=16, interval=0 )
+
+        controller.record ( ttfb=0.1, num_bytes=1000, num_errors=1 )
+        self.assertEqual ( controller.concurrency, 8 )
+
+        controller.record ( ttfb=1.0, num_bytes=1000, num_errors=0 )
+        self.assertEqual ( controller.concurrency, 4 )
+
+        controller.record ( ttfb=0.1, num_bytes=1000, num_errors=5 )
+        self.assertEqual ( controller.concurrency, 3 )
+
+    def test_latency_base ( self ):
+        """
+        It tests that larger images do not pass for a latency spike, and that the lowest time to first byte ages out \
+        after base_windows windows.
+        Please look into corresponding function adjust in concurrency.py
+        :return:
+        """
+        with mock.patch ( "implementation.concurrency.time.monotonic", side_effect=itertools.count ( ) ):
+            controller = AdaptiveConcurrencyController ( min_level=1, max_level=32, initial_level=8, interval=0,
+                                                         base_windows=2 )
+
+            # a window of small images followed by one of large images from equally loaded servers
+            controller.record ( ttfb=0.1, num_bytes=1000, num_errors=0 )
+            controller.record ( ttfb=0.1, num_bytes=1000000, num_errors=0 )
+            self.assertEqual ( controller.concurrency, 9 )
+
+            # the servers got slower for good: the level is halved once, then the new latency becomes the base and \
+            # the level grows again with the throughput
+            for num_bytes in (1000000, 2000000):
+                controller.record ( ttfb=0.5, num_bytes=num_bytes, num_errors=0 )
+            self.assertEqual ( controller.concurrency, 5 )
+
+    def test_permits ( self ):
+        """
+        It tests that no more permits than the concurrency level are held at once, and that a raised level \
+        wakes up a waiting thread.
+        Please look into corresponding function acquire in concurrency.py
+        :return:
+        """
+        controller = AdaptiveConcurrencyController ( min_level=1, max_level=2, initial_level=1, interval=0 )
+        controller.acquire ( )
+
+        waiting_thread = threading.Thread ( target=controller.acquire, daemon=True )
+        waiting_thread.start ( )
+        waiting_thread.join ( 0.2 )
+        self.assertTrue ( waiting_thread.is_alive ( ) )
+
+        controller.record ( ttfb=0.1, num_bytes=1000, num_errors=0 )
+        waiting_thread.join ( 5 )
+        self.assertFalse ( waiting_thread.is_alive ( ) )
+        self.assertEqual ( controller.active, 2 )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from implementation.content_store import ContentStore
+
+
+class ContentStoreTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.save_dir = tempfile.mkdtemp ( )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        shutil.rmtree ( self.save_dir )
+
+    def commit_content ( self, content_store, file_name, content, digest ):
+        """
+        Writes a content into a temporary file and commits it into self.save_dir
+        :return: return value of ContentStore.commit
+        """
+        path = os.path.join ( self.save_dir, file_name )
+        with open ( path + ".part", 'wb' ) as fp:
+            fp.write ( content )
+
+        return content_store.commit ( "http://host/" + file_name, path + ".part", path, digest )
+
+    def test_hardlink_duplicate ( self ):
+        """
+        It tests that a duplicate content is hardlinked to the saved file in "hardlink" mode.
+        Please look into corresponding function commit in content_store.py
+        :return:
+        """
+        content_store = ContentStore ( self.save_dir, "hardlink" )
+
+        self.assertTrue ( self.commit_content ( content_store, "a.png", b"content", "d1" ) )
+        self.assertFalse ( self.commit_content ( content_store, "b.png", b"content", "d1" ) )
+
+        a_stat = os.stat ( os.path.join ( self.save_dir, "a.png" ) )
+        b_stat = os.stat ( os.path.join ( self.save_dir, "b.png" ) )
+        self.assertEqual ( a_stat.st_ino, b_stat.st_ino )
+        self.assertFalse ( os.path.exists ( os.path.join ( self.save_dir, "b.png.part" ) ) )
+
+    def test_manifest_duplicate ( self ):
+        """
+        It tests that a duplicate content is only recorded into the manifest in "manifest" mode.
+        Please look into corresponding function commit in content_store.py
+        :return:
+        """
+        content_store = ContentStore ( self.save_dir, "manifest" )
+
+        self.assertTrue ( self.commit_content ( content_store, "a.png", b"content", "d1" ) )
+        self.assertFalse ( self.commit_content ( content_store, "b.png", b"content", "d1" ) )
+        self.assertTrue ( self.commit_content ( content_store, "c.png", b"other", "d2" ) )
+
+        self.assertEqual ( sorted ( os.listdir ( self.save_dir ) ),
+                           [ ContentStore.INDEX_FILE_NAME, ContentStore.MANIFEST_FILE_NAME, "a.png", "c.png" ] )
+
+        with open ( content_store.manifest_path, 'r' ) as fd:
+            self.assertEqual ( fd.read ( ), "http://host/b.png\td1\ta.png\n" )
+
+    def test_persisted_index ( self ):
+        """
+        It tests that the index of saved contents is reloaded, and that a deleted file gets stored again.
+        Please look into corresponding function load_index in content_store.py
+        :return:
+        """
+        self.commit_content ( ContentStore ( self.save_dir, "manifest" ), "a.png", b"content", "d1" )
+
+        content_store = ContentStore ( self.save_dir, "manifest" )
+        self.assertEqual ( content_store.digest_index, { "d1": "a.png" } )
+        self.assertFalse ( self.commit_content ( content_store, "b.png", b"content", "d1" ) )
+
+        os.remove ( os.path.join ( self.save_dir, "a.png" ) )
+        self.assertTrue ( self.commit_content ( content_store, "c.png", b"content", "d1" ) )
+        self.assertEqual ( content_store.digest_index, { "d1": "c.png" } )
@@ -0,0 +1,120 @@
+import socket
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+import cfg
+from implementation.app_constants import *
+from implementation.dns_cache import DnsCache, close_dns_cache
+from implementation.http_session import TimedHTTPAdapter
+
+
+class DnsCacheTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case. The system resolver is replaced by one which counts its lookups, \
+        and knows a single live host.
+        :return:
+        """
+        self.lookups = [ ]
+        self.lookup_delay = 0
+
+        def getaddrinfo ( host, port, family=0, type=0, *args ):
+            self.lookups.append ( host )
+            time.sleep ( self.lookup_delay )
+            if host != "live.test":
+                raise socket.gaierror ( socket.EAI_NONAME, "Name or service not known" )
+            return [ (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port or 0)) ]
+
+        patcher = mock.patch ( "socket.getaddrinfo", getaddrinfo )
+        patcher.start ( )
+        self.addCleanup ( patcher.stop )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        cfg.APP_CFG[ DNS_CACHE_TTL ] = None
+        cfg.APP_CFG[ DNS_NEGATIVE_TTL ] = 60
+        close_dns_cache ( )
+
+    def test_resolve ( self ):
+        """
+        It tests that concurrent lookups of a host share a single resolution, and that addresses and resolution \
+        errors are cached for their own TTL.
+        Please look into corresponding function resolve in dns_cache.py
+        :return:
+        """
+        dns_cache = DnsCache ( ttl=60, negative_ttl=0.2 )
+        self.lookup_delay = 0.1
+
+        results = [ ]
+        threads = [ threading.Thread ( target=lambda: results.append ( dns_cache.resolve ( "live.test" ) ) )
+                    for _ in range ( 8 ) ]
+        for thread in threads:
+            thread.start ( )
+        for thread in threads:
+            thread.join ( )
+
+        self.assertEqual ( results, [ [ (socket.AF_INET, "127.0.0.1") ] ] * 8 )
+        self.assertEqual ( self.lookups, [ "live.test" ] )
+
+        self.lookup_delay = 0
+        for _ in range ( 2 ):
+            self.assertRaises ( socket.gaierror, dns_cache.resolve, "dead.test" )
+        self.assertEqual ( self.lookups, [ "live.test", "dead.test" ] )
+
+        # the resolution error has expired, unlike the addresses
+        time.sleep ( 0.3 )
+        self.assertRaises ( socket.gaierror, dns_cache.resolve, "dead.test" )
+        dns_cache.resolve ( "live.test" )
+        self.assertEqual ( self.lookups, [ "live.test", "dead.test", "dead.test" ] )
+
+    def test_prefetch ( self ):
+        """
+        It tests that the host of an url is resolved ahead once, however many of its urls are read.
+        Please look into corresponding function prefetch in dns_cache.py
+        :return:
+        """
+        dns_cache = DnsCache ( prefetch_threads=2 )
+        self.lookup_delay = 0.1
+        try:
+            for url in ("http://live.test/a.png", "http://live.test/b.png", "https://dead.test/c.png", "not a url"):
+                dns_cache.prefetch ( url )
+
+            self.assertEqual ( dns_cache.resolve ( "live.test" ), [ (socket.AF_INET, "127.0.0.1") ] )
+            self.assertRaises ( socket.gaierror, dns_cache.resolve, "dead.test" )
+        finally:
+            dns_cache.close ( )
+
+        self.assertEqual ( sorted ( self.lookups ), [ "dead.test", "live.test" ] )
+
+    def test_unresolvable_host_connection ( self ):
+        """
+        It tests that the requests to an unresolvable host fail on its cached resolution error, before any \
+        connection attempt.
+        Please look into corresponding class TimedHTTPConnection in http_session.py
+        :return:
+        """
+        cfg.APP_CFG[ DNS_CACHE_TTL ] = 300
+        cfg.APP_CFG[ DNS_NEGATIVE_TTL ] = 60
+
+        session = requests.Session ( )
+        session.trust_env = False
+        session.mount ( "http://", TimedHTTPAdapter ( ) )
+        with mock.patch ( "urllib3.util.connection.create_connection" ) as create_connection:
+            for _ in range ( 3 ):
+                self.assertRaises ( requests.exceptions.ConnectionError, session.get, "http://dead.test/a.png",
+                                    timeout=2 )
+            create_connection.assert_not_called ( )
+        session.close ( )
+
+        self.assertEqual ( self.lookups, [ "dead.test" ] )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
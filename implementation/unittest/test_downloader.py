@@ -1,11 +1,21 @@
+import gzip
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
 import unittest
+from unittest import mock
 
 import cfg
 from implementation.app_constants import *
 from implementation.downloader import Downloader
+from implementation.host_scheduler import HostScheduler
 from implementation.parser import FileParser
 from settings import get_cmdline_args
-from .helper import Helper
+from implementation.url_item import UrlItem
+from .helper import Helper, LocalImageServer
 
 
 class DownloaderTestCase ( unittest.TestCase ):
@@ -81,3 +91,442 @@ class DownloaderTestCase ( unittest.TestCase ):
 
         # there will be just 1 entry in FileParser.url_queue queue which is "EXIT"
         self.assertEqual ( self.parser.url_queue.qsize ( ), 1 )
+
+
+class DownloaderLocalServerTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        # cfg.APP_CFG is restored after every unittest case
+        self.app_cfg = dict ( cfg.APP_CFG )
+
+        self.helper = Helper ( )
+        self.helper.create_default_cfg ( )
+
+        # images are downloaded into an empty directory
+        cfg.APP_CFG[ IMAGE_SAVE_DIR ] = tempfile.mkdtemp ( )
+
+        self.server = LocalImageServer ( )
+        self.server.start ( )
+
+        self.url_dl = Downloader ( queue.Queue ( ) )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        self.server.stop ( )
+        shutil.rmtree ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] )
+
+        cfg.APP_CFG.clear ( )
+        cfg.APP_CFG.update ( self.app_cfg )
+
+    def test_get_validation_download_image ( self ):
+        """
+        Verifies that in "get" URL_VALIDATION, application downloads an image url and drops a non-image url \
+        without saving it.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ URL_VALIDATION ] = "get"
+
+        self.assertTrue ( self.url_dl.download_image ( self.server.url ( "/image.png" ) ) )
+        self.assertFalse ( self.url_dl.download_image ( self.server.url ( "/page.html" ) ) )
+
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ "image.png" ] )
+
+    def test_head_validation_download_image ( self ):
+        """
+        Verifies that in "head" URL_VALIDATION, downloader trusts the validation of FileParser.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        self.assertTrue ( self.url_dl.download_image ( self.server.url ( "/page.html" ) ) )
+
+    def test_sniffed_download_image ( self ):
+        """
+        Verifies that with IMAGE_SNIFFING, an image whose type is not declared is saved with the extension of its \
+        format, and that the transfer of an error page labelled as an image is aborted after its first bytes.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ URL_VALIDATION ] = "get"
+        cfg.APP_CFG[ IMAGE_SNIFFING ] = True
+        self.server.add_resource ( "/photo", b"\xff\xd8\xff\xe0" + os.urandom ( 1024 ), "application/octet-stream" )
+        self.server.add_resource ( "/photo.jpeg", b"\xff\xd8\xff\xe0" + os.urandom ( 1024 ), "image/jpeg" )
+        self.server.add_resource ( "/icon.png", b"GIF89a" + os.urandom ( 1024 ), "image/png" )
+        self.server.add_resource ( "/error.jpg", b"<html>" + b" " * 4 * 1024 * 1024 + b"</html>", "image/jpeg" )
+        self.server.add_resource ( "/logo", b"<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+                                            b"<svg xmlns=\"http://www.w3.org/2000/svg\" width=\"8\" height=\"8\"/>",
+                                   "image/svg+xml" )
+
+        for path in ("/photo", "/photo.jpeg", "/icon.png", "/logo"):
+            self.assertTrue ( self.url_dl.download_image ( self.server.url ( path ) ) )
+        self.assertFalse ( self.url_dl.download_image ( self.server.url ( "/error.jpg" ) ) )
+
+        self.assertEqual ( sorted ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) ),
+                           [ "icon.gif", "logo.svg", "photo.jpeg", "photo.jpg" ] )
+
+    def test_size_limits_download_image ( self ):
+        """
+        Verifies that an image whose announced size is out of the size limits is not transferred, and that a \
+        transfer exceeding MAX_IMAGE_SIZE without announcing it (e.g; a compressed one) is aborted and removed.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ URL_VALIDATION ] = "get"
+        cfg.APP_CFG[ MIN_IMAGE_SIZE ] = 100
+        cfg.APP_CFG[ MAX_IMAGE_SIZE ] = 64 * 1024
+        body = LocalImageServer.PNG_BYTES + bytes ( 1024 * 1024 )
+        self.server.add_resource ( "/large.png", body, "image/png" )
+        self.server.add_resource ( "/inflated.png", gzip.compress ( body ), "image/png",
+                                   headers={ "Content-Encoding": "gzip" } )
+        self.server.add_resource ( "/pixel.png", LocalImageServer.PNG_BYTES[ :50 ], "image/png" )
+        self.server.add_resource ( "/inflated_pixel.png", gzip.compress ( LocalImageServer.PNG_BYTES[ :50 ] ),
+                                   "image/png", headers={ "Content-Encoding": "gzip" } )
+        self.server.add_resource ( "/medium.png", LocalImageServer.PNG_BYTES + bytes ( 1024 ), "image/png" )
+
+        url_dl = Downloader ( queue.Queue ( ) )
+        for path in ("/large.png", "/inflated.png", "/pixel.png", "/inflated_pixel.png"):
+            self.assertFalse ( url_dl.download_image ( self.server.url ( path ) ), path )
+        self.assertTrue ( url_dl.download_image ( self.server.url ( "/medium.png" ) ) )
+
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ "medium.png" ] )
+
+    def test_dedup_download_image ( self ):
+        """
+        Verifies that with DEDUP_MODE, an image identical to an already saved one is hardlinked to it.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ DEDUP_MODE ] = "hardlink"
+        self.server.add_resource ( "/mirror.png", LocalImageServer.PNG_BYTES, "image/png" )
+        url_dl = Downloader ( queue.Queue ( ) )
+
+        self.assertTrue ( url_dl.download_image ( self.server.url ( "/image.png" ) ) )
+        self.assertTrue ( url_dl.download_image ( self.server.url ( "/mirror.png" ) ) )
+
+        image_stat = os.stat ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/image.png" )
+        self.assertEqual ( image_stat.st_ino, os.stat ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/mirror.png" ).st_ino )
+        self.assertEqual ( image_stat.st_nlink, 2 )
+
+    def test_manifest_dedup_download_image ( self ):
+        """
+        Verifies that with "manifest" DEDUP_MODE, a duplicate image is recorded at the path of the saved content, \
+        as no file of its own is written.
+        Please look into corresponding function complete_download in downloader.py
+        :return:
+        """
+        cache_dir = tempfile.mkdtemp ( )
+        self.addCleanup ( shutil.rmtree, cache_dir )
+        cfg.APP_CFG[ HTTP_CACHE_PATH ] = cache_dir + "/http_cache.jsonl"
+        cfg.APP_CFG[ DEDUP_MODE ] = "manifest"
+        self.server.add_resource ( "/mirror.png", LocalImageServer.PNG_BYTES, "image/png", headers={ "ETag": '"v1"' } )
+        url_dl = Downloader ( queue.Queue ( ) )
+
+        self.assertTrue ( url_dl.download_image ( self.server.url ( "/image.png" ) ) )
+        self.assertTrue ( url_dl.download_image ( self.server.url ( "/mirror.png" ) ) )
+
+        self.assertFalse ( os.path.exists ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/mirror.png" ) )
+        self.assertEqual ( url_dl.http_cache.get_entry ( self.server.url ( "/mirror.png" ) )[ "path" ],
+                           cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/image.png" )
+
+    def test_conditional_download_image ( self ):
+        """
+        Verifies that with HTTP_CACHE_PATH, an unchanged image is not downloaded again by a later run.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        cache_dir = tempfile.mkdtemp ( )
+        self.addCleanup ( shutil.rmtree, cache_dir )
+        cfg.APP_CFG[ HTTP_CACHE_PATH ] = cache_dir + "/http_cache.jsonl"
+        self.server.add_resource ( "/tagged.png", LocalImageServer.PNG_BYTES, "image/png", headers={ "ETag": '"v1"' } )
+        url = self.server.url ( "/tagged.png" )
+
+        url_dl = Downloader ( queue.Queue ( ) )
+        self.assertTrue ( url_dl.download_image ( url ) )
+        url_dl.http_cache.save ( )
+
+        # later run
+        url_dl = Downloader ( queue.Queue ( ) )
+        self.assertTrue ( url_dl.download_image ( url ) )
+
+        self.assertEqual ( self.server.request_log, [ ("GET", "/tagged.png", 200), ("GET", "/tagged.png", 304) ] )
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ "tagged.png" ] )
+
+    def test_resume_download_image ( self ):
+        """
+        Verifies that an interrupted transfer is resumed with a byte range request instead of starting over.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        body = os.urandom ( 256 * 1024 )
+        self.server.add_resource ( "/large.tif", body, "image/tiff", headers={ "Accept-Ranges": "bytes" },
+                                   interrupt_at=100 * 1024 )
+
+        self.assertTrue ( self.url_dl.download_image ( self.server.url ( "/large.tif" ), reattempt_count=1 ) )
+
+        self.assertEqual ( self.server.request_log, [ ("GET", "/large.tif", 200), ("GET", "/large.tif", 206) ] )
+        with open ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/large.tif", 'rb' ) as fp:
+            self.assertEqual ( fp.read ( ), body )
+
+    def test_interrupted_download_image ( self ):
+        """
+        Verifies that an interrupted transfer which cannot be reattempted leaves no truncated image behind.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        self.server.add_resource ( "/large.tif", os.urandom ( 256 * 1024 ), "image/tiff", interrupt_at=1024 )
+
+        self.assertFalse ( self.url_dl.download_image ( self.server.url ( "/large.tif" ), reattempt_count=0 ) )
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ ] )
+
+    def test_segmented_download_image ( self ):
+        """
+        Verifies that a large image validated with byte ranges support is downloaded in SEGMENT_COUNT segments.
+        Please look into corresponding function download_image_segments in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ SEGMENT_COUNT ] = 3
+        cfg.APP_CFG[ SEGMENTED_DOWNLOAD_MIN_SIZE ] = 1024
+        body = os.urandom ( 100 * 1024 + 1 )
+        self.server.add_resource ( "/scan.jp2", body, "image/jp2", headers={ "Accept-Ranges": "bytes" } )
+
+        url = self.server.url ( "/scan.jp2" )
+        self.assertTrue ( self.url_dl.download_image ( UrlItem ( url, content_length=len ( body ),
+                                                                 accept_ranges=True ) ) )
+
+        self.assertEqual ( self.server.request_log, [ ("GET", "/scan.jp2", 206) ] * 3 )
+        with open ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/scan.jp2", 'rb' ) as fp:
+            self.assertEqual ( fp.read ( ), body )
+
+    def test_open_ended_segmented_download_image ( self ):
+        """
+        Verifies that the segments are written up to their last byte, if the server sends the image up to its end \
+        for every byte range, and that a segmented image out of the size limits is not requested.
+        Please look into corresponding function download_segment in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ SEGMENT_COUNT ] = 3
+        cfg.APP_CFG[ SEGMENTED_DOWNLOAD_MIN_SIZE ] = 1024
+        body = b"\x00\x00\x00\x0cjP  \r\n\x87\n" + os.urandom ( 100 * 1024 + 1 )
+        self.server.add_resource ( "/scan.jp2", body, "image/jp2", headers={ "Accept-Ranges": "bytes" },
+                                   open_ended_ranges=True )
+        url_item = UrlItem ( self.server.url ( "/scan.jp2" ), content_length=len ( body ), accept_ranges=True )
+
+        with mock.patch ( "implementation.downloader.os.pwrite", wraps=os.pwrite ) as pwrite:
+            self.assertTrue ( self.url_dl.download_image ( url_item ) )
+        self.assertEqual ( sum ( len ( call.args[ 1 ] ) for call in pwrite.call_args_list ), len ( body ) )
+
+        with open ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/scan.jp2", 'rb' ) as fp:
+            self.assertEqual ( fp.read ( ), body )
+
+        cfg.APP_CFG[ MAX_IMAGE_SIZE ] = 64 * 1024
+        self.server.request_log.clear ( )
+        self.assertFalse ( Downloader ( queue.Queue ( ) ).download_image ( url_item ) )
+        self.assertEqual ( self.server.request_log, [ ] )
+
+    def test_segmented_download_fallback ( self ):
+        """
+        Verifies that an image whose server does not serve byte ranges is downloaded in a single transfer.
+        Please look into corresponding function download_image_segments in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ SEGMENT_COUNT ] = 2
+        cfg.APP_CFG[ SEGMENTED_DOWNLOAD_MIN_SIZE ] = 0
+
+        url = self.server.url ( "/image.png" )
+        self.assertTrue ( self.url_dl.download_image ( UrlItem ( url, content_length=len ( LocalImageServer.PNG_BYTES ),
+                                                                 accept_ranges=True ) ) )
+
+        with open ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/image.png", 'rb' ) as fp:
+            self.assertEqual ( fp.read ( ), LocalImageServer.PNG_BYTES )
+
+    def test_per_host_scheduler_thread_downloader ( self ):
+        """
+        Verifies that downloader threads consume the per-host scheduler and free the slot of every downloaded url, \
+        so that all the urls of a host are downloaded even with a single slot per host.
+        Please look into corresponding function record_download_result in downloader.py
+        :return:
+        """
+        scheduler = HostScheduler ( max_in_flight_per_host=1 )
+        for i in range ( 3 ):
+            self.server.add_resource ( "/image{}.png".format ( i ), LocalImageServer.PNG_BYTES, "image/png" )
+            scheduler.put ( self.server.url ( "/image{}.png".format ( i ) ) )
+        scheduler.put ( "EXIT" )
+
+        url_dl = Downloader ( scheduler )
+        url_dl.start_downloader_threads ( )
+        url_dl.wait_for_downloader_threads ( )
+
+        self.assertEqual ( sorted ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) ),
+                           [ "image0.png", "image1.png", "image2.png" ] )
+        self.assertEqual ( scheduler.in_flight, { } )
+
+    def test_adaptive_concurrency_thread_downloader ( self ):
+        """
+        Verifies that with ADAPTIVE_CONCURRENCY, MAX_DL_THREADS threads are created, downloads start at \
+        NUM_DL_THREADS in flight and every downloader thread exits on "EXIT".
+        Please look into corresponding function thread_downloader in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ ADAPTIVE_CONCURRENCY ] = True
+        cfg.APP_CFG[ MAX_DL_THREADS ] = 8
+
+        url_queue = queue.Queue ( )
+        for i in range ( 5 ):
+            self.server.add_resource ( "/image{}.png".format ( i ), LocalImageServer.PNG_BYTES, "image/png" )
+            url_queue.put ( self.server.url ( "/image{}.png".format ( i ) ) )
+        url_queue.put ( "EXIT" )
+
+        url_dl = Downloader ( url_queue )
+        self.assertEqual ( len ( url_dl.dl_thread_list ), 8 )
+        self.assertEqual ( url_dl.get_concurrency ( ), cfg.APP_CFG[ NUM_DL_THREADS ] )
+
+        url_dl.start_downloader_threads ( )
+        url_dl.wait_for_downloader_threads ( )
+
+        self.assertEqual ( len ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) ), 5 )
+        self.assertEqual ( url_dl.concurrency_controller.active, 0 )
+
+    def test_retry_thread_downloader ( self ):
+        """
+        Verifies that a download failed with a 5xx status code is retried after a backoff delay, and that \
+        downloader threads do not exit before the retry is done.
+        Please look into corresponding function schedule_retry in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ RETRY_POLICY ] = { "server_error": { "max_retries": 2, "base_delay": 0.1, "max_delay": 0.1 } }
+        self.server.add_resource ( "/busy.png", LocalImageServer.PNG_BYTES, "image/png", failures=2 )
+
+        url_queue = queue.Queue ( )
+        url_queue.put ( self.server.url ( "/busy.png" ) )
+        url_queue.put ( "EXIT" )
+
+        url_dl = Downloader ( url_queue )
+        url_dl.start_downloader_threads ( )
+        url_dl.wait_for_downloader_threads ( )
+
+        self.assertEqual ( self.server.request_log, [ ("GET", "/busy.png", 503), ("GET", "/busy.png", 503),
+                                                      ("GET", "/busy.png", 200) ] )
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ "busy.png" ] )
+        self.assertEqual ( url_queue.get ( ), "EXIT" )
+
+    def test_unexpected_error_thread_downloader ( self ):
+        """
+        Verifies that an unexpected exception of a download fails its url, and that downloader threads still exit \
+        instead of waiting for it with "EXIT" held back.
+        Please look into corresponding function thread_downloader in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ RETRY_POLICY ] = { "server_error": { "max_retries": 2, "base_delay": 0.1, "max_delay": 0.1 } }
+        self.server.add_resource ( "/tiger.png", LocalImageServer.PNG_BYTES, "image/png" )
+
+        url_queue = queue.Queue ( )
+        for path in ("/full.png", "/tiger.png", "EXIT"):
+            url_queue.put ( self.server.url ( path ) if path != "EXIT" else path )
+
+        url_dl = Downloader ( url_queue )
+        download_image = url_dl.download_image
+
+        def failing_download_image ( url, *args, **kwargs ):
+            if url.endswith ( "/full.png" ):
+                raise OSError ( 28, "No space left on device" )
+            return download_image ( url, *args, **kwargs )
+
+        with mock.patch.object ( url_dl, "download_image", side_effect=failing_download_image ), \
+                self.assertLogs ( "implementation.downloader", level="ERROR" ):
+            url_dl.start_downloader_threads ( )
+            waiting_thread = threading.Thread ( target=url_dl.wait_for_downloader_threads, daemon=True )
+            waiting_thread.start ( )
+            waiting_thread.join ( 10 )
+
+        self.assertFalse ( waiting_thread.is_alive ( ) )
+        self.assertEqual ( (url_dl.num_downloaded, url_dl.num_failed), (1, 1) )
+        self.assertEqual ( url_queue.get ( ), "EXIT" )
+
+    def test_large_download_image ( self ):
+        """
+        Verifies that a large image is written through the reusable buffer into a temporary file, which replaces \
+        its final path once complete.
+        Please look into corresponding function download_image in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ WRITE_BUFFER_SIZE ] = 64 * 1024
+        cfg.APP_CFG[ FSYNC_BATCH_SIZE ] = 1
+        body = os.urandom ( 1024 * 1024 + 1 )
+        self.server.add_resource ( "/large.png", body, "image/png" )
+
+        self.assertTrue ( Downloader ( queue.Queue ( ) ).download_image ( self.server.url ( "/large.png" ) ) )
+
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ "large.png" ] )
+        with open ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/large.png", 'rb' ) as fp:
+            self.assertEqual ( fp.read ( ), body )
+
+    def test_hash_layout_download_image ( self ):
+        """
+        Verifies that with "hash" OUTPUT_LAYOUT, an image is saved into its shard directory, and that duplicate names \
+        are resolved within the shard.
+        Please look into corresponding function get_dl_filename_from_url in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ OUTPUT_LAYOUT ] = "hash"
+        cfg.APP_CFG[ HASH_SHARD_LEVELS ] = 2
+        self.server.add_resource ( "/tiger.png", b"tiger", "image/png" )
+
+        downloader = Downloader ( queue.Queue ( ) )
+        url = self.server.url ( "/tiger.png" )
+        shard_dir = downloader.output_layout.get_shard_dir ( url )
+        self.assertEqual ( len ( shard_dir.split ( "/" ) ), 2 )
+
+        self.assertTrue ( downloader.download_image ( url ) )
+        self.assertTrue ( downloader.download_image ( url ) )
+
+        self.assertEqual ( sorted ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/" + shard_dir ) ),
+                           [ "application_image_0.jfif", "tiger.png" ] )
+
+    def test_released_dl_filename ( self ):
+        """
+        Verifies that the name reserved by a failed download is released, and that a retried url gets the name \
+        reserved by its earlier attempt again.
+        Please look into corresponding function reserve_dl_filename in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ MAX_IMAGE_SIZE ] = 64 * 1024
+        body = LocalImageServer.PNG_BYTES + bytes ( 1024 * 1024 )
+        self.server.add_resource ( "/a/tiger.png", gzip.compress ( body ), "image/png",
+                                   headers={ "Content-Encoding": "gzip" } )
+        self.server.add_resource ( "/b/tiger.png", LocalImageServer.PNG_BYTES, "image/png" )
+
+        url_dl = Downloader ( queue.Queue ( ) )
+        self.assertFalse ( url_dl.download_image ( self.server.url ( "/a/tiger.png" ) ) )
+        self.assertTrue ( url_dl.download_image ( self.server.url ( "/b/tiger.png" ) ) )
+        self.assertEqual ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ), [ "tiger.png" ] )
+
+        url = self.server.url ( "/" )
+        dl_file_name = url_dl.reserve_dl_filename ( url )
+        url_dl.release_dl_filename ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + dl_file_name )
+        self.assertEqual ( url_dl.reserve_dl_filename ( url ), dl_file_name )
+
+    def test_tar_sink_download_image ( self ):
+        """
+        Verifies that with "tar" OUTPUT_SINK, images are appended into a tar shard instead of being saved as files.
+        Please look into corresponding function complete_download in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ OUTPUT_SINK ] = "tar"
+        self.server.add_resource ( "/tiger.png", b"tiger", "image/png" )
+        self.server.add_resource ( "/lion.png", b"lion", "image/png" )
+
+        downloader = Downloader ( queue.Queue ( ) )
+        self.assertTrue ( downloader.download_image ( self.server.url ( "/tiger.png" ) ) )
+        self.assertTrue ( downloader.download_image ( self.server.url ( "/lion.png" ) ) )
+        downloader.archive_sink.close ( )
+
+        self.assertEqual ( sorted ( os.listdir ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) ),
+                           [ "images-00000.tar", "images-00000.tar.idx" ] )
+        with tarfile.open ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] + "/images-00000.tar" ) as tar:
+            self.assertEqual ( tar.extractfile ( "lion.png" ).read ( ), b"lion" )
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from implementation.file_sink import DiskSpaceWatermark, FileSink, FsyncBatcher, ImageSizeError, PartialDownload, \
+    is_size_allowed
+
+
+class FileSinkTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.save_dir = tempfile.mkdtemp ( )
+        path = os.path.join ( self.save_dir, "image.png" )
+        self.partial_dl = PartialDownload ( path, path + ".part", None )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        shutil.rmtree ( self.save_dir )
+
+    def test_preallocated_write ( self ):
+        """
+        It tests that a file preallocated to a larger size than written is truncated to the written size, and \
+        that a resumed write continues at the written size.
+        Please look into corresponding function write in file_sink.py
+        :return:
+        """
+        with FileSink ( self.partial_dl, expected_size=1024 ) as file_sink:
+            self.assertEqual ( os.path.getsize ( self.partial_dl.write_path ), 1024 )
+            file_sink.write ( b"a" * 100 )
+
+        self.assertEqual ( os.path.getsize ( self.partial_dl.write_path ), 100 )
+
+        with FileSink ( self.partial_dl, expected_size=1024 ) as file_sink:
+            file_sink.write ( memoryview ( b"b" * 50 ) )
+
+        with open ( self.partial_dl.write_path, 'rb' ) as fp:
+            self.assertEqual ( fp.read ( ), b"a" * 100 + b"b" * 50 )
+        self.assertEqual ( self.partial_dl.size, 150 )
+
+    def test_max_size_write ( self ):
+        """
+        It tests that a write exceeding the maximum size is refused, and that the size limits allow unknown sizes.
+        Please look into corresponding functions write and is_size_allowed in file_sink.py
+        :return:
+        """
+        with FileSink ( self.partial_dl, max_size=100 ) as file_sink:
+            file_sink.write ( b"a" * 60 )
+            file_sink.write ( b"a" * 40 )
+            self.assertRaises ( ImageSizeError, file_sink.write, b"a" )
+
+        self.assertEqual ( os.path.getsize ( self.partial_dl.write_path ), 100 )
+
+        self.assertTrue ( is_size_allowed ( None, 10, 100 ) )
+        self.assertTrue ( is_size_allowed ( 100, 10, 100 ) )
+        self.assertTrue ( is_size_allowed ( 10 ** 12, 10, None ) )
+        self.assertFalse ( is_size_allowed ( 101, 10, 100 ) )
+        self.assertFalse ( is_size_allowed ( 9, 10, 100 ) )
+
+    def test_disk_space_watermark ( self ):
+        """
+        It tests that downloads wait while the free space of the disk is below the watermark, and go on once \
+        space has been freed.
+        Please look into corresponding function wait_for_space in file_sink.py
+        :return:
+        """
+        free_spaces = [ 100, 10, 10, 100 ]
+        disk_watermark = DiskSpaceWatermark ( self.save_dir, 50 )
+        disk_watermark.CHECK_INTERVAL = 0
+        disk_watermark.POLL_INTERVAL = 0.05
+
+        with mock.patch.object ( disk_watermark, "get_free_space", side_effect=lambda: free_spaces.pop ( 0 ) ):
+            self.assertTrue ( disk_watermark.wait_for_space ( ) )
+            self.assertFalse ( disk_watermark.is_paused )
+
+            waiter = threading.Thread ( target=disk_watermark.wait_for_space )
+            waiter.start ( )
+            waiter.join ( timeout=5 )
+
+        self.assertFalse ( waiter.is_alive ( ) )
+        self.assertFalse ( disk_watermark.is_paused )
+        self.assertEqual ( free_spaces, [ ] )
+
+        self.assertGreater ( DiskSpaceWatermark ( self.save_dir, 0 ).get_free_space ( ), 0 )
+
+    def test_disk_space_watermark_max_wait ( self ):
+        """
+        It tests that downloads give up waiting for free space after max_wait seconds, fail right away while the \
+        disk stays full, and go on once space has been freed.
+        Please look into corresponding function wait_for_space in file_sink.py
+        :return:
+        """
+        free_space = [ 10 ]
+        disk_watermark = DiskSpaceWatermark ( self.save_dir, 50, max_wait=0.2 )
+        disk_watermark.CHECK_INTERVAL = 0
+        disk_watermark.POLL_INTERVAL = 0.05
+
+        with mock.patch.object ( disk_watermark, "get_free_space", side_effect=lambda: free_space[ 0 ] ):
+            start_time = time.monotonic ( )
+            self.assertFalse ( disk_watermark.wait_for_space ( ) )
+            self.assertGreaterEqual ( time.monotonic ( ) - start_time, 0.2 )
+
+            start_time = time.monotonic ( )
+            self.assertFalse ( disk_watermark.wait_for_space ( ) )
+            self.assertLess ( time.monotonic ( ) - start_time, 0.2 )
+
+            free_space[ 0 ] = 100
+            time.sleep ( 0.05 )
+            self.assertTrue ( disk_watermark.wait_for_space ( ) )
+
+    def test_thread_buffer ( self ):
+        """
+        It tests that the read buffer of a thread is allocated once and reused.
+        Please look into corresponding function get_thread_buffer in file_sink.py
+        :return:
+        """
+        buffer = FileSink.get_thread_buffer ( 4096 )
+        self.assertGreaterEqual ( len ( buffer ), 4096 )
+        self.assertIs ( FileSink.get_thread_buffer ( 1024 ), buffer )
+
+    def test_fsync_batcher ( self ):
+        """
+        It tests that saved files are flushed once a batch is full, and that missing files are skipped.
+        Please look into corresponding function add in file_sink.py
+        :return:
+        """
+        with FileSink ( self.partial_dl ) as file_sink:
+            file_sink.write ( b"image" )
+
+        fsync_batcher = FsyncBatcher ( batch_size=2 )
+        fsync_batcher.add ( self.partial_dl.write_path )
+        self.assertEqual ( len ( fsync_batcher.paths ), 1 )
+
+        fsync_batcher.add ( os.path.join ( self.save_dir, "removed.png" ) )
+        self.assertEqual ( fsync_batcher.paths, [ ] )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
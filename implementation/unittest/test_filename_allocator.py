@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from implementation.filename_allocator import FilenameAllocator
+
+
+class FilenameAllocatorTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.save_dir = tempfile.mkdtemp ( )
+        for name in ("tiger.png", "application_image_7.jfif", "application_image_12.png", "lion.jpg.part"):
+            open ( os.path.join ( self.save_dir, name ), 'wb' ).close ( )
+
+        # temporary file left by the interrupted download of an earlier run
+        os.utime ( os.path.join ( self.save_dir, "lion.jpg.part" ), (0, 0) )
+
+        self.allocator = FilenameAllocator ( self.save_dir )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        shutil.rmtree ( self.save_dir )
+
+    def test_reserve ( self ):
+        """
+        It tests that names present in the directory are replaced by custom names, which are numbered on from \
+        the ones of earlier runs, and that the temporary file of an earlier run is removed instead of blocking its name.
+        Please look into corresponding function reserve in filename_allocator.py
+        :return:
+        """
+        self.assertEqual ( self.allocator.reserve ( "cat.png", "jfif" ), "cat.png" )
+        self.assertEqual ( self.allocator.reserve ( "cat.png", "jfif" ), "application_image_13.jfif" )
+        self.assertEqual ( self.allocator.reserve ( "tiger.png", "jfif" ), "application_image_14.jfif" )
+        self.assertEqual ( self.allocator.reserve ( "lion.jpg", "jfif" ), "lion.jpg" )
+        self.assertEqual ( self.allocator.reserve ( None, "jfif" ), "application_image_15.jfif" )
+
+        self.assertFalse ( os.path.exists ( os.path.join ( self.save_dir, "lion.jpg.part" ) ) )
+
+    def test_release ( self ):
+        """
+        It tests that a released name can be reserved again, and that a temporary file of this run is not removed.
+        Please look into corresponding function release in filename_allocator.py
+        :return:
+        """
+        self.assertEqual ( self.allocator.reserve ( "cat.png", "jfif" ), "cat.png" )
+        open ( os.path.join ( self.save_dir, "cat.png.part" ), 'wb' ).close ( )
+
+        self.allocator.release ( "cat.png" )
+        self.assertEqual ( self.allocator.reserve ( "cat.png", "jfif" ), "cat.png" )
+
+        os.makedirs ( os.path.join ( self.save_dir, "ab" ) )
+        open ( os.path.join ( self.save_dir, "ab", "cat.png.part" ), 'wb' ).close ( )
+        self.assertEqual ( self.allocator.reserve ( "cat.png", "jfif", "ab" ), "cat.png" )
+        self.assertTrue ( os.path.exists ( os.path.join ( self.save_dir, "ab", "cat.png.part" ) ) )
+
+    def test_concurrent_reserve ( self ):
+        """
+        It tests that concurrent threads asking for the same name never get the same name.
+        Please look into corresponding function reserve in filename_allocator.py
+        :return:
+        """
+        reserved_names = [ ]
+
+        def reserve_names ( ):
+            for _ in range ( 100 ):
+                reserved_names.append ( self.allocator.reserve ( "same.png", "jfif" ) )
+
+        threads = [ threading.Thread ( target=reserve_names ) for _ in range ( 8 ) ]
+        for th in threads:
+            th.start ( )
+        for th in threads:
+            th.join ( )
+
+        self.assertEqual ( len ( set ( reserved_names ) ), 800 )
+
+
+    def test_sub_dir_reserve ( self ):
+        """
+        It tests that the names of a sub-directory are indexed and reserved independently of save_dir.
+        Please look into corresponding function reserve in filename_allocator.py
+        :return:
+        """
+        os.makedirs ( os.path.join ( self.save_dir, "ab", "cd" ) )
+        open ( os.path.join ( self.save_dir, "ab", "cd", "application_image_3.png" ), 'wb' ).close ( )
+
+        self.assertEqual ( self.allocator.reserve ( "tiger.png", "jfif", "ab/cd" ), "tiger.png" )
+        self.assertEqual ( self.allocator.reserve ( None, "jfif", "ab/cd" ), "application_image_4.jfif" )
+        self.assertEqual ( self.allocator.reserve ( None, "jfif", "ef" ), "application_image_0.jfif" )
+        self.assertEqual ( self.allocator.reserve ( None, "jfif" ), "application_image_13.jfif" )
+
+if __name__ == '__main__':
+    unittest.main ( )
@@ -0,0 +1,66 @@
+import queue
+import threading
+import time
+import unittest
+
+from implementation.host_scheduler import HostScheduler
+
+
+class HostSchedulerTestCase ( unittest.TestCase ):
+    def test_round_robin ( self ):
+        """
+        It tests that urls are handed over round-robin across hosts, rather than in the order they were put.
+        Please look into corresponding function get in host_scheduler.py
+        :return:
+        """
+        scheduler = HostScheduler ( max_in_flight_per_host=10 )
+        for url in [ "http://a/1", "http://a/2", "http://a/3", "http://b/1", "http://c/1" ]:
+            scheduler.put ( url )
+        scheduler.put ( "EXIT" )
+
+        urls = [ scheduler.get ( ) for _ in range ( 5 ) ]
+        self.assertEqual ( urls, [ "http://a/1", "http://b/1", "http://c/1", "http://a/2", "http://a/3" ] )
+        self.assertEqual ( scheduler.get ( ), "EXIT" )
+
+    def test_max_in_flight_per_host ( self ):
+        """
+        It tests that a host never has more than max_in_flight_per_host urls in flight, and that "EXIT" is handed \
+        over only once every url has been.
+        Please look into corresponding function task_done in host_scheduler.py
+        :return:
+        """
+        scheduler = HostScheduler ( max_in_flight_per_host=1 )
+        scheduler.put ( "http://a/1" )
+        scheduler.put ( "http://a/2" )
+        scheduler.put ( "EXIT" )
+
+        self.assertEqual ( scheduler.get ( ), "http://a/1" )
+        with self.assertRaises ( queue.Empty ):
+            scheduler.get ( block=False )
+
+        threading.Timer ( 0.1, scheduler.task_done, args=("http://a/1",) ).start ( )
+        self.assertEqual ( scheduler.get ( timeout=5 ), "http://a/2" )
+
+        scheduler.task_done ( "http://a/2" )
+        self.assertEqual ( scheduler.get ( timeout=5 ), "EXIT" )
+
+    def test_min_interval ( self ):
+        """
+        It tests that two downloads from the same host never start within min_interval seconds, while other hosts \
+        are served meanwhile.
+        Please look into corresponding function pop_ready_item in host_scheduler.py
+        :return:
+        """
+        scheduler = HostScheduler ( max_in_flight_per_host=10, min_interval=0.2 )
+        for url in [ "http://a/1", "http://a/2", "http://b/1" ]:
+            scheduler.put ( url )
+
+        start_time = time.monotonic ( )
+        self.assertEqual ( scheduler.get ( ), "http://a/1" )
+        self.assertEqual ( scheduler.get ( ), "http://b/1" )
+        self.assertEqual ( scheduler.get ( timeout=5 ), "http://a/2" )
+        self.assertGreaterEqual ( time.monotonic ( ) - start_time, 0.2 )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from implementation.http_cache import ConditionalCache
+
+
+class ConditionalCacheTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.cache_dir = tempfile.mkdtemp ( )
+        self.cache_path = os.path.join ( self.cache_dir, "http_cache.jsonl" )
+
+        self.image_path = os.path.join ( self.cache_dir, "a.png" )
+        with open ( self.image_path, 'wb' ) as fp:
+            fp.write ( b"image" )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        shutil.rmtree ( self.cache_dir )
+
+    def test_conditional_headers ( self ):
+        """
+        It tests that a cached url gets conditional request headers, unless its file has been deleted.
+        Please look into corresponding function get_conditional_headers in http_cache.py
+        :return:
+        """
+        http_cache = ConditionalCache ( self.cache_path )
+        http_cache.store ( "http://host/a.png", '"v1"', "Wed, 21 Oct 2015 07:28:00 GMT", 5, self.image_path )
+        http_cache.store ( "http://host/b.png", None, None, 5, self.image_path )
+
+        self.assertEqual ( http_cache.get_conditional_headers ( "http://host/a.png" ),
+                           { "If-None-Match": '"v1"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT" } )
+        self.assertEqual ( http_cache.get_conditional_headers ( "http://host/b.png" ), { } )
+
+        os.remove ( self.image_path )
+        self.assertEqual ( http_cache.get_conditional_headers ( "http://host/a.png" ), { } )
+
+    def test_persistence_and_eviction ( self ):
+        """
+        It tests that the cache is persisted and reloaded, and that least recently used urls are evicted.
+        Please look into corresponding functions save, load and store in http_cache.py
+        :return:
+        """
+        http_cache = ConditionalCache ( self.cache_path, max_entries=2 )
+        http_cache.store ( "http://host/1.png", '"1"', None, 5, self.image_path )
+        http_cache.store ( "http://host/2.png", '"2"', None, 5, self.image_path )
+        http_cache.get_entry ( "http://host/1.png" )
+        http_cache.store ( "http://host/3.png", '"3"', None, 5, self.image_path )
+        http_cache.save ( )
+
+        http_cache = ConditionalCache ( self.cache_path, max_entries=2 )
+        self.assertEqual ( list ( http_cache.entries ), [ "http://host/1.png", "http://host/3.png" ] )
+        self.assertEqual ( http_cache.get_entry ( "http://host/3.png" )[ "etag" ], '"3"' )
@@ -0,0 +1,113 @@
+import threading
+import unittest
+from unittest import mock
+
+from implementation.http_session import HttpSessionPool, get_http_session_pool, close_http_session_pool
+from .helper import LocalImageServer
+
+
+class HttpSessionPoolTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.server = LocalImageServer ( )
+        self.server.start ( )
+
+        self.session_pool = HttpSessionPool ( pool_size=2, max_hosts=2 )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        self.session_pool.close ( )
+        self.server.stop ( )
+
+    def test_session_per_host ( self ):
+        """
+        It tests that urls of the same host share a session, while different hosts get their own session.
+        Please look into corresponding function get_session in http_session.py
+        :return:
+        """
+        session = self.session_pool.get_session ( "https://www.elegantthemes.com/a.png" )
+        self.assertIs ( session, self.session_pool.get_session ( "HTTPS://WWW.elegantthemes.com/b.png" ) )
+        self.assertIsNot ( session, self.session_pool.get_session ( "https://www.google.com/a.png" ) )
+
+    def test_least_recently_used_adapter_eviction ( self ):
+        """
+        It tests that only HTTP_POOL_MAX_HOSTS adapters are kept and the least recently used one gets closed.
+        Please look into corresponding function get_adapter in http_session.py
+        :return:
+        """
+        first_session = self.session_pool.get_session ( "http://first.com/a.png" )
+        second_adapter = self.session_pool.get_adapter ( "http://second.com/a.png" )
+        self.session_pool.get_session ( "http://first.com/b.png" )
+        self.session_pool.get_session ( "http://third.com/a.png" )
+
+        self.assertEqual ( len ( self.session_pool.adapters ), 2 )
+        self.assertIs ( first_session, self.session_pool.get_session ( "http://first.com/c.png" ) )
+        self.assertNotIn ( ("http", "second.com"), self.session_pool.adapters )
+
+        with mock.patch.object ( second_adapter, "close" ) as close:
+            self.session_pool.get_adapter ( "http://fourth.com/a.png" )
+            close.assert_not_called ( )
+
+    def test_evicted_adapter_in_use ( self ):
+        """
+        It tests that an evicted adapter is closed only once the requests sent through it are done.
+        Please look into corresponding functions get_adapter and release_adapter in http_session.py
+        :return:
+        """
+        adapter = self.session_pool.get_adapter ( "http://first.com/a.png", is_acquired=True )
+        with mock.patch.object ( adapter, "close" ) as close:
+            self.session_pool.get_adapter ( "http://second.com/a.png" )
+            self.session_pool.get_adapter ( "http://third.com/a.png" )
+            self.assertNotIn ( ("http", "first.com"), self.session_pool.adapters )
+            close.assert_not_called ( )
+
+            self.session_pool.release_adapter ( adapter )
+            close.assert_called_once ( )
+
+    def test_session_per_thread ( self ):
+        """
+        It tests that threads get sessions of their own, which share the adapter of a host.
+        Please look into corresponding function get_session in http_session.py
+        :return:
+        """
+        url = "http://first.com/a.png"
+        session = self.session_pool.get_session ( url )
+
+        thread_sessions = [ ]
+        thread = threading.Thread ( target=lambda: thread_sessions.append ( self.session_pool.get_session ( url ) ) )
+        thread.start ( )
+        thread.join ( )
+
+        self.assertIsNot ( session, thread_sessions[ 0 ] )
+        self.assertIs ( session.get_adapter ( url ), thread_sessions[ 0 ].get_adapter ( url ) )
+
+    def test_connection_reuse ( self ):
+        """
+        It tests that HEAD and GET requests to the same host reuse one kept alive connection.
+        Please look into corresponding functions head and get in http_session.py
+        :return:
+        """
+        url = self.server.url ( "/image.png" )
+        for _ in range ( 3 ):
+            self.assertEqual ( self.session_pool.head ( url ).status_code, 200 )
+            self.assertEqual ( self.session_pool.get ( url ).content, LocalImageServer.PNG_BYTES )
+
+        self.assertEqual ( self.server.connection_count, 1 )
+
+    def test_shared_session_pool ( self ):
+        """
+        It tests that the application components share one HttpSessionPool until it is closed.
+        Please look into corresponding function get_http_session_pool in http_session.py
+        :return:
+        """
+        session_pool = get_http_session_pool ( )
+        self.assertIs ( session_pool, get_http_session_pool ( ) )
+
+        close_http_session_pool ( )
+        self.assertIsNot ( session_pool, get_http_session_pool ( ) )
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cfg
+from implementation.app_constants import *
+from implementation.journal import JobJournal, get_job_journal, close_job_journal, PENDING, VALIDATED, \
+    DOWNLOADED, FAILED
+from implementation.parser import FileParser
+from settings import get_cmdline_args
+from .helper import Helper, LocalImageServer
+
+
+class JobJournalTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.journal_dir = tempfile.mkdtemp ( )
+        self.journal_path = os.path.join ( self.journal_dir, "journal.db" )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        cfg.APP_CFG[ JOURNAL_PATH ] = None
+        cfg.APP_CFG[ JOURNAL_RESUME ] = False
+        close_job_journal ( )
+
+        shutil.rmtree ( self.journal_dir )
+
+    def test_record_states ( self ):
+        """
+        It tests that the recorded states are written, kept by a resumed job and dropped by a new job.
+        Please look into corresponding functions record and get_state in journal.py
+        :return:
+        """
+        journal = JobJournal ( self.journal_path, batch_size=2 )
+        for state in (PENDING, VALIDATED, DOWNLOADED):
+            journal.record ( "http://host/a.png", state )
+        journal.record ( "http://host/b.png", FAILED )
+        journal.close ( )
+
+        journal = JobJournal ( self.journal_path, resume=True )
+        self.assertEqual ( journal.get_state ( "http://host/a.png" ), DOWNLOADED )
+        self.assertEqual ( journal.get_state ( "http://host/b.png" ), FAILED )
+        self.assertIsNone ( journal.get_state ( "http://host/c.png" ) )
+        journal.close ( )
+
+        journal = JobJournal ( self.journal_path, resume=False )
+        self.assertIsNone ( journal.get_state ( "http://host/a.png" ) )
+        journal.close ( )
+
+    def test_resume_parse_image_url_file ( self ):
+        """
+        It tests that a resumed job skips the finished urls and does not validate the validated urls again.
+        Please look into corresponding function get_journal_state in parser.py
+        :return:
+        """
+        server = LocalImageServer ( )
+        server.add_resource ( "/pending.png", LocalImageServer.PNG_BYTES, "image/png" )
+        server.start ( )
+
+        done_url, failed_url = server.url ( "/image.png" ), server.url ( "/page.html" )
+        validated_url, pending_url = server.url ( "/validated.png" ), server.url ( "/pending.png" )
+
+        journal = JobJournal ( self.journal_path )
+        journal.record ( done_url, DOWNLOADED )
+        journal.record ( failed_url, FAILED )
+        journal.record ( validated_url, VALIDATED )
+        journal.record ( pending_url, PENDING )
+        journal.close ( )
+
+        url_file = Helper.create_url_file ( [ done_url, failed_url, validated_url, pending_url ] )
+        cfg.APP_CFG[ JOURNAL_PATH ] = self.journal_path
+        cfg.APP_CFG[ JOURNAL_RESUME ] = True
+        try:
+            parser = FileParser ( get_cmdline_args ( [ "--file", url_file ] ) )
+            parser.parse_image_url_file ( )
+        finally:
+            os.remove ( url_file )
+            server.stop ( )
+
+        # validated_url is not served by the server, so it would have failed a validation
+        queued_urls = [ parser.url_queue.get ( ) for _ in range ( parser.url_queue.qsize ( ) ) ]
+        self.assertEqual ( queued_urls, [ validated_url, pending_url, "EXIT" ] )
+
+        self.assertIs ( parser.journal, get_job_journal ( ) )
+        close_job_journal ( )
+        journal = JobJournal ( self.journal_path, resume=True )
+        self.assertEqual ( journal.get_state ( pending_url ), VALIDATED )
+        journal.close ( )
+
+    def test_resume_from_checkpoint ( self ):
+        """
+        It tests that a checkpoint of the plaintext file is recorded, and that a resumed job takes the unfinished \
+        urls read before it from the journal, each of them once.
+        Please look into corresponding function read_input_lines in parser.py
+        :return:
+        """
+        urls = [ "http://host/{}.png".format ( i ) for i in range ( 5 ) ]
+        url_file = Helper.create_url_file ( urls )
+        cfg.APP_CFG[ JOURNAL_PATH ] = self.journal_path
+        cfg.APP_CFG[ URL_VALIDATION ] = "get"
+        cfg.APP_CFG[ INPUT_CHECKPOINT_INTERVAL ] = 2
+        try:
+            parser = FileParser ( get_cmdline_args ( [ "--file", url_file ] ) )
+            parser.parse_image_url_file ( )
+            close_job_journal ( )
+
+            journal = JobJournal ( self.journal_path, resume=True )
+            self.assertEqual ( journal.get_checkpoint ( os.path.abspath ( url_file ) ), os.path.getsize ( url_file ) )
+            journal.record ( urls[ 0 ], DOWNLOADED )
+            journal.record ( urls[ 3 ], FAILED )
+            journal.close ( )
+
+            # the file is not read again before the checkpoint, so a changed line before it goes unnoticed
+            with open ( url_file, 'w' ) as fp:
+                fp.write ( "\n".join ( [ "http://host/X.png" ] + urls[ 1: ] ) + "\n" )
+
+            cfg.APP_CFG[ JOURNAL_RESUME ] = True
+            parser = FileParser ( get_cmdline_args ( [ "--file", url_file ] ) )
+            parser.parse_image_url_file ( )
+        finally:
+            cfg.APP_CFG[ URL_VALIDATION ] = "head"
+            cfg.APP_CFG[ INPUT_CHECKPOINT_INTERVAL ] = 10000
+            close_job_journal ( )
+            os.remove ( url_file )
+
+        queued_urls = [ parser.url_queue.get ( ) for _ in range ( parser.url_queue.qsize ( ) ) ]
+        self.assertEqual ( sorted ( queued_urls[ :-1 ] ), [ urls[ 1 ], urls[ 2 ], urls[ 4 ] ] )
+        self.assertEqual ( queued_urls[ -1 ], "EXIT" )
@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+
+import cfg
+from implementation.app_constants import *
+from implementation.downloader import Downloader
+from implementation.manifest import ResultManifest, close_result_manifest, finish_manifest_entry, \
+    new_manifest_entry, CSV, DOWNLOADED, FAILED, JSONL, MANIFEST_FIELDS, RETRIED
+from implementation.url_item import UrlItem
+from .helper import Helper, LocalImageServer
+
+
+class ResultManifestTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        # cfg.APP_CFG is restored after every unittest case
+        self.app_cfg = dict ( cfg.APP_CFG )
+
+        self.helper = Helper ( )
+        self.helper.create_default_cfg ( )
+        self.manifest_dir = tempfile.mkdtemp ( )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        close_result_manifest ( )
+        shutil.rmtree ( self.manifest_dir )
+
+        cfg.APP_CFG.clear ( )
+        cfg.APP_CFG.update ( self.app_cfg )
+
+    def test_write_formats ( self ):
+        """
+        It tests that the records are written as JSON lines or as CSV rows after a single header row, and \
+        appended to the ones of an earlier run.
+        Please look into corresponding class ResultManifest in manifest.py
+        :return:
+        """
+        jsonl_path = os.path.join ( self.manifest_dir, "manifest.jsonl" )
+        csv_path = os.path.join ( self.manifest_dir, "manifest.csv" )
+
+        for _ in range ( 2 ):
+            for path, manifest_format in ((jsonl_path, JSONL), (csv_path, CSV)):
+                manifest = ResultManifest ( path, manifest_format, batch_size=2 )
+                for url in ("http://host/a.png", "http://host/b.png", "http://host/c.png"):
+                    manifest.record ( finish_manifest_entry ( new_manifest_entry ( url ), FAILED, None ) )
+                manifest.close ( )
+
+        with open ( jsonl_path, encoding='utf-8' ) as fd:
+            records = [ json.loads ( line ) for line in fd ]
+        self.assertEqual ( len ( records ), 6 )
+        self.assertEqual ( tuple ( records[ 0 ] ), MANIFEST_FIELDS )
+        self.assertEqual ( records[ 2 ][ "url" ], "http://host/c.png" )
+        self.assertEqual ( records[ 2 ][ "result" ], FAILED )
+
+        with open ( csv_path, encoding='utf-8', newline='' ) as fd:
+            rows = list ( csv.DictReader ( fd ) )
+        self.assertEqual ( len ( rows ), 6 )
+        self.assertEqual ( [ row[ "url" ] for row in rows[ :3 ] ], [ "http://host/a.png", "http://host/b.png",
+                                                                     "http://host/c.png" ] )
+
+    def test_download_records ( self ):
+        """
+        It tests that the downloader records the final url, HTTP status, size, path and latency breakdown of \
+        every url into the manifest.
+        Please look into corresponding function record_manifest_entry in downloader.py
+        :return:
+        """
+        cfg.APP_CFG[ IMAGE_SAVE_DIR ] = os.path.join ( self.manifest_dir, "images" )
+        os.makedirs ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] )
+        cfg.APP_CFG[ MANIFEST_PATH ] = os.path.join ( self.manifest_dir, "manifest.jsonl" )
+
+        server = LocalImageServer ( )
+        server.add_resource ( "/moved.png", b"", "text/html", status=302, headers={ "Location": "/image.png" } )
+        server.start ( )
+
+        url_queue = queue.Queue ( )
+        for path in ("/moved.png", "/missing.png", "EXIT"):
+            url_queue.put ( server.url ( path ) if path != "EXIT" else path )
+        try:
+            url_dl = Downloader ( url_queue )
+            url_dl.start_downloader_threads ( )
+            url_dl.wait_for_downloader_threads ( )
+            close_result_manifest ( )
+        finally:
+            server.stop ( )
+
+        with open ( cfg.APP_CFG[ MANIFEST_PATH ], encoding='utf-8' ) as fd:
+            records = { record[ "url" ]: record for record in map ( json.loads, fd ) }
+
+        downloaded = records[ server.url ( "/moved.png" ) ]
+        self.assertEqual ( downloaded[ "result" ], DOWNLOADED )
+        self.assertEqual ( downloaded[ "final_url" ], server.url ( "/image.png" ) )
+        self.assertEqual ( downloaded[ "status" ], 200 )
+        self.assertEqual ( downloaded[ "content_type" ], "image/png" )
+        self.assertEqual ( downloaded[ "bytes" ], len ( LocalImageServer.PNG_BYTES ) )
+        self.assertTrue ( os.path.isfile ( downloaded[ "path" ] ) )
+        self.assertEqual ( downloaded[ "retries" ], 0 )
+        for field in ("dns_ms", "connect_ms", "ttfb_ms", "transfer_ms", "total_ms"):
+            self.assertGreaterEqual ( downloaded[ field ], 0, field )
+        self.assertIsNone ( downloaded[ "tls_ms" ] )
+
+        failed = records[ server.url ( "/missing.png" ) ]
+        self.assertEqual ( failed[ "result" ], FAILED )
+        self.assertEqual ( failed[ "status" ], 404 )
+        self.assertIsNone ( failed[ "path" ] )
+
+    def test_retry_records ( self ):
+        """
+        It tests that the record of a download counts the delayed retries of its url (see RETRY_POLICY), and that \
+        a segmented download is recorded as a single attempt with its time to first byte.
+        Please look into corresponding function get_num_retries in http_session.py
+        :return:
+        """
+        cfg.APP_CFG[ IMAGE_SAVE_DIR ] = os.path.join ( self.manifest_dir, "images" )
+        os.makedirs ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] )
+        cfg.APP_CFG[ MANIFEST_PATH ] = os.path.join ( self.manifest_dir, "manifest.jsonl" )
+        cfg.APP_CFG[ RETRY_POLICY ] = { "server_error": { "max_retries": 2, "base_delay": 0.1, "max_delay": 0.1 } }
+        cfg.APP_CFG[ SEGMENT_COUNT ] = 3
+        cfg.APP_CFG[ SEGMENTED_DOWNLOAD_MIN_SIZE ] = 1024
+
+        body = os.urandom ( 100 * 1024 + 1 )
+        server = LocalImageServer ( )
+        server.add_resource ( "/busy.png", LocalImageServer.PNG_BYTES, "image/png", failures=2 )
+        server.add_resource ( "/scan.jp2", body, "image/jp2", headers={ "Accept-Ranges": "bytes" } )
+        server.start ( )
+
+        url_queue = queue.Queue ( )
+        url_queue.put ( server.url ( "/busy.png" ) )
+        url_queue.put ( UrlItem ( server.url ( "/scan.jp2" ), content_length=len ( body ), accept_ranges=True ) )
+        url_queue.put ( "EXIT" )
+        try:
+            url_dl = Downloader ( url_queue )
+            url_dl.start_downloader_threads ( )
+            url_dl.wait_for_downloader_threads ( )
+            close_result_manifest ( )
+        finally:
+            server.stop ( )
+
+        with open ( cfg.APP_CFG[ MANIFEST_PATH ], encoding='utf-8' ) as fd:
+            records = [ json.loads ( line ) for line in fd ]
+
+        busy_records = [ record for record in records if record[ "url" ] == server.url ( "/busy.png" ) ]
+        self.assertEqual ( [ (record[ "result" ], record[ "retries" ]) for record in busy_records ],
+                           [ (RETRIED, 0), (RETRIED, 1), (DOWNLOADED, 2) ] )
+
+        segmented, = [ record for record in records if record[ "url" ] == server.url ( "/scan.jp2" ) ]
+        self.assertEqual ( segmented[ "result" ], DOWNLOADED )
+        self.assertEqual ( segmented[ "retries" ], 0 )
+        self.assertGreaterEqual ( segmented[ "ttfb_ms" ], 0 )
+        self.assertGreaterEqual ( segmented[ "transfer_ms" ], 0 )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
@@ -0,0 +1,53 @@
+import unittest
+
+from implementation.media_type import is_image_content_type, is_image_extension, sniff_image_type
+from .helper import LocalImageServer
+
+
+class MediaTypeTestCase ( unittest.TestCase ):
+    def test_sniff_image_type ( self ):
+        """
+        It tests that image formats are recognized from their first bytes, and that other contents are not.
+        Please look into corresponding function sniff_image_type in media_type.py
+        :return:
+        """
+        samples = {
+            LocalImageServer.PNG_BYTES: "png",
+            b"\xff\xd8\xff\xdb\x00\x43": "jpg",
+            b"GIF89a\x01\x00": "gif",
+            b"MM\x00*\x00\x00\x00\x08": "tif",
+            b"RIFF\x24\x00\x00\x00WEBPVP8 ": "webp",
+            b"\x00\x00\x00\x0cjP  \r\n\x87\n\x00\x00\x00\x14ftypjp2 ": "jp2",
+            b"BM\x36\x00\x0c\x00": "bmp",
+            b"\x00\x00\x00\x1cftypavif\x00\x00\x00\x00": "avif",
+            b"\x00\x00\x00\x18ftypheic\x00\x00\x00\x00": "heic",
+            b"RIFF\x24\x00\x00\x00WAVEfmt ": None,
+            b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00": None,
+            b"<svg xmlns=\"http://www.w3.org/2000/svg\">": "svg",
+            b"\xef\xbb\xbf<?xml version=\"1.0\"?>\n<!DOCTYPE svg PUBLIC \"-//W3C//DTD SVG 1.1//EN\">\n<svg>": "svg",
+            b"<!-- Generator: editor -->\n<svg version=\"1.1\">": "svg",
+            b"<?xml version=\"1.0\"?>\n<html xmlns=\"http://www.w3.org/1999/xhtml\"><body><svg>": None,
+            b"<!DOCTYPE html><html>": None,
+            b"": None,
+        }
+        for data, image_ext in samples.items ( ):
+            self.assertEqual ( sniff_image_type ( data ), image_ext, data )
+
+    def test_content_type ( self ):
+        """
+        It tests that undeclared content types are only accepted as possible images on demand.
+        Please look into corresponding function is_image_content_type in media_type.py
+        :return:
+        """
+        self.assertTrue ( is_image_content_type ( "image/webp" ) )
+        self.assertFalse ( is_image_content_type ( "application/octet-stream" ) )
+        self.assertTrue ( is_image_content_type ( "Application/Octet-Stream; charset=binary", allow_generic=True ) )
+        self.assertTrue ( is_image_content_type ( None, allow_generic=True ) )
+        self.assertFalse ( is_image_content_type ( "text/html", allow_generic=True ) )
+
+        self.assertTrue ( is_image_extension ( "JPEG", "jpg" ) )
+        self.assertFalse ( is_image_extension ( "png", "jpg" ) )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
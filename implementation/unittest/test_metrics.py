@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.request
+
+from implementation.metrics import Counter, Gauge, Histogram, MetricsExporter, MetricsRegistry
+
+
+class MetricsTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        self.registry = MetricsRegistry ( )
+        self.counter = self.registry.register ( Counter ( "test_requests_total", "Requests.", ("status",) ) )
+        self.gauge = self.registry.register ( Gauge ( "test_queue_depth", "Depth.", ("queue",) ) )
+        self.histogram = self.registry.register ( Histogram ( "test_latency_seconds", "Latency.", buckets=(0.1, 1.0) ) )
+
+    def test_concurrent_counter ( self ):
+        """
+        It tests that no increment of a counter is lost to concurrent threads.
+        Please look into corresponding class Counter in metrics.py
+        :return:
+        """
+        threads = [ threading.Thread ( target=lambda: [ self.counter.inc ( labels=("200",) ) for _ in range ( 1000 ) ] )
+                    for _ in range ( 8 ) ]
+        for thread in threads:
+            thread.start ( )
+        for thread in threads:
+            thread.join ( )
+
+        self.assertEqual ( self.counter.get_snapshot ( ), { "200": 8000 } )
+
+    def test_render_prometheus ( self ):
+        """
+        It tests the Prometheus text format of counters, gauges read from a function and cumulative histograms.
+        Please look into corresponding function render_prometheus in metrics.py
+        :return:
+        """
+        self.counter.inc ( labels=("404",) )
+        self.gauge.set_function ( lambda: 7, labels=("url_queue",) )
+        for value in (0.05, 0.5, 0.5, 3.0):
+            self.histogram.observe ( value )
+
+        lines = self.registry.render_prometheus ( ).splitlines ( )
+        self.assertIn ( "# TYPE test_requests_total counter", lines )
+        self.assertIn ( 'test_requests_total{status="404"} 1', lines )
+        self.assertIn ( 'test_queue_depth{queue="url_queue"} 7', lines )
+        self.assertIn ( 'test_latency_seconds_bucket{le="0.1"} 1', lines )
+        self.assertIn ( 'test_latency_seconds_bucket{le="1.0"} 3', lines )
+        self.assertIn ( 'test_latency_seconds_bucket{le="+Inf"} 4', lines )
+        self.assertIn ( "test_latency_seconds_count 4", lines )
+        self.assertIn ( "test_latency_seconds_sum 4.05", lines )
+
+    def test_histogram_percentile ( self ):
+        """
+        It tests that percentiles are interpolated into the bucket holding them.
+        Please look into corresponding function get_percentile in metrics.py
+        :return:
+        """
+        self.assertIsNone ( self.histogram.get_percentile ( 50 ) )
+
+        for value in (0.05,) * 50 + (0.5,) * 50:
+            self.histogram.observe ( value )
+        self.assertAlmostEqual ( self.histogram.get_percentile ( 50 ), 0.1 )
+        self.assertAlmostEqual ( self.histogram.get_percentile ( 75 ), 0.55 )
+
+        self.histogram.observe ( 3.0 )
+        self.assertEqual ( self.histogram.get_percentile ( 100 ), 1.0 )
+
+    def test_exporter ( self ):
+        """
+        It tests that the metrics are served on the HTTP endpoint, and written into the snapshot when the exporter \
+        is closed.
+        Please look into corresponding class MetricsExporter in metrics.py
+        :return:
+        """
+        self.counter.inc ( 3, labels=("200",) )
+        snapshot_path = os.path.join ( tempfile.mkdtemp ( ), "metrics.json" )
+
+        exporter = MetricsExporter ( self.registry, port=0, snapshot_path=snapshot_path, snapshot_interval=60 )
+        try:
+            url = "http://127.0.0.1:{}/metrics".format ( exporter.get_port ( ) )
+            with urllib.request.urlopen ( url, timeout=5 ) as response:
+                self.assertIn ( 'test_requests_total{status="200"} 3', response.read ( ).decode ( 'utf-8' ) )
+        finally:
+            exporter.close ( )
+
+        with open ( snapshot_path, encoding='utf-8' ) as fd:
+            self.assertEqual ( json.load ( fd )[ "test_requests_total" ], { "200": 3 } )
+        os.remove ( snapshot_path )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from implementation.output_layout import OutputLayout, DATE, FLAT, HASH, HOST
+
+
+class OutputLayoutTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.save_dir = tempfile.mkdtemp ( )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        shutil.rmtree ( self.save_dir )
+
+    def test_shard_dir ( self ):
+        """
+        It tests the shard directory of an url in every layout.
+        Please look into corresponding function get_shard_dir in output_layout.py
+        :return:
+        """
+        url = "http://WWW.Example.com:8080/images/tiger.png"
+
+        self.assertEqual ( OutputLayout ( self.save_dir, FLAT ).get_shard_dir ( url ), "" )
+        self.assertEqual ( OutputLayout ( self.save_dir, HOST ).get_shard_dir ( url ), "www.example.com" )
+        self.assertEqual ( OutputLayout ( self.save_dir, HOST ).get_shard_dir ( "file:///tiger.png" ), "_no_host" )
+        self.assertRegex ( OutputLayout ( self.save_dir, DATE ).get_shard_dir ( url ), r"^\d{4}/\d{2}/\d{2}$" )
+
+        hash_layout = OutputLayout ( self.save_dir, HASH, hash_levels=3 )
+        self.assertRegex ( hash_layout.get_shard_dir ( url ), r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{2}$" )
+        self.assertEqual ( hash_layout.get_shard_dir ( url ), hash_layout.get_shard_dir ( url ) )
+
+    def test_make_shard_dir ( self ):
+        """
+        It tests that a shard directory is created on its first use only.
+        Please look into corresponding function make_shard_dir in output_layout.py
+        :return:
+        """
+        layout = OutputLayout ( self.save_dir, HOST )
+
+        self.assertEqual ( layout.make_shard_dir ( "http://a.com/1.png" ), "a.com" )
+        self.assertTrue ( os.path.isdir ( os.path.join ( self.save_dir, "a.com" ) ) )
+
+        os.rmdir ( os.path.join ( self.save_dir, "a.com" ) )
+        layout.make_shard_dir ( "http://a.com/2.png" )
+        self.assertFalse ( os.path.exists ( os.path.join ( self.save_dir, "a.com" ) ) )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
@@ -1,10 +1,11 @@
+import os
 import unittest
 
 import cfg
 from implementation.app_constants import *
 from implementation.parser import FileParser
 from settings import get_cmdline_args
-from .helper import Helper
+from .helper import Helper, LocalImageServer
 
 
 # assert method Reference: https://docs.python.org/3.5/library/unittest.html#assert-methods
@@ -86,3 +87,163 @@ class ParserTestCase ( unittest.TestCase ):
 
         # there are 2 serviceable urls in mock_image_urls.txt + "EXIT" = 3
         self.assertEqual ( self.parser.url_queue.qsize ( ), self.helper.num_serviceable_urls ( self.parser ) )
+
+    def test_get_validation_parse_image_url_file ( self ):
+        """
+        It tests that in "get" URL_VALIDATION, parse_image_url_file queues every url without validating it.
+        Please look into corresponding function parse_image_url_file in parser.py
+        :return:
+        """
+        cfg.APP_CFG[ URL_VALIDATION ] = "get"
+        try:
+            self.parser.parse_image_url_file ( )
+        finally:
+            cfg.APP_CFG[ URL_VALIDATION ] = "head"
+
+        # there are 5 urls in mock_image_urls.txt + "EXIT" = 6
+        self.assertEqual ( self.parser.url_queue.qsize ( ), 6 )
+
+
+class ParserLocalServerTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.helper = Helper ( )
+        self.helper.create_default_cfg ( )
+
+        self.server = LocalImageServer ( )
+        self.server.add_resource ( "/slow.png", LocalImageServer.PNG_BYTES, "image/png", delay=1 )
+        self.server.start ( )
+
+        self.url_file = self.helper.create_url_file ( [ self.server.url ( "/slow.png" ),
+                                                        self.server.url ( "/image.png" ),
+                                                        self.server.url ( "/page.html" ),
+                                                        self.server.url ( "/image.png" ) ] )
+
+    def tearDown ( self ):
+        """
+        Method called after every unittest case
+        :return:
+        """
+        cfg.APP_CFG[ NUM_VALIDATOR_THREADS ] = 4
+
+        os.remove ( self.url_file )
+        self.server.stop ( )
+
+    def test_size_validation ( self ):
+        """
+        It tests that an url whose announced size is out of the size limits is not serviceable.
+        Please look into corresponding function get_serviceable_url_item in parser.py
+        :return:
+        """
+        self.server.add_resource ( "/large.png", LocalImageServer.PNG_BYTES + bytes ( 2048 ), "image/png" )
+        parser = FileParser ( get_cmdline_args ( [ "--file", self.url_file ] ) )
+        try:
+            cfg.APP_CFG[ MAX_IMAGE_SIZE ] = 1024
+            self.assertIsNotNone ( parser.get_serviceable_url_item ( self.server.url ( "/image.png" ) ) )
+            self.assertIsNone ( parser.get_serviceable_url_item ( self.server.url ( "/large.png" ) ) )
+
+            cfg.APP_CFG[ MIN_IMAGE_SIZE ] = len ( LocalImageServer.PNG_BYTES ) + 1
+            self.assertIsNone ( parser.get_serviceable_url_item ( self.server.url ( "/image.png" ) ) )
+        finally:
+            cfg.APP_CFG[ MIN_IMAGE_SIZE ] = 0
+            cfg.APP_CFG[ MAX_IMAGE_SIZE ] = None
+
+    def test_parallel_validation ( self ):
+        """
+        It tests that a slow url does not hold up the validation of the following urls, and that "EXIT" is \
+        only queued after every serviceable url.
+        Please look into corresponding function thread_validator in parser.py
+        :return:
+        """
+        cfg.APP_CFG[ NUM_VALIDATOR_THREADS ] = 2
+        parser = FileParser ( get_cmdline_args ( [ "--file", self.url_file ] ) )
+        parser.parse_image_url_file ( )
+
+        queued_urls = [ parser.url_queue.get ( ) for _ in range ( parser.url_queue.qsize ( ) ) ]
+        self.assertEqual ( queued_urls, [ self.server.url ( "/image.png" ),
+                                          self.server.url ( "/image.png" ),
+                                          self.server.url ( "/slow.png" ),
+                                          "EXIT" ] )
+
+        # meta-information of the validated resources is kept for the downloader
+        self.assertEqual ( queued_urls[ 0 ].content_length, len ( LocalImageServer.PNG_BYTES ) )
+        self.assertFalse ( queued_urls[ 0 ].accept_ranges )
+
+        # validator threads have exited and left nothing behind
+        self.assertFalse ( any ( th.is_alive ( ) for th in parser.validator_thread_list ) )
+        self.assertEqual ( parser.line_queue.qsize ( ), 0 )
+
+    def test_url_dedup ( self ):
+        """
+        It tests that with URL_DEDUP, urls differing only by their spelling are queued once, normalized.
+        Please look into corresponding function is_url_unseen in parser.py
+        :return:
+        """
+        url_file = self.helper.create_url_file ( [ "http://127.0.0.1:80/a.png", "HTTP://127.0.0.1/a.png#x",
+                                                   "http://127.0.0.1/a.png", "http://127.0.0.1/b.png", "" ] )
+        cfg.APP_CFG[ URL_VALIDATION ] = "get"
+        cfg.APP_CFG[ URL_DEDUP ] = True
+        try:
+            parser = FileParser ( get_cmdline_args ( [ "--file", url_file ] ) )
+            parser.parse_image_url_file ( )
+        finally:
+            cfg.APP_CFG[ URL_VALIDATION ] = "head"
+            cfg.APP_CFG[ URL_DEDUP ] = False
+            os.remove ( url_file )
+
+        queued_urls = [ parser.url_queue.get ( ) for _ in range ( parser.url_queue.qsize ( ) ) ]
+        self.assertEqual ( queued_urls, [ "http://127.0.0.1/a.png", "http://127.0.0.1/b.png", "EXIT" ] )
+
+    def test_retry_validation ( self ):
+        """
+        It tests that an url whose validation fails with "503 Service Unavailable" is validated again \
+        after a backoff delay, before "EXIT" is queued.
+        Please look into corresponding function thread_validator in parser.py
+        :return:
+        """
+        self.server.add_resource ( "/busy.png", LocalImageServer.PNG_BYTES, "image/png", failures=1 )
+        url_file = self.helper.create_url_file ( [ self.server.url ( "/busy.png" ), self.server.url ( "/image.png" ) ] )
+        cfg.APP_CFG[ RETRY_POLICY ] = { "server_error": { "max_retries": 1, "base_delay": 0.1, "max_delay": 0.1 } }
+        try:
+            parser = FileParser ( get_cmdline_args ( [ "--file", url_file ] ) )
+            parser.parse_image_url_file ( )
+        finally:
+            cfg.APP_CFG[ RETRY_POLICY ] = None
+            os.remove ( url_file )
+
+        queued_urls = [ parser.url_queue.get ( ) for _ in range ( parser.url_queue.qsize ( ) ) ]
+        self.assertEqual ( queued_urls, [ self.server.url ( "/image.png" ), self.server.url ( "/busy.png" ), "EXIT" ] )
+        self.assertEqual ( parser.line_queue.qsize ( ), 0 )
+
+    def test_sharded_parse ( self ):
+        """
+        It tests that in a sharded run, every url of the document is queued by exactly one shard, in both \
+        SHARD_MODE.
+        Please look into corresponding function read_shard_lines in parser.py
+        :return:
+        """
+        urls = [ "http://host{0}.com/{1}.png".format ( i % 5, i ) for i in range ( 40 ) ]
+        url_file = self.helper.create_url_file ( urls )
+        cfg.APP_CFG[ URL_VALIDATION ] = "get"
+        try:
+            for shard_mode in ("hash", "byte_range"):
+                cfg.APP_CFG[ SHARD_MODE ] = shard_mode
+                queued_urls = [ ]
+                for shard_index in range ( 3 ):
+                    cfg.APP_CFG[ SHARD_COUNT ] = 1
+                    parser = FileParser ( get_cmdline_args ( [ "--file", url_file ] ) )
+                    # set after get_cmdline_args, which would move IMAGE_SAVE_DIR of a sharded run (see configure_shard)
+                    cfg.APP_CFG[ SHARD_INDEX ], cfg.APP_CFG[ SHARD_COUNT ] = shard_index, 3
+                    parser.parse_image_url_file ( )
+                    queued_urls += [ parser.url_queue.get ( ) for _ in range ( parser.url_queue.qsize ( ) - 1 ) ]
+
+                self.assertEqual ( sorted ( queued_urls ), sorted ( urls ) )
+        finally:
+            cfg.APP_CFG[ URL_VALIDATION ] = "head"
+            cfg.APP_CFG[ SHARD_MODE ] = "hash"
+            cfg.APP_CFG[ SHARD_INDEX ] = 0
+            cfg.APP_CFG[ SHARD_COUNT ] = 1
+            os.remove ( url_file )
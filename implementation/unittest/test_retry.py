@@ -0,0 +1,113 @@
+import email.utils
+import queue
+import time
+import unittest
+
+import requests
+
+from implementation.retry import RetryScheduler, classify_status, get_retry_error, parse_retry_after, \
+    CONNECTION, SERVER_ERROR, THROTTLED, TIMEOUT
+
+
+class RetryTestCase ( unittest.TestCase ):
+    def test_retry_error ( self ):
+        """
+        It tests which failures are worth a retry, and how the Retry-After header is parsed.
+        Please look into corresponding functions get_retry_error and parse_retry_after in retry.py
+        :return:
+        """
+        self.assertEqual ( classify_status ( 429 ), THROTTLED )
+        self.assertEqual ( classify_status ( 503 ), SERVER_ERROR )
+        self.assertIsNone ( classify_status ( 501 ) )
+        self.assertIsNone ( classify_status ( 404 ) )
+
+        self.assertEqual ( get_retry_error ( requests.exceptions.ReadTimeout ( ) ), (TIMEOUT, None) )
+        self.assertEqual ( get_retry_error ( requests.exceptions.ConnectionError ( "Connection reset by peer" ) ),
+                           (CONNECTION, None) )
+        self.assertIsNone ( get_retry_error ( requests.exceptions.InvalidURL ( ) ) )
+
+        self.assertEqual ( parse_retry_after ( "120" ), 120.0 )
+        self.assertAlmostEqual ( parse_retry_after ( email.utils.formatdate ( time.time ( ) + 60, usegmt=True ) ), 60,
+                                 delta=2 )
+        self.assertIsNone ( parse_retry_after ( "soon" ) )
+
+    def test_schedule ( self ):
+        """
+        It tests that a failed url is put back into its queue after its delay, at most max_retries times.
+        Please look into corresponding function schedule in retry.py
+        :return:
+        """
+        url_queue = queue.Queue ( )
+        retry_scheduler = RetryScheduler ( url_queue, { TIMEOUT: { "max_retries": 1, "base_delay": 0.2,
+                                                                   "max_delay": 0.2 } } )
+
+        start_time = time.monotonic ( )
+        self.assertTrue ( retry_scheduler.schedule ( "http://a/1.png", TIMEOUT ) )
+        self.assertFalse ( retry_scheduler.schedule ( "http://a/1.png", TIMEOUT ) )
+        self.assertFalse ( retry_scheduler.schedule ( "http://a/2.png", THROTTLED ) )
+
+        self.assertEqual ( url_queue.get ( timeout=5 ), "http://a/1.png" )
+        self.assertGreaterEqual ( time.monotonic ( ) - start_time, 0.1 )
+
+        retry_scheduler.close ( )
+
+    def test_handle_exit ( self ):
+        """
+        It tests that "EXIT" is held back while an url is being processed or waits for a retry, and is put back \
+        after the retried url.
+        Please look into corresponding function handle_exit in retry.py
+        :return:
+        """
+        url_queue = queue.Queue ( )
+        retry_scheduler = RetryScheduler ( url_queue, { SERVER_ERROR: { "max_retries": 1, "base_delay": 0.1,
+                                                                        "max_delay": 0.1 } } )
+
+        retry_scheduler.task_started ( )
+        self.assertFalse ( retry_scheduler.handle_exit ( ) )
+
+        self.assertTrue ( retry_scheduler.schedule ( "http://a/1.png", SERVER_ERROR ) )
+        retry_scheduler.task_finished ( "http://a/1.png", is_final=False )
+        self.assertEqual ( url_queue.get ( timeout=5 ), "http://a/1.png" )
+
+        retry_scheduler.task_started ( )
+        retry_scheduler.task_finished ( "http://a/1.png", is_final=True )
+        self.assertEqual ( url_queue.get ( timeout=5 ), "EXIT" )
+        self.assertTrue ( retry_scheduler.handle_exit ( ) )
+
+        retry_scheduler.close ( )
+
+    def test_final_failure_of_retried_url ( self ):
+        """
+        It tests that "EXIT" is put back when a retried url fails for good before the timer thread is done with it.
+        Please look into corresponding function thread_timer in retry.py
+        :return:
+        """
+        retry_scheduler = None
+
+        class ConsumingQueue ( queue.Queue ):
+            # a consumer gets the retried url and fails it for good, as soon as it is put
+            def put ( self, item, block=True, timeout=None ):
+                super ( ).put ( item, block, timeout )
+                if item != "EXIT":
+                    self.get ( )
+                    retry_scheduler.task_started ( )
+                    retry_scheduler.task_finished ( item, is_final=True )
+
+        url_queue = ConsumingQueue ( )
+        retry_scheduler = RetryScheduler ( url_queue, { SERVER_ERROR: { "max_retries": 1, "base_delay": 0.1,
+                                                                        "max_delay": 0.1 } } )
+
+        # transient failure
+        retry_scheduler.task_started ( )
+        self.assertTrue ( retry_scheduler.schedule ( "http://a/1.png", SERVER_ERROR ) )
+        retry_scheduler.task_finished ( "http://a/1.png", is_final=False )
+        self.assertFalse ( retry_scheduler.handle_exit ( ) )
+
+        self.assertEqual ( url_queue.get ( timeout=5 ), "EXIT" )
+        self.assertTrue ( retry_scheduler.handle_exit ( ) )
+
+        retry_scheduler.close ( )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
@@ -1,8 +1,14 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 
 import cfg
 from implementation.app_constants import *
-from settings import configure_application
+from settings import LazyQueueHandler, close_logging, configure_logging
+from settings import configure_application, configure_shard
 from settings import get_cmdline_args
 
 from .helper import Helper
@@ -59,3 +65,77 @@ class SettingsTestCase ( unittest.TestCase ):
         :return:
         """
         self.assertRaises ( SystemExit, lambda: get_cmdline_args ( [ ] ) )
+
+    def test_engine_cmdline_args ( self ):
+        """
+        It tests how get_cmdline_args overrides DOWNLOAD_ENGINE of cfg.APP_CFG and rejects an unknown engine
+        Please look into corresponding function get_cmdline_args in settings.py.
+        :return:
+        """
+        file_descriptor = get_cmdline_args ( [ "--file", "./implementation/unittest/mock_image_urls.txt",
+                                               "--engine", "thread" ] )
+        file_descriptor.close ( )
+        self.assertEqual ( cfg.APP_CFG[ DOWNLOAD_ENGINE ], "thread" )
+
+        self.assertRaises ( SystemExit, lambda: get_cmdline_args (
+            [ "--file", "./implementation/unittest/mock_image_urls.txt", "--engine", "invalid" ] ) )
+
+    def test_async_logging ( self ):
+        """
+        It tests that in "async" LOG_MODE, the records of concurrent threads are only queued by them, and are all \
+        written into the log file once logging is closed.
+        Please look into corresponding function configure_logging in settings.py.
+        :return:
+        """
+        log_dir = tempfile.mkdtemp ( )
+        cfg.APP_CFG[ LOG_DIR ] = log_dir
+        cfg.APP_CFG[ LOG_MODE ] = "async"
+        try:
+            configure_logging ( )
+            self.assertEqual ( [ type ( handler ) for handler in logging.getLogger ( ).handlers ],
+                               [ LazyQueueHandler ] )
+
+            test_logger = logging.getLogger ( "test_async_logging" )
+            test_logger.setLevel ( logging.INFO )
+            threads = [ threading.Thread ( target=lambda i=i: [ test_logger.info ( "record %s-%s", i, j )
+                                                                for j in range ( 250 ) ] )
+                        for i in range ( 4 ) ]
+            for thread in threads:
+                thread.start ( )
+            for thread in threads:
+                thread.join ( )
+
+            close_logging ( )
+            with open ( os.path.join ( log_dir, "app.log" ), encoding='utf-8' ) as fd:
+                records = [ line for line in fd if "test_async_logging" in line ]
+            self.assertEqual ( len ( records ), 1000 )
+            self.assertIn ( "INFO record 3-249", "".join ( records ) )
+        finally:
+            self.helper.create_default_cfg ( )
+            cfg.APP_CFG[ LOG_MODE ] = "sync"
+            configure_logging ( )
+            shutil.rmtree ( log_dir )
+
+    def test_shard_log_file ( self ):
+        """
+        It tests that a sharded run logs into a file of its own, next to the log files of the other shards.
+        Please look into corresponding function configure_shard in settings.py.
+        :return:
+        """
+        log_dir = tempfile.mkdtemp ( )
+        cfg.APP_CFG[ LOG_DIR ] = log_dir
+        cfg.APP_CFG[ IMAGE_SAVE_DIR ] = log_dir
+        cfg.APP_CFG[ SHARD_INDEX ] = 1
+        cfg.APP_CFG[ SHARD_COUNT ] = 2
+        try:
+            configure_shard ( )
+            logging.getLogger ( "test_shard_log_file" ).warning ( "shard record" )
+            close_logging ( )
+
+            self.assertFalse ( os.path.exists ( os.path.join ( log_dir, "app.log" ) ) )
+            with open ( os.path.join ( log_dir, "app.log.shard-1-of-2" ), encoding='utf-8' ) as fd:
+                self.assertIn ( "shard record", fd.read ( ) )
+        finally:
+            self.helper.create_default_cfg ( )
+            configure_logging ( )
+            shutil.rmtree ( log_dir )
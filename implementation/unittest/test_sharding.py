@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from implementation.sharding import ShardCoordinator, get_byte_range, get_url_shard, merge_shard_manifests, \
+    merge_shard_stats, parse_shard_arg
+from implementation.url_source import UrlSource
+
+
+class ShardingTestCase ( unittest.TestCase ):
+    def test_parse_shard_arg ( self ):
+        """
+        It tests how "--shard" values are parsed and rejected.
+        Please look into corresponding function parse_shard_arg in sharding.py
+        :return:
+        """
+        self.assertEqual ( parse_shard_arg ( "2/8" ), (2, 8) )
+        for shard_arg in ("8/8", "-1/8", "2", "a/b"):
+            with self.assertRaises ( ValueError ):
+                parse_shard_arg ( shard_arg )
+
+    def test_url_shard ( self ):
+        """
+        It tests that all the urls of a host belong to the same shard.
+        Please look into corresponding function get_url_shard in sharding.py
+        :return:
+        """
+        shard = get_url_shard ( "http://www.example.com/1.png", 8 )
+        self.assertEqual ( get_url_shard ( "https://WWW.EXAMPLE.COM:8443/images/2.png", 8 ), shard )
+        self.assertIn ( get_url_shard ( "not an url", 8 ), range ( 8 ) )
+
+    def test_byte_range_lines ( self ):
+        """
+        It tests that every line of a file is read by exactly one shard, whatever the number of shards, through \
+        read buffers or a memory mapping.
+        Please look into corresponding function get_byte_range in sharding.py
+        :return:
+        """
+        lines = [ "http://a.com/{}.png\n".format ( "x" * (i % 7) ).encode ( ) for i in range ( 50 ) ] + [ b"last" ]
+        fd, file_name = tempfile.mkstemp ( )
+        with os.fdopen ( fd, 'wb' ) as fp:
+            fp.write ( b"".join ( lines ) )
+
+        try:
+            for mmap_min_size in (1, 1024 * 1024):
+                with open ( file_name, 'rb' ) as fd:
+                    url_source = UrlSource ( fd, mmap_min_size )
+                    for num_shards in (1, 3, 7, 200):
+                        shard_lines = [ line.encode ( ) for shard_index in range ( num_shards )
+                                        for line, _ in url_source.iter_lines (
+                                            "UTF-8-SIG", *get_byte_range ( url_source.file_size, shard_index,
+                                                                           num_shards ), align=True ) ]
+                        self.assertEqual ( shard_lines, lines )
+        finally:
+            os.remove ( file_name )
+
+    def test_merge_shard_stats ( self ):
+        """
+        It tests that counters of shards are summed up and that the elapsed time is the one of the slowest shard.
+        Please look into corresponding function merge_shard_stats in sharding.py
+        :return:
+        """
+        merged_stats = merge_shard_stats ( [ { "shard_index": 0, "num_shards": 2, "num_urls": 3, "elapsed": 1.5 },
+                                             { "shard_index": 1, "num_shards": 2, "num_urls": 4, "elapsed": 2.5 } ] )
+        self.assertEqual ( merged_stats, { "num_shards": 2, "num_urls": 7, "elapsed": 2.5 } )
+
+    def test_merge_shard_manifests ( self ):
+        """
+        It tests that the manifests of the shards are appended to the manifest of the job with a single header row, \
+        and removed once merged.
+        Please look into corresponding function merge_shard_manifests in sharding.py
+        :return:
+        """
+        manifest_dir = tempfile.mkdtemp ( )
+        manifest_path = os.path.join ( manifest_dir, "manifest.csv" )
+        shard_paths = [ manifest_path + ".shard-{}-of-3".format ( shard_index ) for shard_index in range ( 3 ) ]
+        for shard_path, row in ((shard_paths[ 0 ], "a\r\n"), (shard_paths[ 2 ], "c\r\nd\r\n")):
+            with open ( shard_path, mode='w', encoding='utf-8', newline='' ) as fd:
+                fd.write ( "url\r\n" + row )
+
+        try:
+            self.assertEqual ( merge_shard_manifests ( manifest_path, shard_paths, has_header=True ), 2 )
+            with open ( manifest_path, encoding='utf-8', newline='' ) as fd:
+                self.assertEqual ( fd.read ( ), "url\r\na\r\nc\r\nd\r\n" )
+            self.assertEqual ( os.listdir ( manifest_dir ), [ "manifest.csv" ] )
+
+            # a later run appends its records without another header row
+            with open ( shard_paths[ 1 ], mode='w', encoding='utf-8', newline='' ) as fd:
+                fd.write ( "url\r\nb\r\n" )
+            self.assertEqual ( merge_shard_manifests ( manifest_path, shard_paths, has_header=True ), 1 )
+            with open ( manifest_path, encoding='utf-8', newline='' ) as fd:
+                self.assertEqual ( fd.read ( ), "url\r\na\r\nc\r\nd\r\nb\r\n" )
+        finally:
+            shutil.rmtree ( manifest_dir )
+
+    def test_failed_worker_shards ( self ):
+        """
+        It tests that a worker exiting with a non zero exit code fails its shard, even if it has written its \
+        statistics, as does a worker exiting without statistics.
+        Please look into corresponding function run in sharding.py
+        :return:
+        """
+        log_dir = tempfile.mkdtemp ( )
+        script_path = os.path.join ( log_dir, "worker.py" )
+        with open ( script_path, mode='w', encoding='utf-8' ) as fd:
+            # shard 0 succeeds, shard 1 writes its statistics then fails, shard 2 exits without statistics
+            fd.write ( "import json, os, sys\n"
+                       "shard_index, num_shards = map ( int, sys.argv[ 4 ].split ( '/' ) )\n"
+                       "if shard_index != 2:\n"
+                       "    with open ( os.path.join ( sys.argv[ 5 ], 'shard-{0}-of-{1}.stats.json'.format ( "
+                       "shard_index, num_shards ) ), 'w' ) as fd:\n"
+                       "        json.dump ( { 'shard_index': shard_index, 'num_shards': num_shards, 'num_urls': 1 }, "
+                       "fd )\n"
+                       "sys.exit ( 1 if shard_index == 1 else 0 )\n" )
+
+        try:
+            coordinator = ShardCoordinator ( script_path, "urls.txt", 3, log_dir, worker_args=(log_dir,),
+                                             image_save_dir=os.path.join ( log_dir, "images" ) )
+            with self.assertLogs ( "implementation.sharding", level="ERROR" ) as logs:
+                merged_stats = coordinator.run ( )
+
+            self.assertEqual ( merged_stats[ "failed_shards" ], [ 1, 2 ] )
+            self.assertEqual ( merged_stats[ "num_urls" ], 2 )
+            self.assertEqual ( merged_stats[ "shard_dirs" ],
+                               [ os.path.join ( log_dir, "images", "shard-{}-of-3".format ( shard_index ) )
+                                 for shard_index in range ( 3 ) ] )
+            self.assertEqual ( len ( logs.records ), 2 )
+
+            with open ( os.path.join ( log_dir, "shard-summary.json" ), mode='r', encoding='utf-8' ) as fd:
+                self.assertEqual ( json.load ( fd )[ "failed_shards" ], [ 1, 2 ] )
+        finally:
+            shutil.rmtree ( log_dir )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
@@ -0,0 +1,35 @@
+import unittest
+
+from implementation.url_filter import BloomFilter, normalize_url
+
+
+class UrlFilterTestCase ( unittest.TestCase ):
+    def test_normalize_url ( self ):
+        """
+        It tests how normalize_url spells urls of the same resource the same way.
+        Please look into corresponding function normalize_url in url_filter.py
+        :return:
+        """
+        self.assertEqual ( normalize_url ( " HTTPS://WWW.Example.com:443/a/B.png#top \n" ),
+                           "https://www.example.com/a/B.png" )
+        self.assertEqual ( normalize_url ( "http://Example.com:80?q=A" ), "http://example.com/?q=A" )
+        self.assertEqual ( normalize_url ( "http://user@Example.com:8080/a.png" ), "http://user@example.com:8080/a.png" )
+        self.assertEqual ( normalize_url ( "www.google.com#fragment" ), "www.google.com" )
+
+    def test_bloom_filter ( self ):
+        """
+        It tests that BloomFilter never forgets an added url, and only rarely reports an url as present falsely.
+        Please look into corresponding function add in url_filter.py
+        :return:
+        """
+        seen_urls = BloomFilter ( memory_bytes=16 * 1024, error_rate=0.01 )
+        added_urls = [ "http://host/{}.png".format ( i ) for i in range ( seen_urls.capacity ) ]
+
+        for url in added_urls:
+            seen_urls.add ( url )
+
+        self.assertTrue ( all ( url in seen_urls for url in added_urls ) )
+        self.assertFalse ( seen_urls.add ( added_urls[ 0 ] ) )
+
+        false_positives = sum ( "http://other/{}.png".format ( i ) in seen_urls for i in range ( 10000 ) )
+        self.assertLess ( false_positives, 10000 * 0.02 )
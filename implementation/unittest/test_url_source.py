@@ -0,0 +1,73 @@
+import gzip
+import io
+import lzma
+import os
+import tempfile
+import unittest
+
+from implementation.url_source import UrlSource, GZIP, XZ
+
+
+class UrlSourceTestCase ( unittest.TestCase ):
+    def setUp ( self ):
+        """
+        Method called before any unittest case
+        :return:
+        """
+        self.content = "﻿http://a.com/1.png\r\nhttp://a.com/2.png\n\nhttp://a.com/3.png".encode ( 'utf-8' )
+        self.lines = [ "http://a.com/1.png\n", "http://a.com/2.png\n", "\n", "http://a.com/3.png" ]
+
+    def test_compressed_input ( self ):
+        """
+        It tests that gzip and xz compressed inputs are detected and decompressed, with the offsets of the lines \
+        counted in the decompressed input.
+        Please look into corresponding function iter_lines in url_source.py
+        :return:
+        """
+        for compress, compression in ((gzip.compress, GZIP), (lzma.compress, XZ)):
+            url_source = UrlSource ( io.BufferedReader ( io.BytesIO ( compress ( self.content ) ) ) )
+            self.assertEqual ( url_source.compression, compression )
+            self.assertFalse ( url_source.is_seekable ( ) )
+            self.assertEqual ( url_source.peek ( 3 ), b"\xef\xbb\xbf" )
+
+            lines = list ( url_source.iter_lines ( "UTF-8-SIG" ) )
+            self.assertEqual ( [ line for line, _ in lines ], self.lines )
+            self.assertEqual ( lines[ -1 ][ 1 ], len ( self.content ) )
+
+    def test_start_offset ( self ):
+        """
+        It tests that reading a stream or a memory mapped file from the offset of a line resumes at the next line.
+        Please look into corresponding function iter_lines in url_source.py
+        :return:
+        """
+        offsets = [ offset for _, offset in UrlSource ( io.BufferedReader ( io.BytesIO ( self.content ) ) ).iter_lines (
+            "UTF-8-SIG" ) ]
+
+        stream_source = UrlSource ( io.BufferedReader ( io.BytesIO ( self.content ) ) )
+        self.assertEqual ( [ line for line, _ in stream_source.iter_lines ( "UTF-8-SIG", offsets[ 1 ] ) ],
+                           self.lines[ 2: ] )
+
+        fd, file_name = tempfile.mkstemp ( )
+        with os.fdopen ( fd, 'wb' ) as fp:
+            fp.write ( self.content )
+        try:
+            with open ( file_name, 'rb' ) as fd:
+                mmap_source = UrlSource ( fd, mmap_min_size=1 )
+                self.assertTrue ( mmap_source.is_seekable ( ) )
+                self.assertEqual ( list ( mmap_source.iter_lines ( "UTF-8-SIG", offsets[ 0 ] ) ),
+                                   list ( zip ( self.lines[ 1: ], offsets[ 1: ] ) ) )
+        finally:
+            os.remove ( file_name )
+
+    def test_utf16_input ( self ):
+        """
+        It tests that an input in an encoding which is not byte oriented is read without offsets.
+        Please look into corresponding function iter_lines in url_source.py
+        :return:
+        """
+        url_source = UrlSource ( io.BufferedReader ( io.BytesIO ( "http://a.com/1.png\n".encode ( 'utf-16' ) ) ) )
+        self.assertEqual ( list ( url_source.iter_lines ( "UTF-16" ) ), [ ("http://a.com/1.png\n", None) ] )
+
+
+if __name__ == '__main__':
+    unittest.main ( )
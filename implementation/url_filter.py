@@ -0,0 +1,101 @@
+import hashlib
+import math
+from urllib.parse import urlsplit, urlunsplit
+
+# default port of the protocols, which is dropped from the network location of an url
+DEFAULT_PORTS = { "http": 80, "https": 443 }
+
+
+def normalize_url ( url ):
+    """
+    Normalizes an url, so that urls which denote the same resource are spelled the same. It strips the \
+    surrounding whitespaces, lowercases the scheme and the host, drops the default port of the scheme, \
+    drops the fragment (it is never sent to the server) and uses "/" as an empty path.
+    An url without scheme or host (e.g; "www.google.com") is only stripped of its whitespaces and fragment.
+    :param url: string
+    :return: normalized url (str)
+    """
+    url = url.strip ( )
+
+    try:
+        url_parts = urlsplit ( url )
+        port = url_parts.port
+    except ValueError:  # e.g; invalid port or IPv6 address, left as it is for the validation to reject it
+        return url
+
+    if not url_parts.scheme or not url_parts.netloc:
+        return url.split ( '#', 1 )[ 0 ]
+
+    scheme = url_parts.scheme.lower ( )
+    netloc = url_parts.hostname or ""
+
+    if ':' in netloc:  # IPv6 address
+        netloc = "[" + netloc + "]"
+    if port is not None and port != DEFAULT_PORTS.get ( scheme ):
+        netloc += ":" + str ( port )
+
+    userinfo = url_parts.netloc.rpartition ( '@' )[ 0 ]
+    if userinfo:
+        netloc = userinfo + "@" + netloc
+
+    return urlunsplit ( (scheme, netloc, url_parts.path or "/", url_parts.query, "") )
+
+
+class BloomFilter:
+    """
+    Description: BloomFilter class is a compact probabilistic set of strings, sized by a memory budget. A string \
+                 which has been added is always reported as present, while a string which has not been added is \
+                 reported as present with a probability of "error_rate" (false positive), as long as no more than \
+                 "capacity" strings have been added. Beyond "capacity", the false positive rate keeps rising.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, memory_bytes, error_rate ):
+        # bit array of the filter
+        self.num_bits = max ( 8, int ( memory_bytes ) * 8 )
+        self.bits = bytearray ( self.num_bits // 8 )
+        self.num_bits = len ( self.bits ) * 8
+
+        # optimal number of hash functions for the targeted false positive rate
+        self.num_hashes = max ( 1, round ( -math.log2 ( error_rate ) ) )
+
+        # number of strings which can be added before the false positive rate exceeds error_rate
+        self.capacity = int ( self.num_bits * (math.log ( 2 ) ** 2) / -math.log ( error_rate ) )
+
+        # number of strings added so far
+        self.count = 0
+
+    def bit_positions ( self, item ):
+        """
+        Derives the bit positions of a string using double hashing over a single 128 bit digest
+        :param item: string
+        :return: list of int
+        """
+        digest = hashlib.blake2b ( item.encode ( 'utf-8', 'surrogatepass' ), digest_size=16 ).digest ( )
+        hash_1 = int.from_bytes ( digest[ :8 ], 'little' )
+        hash_2 = int.from_bytes ( digest[ 8: ], 'little' ) | 1
+
+        return [ (hash_1 + i * hash_2) % self.num_bits for i in range ( self.num_hashes ) ]
+
+    def __contains__ ( self, item ):
+        return all ( self.bits[ pos >> 3 ] & (1 << (pos & 7)) for pos in self.bit_positions ( item ) )
+
+    def add ( self, item ):
+        """
+        Adds a string into the filter.
+        :param item: string
+        :return: True (If string was not present) / False (If string was (probably) present already)
+        """
+        is_new = False
+        for pos in self.bit_positions ( item ):
+            mask = 1 << (pos & 7)
+            if not self.bits[ pos >> 3 ] & mask:
+                self.bits[ pos >> 3 ] |= mask
+                is_new = True
+
+        if is_new:
+            self.count += 1
+
+        return is_new
@@ -0,0 +1,38 @@
+class UrlItem ( str ):
+    """
+    Description: UrlItem class is an url (a str) which also carries the meta-information that FileParser received \
+                 in the response headers while validating it. Downloader uses this information to plan the download \
+                 of the url (e.g; resuming or segmenting large images). Being a str, an UrlItem goes through \
+                 "url_queue" and every function taking an url like a plain url does.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __new__ ( cls, url, content_length=None, accept_ranges=False ):
+        url_item = super ( ).__new__ ( cls, url )
+
+        # size of the resource in bytes (int), if the server announced it (Content-Length header)
+        url_item.content_length = content_length
+
+        # whether or not the server serves byte ranges of the resource (Accept-Ranges header)
+        url_item.accept_ranges = accept_ranges
+
+        return url_item
+
+    @classmethod
+    def from_headers ( cls, url, headers ):
+        """
+        Creates an UrlItem from the response headers of an url
+        :param url: string
+        :param headers: response headers (case-insensitive dict)
+        :return: UrlItem
+        """
+        try:
+            content_length = int ( headers.get ( 'content-length' ) )
+        except (TypeError, ValueError):
+            content_length = None
+
+        accept_ranges = (headers.get ( 'accept-ranges' ) or '').strip ( ).lower ( ) == 'bytes'
+
+        return cls ( url, content_length=content_length, accept_ranges=accept_ranges )
@@ -0,0 +1,214 @@
+import io
+import logging
+import mmap
+import os
+import sys
+
+# Compression formats of the plaintext file, detected from their magic bytes
+GZIP = "gzip"
+XZ = "xz"
+ZSTD = "zstd"
+
+MAGIC_BYTES = (
+    (b"\x1f\x8b", GZIP),
+    (b"\xfd7zXZ\x00", XZ),
+    (b"\x28\xb5\x2f\xfd", ZSTD),
+)
+
+
+def detect_compression ( fd ):
+    """
+    Detects the compression of a file from its first bytes, without consuming them
+    :param fd: binary file object supporting peek (e.g; io.BufferedReader)
+    :return: one of GZIP, XZ, ZSTD / None (If not compressed)
+    """
+    head = fd.peek ( 6 )
+    for magic, compression in MAGIC_BYTES:
+        if head.startswith ( magic ):
+            return compression
+
+    return None
+
+
+def is_zstandard_available ( ):
+    """
+    Checks whether the optional "zstandard" package, required by zstd compressed plaintext files, is installed.
+    :return: boolean
+    """
+    import importlib.util
+    return importlib.util.find_spec ( "zstandard" ) is not None
+
+
+class UrlSource:
+    """
+    Description: UrlSource class reads the lines of the plaintext file from the file object opened by \
+                 get_cmdline_args, which is never reopened: it can be a regular file, or the standard input ("-"), \
+                 so the urls can be piped from another job. gzip, xz and zstd compressed inputs are decompressed \
+                 on the fly, whatever their name is. A regular UTF-8 file of at least "mmap_min_size" bytes is \
+                 scanned through a memory mapping, which spares a copy of every line through the read buffers.
+                 Along with every line, the byte offset of its end into the (decompressed) input is reported, so \
+                 that a consumer can checkpoint how far the input has been read, and later skip that far.
+
+    Version: 1.0
+    Comment:
+    """
+
+    def __init__ ( self, fd, mmap_min_size=64 * 1024 * 1024 ):
+        self.logger = logging.getLogger ( __name__ )
+
+        # name of the input (e.g; "<stdin>" for the standard input)
+        self.name = getattr ( fd, "name", "<stream>" )
+
+        # file object given by get_cmdline_args. peek needs a buffered reader.
+        self.raw_fd = fd if hasattr ( fd, "peek" ) else io.BufferedReader ( fd )
+
+        self.compression = detect_compression ( self.raw_fd )
+
+        # decompressed input
+        self.fd = self.open_decompressor ( ) if self.compression else self.raw_fd
+
+        # size of a regular uncompressed file / None (If it is a stream or compressed)
+        self.file_size = None
+        if not self.compression:
+            try:
+                file_stat = os.fstat ( self.raw_fd.fileno ( ) )
+                if file_stat.st_size and self.raw_fd.seekable ( ):
+                    self.file_size = file_stat.st_size
+            except (OSError, io.UnsupportedOperation):
+                pass
+
+        self.mmap_min_size = mmap_min_size
+
+    def open_decompressor ( self ):
+        """
+        :return: binary file object of the decompressed input
+        """
+        if self.compression == GZIP:
+            import gzip
+            return gzip.GzipFile ( fileobj=self.raw_fd, mode='rb' )
+
+        if self.compression == XZ:
+            import lzma
+            return lzma.LZMAFile ( self.raw_fd, mode='rb' )
+
+        import zstandard
+        return io.BufferedReader ( zstandard.ZstdDecompressor ( ).stream_reader ( self.raw_fd ) )
+
+    def is_seekable ( self ):
+        """
+        Verifies whether or not, the input can be read from an arbitrary byte offset without reading what precedes
+        :return: boolean
+        """
+        return self.file_size is not None
+
+    def get_key ( self ):
+        """
+        :return: name identifying the input in the checkpoints of the journal (str)
+        """
+        if self.name == "<stdin>" or self.name == "-":
+            return "<stdin>"
+        return os.path.abspath ( self.name )
+
+    def peek ( self, size ):
+        """
+        Returns the first bytes of the (decompressed) input, without consuming them
+        :param size: int
+        :return: bytes (might be fewer than size)
+        """
+        return self.fd.peek ( size )[ :size ]
+
+    def iter_lines ( self, encoding, start_offset=0, end_offset=None, align=False ):
+        """
+        Reads the lines of the input, from a byte offset. Line terminators are translated to "\n" (universal \
+        newlines mode). The offsets can only be tracked in a byte oriented encoding (UTF-8).
+        :param encoding: encoding of the input (str, e.g; "UTF-8-SIG")
+        :param start_offset: offset of the first line to read (int)
+        :param end_offset: offset from which no more line is started (int) / None (read up to the end)
+        :param align: if True, start_offset might be inside a line, which is then skipped
+        :return: generator of (line, offset of the end of the line) tuples (str, int / None)
+        """
+        if encoding.upper ( ).replace ( "_", "-" ) not in ("UTF-8-SIG", "UTF-8"):
+            if start_offset:
+                raise ValueError ( "{} encoded input cannot be read from a byte offset".format ( encoding ) )
+            if self.is_seekable ( ):
+                self.fd.seek ( 0 )
+            text_fd = io.TextIOWrapper ( self.fd, encoding=encoding, newline=None )
+            try:
+                for line in text_fd:
+                    yield line, None
+            finally:
+                # the input stays open (closing the wrapper would close it)
+                text_fd.detach ( )
+            return
+
+        if self.is_seekable ( ) and self.file_size >= self.mmap_min_size:
+            lines = self.iter_mmap_lines ( start_offset, end_offset, align )
+        else:
+            lines = self.iter_stream_lines ( start_offset, end_offset, align )
+
+        for line, offset in lines:
+            line = line.decode ( 'utf-8-sig' if line.startswith ( b"\xef\xbb\xbf" ) else 'utf-8' )
+            if line.endswith ( "\r\n" ):
+                line = line[ :-2 ] + "\n"
+            yield line, offset
+
+    def iter_stream_lines ( self, start_offset, end_offset, align ):
+        """
+        Reads the byte lines of the input through its read buffer
+        :return: generator of (line, offset of the end of the line) tuples (bytes, int)
+        """
+        offset = start_offset - 1 if align and start_offset else start_offset
+
+        if self.is_seekable ( ):
+            self.fd.seek ( offset )
+        else:
+            # a stream (or a compressed input) is read up to the offset
+            remaining = offset
+            while remaining > 0:
+                skipped = len ( self.fd.read ( min ( remaining, 1024 * 1024 ) ) )
+                if not skipped:
+                    return
+                remaining -= skipped
+
+        if offset != start_offset:
+            offset += len ( self.fd.readline ( ) )
+
+        while end_offset is None or offset < end_offset:
+            line = self.fd.readline ( )
+            if not line:
+                break
+            offset += len ( line )
+            yield line, offset
+
+    def iter_mmap_lines ( self, start_offset, end_offset, align ):
+        """
+        Reads the byte lines of a regular file through a read-only memory mapping
+        :return: generator of (line, offset of the end of the line) tuples (bytes, int)
+        """
+        with mmap.mmap ( self.raw_fd.fileno ( ), 0, access=mmap.ACCESS_READ ) as file_map:
+            if hasattr ( file_map, "madvise" ) and hasattr ( mmap, "MADV_SEQUENTIAL" ):
+                file_map.madvise ( mmap.MADV_SEQUENTIAL )
+
+            size = len ( file_map )
+            end_offset = size if end_offset is None else min ( end_offset, size )
+
+            offset = start_offset
+            if align and start_offset:
+                new_line = file_map.find ( b"\n", start_offset - 1 )
+                offset = size if new_line < 0 else new_line + 1
+
+            while offset < end_offset:
+                new_line = file_map.find ( b"\n", offset )
+                line_end = size if new_line < 0 else new_line + 1
+                yield file_map[ offset:line_end ], line_end
+                offset = line_end
+
+    def close ( self ):
+        """
+        Closes the input, unless it is the standard input
+        :return:
+        """
+        if self.fd is not self.raw_fd:
+            self.fd.close ( )
+        if self.raw_fd is not getattr ( sys.stdin, "buffer", None ):
+            self.raw_fd.close ( )
@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cfg
+from implementation import app_constants
+from implementation.app_constants import *
+from implementation.benchmark import SCENARIOS, StandInImageServer, compare_results, generate_urls, get_git_commit, \
+    run_pipeline, save_results
+from settings import configure_application, is_aiohttp_available
+
+REPO_DIR = os.path.dirname ( os.path.dirname ( os.path.abspath ( __file__ ) ) )
+
+
+def get_cmdline_args ( ):
+    parser = argparse.ArgumentParser ( description='File Parser - Web Image Downloader benchmark, against a local ' +
+                                                   'stand-in image server' )
+    parser.add_argument ( '-s', '--scenario', dest='scenarios', nargs='+', choices=sorted ( SCENARIOS ),
+                          default=sorted ( SCENARIOS ), help='Scenarios to run (default: all)' )
+    parser.add_argument ( '-e', '--engine', dest='engines', nargs='+', choices=( 'thread', 'asyncio' ),
+                          help='Download engines to run (default: all the available ones)' )
+    parser.add_argument ( '-n', '--num-urls', dest='num_urls', type=int,
+                          help='Number of URLs of every scenario (overrides the one of the scenario)' )
+    parser.add_argument ( '--seed', dest='seed', type=int, default=0, help='Seed of the generated URLs (default: 0)' )
+    parser.add_argument ( '--set', dest='cfg_overrides', action='append', default=[ ], metavar="NAME=VALUE",
+                          help='Configuration of cfg.py to use, e.g; NUM_DL_THREADS=16 (can be repeated)' )
+    parser.add_argument ( '-o', '--output-dir', dest='output_dir', default=os.path.join ( REPO_DIR, 'benchmarks' ),
+                          help='Directory of the result files (default: ./benchmarks)' )
+    parser.add_argument ( '-c', '--compare', dest='baseline', metavar="RESULT_FILE",
+                          help='Result file of an earlier run (e.g; of another commit) to compare with' )
+
+    # internal: runs one engine over one scenario in this process (see run_child)
+    parser.add_argument ( '--run-child', dest='run_child', nargs=2, metavar=("URL_FILE", "RESULT_FILE"),
+                          help=argparse.SUPPRESS )
+
+    return parser.parse_args ( )
+
+
+def run_child ( args ):
+    """
+    Runs the application over the urls of a scenario, and writes its measurements into a result file. Every run \
+    has a process of its own, so that its peak RSS is not the one of an earlier run.
+    """
+    url_fname, result_fname = args.run_child
+    scenario = SCENARIOS[ args.scenarios[ 0 ] ]
+    work_dir = os.path.dirname ( result_fname )
+
+    cfg.APP_CFG.update ( {
+        IMAGE_SAVE_DIR: os.path.join ( work_dir, "images" ),
+        LOG_DIR: os.path.join ( work_dir, "logs" ),
+        URL_TIMEOUT: scenario[ "url_timeout" ],
+        SYSTEM_PROXY: None,
+        JOURNAL_PATH: None,
+        HTTP_CACHE_PATH: None,
+        METRICS_PORT: None,
+        METRICS_SNAPSHOT_PATH: None,
+        MANIFEST_PATH: None,
+        DOWNLOAD_ENGINE: args.engines[ 0 ],
+    } )
+    for cfg_override in args.cfg_overrides:
+        name, _, value = cfg_override.partition ( "=" )
+        cfg.APP_CFG[ getattr ( app_constants, name ) ] = ast.literal_eval ( value )
+
+    os.makedirs ( cfg.APP_CFG[ IMAGE_SAVE_DIR ], exist_ok=True )
+    os.makedirs ( cfg.APP_CFG[ LOG_DIR ], exist_ok=True )
+    configure_application ( )
+
+    result = run_pipeline ( url_fname, args.engines[ 0 ] )
+    with open ( result_fname, mode='w', encoding='utf-8' ) as fd:
+        json.dump ( result, fd )
+
+
+def run_scenario ( args, scenario_name, engines ):
+    """
+    Serves the urls of a scenario from a stand-in image server, and runs every engine over them
+    :return: list of dicts of the measurements
+    """
+    scenario = dict ( SCENARIOS[ scenario_name ] )
+    if args.num_urls:
+        scenario[ "num_urls" ] = args.num_urls
+
+    server = StandInImageServer ( bandwidth=scenario[ "bandwidth" ], hang_time=scenario[ "url_timeout" ] * 2 )
+
+    # the stand-in server is local, so no proxy of the environment must be used
+    env = dict ( os.environ, NO_PROXY="127.0.0.1,localhost", no_proxy="127.0.0.1,localhost",
+                 PYTHONPATH=os.pathsep.join ( filter ( None, (REPO_DIR, os.environ.get ( "PYTHONPATH" )) ) ) )
+
+    results = [ ]
+    try:
+        for engine in engines:
+            with tempfile.TemporaryDirectory ( ) as work_dir:
+                url_fname = os.path.join ( work_dir, "urls.txt" )
+                with open ( url_fname, mode='w', encoding='utf-8' ) as fd:
+                    for url in generate_urls ( server.get_base_url ( ), scenario, args.seed ):
+                        fd.write ( url + "\n" )
+
+                result_fname = os.path.join ( work_dir, "result.json" )
+                child_args = [ sys.executable, os.path.abspath ( __file__ ), "--run-child", url_fname, result_fname,
+                               "--scenario", scenario_name, "--engine", engine ]
+                for cfg_override in args.cfg_overrides:
+                    child_args += [ "--set", cfg_override ]
+
+                print ( "Running scenario {0} ({1} URLs) with {2} engine...".format ( scenario_name,
+                                                                                    scenario[ "num_urls" ],
+                                                                                    engine ) )
+                subprocess.run ( child_args, env=env, stdout=subprocess.DEVNULL, check=True )
+
+                with open ( result_fname, mode='r', encoding='utf-8' ) as fd:
+                    result = json.load ( fd )
+                result[ "scenario" ] = scenario_name
+                result[ "scenario_cfg" ] = scenario
+                results.append ( result )
+    finally:
+        server.close ( )
+
+    return results
+
+
+def main ( ):
+    args = get_cmdline_args ( )
+
+    if args.run_child:
+        run_child ( args )
+        return
+
+    engines = args.engines or ([ "thread", "asyncio" ] if is_aiohttp_available ( ) else [ "thread" ])
+
+    results = [ ]
+    for scenario_name in args.scenarios:
+        results += run_scenario ( args, scenario_name, engines )
+
+    print ( "{0:<8} {1:<8} {2:>9} {3:>9} {4:>9} {5:>11} {6:>11} {7:>12}".format (
+        "scenario", "engine", "URLs", "URLs/s", "MB/s", "p50 (ms)", "p99 (ms)", "peak RSS MB" ) )
+    for result in results:
+        print ( "{0:<8} {1:<8} {2:>9} {3:>9} {4:>9} {5:>11} {6:>11} {7:>12}".format (
+            result[ "scenario" ], result[ "engine" ], result[ "num_urls" ], result[ "urls_per_s" ],
+            result[ "mb_per_s" ], str ( result[ "download_p50_ms" ] ), str ( result[ "download_p99_ms" ] ),
+            str ( result[ "peak_rss_mb" ] ) ) )
+
+    print ( "Results saved into {}".format (
+        save_results ( args.output_dir, results, get_git_commit ( REPO_DIR ), args.cfg_overrides ) ) )
+
+    if args.baseline:
+        with open ( args.baseline, mode='r', encoding='utf-8' ) as fd:
+            for line in compare_results ( json.load ( fd ), results ):
+                print ( line )
+
+
+if __name__ == '__main__':
+    main ( )
@@ -1,8 +1,21 @@
 #!/usr/bin/python3
 
+import os
+import sys
+import time
+
+import cfg
+from implementation.app_constants import *
+from implementation.async_downloader import AsyncDownloader
+from implementation.dns_cache import close_dns_cache
 from implementation.downloader import Downloader
+from implementation.http_session import close_http_session_pool
+from implementation.journal import close_job_journal
+from implementation.manifest import close_result_manifest, CSV
+from implementation.metrics import close_metrics_exporter, start_metrics_exporter
 from implementation.parser import FileParser
-from settings import configure_application, get_cmdline_args
+from implementation.sharding import ShardCoordinator, get_shard_name, write_shard_stats
+from settings import close_logging, configure_application, get_cmdline_args
 
 # configuring application using defined configurations
 configure_application ( )
@@ -10,12 +23,39 @@ configure_application ( )
 # Asking user from command line argument for plaintext file path
 url_fd = get_cmdline_args ( )
 
+# With several worker processes, this process only coordinates them. Every worker runs this script on its own shard.
+if cfg.APP_CFG[ SHARD_WORKERS ] > 1:
+    url_fd.close ( )
+
+    worker_args = [ "--engine", cfg.APP_CFG[ DOWNLOAD_ENGINE ] ]
+    if cfg.APP_CFG.get ( JOURNAL_RESUME ):
+        worker_args.append ( "--resume" )
+
+    summary = ShardCoordinator ( os.path.abspath ( __file__ ), url_fd.name, cfg.APP_CFG[ SHARD_WORKERS ],
+                                 cfg.APP_CFG[ LOG_DIR ], worker_args, cfg.APP_CFG[ IMAGE_SAVE_DIR ],
+                                 cfg.APP_CFG.get ( MANIFEST_PATH ),
+                                 cfg.APP_CFG.get ( MANIFEST_FORMAT ) == CSV ).run ( )
+
+    print ( "Shards: {0}, URLs read: {1}, downloaded: {2}, failed: {3}, failed shards: {4}".format (
+        summary[ "num_shards" ], summary.get ( "num_urls", 0 ), summary.get ( "num_downloaded", 0 ),
+        summary.get ( "num_failed", 0 ), summary[ "failed_shards" ] or "none" ) )
+    print ( "Download dirs are {}/shard-*".format ( cfg.APP_CFG[ IMAGE_SAVE_DIR ] ) )
+    sys.exit ( 1 if summary[ "failed_shards" ] else 0 )
+
+start_time = time.monotonic ( )
+
+# exposing the runtime metrics (see METRICS_PORT and METRICS_SNAPSHOT_PATH)
+start_metrics_exporter ( )
+
 # starting file parser
 fp = FileParser ( url_fd )
 fp.start_parser_thread ( )
 
-# starting url downloader threads
-url_dl = Downloader ( fp.url_queue )
+# starting url downloader threads (the "asyncio" engine hosts all of its downloads on a single thread)
+if cfg.APP_CFG[ DOWNLOAD_ENGINE ] == "asyncio":
+    url_dl = AsyncDownloader ( fp.url_queue )
+else:
+    url_dl = Downloader ( fp.url_queue )
 url_dl.start_downloader_threads ( )
 
 # waiting for file parser thread (Normally it will finish first)
@@ -24,6 +64,33 @@ fp.wait_for_parser_thread ( )
 # waiting for downloader threads
 url_dl.wait_for_downloader_threads ( )
 
+# closing the pooled connections
+close_http_session_pool ( )
+
+# stopping the DNS pre-resolution threads
+close_dns_cache ( )
+
+# writing the remaining url states into the journal
+close_job_journal ( )
+
+# writing the remaining records into the manifest
+close_result_manifest ( )
+
+# writing the last metrics snapshot
+close_metrics_exporter ( )
+
+# statistics of this shard, merged by the coordinator of a sharded run
+if cfg.APP_CFG[ SHARD_COUNT ] > 1:
+    write_shard_stats ( os.path.join ( cfg.APP_CFG[ LOG_DIR ], get_shard_name ( cfg.APP_CFG[ SHARD_INDEX ],
+                                                                                cfg.APP_CFG[ SHARD_COUNT ] ) +
+                                       ".stats.json" ),
+                        { "shard_index": cfg.APP_CFG[ SHARD_INDEX ], "num_shards": cfg.APP_CFG[ SHARD_COUNT ],
+                          "num_urls": fp.num_urls, "num_downloaded": url_dl.num_downloaded,
+                          "num_failed": url_dl.num_failed, "elapsed": time.monotonic ( ) - start_time } )
+
+# writing the queued log records
+close_logging ( )
+
 print ( "----------------------------------------------------------------------" )
 print ( "<<Thank you for using File Parser - Web Image Downloader application>>" )
 print ( "----------------------------------------------------------------------" )
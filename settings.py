@@ -1,11 +1,26 @@
+import atexit
 import logging
 import logging.config
+import logging.handlers
+import queue
 
 import cfg
 from implementation.app_constants import *
+from implementation.archive_sink import OUTPUT_SINKS
+from implementation.manifest import MANIFEST_FORMATS
+from implementation.output_layout import OUTPUT_LAYOUTS
+from implementation.retry import DEFAULT_RETRY_POLICY, ERROR_CLASSES
+from implementation.sharding import SHARD_MODES, get_shard_name, parse_shard_arg
+from implementation.url_source import detect_compression, is_zstandard_available, ZSTD
 
 logger = logging.getLogger ( __name__ )
 
+# Available LOG_MODE options (see cfg.py)
+LOG_MODES = ("sync", "async")
+
+# QueueListener which writes the log records in "async" LOG_MODE (see configure_logging)
+log_listener = None
+
 
 def set_log_level ( ):
     """
@@ -43,12 +58,36 @@ def set_log_level ( ):
     logging.getLogger ( ).setLevel ( mapped_log_level )
 
 
-def configure_logging ( ):
+class LazyQueueHandler ( logging.handlers.QueueHandler ):
+    """
+    Description: LazyQueueHandler enqueues log records as they are. Unlike QueueHandler, it does not merge the \
+                 arguments of a record into its message, so the calling thread neither formats the record nor \
+                 waits on the lock of a file handler: it is done by the thread of the QueueListener. \
+                 Records never leave this process, so they need not be made picklable.
+
+    Version: 1.0
+    Comment: Arguments of a record are formatted after the call. Mutable objects must not be logged as arguments.
+    """
+
+    def prepare ( self, record ):
+        return record
+
+
+def configure_logging ( log_file_suffix="" ):
     """
-    Configures logging using predefined default configuration in ".logging.conf"
+    Configures logging using predefined default configuration in ".logging.conf".
+    In "async" LOG_MODE, handlers of the root logger are moved behind a queue: logging threads only enqueue \
+    their records, and a single QueueListener thread formats, writes and rotates them.
+    :param log_file_suffix: suffix of the log file LOG_DIR/app.log, which keeps apart the log files of the \
+    processes running at the same time
     :return:
     """
-    log_file_path = cfg.APP_CFG[ LOG_DIR ] + "/app.log"
+    global log_listener
+
+    # records logged so far are written by the handlers which are going to be replaced
+    close_logging ( )
+
+    log_file_path = cfg.APP_CFG[ LOG_DIR ] + "/app.log" + log_file_suffix
 
     logging.config.fileConfig (
         fname='.logging.conf',
@@ -56,6 +95,41 @@ def configure_logging ( ):
         disable_existing_loggers=False
     )
 
+    if cfg.APP_CFG.get ( LOG_MODE ) != "async":
+        return
+
+    root_logger = logging.getLogger ( )
+    handlers = list ( root_logger.handlers )
+    log_queue = queue.SimpleQueue ( )
+
+    for handler in handlers:
+        root_logger.removeHandler ( handler )
+    root_logger.addHandler ( LazyQueueHandler ( log_queue ) )
+
+    log_listener = logging.handlers.QueueListener ( log_queue, *handlers, respect_handler_level=True )
+    log_listener.start ( )
+
+    # the listener thread is a daemon, so the queued records are written when the application exits
+    atexit.unregister ( close_logging )
+    atexit.register ( close_logging )
+
+
+def close_logging ( ):
+    """
+    Writes the queued log records and stops the listener thread of "async" LOG_MODE (see configure_logging).
+    The handlers of the listener are closed.
+    :return:
+    """
+    global log_listener
+
+    if log_listener is None:
+        return
+
+    listener, log_listener = log_listener, None
+    listener.stop ( )
+    for handler in listener.handlers:
+        handler.close ( )
+
 
 def verify_cfg ( ):
     """
@@ -143,6 +217,398 @@ def verify_cfg ( ):
     # verification of LOG_LEVEL
     # This is verified in set_log_level function
 
+    # verification of LOG_MODE
+    if cfg.APP_CFG.get ( LOG_MODE ) not in LOG_MODES:
+        error_msg_dict[ "Warning" ].append (
+            "LOG_MODE is either not configured or not one of {} in cfg.py. ".format ( LOG_MODES ) +
+            "Default configuration of \"sync\" is activated." )
+        cfg.APP_CFG[ LOG_MODE ] = "sync"
+
+    # verification of DOWNLOAD_ENGINE
+    dl_engine = cfg.APP_CFG.get ( DOWNLOAD_ENGINE )
+    if dl_engine not in ("thread", "asyncio"):
+        error_msg_dict[ "Warning" ].append (
+            "DOWNLOAD_ENGINE is either not configured or invalid in cfg.py. " +
+            "Default configuration is activated with \"thread\"." )
+        cfg.APP_CFG[ DOWNLOAD_ENGINE ] = "thread"
+
+    elif dl_engine == "asyncio" and not is_aiohttp_available ( ):
+        error_msg_dict[ "Warning" ].append (
+            "DOWNLOAD_ENGINE \"asyncio\" requires aiohttp package which is not installed. " +
+            "Default configuration is activated with \"thread\"." )
+        cfg.APP_CFG[ DOWNLOAD_ENGINE ] = "thread"
+
+    # verification of ASYNC_MAX_CONCURRENCY
+    async_max_concurrency = cfg.APP_CFG.get ( ASYNC_MAX_CONCURRENCY )
+    if type ( async_max_concurrency ) is not int or async_max_concurrency < 1:
+        error_msg_dict[ "Warning" ].append (
+            "ASYNC_MAX_CONCURRENCY is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 1000 is activated." )
+        cfg.APP_CFG[ ASYNC_MAX_CONCURRENCY ] = 1000
+
+    # verification of HTTP_POOL_SIZE and HTTP_POOL_MAX_HOSTS
+    for cfg_name, cfg_key, default_value in (("HTTP_POOL_SIZE", HTTP_POOL_SIZE, 10),
+                                             ("HTTP_POOL_MAX_HOSTS", HTTP_POOL_MAX_HOSTS, 100)):
+        cfg_value = cfg.APP_CFG.get ( cfg_key )
+        if type ( cfg_value ) is not int or cfg_value < 1:
+            error_msg_dict[ "Warning" ].append (
+                "{0} is either not configured or not a positive integer in cfg.py. ".format ( cfg_name ) +
+                "Default configuration of {0} is activated.".format ( default_value ) )
+            cfg.APP_CFG[ cfg_key ] = default_value
+
+    # verification of HTTP_KEEP_ALIVE
+    if type ( cfg.APP_CFG.get ( HTTP_KEEP_ALIVE ) ) is not bool:
+        error_msg_dict[ "Warning" ].append (
+            "HTTP_KEEP_ALIVE is either not configured or not a boolean in cfg.py. " +
+            "Default configuration of True is activated." )
+        cfg.APP_CFG[ HTTP_KEEP_ALIVE ] = True
+
+    # verification of URL_VALIDATION
+    if cfg.APP_CFG.get ( URL_VALIDATION ) not in ("head", "get"):
+        error_msg_dict[ "Warning" ].append (
+            "URL_VALIDATION is either not configured or invalid in cfg.py. " +
+            "Default configuration is activated with \"head\"." )
+        cfg.APP_CFG[ URL_VALIDATION ] = "head"
+
+    # verification of IMAGE_SNIFFING
+    if type ( cfg.APP_CFG.get ( IMAGE_SNIFFING ) ) is not bool:
+        error_msg_dict[ "Warning" ].append (
+            "IMAGE_SNIFFING is either not configured or not a boolean in cfg.py. " +
+            "Default configuration of False is activated." )
+        cfg.APP_CFG[ IMAGE_SNIFFING ] = False
+
+    # verification of MIN_IMAGE_SIZE
+    min_image_size = cfg.APP_CFG.get ( MIN_IMAGE_SIZE )
+    if type ( min_image_size ) is not int or min_image_size < 0:
+        error_msg_dict[ "Warning" ].append (
+            "MIN_IMAGE_SIZE is either not configured or not a non-negative integer in cfg.py. " +
+            "Default configuration of 0 is activated." )
+        cfg.APP_CFG[ MIN_IMAGE_SIZE ] = 0
+
+    # verification of MAX_IMAGE_SIZE
+    max_image_size = cfg.APP_CFG.get ( MAX_IMAGE_SIZE )
+    if max_image_size is not None and (type ( max_image_size ) is not int or max_image_size < 1 or
+                                       max_image_size < cfg.APP_CFG[ MIN_IMAGE_SIZE ]):
+        error_msg_dict[ "Warning" ].append (
+            "MAX_IMAGE_SIZE is either not a positive integer or smaller than MIN_IMAGE_SIZE in cfg.py. " +
+            "Default configuration of None (no maximum size) is activated." )
+        max_image_size = None
+    cfg.APP_CFG[ MAX_IMAGE_SIZE ] = max_image_size
+
+    # verification of MIN_FREE_DISK_SPACE
+    min_free_disk_space = cfg.APP_CFG.get ( MIN_FREE_DISK_SPACE )
+    if min_free_disk_space is not None and (type ( min_free_disk_space ) is not int or min_free_disk_space < 0):
+        error_msg_dict[ "Warning" ].append (
+            "MIN_FREE_DISK_SPACE is not a non-negative integer in cfg.py. " +
+            "Default configuration of None (no disk space check) is activated." )
+        min_free_disk_space = None
+    cfg.APP_CFG[ MIN_FREE_DISK_SPACE ] = min_free_disk_space
+
+    # verification of MAX_DISK_SPACE_WAIT
+    max_disk_space_wait = cfg.APP_CFG.get ( MAX_DISK_SPACE_WAIT, 600 )
+    if max_disk_space_wait is not None and (type ( max_disk_space_wait ) not in (int, float) or
+                                            max_disk_space_wait < 0):
+        error_msg_dict[ "Warning" ].append (
+            "MAX_DISK_SPACE_WAIT is not a non-negative number in cfg.py. " +
+            "Default configuration of 600 is activated." )
+        max_disk_space_wait = 600
+    cfg.APP_CFG[ MAX_DISK_SPACE_WAIT ] = max_disk_space_wait
+
+    # verification of NUM_VALIDATOR_THREADS
+    num_validator_threads = cfg.APP_CFG.get ( NUM_VALIDATOR_THREADS )
+    if type ( num_validator_threads ) is not int or num_validator_threads < 1:
+        error_msg_dict[ "Warning" ].append (
+            "NUM_VALIDATOR_THREADS is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 4 is activated." )
+        cfg.APP_CFG[ NUM_VALIDATOR_THREADS ] = 4
+
+    # verification of DEDUP_MODE
+    if cfg.APP_CFG.get ( DEDUP_MODE ) not in (None, "hardlink", "manifest"):
+        error_msg_dict[ "Warning" ].append (
+            "DEDUP_MODE is invalid in cfg.py. By default application configures it to None." )
+        cfg.APP_CFG[ DEDUP_MODE ] = None
+
+    # verification of URL_DEDUP, URL_DEDUP_MEMORY_MB and URL_DEDUP_FP_RATE
+    if type ( cfg.APP_CFG.get ( URL_DEDUP ) ) is not bool:
+        error_msg_dict[ "Warning" ].append (
+            "URL_DEDUP is either not configured or not a boolean in cfg.py. "
+            "Default configuration of False is activated." )
+        cfg.APP_CFG[ URL_DEDUP ] = False
+
+    url_dedup_memory = cfg.APP_CFG.get ( URL_DEDUP_MEMORY_MB )
+    if type ( url_dedup_memory ) not in (int, float) or url_dedup_memory <= 0:
+        error_msg_dict[ "Warning" ].append (
+            "URL_DEDUP_MEMORY_MB is either not configured or not a positive number in cfg.py. " +
+            "Default configuration of 32 is activated." )
+        cfg.APP_CFG[ URL_DEDUP_MEMORY_MB ] = 32
+
+    url_dedup_fp_rate = cfg.APP_CFG.get ( URL_DEDUP_FP_RATE )
+    if type ( url_dedup_fp_rate ) is not float or not 0 < url_dedup_fp_rate < 1:
+        error_msg_dict[ "Warning" ].append (
+            "URL_DEDUP_FP_RATE is either not configured or not between 0 and 1 in cfg.py. " +
+            "Default configuration of 0.001 is activated." )
+        cfg.APP_CFG[ URL_DEDUP_FP_RATE ] = 0.001
+
+    # verification of JOURNAL_PATH, JOURNAL_BATCH_SIZE and JOURNAL_RESUME
+    journal_path = cfg.APP_CFG.get ( JOURNAL_PATH )
+    if journal_path is not None and type ( journal_path ) is not str:
+        error_msg_dict[ "Warning" ].append (
+            "JOURNAL_PATH should have been a file path. By default application configures it to None." )
+        cfg.APP_CFG[ JOURNAL_PATH ] = None
+
+    journal_batch_size = cfg.APP_CFG.get ( JOURNAL_BATCH_SIZE )
+    if type ( journal_batch_size ) is not int or journal_batch_size < 1:
+        error_msg_dict[ "Warning" ].append (
+            "JOURNAL_BATCH_SIZE is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 1000 is activated." )
+        cfg.APP_CFG[ JOURNAL_BATCH_SIZE ] = 1000
+
+    if type ( cfg.APP_CFG.get ( JOURNAL_RESUME ) ) is not bool:
+        error_msg_dict[ "Warning" ].append (
+            "JOURNAL_RESUME is either not configured or not a boolean in cfg.py. " +
+            "Default configuration of False is activated." )
+        cfg.APP_CFG[ JOURNAL_RESUME ] = False
+
+    # verification of HTTP_CACHE_PATH and HTTP_CACHE_MAX_ENTRIES
+    http_cache_path = cfg.APP_CFG.get ( HTTP_CACHE_PATH )
+    if http_cache_path is not None and type ( http_cache_path ) is not str:
+        error_msg_dict[ "Warning" ].append (
+            "HTTP_CACHE_PATH should have been a file path. By default application configures it to None." )
+        cfg.APP_CFG[ HTTP_CACHE_PATH ] = None
+
+    elif http_cache_path and os.path.dirname ( http_cache_path ):
+        os.makedirs ( os.path.dirname ( http_cache_path ), exist_ok=True )
+
+    http_cache_max_entries = cfg.APP_CFG.get ( HTTP_CACHE_MAX_ENTRIES )
+    if type ( http_cache_max_entries ) is not int or http_cache_max_entries < 1:
+        error_msg_dict[ "Warning" ].append (
+            "HTTP_CACHE_MAX_ENTRIES is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 1000000 is activated." )
+        cfg.APP_CFG[ HTTP_CACHE_MAX_ENTRIES ] = 1000000
+
+    # verification of SEGMENT_COUNT and SEGMENTED_DOWNLOAD_MIN_SIZE
+    segment_count = cfg.APP_CFG.get ( SEGMENT_COUNT )
+    if type ( segment_count ) is not int or segment_count < 1:
+        error_msg_dict[ "Warning" ].append (
+            "SEGMENT_COUNT is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 1 is activated." )
+        cfg.APP_CFG[ SEGMENT_COUNT ] = 1
+
+    segmented_dl_min_size = cfg.APP_CFG.get ( SEGMENTED_DOWNLOAD_MIN_SIZE )
+    if type ( segmented_dl_min_size ) is not int or segmented_dl_min_size < 0:
+        error_msg_dict[ "Warning" ].append (
+            "SEGMENTED_DOWNLOAD_MIN_SIZE is either not configured or negative in cfg.py. " +
+            "Default configuration of 16 MB is activated." )
+        cfg.APP_CFG[ SEGMENTED_DOWNLOAD_MIN_SIZE ] = 16 * 1024 * 1024
+
+    # verification of URL_SCHEDULER, HOST_MAX_IN_FLIGHT, HOST_MIN_INTERVAL and SCHEDULER_MAX_QUEUED
+    if cfg.APP_CFG.get ( URL_SCHEDULER ) not in ("fifo", "per_host"):
+        error_msg_dict[ "Warning" ].append (
+            "URL_SCHEDULER is either not configured or not supported in cfg.py. " +
+            "Default configuration of \"fifo\" is activated." )
+        cfg.APP_CFG[ URL_SCHEDULER ] = "fifo"
+
+    host_max_in_flight = cfg.APP_CFG.get ( HOST_MAX_IN_FLIGHT )
+    if type ( host_max_in_flight ) is not int or host_max_in_flight < 1:
+        error_msg_dict[ "Warning" ].append (
+            "HOST_MAX_IN_FLIGHT is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 2 is activated." )
+        cfg.APP_CFG[ HOST_MAX_IN_FLIGHT ] = 2
+
+    host_min_interval = cfg.APP_CFG.get ( HOST_MIN_INTERVAL )
+    if type ( host_min_interval ) not in (int, float) or host_min_interval < 0:
+        error_msg_dict[ "Warning" ].append (
+            "HOST_MIN_INTERVAL is either not configured or negative in cfg.py. " +
+            "Default configuration of 0 second is activated." )
+        cfg.APP_CFG[ HOST_MIN_INTERVAL ] = 0
+
+    scheduler_max_queued = cfg.APP_CFG.get ( SCHEDULER_MAX_QUEUED )
+    if type ( scheduler_max_queued ) is not int or scheduler_max_queued < 1:
+        error_msg_dict[ "Warning" ].append (
+            "SCHEDULER_MAX_QUEUED is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 1000 is activated." )
+        cfg.APP_CFG[ SCHEDULER_MAX_QUEUED ] = 1000
+
+    # verification of NUM_DL_THREADS, ADAPTIVE_CONCURRENCY, MIN_DL_THREADS and MAX_DL_THREADS
+    num_dl_threads = cfg.APP_CFG.get ( NUM_DL_THREADS )
+    if type ( num_dl_threads ) is not int or num_dl_threads < 1:
+        error_msg_dict[ "Warning" ].append (
+            "NUM_DL_THREADS is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 4 is activated." )
+        cfg.APP_CFG[ NUM_DL_THREADS ] = 4
+
+    if type ( cfg.APP_CFG.get ( ADAPTIVE_CONCURRENCY ) ) is not bool:
+        error_msg_dict[ "Warning" ].append (
+            "ADAPTIVE_CONCURRENCY is either not configured or not a boolean in cfg.py. " +
+            "Default configuration of False is activated." )
+        cfg.APP_CFG[ ADAPTIVE_CONCURRENCY ] = False
+
+    min_dl_threads = cfg.APP_CFG.get ( MIN_DL_THREADS )
+    if type ( min_dl_threads ) is not int or min_dl_threads < 1:
+        error_msg_dict[ "Warning" ].append (
+            "MIN_DL_THREADS is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 1 is activated." )
+        cfg.APP_CFG[ MIN_DL_THREADS ] = 1
+
+    max_dl_threads = cfg.APP_CFG.get ( MAX_DL_THREADS )
+    if type ( max_dl_threads ) is not int or max_dl_threads < cfg.APP_CFG[ MIN_DL_THREADS ]:
+        error_msg_dict[ "Warning" ].append (
+            "MAX_DL_THREADS is either not configured or lower than MIN_DL_THREADS in cfg.py. " +
+            "Default configuration of 32 (or MIN_DL_THREADS, if higher) is activated." )
+        cfg.APP_CFG[ MAX_DL_THREADS ] = max ( 32, cfg.APP_CFG[ MIN_DL_THREADS ] )
+
+    # verification of RETRY_POLICY
+    if not is_retry_policy_valid ( cfg.APP_CFG.get ( RETRY_POLICY ) ):
+        error_msg_dict[ "Warning" ].append (
+            "RETRY_POLICY is not a valid retry policy in cfg.py. Please look into cfg.py for its format. " +
+            "Recommended retry policy is activated." )
+        cfg.APP_CFG[ RETRY_POLICY ] = DEFAULT_RETRY_POLICY
+
+    # verification of WRITE_BUFFER_SIZE and FSYNC_BATCH_SIZE
+    write_buffer_size = cfg.APP_CFG.get ( WRITE_BUFFER_SIZE )
+    if type ( write_buffer_size ) is not int or write_buffer_size < 1:
+        error_msg_dict[ "Warning" ].append (
+            "WRITE_BUFFER_SIZE is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 256 KB is activated." )
+        cfg.APP_CFG[ WRITE_BUFFER_SIZE ] = 256 * 1024
+
+    fsync_batch_size = cfg.APP_CFG.get ( FSYNC_BATCH_SIZE )
+    if type ( fsync_batch_size ) is not int or fsync_batch_size < 0:
+        error_msg_dict[ "Warning" ].append (
+            "FSYNC_BATCH_SIZE is either not configured or negative in cfg.py. " +
+            "Default configuration of 0 is activated." )
+        cfg.APP_CFG[ FSYNC_BATCH_SIZE ] = 0
+
+    # verification of OUTPUT_LAYOUT and HASH_SHARD_LEVELS
+    if cfg.APP_CFG.get ( OUTPUT_LAYOUT ) not in OUTPUT_LAYOUTS:
+        error_msg_dict[ "Warning" ].append (
+            "OUTPUT_LAYOUT is either not configured or not supported in cfg.py. " +
+            "Default configuration of \"flat\" is activated." )
+        cfg.APP_CFG[ OUTPUT_LAYOUT ] = "flat"
+
+    hash_shard_levels = cfg.APP_CFG.get ( HASH_SHARD_LEVELS )
+    if type ( hash_shard_levels ) is not int or not 1 <= hash_shard_levels <= 16:
+        error_msg_dict[ "Warning" ].append (
+            "HASH_SHARD_LEVELS is either not configured or not in range [1, 16] in cfg.py. " +
+            "Default configuration of 2 is activated." )
+        cfg.APP_CFG[ HASH_SHARD_LEVELS ] = 2
+
+    # verification of OUTPUT_SINK and ARCHIVE_SHARD_SIZE
+    if cfg.APP_CFG.get ( OUTPUT_SINK ) not in OUTPUT_SINKS:
+        error_msg_dict[ "Warning" ].append (
+            "OUTPUT_SINK is either not configured or not supported in cfg.py. " +
+            "Default configuration of \"files\" is activated." )
+        cfg.APP_CFG[ OUTPUT_SINK ] = "files"
+
+    archive_shard_size = cfg.APP_CFG.get ( ARCHIVE_SHARD_SIZE )
+    if type ( archive_shard_size ) is not int or archive_shard_size < 1:
+        error_msg_dict[ "Warning" ].append (
+            "ARCHIVE_SHARD_SIZE is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 1 GB is activated." )
+        cfg.APP_CFG[ ARCHIVE_SHARD_SIZE ] = 1024 * 1024 * 1024
+
+    if cfg.APP_CFG[ OUTPUT_SINK ] != "files":
+        for key, key_name in ((DEDUP_MODE, "DEDUP_MODE"), (HTTP_CACHE_PATH, "HTTP_CACHE_PATH")):
+            if cfg.APP_CFG.get ( key ):
+                error_msg_dict[ "Warning" ].append (
+                    "{} is not supported by archive OUTPUT_SINK in cfg.py. It is deactivated.".format ( key_name ) )
+                cfg.APP_CFG[ key ] = None
+
+    # verification of SHARD_MODE, SHARD_INDEX, SHARD_COUNT and SHARD_WORKERS
+    if cfg.APP_CFG.get ( SHARD_MODE ) not in SHARD_MODES:
+        error_msg_dict[ "Warning" ].append (
+            "SHARD_MODE is either not configured or not supported in cfg.py. " +
+            "Default configuration of \"hash\" is activated." )
+        cfg.APP_CFG[ SHARD_MODE ] = "hash"
+
+    shard_count = cfg.APP_CFG.get ( SHARD_COUNT )
+    shard_index = cfg.APP_CFG.get ( SHARD_INDEX )
+    if type ( shard_count ) is not int or type ( shard_index ) is not int or not 0 <= shard_index < shard_count:
+        error_msg_dict[ "Warning" ].append (
+            "SHARD_INDEX and SHARD_COUNT are either not configured or SHARD_INDEX is not in range " +
+            "[0, SHARD_COUNT) in cfg.py. Default configuration of an unsharded run is activated." )
+        cfg.APP_CFG[ SHARD_INDEX ] = 0
+        cfg.APP_CFG[ SHARD_COUNT ] = 1
+
+    shard_workers = cfg.APP_CFG.get ( SHARD_WORKERS )
+    if type ( shard_workers ) is not int or shard_workers < 1:
+        error_msg_dict[ "Warning" ].append (
+            "SHARD_WORKERS is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 1 is activated." )
+        cfg.APP_CFG[ SHARD_WORKERS ] = 1
+
+    # verification of INPUT_MMAP_MIN_SIZE and INPUT_CHECKPOINT_INTERVAL
+    input_mmap_min_size = cfg.APP_CFG.get ( INPUT_MMAP_MIN_SIZE )
+    if type ( input_mmap_min_size ) is not int or input_mmap_min_size < 1:
+        error_msg_dict[ "Warning" ].append (
+            "INPUT_MMAP_MIN_SIZE is either not configured or not a positive integer in cfg.py. " +
+            "Default configuration of 64 MB is activated." )
+        cfg.APP_CFG[ INPUT_MMAP_MIN_SIZE ] = 64 * 1024 * 1024
+
+    input_checkpoint_interval = cfg.APP_CFG.get ( INPUT_CHECKPOINT_INTERVAL )
+    if type ( input_checkpoint_interval ) is not int or input_checkpoint_interval < 0:
+        error_msg_dict[ "Warning" ].append (
+            "INPUT_CHECKPOINT_INTERVAL is either not configured or negative in cfg.py. " +
+            "Default configuration of 10000 is activated." )
+        cfg.APP_CFG[ INPUT_CHECKPOINT_INTERVAL ] = 10000
+
+    # verification of METRICS_PORT, METRICS_SNAPSHOT_PATH and METRICS_SNAPSHOT_INTERVAL
+    metrics_port = cfg.APP_CFG.get ( METRICS_PORT )
+    if metrics_port is not None and (type ( metrics_port ) is not int or not 0 <= metrics_port <= 65535):
+        error_msg_dict[ "Warning" ].append (
+            "METRICS_PORT is not a valid port number in cfg.py. " +
+            "Default configuration of None (no metrics endpoint) is activated." )
+        cfg.APP_CFG[ METRICS_PORT ] = None
+
+    metrics_snapshot_path = cfg.APP_CFG.get ( METRICS_SNAPSHOT_PATH )
+    if metrics_snapshot_path is not None and not isinstance ( metrics_snapshot_path, str ):
+        error_msg_dict[ "Warning" ].append (
+            "METRICS_SNAPSHOT_PATH is not a path in cfg.py. " +
+            "Default configuration of None (no metrics snapshot) is activated." )
+        cfg.APP_CFG[ METRICS_SNAPSHOT_PATH ] = None
+
+    metrics_snapshot_interval = cfg.APP_CFG.get ( METRICS_SNAPSHOT_INTERVAL )
+    if type ( metrics_snapshot_interval ) not in (int, float) or metrics_snapshot_interval <= 0:
+        error_msg_dict[ "Warning" ].append (
+            "METRICS_SNAPSHOT_INTERVAL is either not configured or not positive in cfg.py. " +
+            "Default configuration of 10 is activated." )
+        cfg.APP_CFG[ METRICS_SNAPSHOT_INTERVAL ] = 10
+
+    # verification of MANIFEST_PATH and MANIFEST_FORMAT
+    manifest_path = cfg.APP_CFG.get ( MANIFEST_PATH )
+    if manifest_path is not None and not isinstance ( manifest_path, str ):
+        error_msg_dict[ "Warning" ].append (
+            "MANIFEST_PATH is not a path in cfg.py. Default configuration of None (no manifest) is activated." )
+        cfg.APP_CFG[ MANIFEST_PATH ] = None
+
+    if cfg.APP_CFG.get ( MANIFEST_FORMAT ) not in MANIFEST_FORMATS:
+        error_msg_dict[ "Warning" ].append (
+            "MANIFEST_FORMAT is either not configured or not one of {} in cfg.py. ".format ( MANIFEST_FORMATS ) +
+            "Default configuration of \"jsonl\" is activated." )
+        cfg.APP_CFG[ MANIFEST_FORMAT ] = "jsonl"
+
+    # verification of DNS_CACHE_TTL, DNS_NEGATIVE_TTL and DNS_PREFETCH_THREADS
+    dns_cache_ttl = cfg.APP_CFG.get ( DNS_CACHE_TTL )
+    if dns_cache_ttl is not None and (type ( dns_cache_ttl ) not in (int, float) or dns_cache_ttl < 0):
+        error_msg_dict[ "Warning" ].append (
+            "DNS_CACHE_TTL is neither None nor a non-negative number in cfg.py. " +
+            "Default configuration of None (no DNS cache) is activated." )
+        cfg.APP_CFG[ DNS_CACHE_TTL ] = None
+
+    dns_negative_ttl = cfg.APP_CFG.get ( DNS_NEGATIVE_TTL )
+    if type ( dns_negative_ttl ) not in (int, float) or dns_negative_ttl < 0:
+        error_msg_dict[ "Warning" ].append (
+            "DNS_NEGATIVE_TTL is either not configured or not a non-negative number in cfg.py. " +
+            "Default configuration of 60 is activated." )
+        cfg.APP_CFG[ DNS_NEGATIVE_TTL ] = 60
+
+    dns_prefetch_threads = cfg.APP_CFG.get ( DNS_PREFETCH_THREADS )
+    if type ( dns_prefetch_threads ) is not int or dns_prefetch_threads < 0:
+        error_msg_dict[ "Warning" ].append (
+            "DNS_PREFETCH_THREADS is either not configured or not a non-negative integer in cfg.py. " +
+            "Default configuration of 0 is activated." )
+        cfg.APP_CFG[ DNS_PREFETCH_THREADS ] = 0
+
     # printing error msg on console
     for error_severity in error_msg_dict:
         error_msg_list = error_msg_dict[ error_severity ]
@@ -150,6 +616,41 @@ def verify_cfg ( ):
             logger.info ( "{0}: {1}".format ( error_severity, msg ) )
 
 
+def is_retry_policy_valid ( retry_policy ):
+    """
+    Verifies whether or not, a retry policy (see RETRY_POLICY in cfg.py) is valid
+    :param retry_policy: dict / None
+    :return: boolean
+    """
+    if retry_policy is None:
+        return True
+
+    if type ( retry_policy ) is not dict:
+        return False
+
+    for error_class, policy in retry_policy.items ( ):
+        if error_class not in ERROR_CLASSES or type ( policy ) is not dict:
+            return False
+
+        if type ( policy.get ( "max_retries" ) ) is not int or policy[ "max_retries" ] < 0:
+            return False
+
+        for delay_key in ("base_delay", "max_delay"):
+            if type ( policy.get ( delay_key ) ) not in (int, float) or policy[ delay_key ] < 0:
+                return False
+
+    return True
+
+
+def is_aiohttp_available ( ):
+    """
+    Checks whether the optional "aiohttp" package, required by the "asyncio" download engine, is installed.
+    :return: boolean
+    """
+    import importlib.util
+    return importlib.util.find_spec ( "aiohttp" ) is not None
+
+
 def configure_application ( ):
     """
     This function configures the application and logging setup and verifies the user configuration defined in cfg.py.
@@ -164,7 +665,7 @@ def configure_application ( ):
 def get_cmdline_args ( test_args=[ ] ):
     """
     Takes the file path of plaintext file as an argument which contains image URLs through command line arguments \
-    from user and returns the file descriptor.
+    from user and returns the file descriptor. Optional arguments override the corresponding configuration of cfg.py.
     :param test_args: only used for testing argparse  capabilty to parse command-line arguments
     :return: file descriptor of the plaintext file
     """
@@ -173,11 +674,82 @@ def get_cmdline_args ( test_args=[ ] ):
     required = parser.add_argument_group ( 'required arguments' )
     required.add_argument ( '-f', '--file', dest='infile', required=True, metavar="FILE_PATH",
                             type=argparse.FileType ( 'rb' ),
-                            help='Relative/Absolute path to the URLs containing plaintext file' )
+                            help='Relative/Absolute path to the URLs containing plaintext file, or - for the ' +
+                                 'standard input (gzip, xz and zstd compressed files are decompressed)' )
+    parser.add_argument ( '-r', '--resume', dest='resume', action='store_true',
+                          help='Resume the interrupted job recorded in the journal (requires JOURNAL_PATH in cfg.py)' )
+    parser.add_argument ( '-e', '--engine', dest='engine', choices=( 'thread', 'asyncio' ),
+                          help='Download engine of the application (overrides DOWNLOAD_ENGINE of cfg.py)' )
+    shard_options = parser.add_mutually_exclusive_group ( )
+    shard_options.add_argument ( '-s', '--shard', dest='shard', metavar="INDEX/COUNT",
+                                 help='Process only the given shard of the URLs, e.g; 0/4 (overrides SHARD_INDEX and ' +
+                                      'SHARD_COUNT of cfg.py)' )
+    shard_options.add_argument ( '-w', '--workers', dest='workers', type=int, metavar="NUM_WORKERS",
+                                 help='Split the URLs between as many worker processes (overrides SHARD_WORKERS of ' +
+                                      'cfg.py)' )
 
     if test_args:
         args = parser.parse_args ( test_args )
     else:
         args = parser.parse_args ( )
 
+    if detect_compression ( args.infile ) == ZSTD and not is_zstandard_available ( ):
+        parser.error ( "zstd compressed file requires zstandard package which is not installed" )
+
+    if args.resume:
+        if not cfg.APP_CFG.get ( JOURNAL_PATH ):
+            parser.error ( "resuming a job requires JOURNAL_PATH to be configured in cfg.py" )
+        cfg.APP_CFG[ JOURNAL_RESUME ] = True
+
+    if args.engine:
+        if args.engine == "asyncio" and not is_aiohttp_available ( ):
+            parser.error ( "download engine \"asyncio\" requires aiohttp package which is not installed" )
+        cfg.APP_CFG[ DOWNLOAD_ENGINE ] = args.engine
+
+    if args.shard:
+        try:
+            cfg.APP_CFG[ SHARD_INDEX ], cfg.APP_CFG[ SHARD_COUNT ] = parse_shard_arg ( args.shard )
+        except ValueError as err:
+            parser.error ( "argument -s/--shard: {}".format ( err ) )
+        # a shard is processed by this process itself (e.g; a worker started by ShardCoordinator)
+        cfg.APP_CFG[ SHARD_WORKERS ] = 1
+
+    if args.workers is not None:
+        if args.workers < 1:
+            parser.error ( "argument -w/--workers: number of workers must be a positive integer" )
+        cfg.APP_CFG[ SHARD_WORKERS ] = args.workers
+
+    if (cfg.APP_CFG.get ( SHARD_WORKERS ) or 1) > 1 and args.infile.name == "<stdin>":
+        parser.error ( "worker processes cannot share the standard input, please provide a file path" )
+
+    if (cfg.APP_CFG.get ( SHARD_COUNT ) or 1) > 1 and (cfg.APP_CFG.get ( SHARD_WORKERS ) or 1) == 1:
+        configure_shard ( )
+
     return args.infile
+
+
+def configure_shard ( ):
+    """
+    Separates the outputs of a sharded run from the ones of the other shards, which might run at the same time \
+    on this machine: images are saved into a directory of their own, the log, the journal, the HTTP cache, the \
+    metrics snapshot and the manifest get a file of their own, and the metrics endpoint listens on \
+    METRICS_PORT + SHARD_INDEX.
+    :return:
+    """
+    import os
+    shard_name = get_shard_name ( cfg.APP_CFG[ SHARD_INDEX ], cfg.APP_CFG[ SHARD_COUNT ] )
+
+    cfg.APP_CFG[ IMAGE_SAVE_DIR ] = os.path.join ( cfg.APP_CFG[ IMAGE_SAVE_DIR ], shard_name )
+    os.makedirs ( cfg.APP_CFG[ IMAGE_SAVE_DIR ], exist_ok=True )
+
+    for path_key in (JOURNAL_PATH, HTTP_CACHE_PATH, METRICS_SNAPSHOT_PATH, MANIFEST_PATH):
+        if cfg.APP_CFG.get ( path_key ):
+            cfg.APP_CFG[ path_key ] = cfg.APP_CFG[ path_key ] + "." + shard_name
+
+    if cfg.APP_CFG.get ( METRICS_PORT ):
+        cfg.APP_CFG[ METRICS_PORT ] += cfg.APP_CFG[ SHARD_INDEX ]
+
+    # a RotatingFileHandler cannot share its file with the ones of the other shards: each one would rotate it \
+    # under the others
+    configure_logging ( "." + shard_name )
+    set_log_level ( )
@@ -4,7 +4,11 @@ setup (
     name='image_downloader',
     version='1.0',
     packages=[ 'implementation', 'implementation.unittest' ],
-    install_requires=[ "requests" ],
+    # http_session extends the connections of urllib3 2.x to time and cache host resolution
+    install_requires=[ "requests", "urllib3>=2" ],
+    # "asyncio" download engine (DOWNLOAD_ENGINE in cfg.py) requires aiohttp 3.10 or later
+    # zstd compressed plaintext files require zstandard
+    extras_require={ "asyncio": [ "aiohttp>=3.10" ], "zstd": [ "zstandard" ] },
     url='https://github.com/mantoshkumar1',
     license='MIT License',
     author='Mantosh Kumar',